@@ -0,0 +1,395 @@
+"""
+Кэш аутентификации в памяти воркера для get_current_user.
+
+Токен сессии -> снимок пользователя (колонки User, глобальной роли и команды) со
+сроком годности: min(AUTH_CACHE_TTL_SECONDS, время до истечения сессии).
+Попадание в кэш избавляет запрос от обращений к Redis и БД. Тот же снимок
+хранится в хеше Redis-сессии (см. RedisSessionService), так что промах
+кэша обходится одним HGETALL.
+
+Вытеснение - LRU по AUTH_CACHE_SIZE. Записи сбрасываются при деактивации сессий,
+изменении пользователя или ролей: сообщение публикуется в Redis-канал
+AUTH_CACHE_CHANNEL, и каждый воркер удаляет у себя соответствующие записи.
+
+Рядом живёт кэш членства в командах (MembershipCache): (user_id, event_id) ->
+команда, язык и флаг капитана. Он сбрасывается теми же сообщениями по user_id,
+что и снимки, поэтому изменения состава команд инвалидируются одним вызовом
+invalidate_user_auth.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import DateTime, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.auth.models import Command, Role, User
+from app.config import settings
+from app.logger import logger
+
+AUTH_CACHE_LOOKUPS = Counter(
+    "auth_cache_lookups_total",
+    "Обращения к кэшу аутентификации",
+    ["result"],
+)
+AUTH_CACHE_INVALIDATIONS = Counter(
+    "auth_cache_invalidations_total",
+    "Применённые сообщения инвалидации кэша аутентификации по виду",
+    ["kind"],
+)
+MEMBERSHIP_CACHE_LOOKUPS = Counter(
+    "membership_cache_lookups_total",
+    "Обращения к кэшу членства в командах",
+    ["result"],
+)
+
+
+def _columns(model) -> Dict[str, bool]:
+    """Колонки модели: имя -> является ли колонка датой-временем (для JSON)."""
+    return {attr.key: isinstance(attr.columns[0].type, DateTime) for attr in inspect(model).column_attrs}
+
+
+_USER_COLUMNS = _columns(User)
+_ROLE_COLUMNS = _columns(Role)
+_COMMAND_COLUMNS = _columns(Command)
+
+
+def _dump(obj, columns: Dict[str, bool]) -> Optional[Dict[str, Any]]:
+    return {key: getattr(obj, key) for key in columns} if obj is not None else None
+
+
+def _to_json(row: Optional[Dict[str, Any]], columns: Dict[str, bool]) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    return {key: value.isoformat() if columns[key] and value is not None else value for key, value in row.items()}
+
+
+def _from_json(row: Optional[Dict[str, Any]], columns: Dict[str, bool]) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    return {key: datetime.fromisoformat(value) if columns[key] and value is not None else value
+            for key, value in row.items() if key in columns}
+
+
+def _detached(model, row: Dict[str, Any]):
+    obj = model(**row)
+    make_transient_to_detached(obj)
+    return obj
+
+
+@dataclass(frozen=True)
+class AuthSnapshot:
+    """
+    Колонки пользователя, его глобальной роли и команды в мероприятии по умолчанию
+    (та же, что ищет UsersDAO.find_user_command_in_event) на момент аутентификации.
+    command = None - пользователь не состоит в команде.
+    """
+    user: Dict[str, Any]
+    role: Optional[Dict[str, Any]]
+    command: Optional[Dict[str, Any]]
+
+    @classmethod
+    def from_models(cls, user: User, command: Optional[Command]) -> "AuthSnapshot":
+        return cls(
+            user=_dump(user, _USER_COLUMNS),
+            role=_dump(user.role, _ROLE_COLUMNS),
+            command=_dump(command, _COMMAND_COLUMNS),
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "user": _to_json(self.user, _USER_COLUMNS),
+            "role": _to_json(self.role, _ROLE_COLUMNS),
+            "command": _to_json(self.command, _COMMAND_COLUMNS),
+        }, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "AuthSnapshot":
+        data = json.loads(raw)
+        return cls(
+            user=_from_json(data["user"], _USER_COLUMNS),
+            role=_from_json(data["role"], _ROLE_COLUMNS),
+            command=_from_json(data["command"], _COMMAND_COLUMNS),
+        )
+
+    @property
+    def user_id(self) -> int:
+        return self.user["id"]
+
+    def to_user(self) -> User:
+        """
+        Собирает отсоединённый от сессии объект User с загруженной ролью.
+        Остальные связи не загружены: обращение к ним поднимает DetachedInstanceError,
+        как и raise_on_sql для пользователя из БД.
+        """
+        user = User(**self.user)
+        user.role = _detached(Role, self.role) if self.role is not None else None
+        make_transient_to_detached(user)
+        return user
+
+    def to_command(self) -> Optional[Command]:
+        """Отсоединённый объект Command только с колонками (без участников и языка)."""
+        return _detached(Command, self.command) if self.command is not None else None
+
+
+@dataclass(frozen=True)
+class Membership:
+    """Членство пользователя в команде мероприятия."""
+    command_id: int
+    language_id: int
+    is_captain: bool
+
+
+# Отметка "пользователь не состоит в команде": кэшируется наравне с членством
+NO_MEMBERSHIP = object()
+
+
+class MembershipCache:
+    """LRU-кэш членства в командах по (user_id, event_id) с TTL."""
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        # (user_id, event_id) -> (time.monotonic(), после которого запись недействительна; Membership или NO_MEMBERSHIP)
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[float, Any]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[Tuple[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int, event_id: int):
+        """Membership, NO_MEMBERSHIP или None, если записи нет или она устарела."""
+        if not self.enabled:
+            return None
+        key = (user_id, event_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._discard(key)
+            entry = None
+        if entry is None:
+            MEMBERSHIP_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        MEMBERSHIP_CACHE_LOOKUPS.labels(result="hit").inc()
+        return entry[1]
+
+    def put(self, user_id: int, event_id: int, membership: Optional[Membership]) -> None:
+        if not self.enabled:
+            return
+        key = (user_id, event_id)
+        self._discard(key)
+        self._entries[key] = (time.monotonic() + self.ttl, membership if membership is not None else NO_MEMBERSHIP)
+        self._keys_by_user.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: Tuple[int, int]) -> None:
+        if self._entries.pop(key, None) is None:
+            return
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+    def drop_user(self, user_id: int) -> None:
+        for key in list(self._keys_by_user.get(user_id, ())):
+            self._discard(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_user.clear()
+
+
+class AuthCache:
+    """LRU-кэш снимков пользователей по токену сессии с TTL и рассылкой инвалидаций."""
+
+    def __init__(self, maxsize: int, ttl: float, channel: str, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.channel = channel
+        self.enabled = enabled
+        # токен -> (time.monotonic(), после которого запись недействительна; снимок)
+        self._entries: "OrderedDict[str, Tuple[float, AuthSnapshot]]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self.memberships = MembershipCache(maxsize, ttl, enabled)
+        self.hits = 0
+        self.misses = 0
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio, 4),
+            "memberships": len(self.memberships),
+        }
+
+    def get(self, token: str) -> Optional[AuthSnapshot]:
+        """Возвращает снимок из кэша или None (промах, запись устарела)."""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(token)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._discard(token)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            AUTH_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        AUTH_CACHE_LOOKUPS.labels(result="hit").inc()
+        return entry[1]
+
+    def put(self, token: str, snapshot: AuthSnapshot, session_expires_at: datetime) -> None:
+        """Запоминает снимок на время не дольше жизни сессии."""
+        if not self.enabled:
+            return
+        if session_expires_at.tzinfo is None:
+            session_expires_at = session_expires_at.replace(tzinfo=timezone.utc)
+        session_left = (session_expires_at - datetime.now(timezone.utc)).total_seconds()
+        lifetime = min(self.ttl, session_left)
+        if lifetime <= 0:
+            return
+        self._discard(token)
+        self._entries[token] = (time.monotonic() + lifetime, snapshot)
+        self._tokens_by_user.setdefault(snapshot.user_id, set()).add(token)
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, token: str) -> bool:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return False
+        user_id = entry[1].user_id
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+        return True
+
+    def _drop_token(self, token: str) -> None:
+        self._discard(token)
+        AUTH_CACHE_INVALIDATIONS.labels(kind="token").inc()
+
+    def _drop_user(self, user_id: int) -> None:
+        for token in list(self._tokens_by_user.get(user_id, ())):
+            self._discard(token)
+        self.memberships.drop_user(user_id)
+        AUTH_CACHE_INVALIDATIONS.labels(kind="user").inc()
+
+    def _drop_all(self) -> None:
+        self._entries.clear()
+        self._tokens_by_user.clear()
+        self.memberships.clear()
+        AUTH_CACHE_INVALIDATIONS.labels(kind="all").inc()
+
+    def _apply(self, message: Dict[str, Any]) -> None:
+        if "token" in message:
+            self._drop_token(message["token"])
+        elif "user_id" in message:
+            self._drop_user(int(message["user_id"]))
+        elif message.get("all"):
+            self._drop_all()
+
+    async def _publish(self, message: Dict[str, Any]) -> None:
+        """Сбрасывает записи в своём воркере и рассылает сообщение остальным."""
+        self._apply(message)
+        if self._redis is None:
+            return
+        try:
+            await self._redis.publish(self.channel, json.dumps(message))
+        except Exception as e:
+            logger.error(f"Не удалось разослать инвалидацию кэша аутентификации {message}: {e}")
+
+    async def invalidate_token(self, token: str) -> None:
+        await self._publish({"token": token})
+
+    async def invalidate_user(self, user_id: int) -> None:
+        """Сбрасывает все сессии и членства пользователя: изменились его данные, роль, команда или сессии."""
+        await self._publish({"user_id": user_id})
+
+    async def invalidate_all(self) -> None:
+        await self._publish({"all": True})
+
+    @property
+    def is_listening(self) -> bool:
+        return self._listener is not None and not self._listener.done()
+
+    async def start(self) -> None:
+        """Подписывается на канал инвалидаций (вызывается при старте приложения с Redis)."""
+        if not self.enabled or self.is_listening:
+            return
+        from app.redis_client import redis_clients
+
+        self._redis = redis_clients.get()
+        self._listener = asyncio.create_task(self._listen(), name="auth-cache-invalidation")
+        logger.info(f"Кэш аутентификации подписан на канал {self.channel}")
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        # Клиент общий (app.redis_client), пул закрывает redis_clients.close()
+        self._redis = None
+        self._drop_all()
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                # Пока подписки не было, сообщения могли потеряться
+                self._drop_all()
+                while True:
+                    # Ожидание с таймаутом: listen() упирается в таймаут сокета общего пула
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None or message["type"] != "message":
+                        continue
+                    try:
+                        self._apply(json.loads(message["data"]))
+                    except (ValueError, TypeError) as e:
+                        logger.warning(f"Некорректное сообщение инвалидации кэша аутентификации: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Подписка на инвалидации кэша аутентификации прервана: {e}")
+                self._drop_all()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+auth_cache = AuthCache(
+    maxsize=settings.AUTH_CACHE_SIZE,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+    channel=settings.AUTH_CACHE_CHANNEL,
+    enabled=settings.AUTH_CACHE_ENABLED,
+)
+
+Gauge("auth_cache_entries", "Записей в кэше аутентификации").set_function(lambda: len(auth_cache))
+Gauge("auth_cache_hit_ratio", "Доля попаданий в кэш аутентификации с запуска воркера").set_function(
+    lambda: auth_cache.hit_ratio
+)
@@ -1,9 +1,9 @@
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload
 
 from app.auth.models import (
     Command,
@@ -19,18 +19,31 @@ from app.auth.models import (
     User,
     UserProfile,
 )
-from app.auth.redis_session import get_redis_session_service
-from app.auth.schemas import (
-    SessionCreate,
-    SessionFindUpdate,
-    SessionGet,
-    SessionMakeUpdate,
-)
-from app.auth.utils import create_session
+from app.auth.auth_cache import NO_MEMBERSHIP, Membership, auth_cache
+from app.auth.loading import COMMAND_MEMBERS_PROFILE
+from app.auth.session_store import get_session_store
 from app.config import CAPTAIN_ROLE_NAME, settings
-from app.dao.base import BaseDAO
+from app.dao.base import BaseDAO, Page
 from app.logger import logger
 
+# Команда пользователя в мероприятии: вызывается почти в каждом запросе квеста,
+# поэтому запрос строится один раз при импорте, при вызове передаются только параметры
+_USER_COMMAND_IN_EVENT = (
+    select(Command)
+    .join(CommandsUser, Command.id == CommandsUser.command_id)
+    .where(Command.event_id == bindparam("event_id"), CommandsUser.user_id == bindparam("user_id"))
+    .limit(1)
+)
+_USER_COMMAND_IN_EVENT_MEMBERS = _USER_COMMAND_IN_EVENT.options(*COMMAND_MEMBERS_PROFILE)
+# Членство без загрузки команды и её участников: только id, язык и роль в команде
+_USER_MEMBERSHIP_IN_EVENT = (
+    select(Command.id, Command.language_id, RoleUserCommand.name)
+    .join(CommandsUser, Command.id == CommandsUser.command_id)
+    .join(RoleUserCommand, RoleUserCommand.id == CommandsUser.role_id)
+    .where(Command.event_id == bindparam("event_id"), CommandsUser.user_id == bindparam("user_id"))
+    .limit(1)
+)
+
 
 class UsersDAO(BaseDAO):
     model = User
@@ -59,32 +72,47 @@ class UsersDAO(BaseDAO):
             raise
 
     async def find_user_command_in_event(
-        self, user_id: int, event_id: int = 1
+        self, user_id: int, event_id: int = 1, options: list = None
     ) -> Optional[Command]:
         """
         Находит команду, в которой состоит пользователь для указанного мероприятия.
+        По умолчанию загружает участников с ролями (COMMAND_MEMBERS_PROFILE).
         """
         logger.info(
             f"Поиск команды для пользователя {user_id} в мероприятии {event_id}"
         )
         try:
-            query = (
-                select(Command)
-                .join(CommandsUser, Command.id == CommandsUser.command_id)
-                .filter(Command.event_id == event_id)
-                .filter(CommandsUser.user_id == user_id)
-                .options(
-                    selectinload(Command.users).joinedload(CommandsUser.user),
-                    selectinload(Command.users).joinedload(CommandsUser.role),
-                )
-                .limit(1)  # Добавляем лимит для оптимизации
-            )
-            result = await self._session.execute(query)
+            if options is None:
+                query = _USER_COMMAND_IN_EVENT_MEMBERS
+            else:
+                query = _USER_COMMAND_IN_EVENT.options(*options)
+            result = await self._session.execute(query, {"user_id": user_id, "event_id": event_id})
             return result.unique().scalar_one_or_none()
         except Exception as e:
             logger.error(f"Ошибка при поиске команды: {e}")
             raise
 
+    async def find_user_membership(self, user_id: int, event_id: int = 1) -> Optional[Membership]:
+        """
+        Членство пользователя в команде мероприятия (id команды, язык, капитан ли).
+        Результат, в том числе отсутствие команды, кэшируется в auth_cache.memberships
+        и сбрасывается вместе со снимками пользователя (invalidate_user_auth).
+        """
+        cached = auth_cache.memberships.get(user_id, event_id)
+        if cached is not None:
+            return None if cached is NO_MEMBERSHIP else cached
+        try:
+            result = await self._session.execute(
+                _USER_MEMBERSHIP_IN_EVENT, {"user_id": user_id, "event_id": event_id}
+            )
+            row = result.first()
+        except Exception as e:
+            logger.error(f"Ошибка при поиске членства пользователя {user_id} в мероприятии {event_id}: {e}")
+            raise
+        membership = Membership(row[0], row[1], row[2] == CAPTAIN_ROLE_NAME) if row else None
+        auth_cache.memberships.put(user_id, event_id, membership)
+        return membership
+
     async def is_user_captain_in_command(self, user_id: int, command_id: int) -> bool:
         """
         Проверяет, является ли пользователь капитаном в указанной команде.
@@ -97,6 +125,7 @@ class UsersDAO(BaseDAO):
                 select(CommandsUser)
                 .filter_by(command_id=command_id)
                 .filter_by(user_id=user_id)
+                .options(joinedload(CommandsUser.role))
             )
             result = await self._session.execute(query)
             command_user = result.scalar_one_or_none()
@@ -412,45 +441,36 @@ class UsersDAO(BaseDAO):
             )
             return []
 
-    async def find_all_looking_for_team(self):
+    async def find_looking_for_team_page(
+        self, exclude_user_id: Optional[int] = None, after: Optional[str] = None, limit: Optional[int] = 50
+    ) -> Page:
         """
-        Находит всех пользователей, которые ищут команду (is_looking_for_friends == True).
+        Страница пользователей, которые ищут команду (is_looking_for_friends == True),
+        в порядке full_name. Идёт по частичному индексу ix_users_looking_for_team.
+
+        Args:
+            exclude_user_id: ID пользователя, которого не нужно включать (обычно текущий)
+            after: Курсор предыдущей страницы
+            limit: Размер страницы (None - вся выборка)
 
         Returns:
-            Список пользователей с информацией о команде и статусе капитана (если есть).
+            Page со строками (id, full_name, telegram_username)
         """
-        logger.info("Поиск всех пользователей, ищущих команду")
+        logger.info("Поиск страницы пользователей, ищущих команду")
         try:
-            from sqlalchemy import case, false, select, true
-
-            # Запрос для получения всех пользователей, ищущих команду,
-            # с информацией о команде и статусе капитана
-            query = (
-                select(
-                    self.model.id,
-                    self.model.full_name,
-                    self.model.telegram_username,
-                    Command.name.label("team_name"),
-                    case((Role.name == "captain", true()), else_=false()).label(
-                        "is_captain"
-                    ),
-                )
-                .select_from(self.model)  # Явно указываем начальную таблицу
-                .outerjoin(CommandsUser, self.model.id == CommandsUser.user_id)
-                .outerjoin(Command, CommandsUser.command_id == Command.id)
-                .outerjoin(Role, CommandsUser.role_id == Role.id)
-                .where(self.model.is_looking_for_friends == True)
-                .order_by(self.model.full_name)
-            )
-
-            # Выполняем запрос
-            result = await self._session.execute(query)
-            all_users = result.all()
-
-            logger.info(f"Найдено {len(all_users)} пользователей, ищущих команду")
-            return all_users
+            query = select(
+                self.model.id,
+                self.model.full_name,
+                self.model.telegram_username,
+            ).where(self.model.is_looking_for_friends == True)
+            if exclude_user_id is not None:
+                query = query.where(self.model.id != exclude_user_id)
+
+            page = await self.find_page(order_by=[self.model.full_name], after=after, limit=limit, statement=query)
+            logger.info(f"Найдено {len(page.items)} пользователей, ищущих команду")
+            return page
         except Exception as e:
-            logger.error(f"Ошибка при поиске всех пользователей, ищущих команду: {e}")
+            logger.error(f"Ошибка при поиске пользователей, ищущих команду: {e}")
             raise
 
 
@@ -535,6 +555,59 @@ class CommandsDAO(BaseDAO):
             logger.error(f"Ошибка при поиске команд для мероприятия {event_id}: {e}")
             raise
 
+    async def find_stats_page(
+        self, event_id: int, after: Optional[str] = None, limit: Optional[int] = 50, options: list = None
+    ) -> Page:
+        """
+        Страница команд мероприятия вместе с балансами, по убыванию очков.
+
+        Returns:
+            Page со строками (Command, score, coins, solved_count)
+        """
+        from sqlalchemy import func
+        from app.quest.models import CommandBalance
+
+        logger.info(f"Поиск страницы статистики команд для мероприятия {event_id}")
+        score = func.coalesce(CommandBalance.score, 0)
+        query = (
+            select(
+                self.model,
+                score.label("score"),
+                func.coalesce(CommandBalance.coins, 0).label("coins"),
+                func.coalesce(CommandBalance.solved_count, 0).label("solved_count"),
+            )
+            .outerjoin(CommandBalance, CommandBalance.command_id == self.model.id)
+            .where(self.model.event_id == event_id)
+        )
+        return await self.find_page(
+            order_by=[score.desc()], after=after, limit=limit, statement=query, options=options or ()
+        )
+
+    async def find_leaderboard_page(self, event_id: int, after: Optional[str] = None, limit: Optional[int] = 50) -> Page:
+        """
+        Страница лидерборда: команды с итогом coins * 0.5 + score больше 2, по убыванию итога.
+
+        Returns:
+            Page со строками (command_name, language_name, total_score)
+        """
+        from sqlalchemy import func
+        from app.quest.models import CommandBalance
+
+        logger.info(f"Поиск страницы лидерборда для мероприятия {event_id}")
+        total_score = func.coalesce(CommandBalance.coins, 0) * 0.5 + func.coalesce(CommandBalance.score, 0)
+        query = (
+            select(
+                self.model.name.label("command_name"),
+                Language.name.label("language_name"),
+                total_score.label("total_score"),
+            )
+            .select_from(self.model)
+            .outerjoin(CommandBalance, CommandBalance.command_id == self.model.id)
+            .outerjoin(Language, Language.id == self.model.language_id)
+            .where(self.model.event_id == event_id, total_score > 2)
+        )
+        return await self.find_page(order_by=[total_score.desc()], after=after, limit=limit, statement=query)
+
     async def delete_by_id(self, command_id: int):
         """
         Удаляет команду по ID с учётом всех связей (attempts, commandsusers)
@@ -812,141 +885,116 @@ class EventsDAO(BaseDAO):
 
 
 class SessionDAO(BaseDAO):
+    """
+    Сессии пользователей. Хранилище (Redis, таблица sessions или память процесса)
+    выбирается настройкой SESSION_STORE, см. app.auth.session_store.
+    """
     model = Session
 
-    async def create_session(self, user_id: int) -> str:
+    @property
+    def _store(self):
+        return get_session_store(self._session)
+
+    async def create_session(
+        self, user_id: int, role_id: Optional[int] = None, event_id: Optional[int] = None
+    ) -> str:
         """
         Создает новую сессию для пользователя.
         Если у пользователя уже есть активная сессия, она будет деактивирована.
-        Возвращает токен созданной сессии.
-        """
-        if settings.USE_REDIS:
-            # Используем Redis для сессий
-            redis_session_service = await get_redis_session_service()
-            return await redis_session_service.create_session(user_id)
-        else:
-            # Fallback к базе данных
-            logger.info(f"Создание новой сессии для пользователя {user_id}")
-            try:
-                # Деактивируем все активные сессии пользователя
-                await self.deactivate_all_sessions(user_id)
-
-                # Создаем новую сессию
-                session = await create_session(user_id)
-
-                session_data = SessionCreate(
-                    user_id=user_id,
-                    token=session.token,
-                    expires_at=session.expires_at,
-                    is_active=True,
-                )
-
-                await self.add(values=session_data)
-
-                logger.info(f"Новая сессия успешно создана для пользователя {user_id}")
-                return session.token
+        Возвращает токен созданной сессии. role_id и event_id нужны только
+        подписанным токенам (SESSION_TOKEN_FORMAT = "signed", только с Redis).
+        """
+        logger.info(f"Создание новой сессии для пользователя {user_id}")
+        try:
+            token = await self._store.create_session(user_id, role_id=role_id, event_id=event_id)
+            logger.info(f"Новая сессия успешно создана для пользователя {user_id}")
+            return token
+        except Exception as e:
+            logger.error(f"Ошибка при создании сессии: {e}")
+            raise
 
+    async def login(
+        self, user_id: int, role_id: Optional[int] = None, event_id: Optional[int] = None
+    ) -> str:
+        """
+        Сессия для входа пользователя: действующая сессия продлевается и
+        возвращается повторно (SESSION_REUSE_ON_LOGIN), иначе создаётся новая.
+        Так повторное открытие Mini App не пишет новую сессию и не ломает токен
+        в уже показанных QR-кодах.
+        """
+        if settings.SESSION_REUSE_ON_LOGIN:
+            try:
+                token = await self._store.reuse_session(user_id)
             except Exception as e:
-                logger.error(f"Ошибка при создании сессии: {e}")
-                raise
+                logger.error(f"Ошибка при продлении сессии пользователя {user_id}: {e}")
+                token = None
+            if token:
+                logger.info(f"Повторный вход пользователя {user_id}: сессия продлена")
+                return token
+        return await self.create_session(user_id, role_id=role_id, event_id=event_id)
 
     async def deactivate_all_sessions(self, user_id: int):
         """
         Деактивирует все активные сессии пользователя.
         """
-        if settings.USE_REDIS:
-            # Используем Redis для сессий
-            redis_session_service = await get_redis_session_service()
-            await redis_session_service.deactivate_all_sessions(user_id)
-        else:
-            # Fallback к базе данных
-            logger.info(f"Деактивация всех сессий пользователя {user_id}")
-            try:
-                await self.update(
-                    filters=SessionFindUpdate(user_id=user_id, is_active=True),
-                    values=SessionMakeUpdate(
-                        is_active=False, expires_at=datetime.now(timezone.utc)
-                    ),
-                )
-                logger.info(f"Все сессии пользователя {user_id} успешно деактивированы")
-            except Exception as e:
-                logger.error(f"Ошибка при деактивации сессий: {e}")
-                raise
+        logger.info(f"Деактивация всех сессий пользователя {user_id}")
+        try:
+            await self._store.deactivate_all_sessions(user_id)
+            logger.info(f"Все сессии пользователя {user_id} успешно деактивированы")
+        except Exception as e:
+            logger.error(f"Ошибка при деактивации сессий: {e}")
+            raise
 
     async def deactivate_session(self, session_token: str):
         """
         Деактивирует сессию по её токену.
         """
-        if settings.USE_REDIS:
-            # Используем Redis для сессий
-            redis_session_service = await get_redis_session_service()
-            await redis_session_service.deactivate_session(session_token)
-        else:
-            # Fallback к базе данных
-            logger.info(f"Деактивация сессии с токеном {session_token}")
-            try:
-                await self.update(
-                    filters={"token": session_token},
-                    values={
-                        "is_active": False,
-                        "expires_at": datetime.now(timezone.utc),
-                    },
-                )
-                logger.info(f"Сессия с токеном {session_token} успешно деактивирована")
-            except Exception as e:
-                logger.error(f"Ошибка при деактивации сессии: {e}")
-                raise
+        logger.info(f"Деактивация сессии с токеном {session_token}")
+        try:
+            await self._store.deactivate_session(session_token)
+            logger.info(f"Сессия с токеном {session_token} успешно деактивирована")
+        except Exception as e:
+            logger.error(f"Ошибка при деактивации сессии: {e}")
+            raise
 
     async def get_session(self, session_token: str):
         """
-        Получает сессию по токену.
+        Получает сессию по токену (None, если она не найдена, истекла или деактивирована).
         """
-        if settings.USE_REDIS:
-            # Используем Redis для сессий
-            redis_session_service = await get_redis_session_service()
-            return await redis_session_service.get_session(session_token)
-        else:
-            # Fallback к базе данных
-            logger.info(f"Получение сессии по токену {session_token}")
-            try:
-                session = await self.find_one_or_none(
-                    filters=SessionGet(token=session_token)
-                )
-                if not session or not session.is_valid():
-                    logger.warning(
-                        f"Недействительная или истекшая сессия с токеном {session_token}"
-                    )
-                    return None
-                logger.info(f"Сессия с токеном {session_token} успешно получена")
-                return session
-            except Exception as e:
-                logger.error(f"Ошибка при получении сессии: {e}")
-                return None
+        try:
+            session = await self._store.get_session(session_token)
+            if session is None:
+                logger.warning(f"Недействительная или истекшая сессия с токеном {session_token}")
+            return session
+        except Exception as e:
+            logger.error(f"Ошибка при получении сессии: {e}")
+            return None
+
+    async def get_snapshot_versions(self, user_id: int) -> Optional[Tuple[str, str]]:
+        """
+        Версии снимка пользователя в хранилище сессий (None - хранилище снимки не держит).
+        """
+        return await self._store.get_snapshot_versions(user_id)
+
+    async def save_snapshot(self, session_token: str, user_id: int, snapshot: str, versions: Tuple[str, str]) -> bool:
+        """
+        Сохраняет снимок пользователя в сессию, чтобы следующие запросы
+        обходились без БД.
+        """
+        return await self._store.save_snapshot(session_token, user_id, snapshot, versions)
 
     async def clear_all_sessions(self) -> int:
         """
-        Удаляет все сессии из базы данных (для тестирования).
+        Удаляет все сессии из хранилища (для тестирования).
         Возвращает количество удаленных сессий.
         """
-        logger.info("Удаление всех сессий из базы данных")
+        logger.info("Удаление всех сессий")
         try:
-            # Получаем количество сессий перед удалением
-            all_sessions = await self.find_all()
-            sessions_count = len(all_sessions)
-
-            # Удаляем все сессии
-            from sqlalchemy import delete
-
-            delete_stmt = delete(self.model)
-            result = await self._session.execute(delete_stmt)
-            await self._session.commit()
-
-            deleted_count = result.rowcount
-            logger.info(f"Удалено {deleted_count} сессий из базы данных")
+            deleted_count = await self._store.clear_all_sessions()
+            logger.info(f"Удалено {deleted_count} сессий")
             return deleted_count
         except Exception as e:
             logger.error(f"Ошибка при удалении всех сессий: {e}")
-            await self._session.rollback()
             raise
 
 
@@ -963,33 +1011,18 @@ class InsidersInfoDAO(BaseDAO):
             f"Создание или обновление информации инсайдера для пользователя {user_id}"
         )
         try:
-            # Ищем существующую запись
-            query = select(self.model).filter_by(user_id=user_id)
-            result = await self._session.execute(query)
-            insider_info = result.scalar_one_or_none()
-
-            if insider_info:
-                # Обновляем существующую запись
-                if student_organization is not None:
-                    insider_info.student_organization = student_organization
-                if geo_link is not None:
-                    insider_info.geo_link = geo_link
-                await self._session.commit()
-                logger.info(
-                    f"Информация инсайдера для пользователя {user_id} обновлена"
-                )
-                return insider_info
-            else:
-                # Создаем новую запись
-                insider_info = InsiderInfo(
-                    user_id=user_id,
-                    student_organization=student_organization,
-                    geo_link=geo_link,
-                )
-                self._session.add(insider_info)
-                await self._session.commit()
-                logger.info(f"Информация инсайдера для пользователя {user_id} создана")
-                return insider_info
+            # Один INSERT ... ON CONFLICT вместо поиска и отдельной вставки/обновления
+            values = {"student_organization": student_organization, "geo_link": geo_link}
+            insider_info = await self.upsert(
+                {"user_id": user_id, **values},
+                index_elements=["user_id"],
+                update_fields=[name for name, value in values.items() if value is not None],
+            )
+            await self._session.commit()
+            logger.info(
+                f"Информация инсайдера для пользователя {user_id} сохранена"
+            )
+            return insider_info
         except Exception as e:
             logger.error(f"Ошибка при создании/обновлении информации инсайдера: {e}")
             await self._session.rollback()
@@ -1101,6 +1134,22 @@ class ProgramDAO(BaseDAO):
             )
             return []
 
+    async def get_score_history_page(self, user_id: int, after: Optional[str] = None, limit: Optional[int] = 50) -> Page:
+        """
+        Получает страницу истории начисления баллов, новые записи первыми
+
+        Args:
+            user_id: ID пользователя
+            after: Курсор предыдущей страницы
+            limit: Размер страницы (None - вся выборка)
+
+        Returns:
+            Page с записями Program
+        """
+        logger.info(f"Получение страницы истории баллов пользователя {user_id}")
+        query = select(self.model).where(self.model.user_id == user_id)
+        return await self.find_page(order_by=[self.model.id.desc()], after=after, limit=limit, statement=query)
+
 
 class UserProfileDAO(BaseDAO):
     """DAO для работы с профилями пользователей"""
@@ -1120,26 +1169,15 @@ class UserProfileDAO(BaseDAO):
         """
         logger.info(f"Создание/обновление профиля пользователя {user_id}")
         try:
-            # Ищем существующий профиль напрямую через SQLAlchemy
-            query = select(self.model).filter_by(user_id=user_id)
-            result = await self._session.execute(query)
-            existing_profile = result.scalar_one_or_none()
-
-            if existing_profile:
-                # Обновляем существующий профиль
-                if email is not None:
-                    existing_profile.email = email
-
-                await self._session.commit()
-                logger.info(f"Профиль пользователя {user_id} обновлен")
-                return existing_profile
-            else:
-                # Создаем новый профиль
-                new_profile = UserProfile(user_id=user_id, email=email)
-                self._session.add(new_profile)
-                await self._session.commit()
-                logger.info(f"Создан новый профиль для пользователя {user_id}")
-                return new_profile
+            # Один INSERT ... ON CONFLICT вместо поиска и отдельной вставки/обновления
+            profile = await self.upsert(
+                {"user_id": user_id, "email": email},
+                index_elements=["user_id"],
+                update_fields=["email"] if email is not None else [],
+            )
+            await self._session.commit()
+            logger.info(f"Профиль пользователя {user_id} сохранен")
+            return profile
 
         except Exception as e:
             logger.error(
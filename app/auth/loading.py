@@ -0,0 +1,41 @@
+"""
+Профили загрузки связей для пользователей и команд.
+
+Связи моделей объявлены с lazy="raise_on_sql", поэтому каждый эндпоинт явно
+говорит, какие связи ему нужны: передаёт в DAO (options=...) один из профилей.
+Профиль - список опций загрузки SQLAlchemy; коллекции грузятся selectinload
+(отдельный запрос с IN, без размножения строк), одиночные связи - joinedload.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.auth.models import Command, CommandsUser, User
+
+# Текущий пользователь (get_current_user, middleware админки): только глобальная роль
+USER_AUTH_PROFILE = [joinedload(User.role)]
+
+# Участники команды с их ролями в команде
+COMMAND_MEMBERS_PROFILE = [
+    selectinload(Command.users).joinedload(CommandsUser.user),
+    selectinload(Command.users).joinedload(CommandsUser.role),
+]
+
+# Участники для format_participants: ещё глобальная роль и данные инсайдера
+COMMAND_PARTICIPANTS_PROFILE = [
+    selectinload(Command.users).joinedload(CommandsUser.role),
+    selectinload(Command.users).joinedload(CommandsUser.user).options(
+        joinedload(User.role), selectinload(User.insider_info)
+    ),
+]
+
+# GET /commands/stats: участники, их роли и язык команды
+COMMAND_STATS_PROFILE = COMMAND_MEMBERS_PROFILE + [joinedload(Command.language)]
+
+# GET /auth/me: роль, данные инсайдера и команды пользователя с участниками
+USER_ME_PROFILE = [
+    joinedload(User.role),
+    selectinload(User.insider_info),
+    selectinload(User.commands).joinedload(CommandsUser.role),
+    selectinload(User.commands).joinedload(CommandsUser.command).selectinload(Command.users).joinedload(CommandsUser.role),
+    selectinload(User.commands).joinedload(CommandsUser.command).selectinload(Command.users)
+    .joinedload(CommandsUser.user).options(joinedload(User.role), selectinload(User.insider_info)),
+]
@@ -1,14 +1,18 @@
 from datetime import datetime, timezone
 import uuid
-from sqlalchemy import ForeignKey, UniqueConstraint
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import ForeignKey, Index, UniqueConstraint, text
+from sqlalchemy.orm import Mapped, backref, mapped_column, relationship
 from app.dao.database import Base, str_uniq, int_uniq, BaseNoID
 from app.quest.models import Attempt, Block, QuestionInsider
 
+# Все связи объявлены с lazy="raise_on_sql": обращение к незагруженной связи
+# поднимает исключение вместо скрытого запроса. Что загружать, решает вызывающий
+# код, передавая в DAO профиль загрузки из app/auth/loading.py или app/quest/loading.py.
+
 class Role(Base):
     # "guest" "organizer" "insider" "ctc"
     name: Mapped[str_uniq]
-    users: Mapped[list["User"]] = relationship(back_populates="role")
+    users: Mapped[list["User"]] = relationship(back_populates="role", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"{self.name}"
@@ -22,6 +26,15 @@ class RoleUserCommand(Base):
 
 
 class User(Base):
+    __table_args__ = (
+        # Список ищущих команду: фильтр по флагу и сортировка по ФИО
+        Index(
+            'ix_users_looking_for_team', 'full_name',
+            sqlite_where=text('is_looking_for_friends = 1'),
+            postgresql_where=text('is_looking_for_friends'),
+        ),
+    )
+
     full_name: Mapped[str]
     telegram_id: Mapped[int_uniq] = mapped_column(index=True)
     telegram_username: Mapped[str | None] = mapped_column(nullable=True)
@@ -34,19 +47,19 @@ class User(Base):
         nullable=True,
         comment='Идентификатор роли пользователя. Если NULL - пользователь неактивен'
     )
-    role: Mapped["Role"] = relationship("Role", back_populates="users", lazy="joined")
+    role: Mapped["Role"] = relationship("Role", back_populates="users", lazy="raise_on_sql")
 
     # Команды, где пользователь участник или капитан
-    commands: Mapped[list["CommandsUser"]] = relationship("CommandsUser", back_populates="user")
+    commands: Mapped[list["CommandsUser"]] = relationship("CommandsUser", back_populates="user", lazy="raise_on_sql")
     
     # Вопросы, закрепленные за инсайдером
-    insider_questions: Mapped[list["QuestionInsider"]] = relationship("QuestionInsider", back_populates="user")
+    insider_questions: Mapped[list["QuestionInsider"]] = relationship("QuestionInsider", back_populates="user", lazy="raise_on_sql")
     
     # Профиль пользователя с дополнительной информацией
-    profile: Mapped["UserProfile"] = relationship("UserProfile", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    profile: Mapped["UserProfile"] = relationship("UserProfile", back_populates="user", uselist=False, cascade="all, delete-orphan", lazy="raise_on_sql")
     
     # Информация об инсайдере
-    insider_info: Mapped["InsiderInfo"] = relationship("InsiderInfo", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    insider_info: Mapped["InsiderInfo"] = relationship("InsiderInfo", back_populates="user", uselist=False, cascade="all, delete-orphan", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"{self.full_name}"
@@ -59,7 +72,7 @@ class UserProfile(Base):
     # geo_link: Mapped[str] = mapped_column(nullable=True)
     
     # Обратная связь с пользователем
-    user: Mapped["User"] = relationship("User", back_populates="profile")
+    user: Mapped["User"] = relationship("User", back_populates="profile", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"{self.email or 'No email'}"
@@ -71,7 +84,7 @@ class InsiderInfo(Base):
     geo_link: Mapped[str] = mapped_column(nullable=True)
     
     # Обратная связь с пользователем
-    user: Mapped["User"] = relationship("User", back_populates="insider_info")
+    user: Mapped["User"] = relationship("User", back_populates="insider_info", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"{self.student_organization}"
@@ -80,21 +93,21 @@ class Command(Base):
     name: Mapped[str]
 
     # Участники команды (включая капитана) с cascade delete
-    users: Mapped[list["CommandsUser"]] = relationship("CommandsUser", back_populates="command", cascade="all, delete-orphan")
+    users: Mapped[list["CommandsUser"]] = relationship("CommandsUser", back_populates="command", cascade="all, delete-orphan", lazy="raise_on_sql")
 
     # Связь с мероприятием
-    event_id: Mapped[int] = mapped_column(ForeignKey('events.id'), nullable=False)
-    event: Mapped["Event"] = relationship("Event", back_populates="commands")
+    event_id: Mapped[int] = mapped_column(ForeignKey('events.id'), nullable=False, index=True)
+    event: Mapped["Event"] = relationship("Event", back_populates="commands", lazy="raise_on_sql")
 
     # Связь с языком
     language_id: Mapped[int] = mapped_column(ForeignKey('languages.id'), nullable=False, default=1)
-    language: Mapped["Language"] = relationship("Language", back_populates="commands")
+    language: Mapped["Language"] = relationship("Language", back_populates="commands", lazy="raise_on_sql")
 
     # Связь с попытками
-    attempts: Mapped[list["Attempt"]] = relationship("Attempt", back_populates="command", cascade="all, delete-orphan")
+    attempts: Mapped[list["Attempt"]] = relationship("Attempt", back_populates="command", cascade="all, delete-orphan", lazy="raise_on_sql")
     
     # Связь с приглашениями
-    invite: Mapped["CommandInvite"] = relationship("CommandInvite", back_populates="command", uselist=False, cascade="all, delete-orphan")
+    invite: Mapped["CommandInvite"] = relationship("CommandInvite", back_populates="command", uselist=False, cascade="all, delete-orphan", lazy="raise_on_sql")
 
     def __repr__(self):
         return self.name
@@ -117,10 +130,10 @@ class CommandInvite(Base):
     created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
     
     # Обратная связь с командой
-    command: Mapped["Command"] = relationship("Command", back_populates="invite")
+    command: Mapped["Command"] = relationship("Command", back_populates="invite", lazy="raise_on_sql")
     
     def __repr__(self):
-        return f"Invite for {self.command.name if self.command else 'Unknown'}"
+        return f"Invite for command {self.command_id}"
     # __table_args__ = (
     #     CheckConstraint('count_users >= 1 AND count_users <= 100', name='check_count_users_range'),
     # )
@@ -139,7 +152,7 @@ class Event(Base):
     start_time: Mapped[datetime] = mapped_column(nullable=True)
     end_time: Mapped[datetime] = mapped_column(nullable=True)
     # Связь с командами
-    commands: Mapped[list["Command"]] = relationship("Command", back_populates="event")
+    commands: Mapped[list["Command"]] = relationship("Command", back_populates="event", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"{self.name}"
@@ -150,22 +163,28 @@ class CommandsUser(BaseNoID):
     )
 
     command_id: Mapped[int] = mapped_column(ForeignKey('commands.id'), primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), primary_key=True)
+    # Составной PK начинается с command_id, поэтому для поиска команд пользователя нужен отдельный индекс
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), primary_key=True, index=True)
     role_id: Mapped[int] = mapped_column(ForeignKey('roleusercommands.id'))  # Ссылка на роль
 
     # Опционально: связи для удобства доступа
-    command: Mapped["Command"] = relationship("Command", back_populates="users")
-    user: Mapped["User"] = relationship("User", back_populates="commands")
-    role: Mapped["RoleUserCommand"] = relationship("RoleUserCommand")
+    command: Mapped["Command"] = relationship("Command", back_populates="users", lazy="raise_on_sql")
+    user: Mapped["User"] = relationship("User", back_populates="commands", lazy="raise_on_sql")
+    role: Mapped["RoleUserCommand"] = relationship("RoleUserCommand", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"{self.command_id}"
 
 
 class Session(Base):
+    __table_args__ = (
+        Index('ix_sessions_user_active', 'user_id', 'is_active'),
+    )
+
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
+    # token уже проиндексирован ограничением UNIQUE
     token: Mapped[str] = mapped_column(nullable=False, unique=True)
-    expires_at: Mapped[datetime] = mapped_column(nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(nullable=False, index=True)
     # user_agent: Mapped[str] = mapped_column(nullable=True)  # Весь User-Agent
     is_active: Mapped[bool] = mapped_column(default=False)
 
@@ -190,22 +209,22 @@ class Language(Base):
     name: Mapped[str_uniq]  # Уникальное название языка
     
     # Связь с блоками
-    blocks: Mapped[list["Block"]] = relationship("Block", back_populates="language", lazy="joined")
+    blocks: Mapped[list["Block"]] = relationship("Block", back_populates="language", lazy="raise_on_sql")
 
     # Связь с командами
-    commands: Mapped[list["Command"]] = relationship("Command", back_populates="language", lazy="joined")
+    commands: Mapped[list["Command"]] = relationship("Command", back_populates="language", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"{self.name}"
 
 class Program(Base):
     """Модель для хранения баллов пользователей (посещения и взаимодействия)"""
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), index=True)
     score: Mapped[float] = mapped_column(default=0)
     comment: Mapped[str | None] = mapped_column(nullable=True)
     
     # Обратная связь с пользователем
-    user: Mapped["User"] = relationship("User", backref="program_scores")
+    user: Mapped["User"] = relationship("User", backref=backref("program_scores", lazy="raise_on_sql"), lazy="raise_on_sql")
     
     def __repr__(self):
         return f"{self.comment}"
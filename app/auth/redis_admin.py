@@ -3,11 +3,14 @@
 Предоставляет web-интерфейс для мониторинга и управления активными сессиями.
 """
 
+from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
 from sqlalchemy import select
 
 
-from app.auth.redis_session import get_redis_session_service, RedisSession
+from app.auth.auth_cache import auth_cache
+from app.auth.redis_session import get_redis_session_service
+from app.auth.loading import USER_AUTH_PROFILE
 from app.auth.models import User
 from app.dao.database import async_session_maker
 from app.config import settings
@@ -29,46 +32,35 @@ class RedisSessionAdmin:
         try:
             redis_session_service = await get_redis_session_service()
             
-            # Получаем все ключи сессий
-            session_keys = await redis_session_service.redis.keys(f"{redis_session_service.session_prefix}*")
-            total = len(session_keys)
+            # Страница из индекса сессий по сроку действия
+            total = await redis_session_service.get_index_size()
+            page_sessions = await redis_session_service.list_sessions((page - 1) * per_page, per_page)
             
-            # Применяем пагинацию
-            start_idx = (page - 1) * per_page
-            end_idx = start_idx + per_page
-            paginated_keys = session_keys[start_idx:end_idx]
+            # Получаем информацию о пользователях одним запросом
+            user_ids = {redis_session.user_id for redis_session in page_sessions}
+            users = {}
+            if user_ids:
+                async with async_session_maker() as db_session:
+                    user_result = await db_session.execute(select(User).where(User.id.in_(user_ids)))
+                    users = {user.id: user for user in user_result.scalars()}
             
+            now = datetime.now(timezone.utc)
             sessions = []
-            
-            # Получаем информацию о пользователях
-            async with async_session_maker() as db_session:
-                for session_key in paginated_keys:
-                    try:
-                        token = session_key.split(':', 1)[1]
-                        session_data = await redis_session_service.redis.hgetall(session_key)
-                        
-                        if session_data:
-                            redis_session = RedisSession.from_dict(token, session_data)
-                            
-                            # Получаем информацию о пользователе
-                            user_query = select(User).where(User.id == redis_session.user_id)
-                            user_result = await db_session.execute(user_query)
-                            user = user_result.scalar_one_or_none()
-                            
-                            sessions.append({
-                                "token": redis_session.token,
-                                "user_id": redis_session.user_id,
-                                "user_name": user.full_name if user else "Unknown",
-                                "user_telegram": user.telegram_username if user else None,
-                                "expires_at": redis_session.expires_at,
-                                "is_active": redis_session.is_active,
-                                "is_expired": redis_session.is_expired(),
-                                "is_valid": redis_session.is_valid(),
-                                "ttl_seconds": await redis_session_service.redis.ttl(session_key)
-                            })
-                    except Exception as e:
-                        logger.error(f"Ошибка получения данных сессии {session_key}: {e}")
-                        continue
+            for redis_session in page_sessions:
+                user = users.get(redis_session.user_id)
+                expires_at = redis_session.expires_at.replace(tzinfo=timezone.utc)
+                sessions.append({
+                    "token": redis_session.token,
+                    "user_id": redis_session.user_id,
+                    "user_name": user.full_name if user else "Unknown",
+                    "user_telegram": user.telegram_username if user else None,
+                    "expires_at": redis_session.expires_at,
+                    "is_active": redis_session.is_active,
+                    "is_expired": redis_session.is_expired(),
+                    "is_valid": redis_session.is_valid(),
+                    # TTL хеша совпадает со сроком действия сессии
+                    "ttl_seconds": int((expires_at - now).total_seconds()),
+                })
             
             return {
                 "sessions": sessions,
@@ -96,7 +88,7 @@ class RedisSessionAdmin:
             
             # Получаем информацию о пользователе
             async with async_session_maker() as db_session:
-                user_query = select(User).where(User.id == session.user_id)
+                user_query = select(User).options(*USER_AUTH_PROFILE).where(User.id == session.user_id)
                 user_result = await db_session.execute(user_query)
                 user = user_result.scalar_one_or_none()
                 
@@ -153,37 +145,24 @@ class RedisSessionAdmin:
         try:
             redis_session_service = await get_redis_session_service()
             
-            # Получаем все сессии
-            session_keys = await redis_session_service.redis.keys(f"{redis_session_service.session_prefix}*")
-            total_sessions = len(session_keys)
-            
-            active_sessions = 0
-            expired_sessions = 0
-            users_with_sessions = set()
-            
-            for session_key in session_keys:
-                try:
-                    token = session_key.split(':', 1)[1]
-                    session_data = await redis_session_service.redis.hgetall(session_key)
-                    
-                    if session_data:
-                        redis_session = RedisSession.from_dict(token, session_data)
-                        users_with_sessions.add(redis_session.user_id)
-                        
-                        if redis_session.is_valid():
-                            active_sessions += 1
-                        else:
-                            expired_sessions += 1
-                            
-                except Exception as e:
-                    logger.error(f"Ошибка анализа сессии {session_key}: {e}")
-                    continue
+            # Счётчики по индексу сессий; пользователей считаем по наборам
+            # user_sessions:* через SCAN, не блокируя Redis
+            total_sessions = await redis_session_service.get_index_size()
+            active_sessions = await redis_session_service.get_session_count()
+            expired_sessions = total_sessions - active_sessions
+            unique_users = 0
+            async for _ in redis_session_service.redis.scan_iter(
+                match=f"{redis_session_service.user_sessions_prefix}*", count=1000
+            ):
+                unique_users += 1
             
             return {
                 "total_sessions": total_sessions,
                 "active_sessions": active_sessions,
                 "expired_sessions": expired_sessions,
-                "unique_users": len(users_with_sessions)
+                "unique_users": unique_users,
+                # Кэш аутентификации этого воркера
+                "auth_cache": auth_cache.stats(),
             }
             
         except Exception as e:
@@ -1,12 +1,147 @@
+import time
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Set, Dict, Any
+from typing import Optional, Set, Dict, Any, Tuple
 from faststream.redis import RedisBroker
 import secrets
+from app.auth.auth_cache import auth_cache
+from app.auth.signed_tokens import is_signed_token, issue_token, verify_token
 from app.config import settings
+from app.dao.after_commit import after_commit
 from app.logger import logger
+from app.redis_client import redis_clients
 from dataclasses import dataclass
 
 
+SNAPSHOT_FIELD = "snapshot"
+
+# Операции жизненного цикла сессии выполняются Lua-скриптами: каждая - один
+# атомарный вызов Redis, поэтому параллельные вход и выход одного пользователя
+# не видят промежуточного состояния (хеш сессии уже удалён, а токен ещё в наборе
+# и индексе). Скрипты загружаются при старте (RedisSessionService.load_scripts)
+# и дальше вызываются через EVALSHA.
+
+# Снимок записывается, только если сессия ещё существует и с момента чтения версий
+# (до запроса в БД) данные пользователя не менялись - иначе снимок устарел
+SAVE_SNAPSHOT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1
+    and (redis.call('GET', KEYS[2]) or '0') == ARGV[1]
+    and (redis.call('GET', KEYS[3]) or '0') == ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[3], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+# Повторный вход: первая живая сессия пользователя продлевается на полный срок
+# (поле expires_at, TTL хеша и набора сессий, score в индексе) за один вызов.
+# Истёкшие сессии к этому моменту уже удалены по TTL, деактивированные - удалены явно
+RENEW_USER_SESSION_SCRIPT = """
+local tokens = redis.call('SMEMBERS', KEYS[1])
+for _, token in ipairs(tokens) do
+    local key = ARGV[1] .. token
+    if redis.call('TTL', key) > 0 and redis.call('HGET', key, 'is_active') == 'True' then
+        redis.call('HSET', key, 'expires_at', ARGV[3])
+        redis.call('EXPIRE', key, ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+        redis.call('ZADD', KEYS[2], ARGV[4], token)
+        return token
+    end
+end
+return false
+"""
+
+# Общая часть create и deactivate_all. KEYS: набор сессий пользователя, индекс,
+# revoked_before пользователя; ARGV[1] - префикс ключей сессий, ARGV[2] - текущее
+# время в мс (отзыв подписанных токенов), ARGV[3] - TTL
+_EVICT_USER_SESSIONS = """
+redis.call('SET', KEYS[3], ARGV[2], 'EX', ARGV[3])
+local tokens = redis.call('SMEMBERS', KEYS[1])
+for _, token in ipairs(tokens) do
+    redis.call('DEL', ARGV[1] .. token)
+    redis.call('ZREM', KEYS[2], token)
+end
+redis.call('DEL', KEYS[1])
+"""
+
+# Вход: прежние сессии пользователя удаляются, новая записывается вместе с набором
+# и индексом. ARGV[4] - токен, ARGV[5] - score в индексе, дальше пары поле/значение хеша.
+# Заодно из индекса убираются истёкшие токены: их хеши Redis удаляет по TTL, а без
+# чтения они остались бы в индексе навсегда
+CREATE_SESSION_SCRIPT = _EVICT_USER_SESSIONS + """
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', math.floor(tonumber(ARGV[2]) / 1000))
+local key = ARGV[1] .. ARGV[4]
+redis.call('HSET', key, unpack(ARGV, 6))
+redis.call('EXPIRE', key, ARGV[3])
+redis.call('SADD', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[5], ARGV[4])
+return #tokens
+"""
+
+DEACTIVATE_ALL_SESSIONS_SCRIPT = _EVICT_USER_SESSIONS + """
+return #tokens
+"""
+
+# Чтение с проверкой: деактивированная или истёкшая по индексу сессия удаляется
+# в том же вызове (ответ 0), отсутствующая - вычищается из индекса (ответ nil).
+# KEYS: хеш сессии, индекс; ARGV: токен, префикс наборов сессий, текущее unix-время
+GET_SESSION_SCRIPT = """
+local data = redis.call('HGETALL', KEYS[1])
+if #data == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return false
+end
+local fields = {}
+for i = 1, #data, 2 do
+    fields[data[i]] = data[i + 1]
+end
+local score = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if fields['is_active'] ~= 'True' or (score and tonumber(score) <= tonumber(ARGV[3])) then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', ARGV[2] .. fields['user_id'], ARGV[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return 0
+end
+return data
+"""
+
+# KEYS: хеш сессии, индекс; ARGV: токен, префикс наборов сессий
+DEACTIVATE_SESSION_SCRIPT = """
+local user_id = redis.call('HGET', KEYS[1], 'user_id')
+redis.call('ZREM', KEYS[2], ARGV[1])
+if not user_id then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', ARGV[2] .. user_id, ARGV[1])
+return 1
+"""
+
+# Продление одной сессии. KEYS: хеш сессии, индекс; ARGV: токен, префикс наборов
+# сессий, TTL, новый expires_at, score в индексе
+TOUCH_SESSION_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'is_active') ~= 'True' then
+    return 0
+end
+local user_id = redis.call('HGET', KEYS[1], 'user_id')
+redis.call('HSET', KEYS[1], 'expires_at', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', ARGV[2] .. user_id, ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[5], ARGV[1])
+return 1
+"""
+
+SESSION_SCRIPTS = {
+    "save_snapshot": SAVE_SNAPSHOT_SCRIPT,
+    "renew_user_session": RENEW_USER_SESSION_SCRIPT,
+    "create_session": CREATE_SESSION_SCRIPT,
+    "deactivate_all_sessions": DEACTIVATE_ALL_SESSIONS_SCRIPT,
+    "get_session": GET_SESSION_SCRIPT,
+    "deactivate_session": DEACTIVATE_SESSION_SCRIPT,
+    "touch_session": TOUCH_SESSION_SCRIPT,
+}
+
+
 @dataclass
 class RedisSession:
     """Модель Redis-сессии"""
@@ -14,6 +149,7 @@ class RedisSession:
     token: str
     expires_at: datetime
     is_active: bool = True
+    snapshot: Optional[str] = None  # JSON AuthSnapshot, если уже записан
     
     def is_expired(self) -> bool:
         """Проверка, истёк ли срок действия сессии."""
@@ -38,29 +174,70 @@ class RedisSession:
             user_id=int(data['user_id']),
             token=token,
             expires_at=datetime.fromisoformat(data['expires_at']),
-            is_active=data['is_active'].lower() == 'true' if isinstance(data['is_active'], str) else bool(data['is_active'])
+            is_active=data['is_active'].lower() == 'true' if isinstance(data['is_active'], str) else bool(data['is_active']),
+            snapshot=data.get(SNAPSHOT_FIELD),
         )
 
 
 class RedisSessionService:
-    """Сервис для работы с сессиями в Redis"""
+    """
+    Сервис для работы с сессиями в Redis.
+
+    Токены двух форматов (SESSION_TOKEN_FORMAT): случайные, данные которых лежат
+    в хеше session:<token>, и подписанные (app.auth.signed_tokens), которые
+    проверяются локально. Для подписанных в Redis хранится только отзыв:
+    jti отозванных токенов в sorted set (score - срок действия токена) и
+    время отзыва всех токенов пользователя (или всех вообще) в revoked_before:*.
+
+    В хеше случайного токена хранится снимок пользователя (AuthSnapshot: ФИО,
+    роль, команда), поэтому аутентификация вместе с поиском команды обходится
+    одним HGETALL. Снимок записывается при первой аутентификации сессии; при
+    изменении пользователя растёт его версия snapshot_version:<user_id> и снимки
+    удаляются из всех его сессий.
+
+    Токены случайных сессий индексируются в sorted set session_index
+    (score - unix-время истечения): подсчёт активных сессий - ZCOUNT, очистка
+    истёкших - выборка по диапазону score, список в админке - постраничный
+    ZRANGE. KEYS не используется: он блокирует Redis на всё время обхода;
+    там, где без обхода ключей не обойтись (перестроение индекса, полная
+    очистка), используется SCAN.
+    """
     
     def __init__(self, redis_broker: RedisBroker):
         self.broker = redis_broker
         self.session_prefix = "session:"
         self.user_sessions_prefix = "user_sessions:"
+        self.revoked_tokens_key = "revoked_tokens"
+        self.revoked_before_prefix = "revoked_before:"
+        self.snapshot_version_prefix = "snapshot_version:"
+        self.session_index_key = "session_index"
         self._redis_client = None
+        self._scripts: Dict[str, Any] = {}
     
     @property
     def redis(self):
-        """Получить Redis клиент из FastStream broker"""
+        """Общий Redis клиент процесса (app.redis_client)"""
         if self._redis_client is None:
-            # Создаем Redis клиент напрямую, так как RedisBroker не имеет атрибута redis
-            from redis import asyncio as aioredis
-            from app.config import settings
-            self._redis_client = aioredis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+            self._redis_client = redis_clients.get()
         return self._redis_client
     
+    def _script(self, name: str):
+        """Скрипт из SESSION_SCRIPTS; вызывается через EVALSHA, при NOSCRIPT загружается заново."""
+        script = self._scripts.get(name)
+        if script is None:
+            script = self._scripts[name] = self.redis.register_script(SESSION_SCRIPTS[name])
+        return script
+
+    async def load_scripts(self) -> None:
+        """Загружает скрипты сессий в Redis при старте (SCRIPT LOAD), чтобы ошибка проявилась сразу."""
+        try:
+            for name in SESSION_SCRIPTS:
+                script = self._script(name)
+                await self.redis.script_load(script.script)
+            logger.info(f"Скрипты сессий загружены в Redis: {len(SESSION_SCRIPTS)}")
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке скриптов сессий в Redis: {e}")
+
     def _get_session_key(self, token: str) -> str:
         """Получить ключ для сессии"""
         return f"{self.session_prefix}{token}"
@@ -68,18 +245,125 @@ class RedisSessionService:
     def _get_user_sessions_key(self, user_id: int) -> str:
         """Получить ключ для сессий пользователя"""
         return f"{self.user_sessions_prefix}{user_id}"
+
+    def _get_revoked_before_key(self, user_id: Optional[int] = None) -> str:
+        """Ключ времени отзыва подписанных токенов пользователя (None - всех пользователей)"""
+        return f"{self.revoked_before_prefix}{'all' if user_id is None else user_id}"
+
+    def _get_snapshot_version_key(self, user_id: Optional[int] = None) -> str:
+        """Ключ версии снимков пользователя (None - общая версия всех снимков)"""
+        return f"{self.snapshot_version_prefix}{'all' if user_id is None else user_id}"
+
+    async def get_snapshot_versions(self, user_id: int) -> Tuple[str, str]:
+        """Версии снимков пользователя и общая; читаются до загрузки пользователя из БД."""
+        values = await self.redis.mget(self._get_snapshot_version_key(user_id), self._get_snapshot_version_key())
+        return tuple(value or "0" for value in values)
+
+    async def save_snapshot(self, token: str, user_id: int, snapshot: str, versions: Tuple[str, str]) -> bool:
+        """Записывает снимок пользователя в хеш сессии, если версии не изменились."""
+        if is_signed_token(token):
+            # У подписанного токена нет хеша в Redis
+            return False
+        try:
+            saved = await self._script("save_snapshot")(
+                keys=[self._get_session_key(token), self._get_snapshot_version_key(user_id),
+                      self._get_snapshot_version_key()],
+                args=[*versions, SNAPSHOT_FIELD, snapshot],
+            )
+            return bool(saved)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении снимка пользователя {user_id} в сессию: {e}")
+            return False
+
+    async def drop_user_snapshots(self, user_id: int) -> None:
+        """Удаляет снимки пользователя из всех его сессий и запрещает запись устаревших."""
+        try:
+            version_key = self._get_snapshot_version_key(user_id)
+            async with self.redis.pipeline() as pipe:
+                pipe.incr(version_key)
+                pipe.expire(version_key, int(settings.SESSION_EXPIRE_SECONDS))
+                pipe.smembers(self._get_user_sessions_key(user_id))
+                *_, tokens = await pipe.execute()
+            if tokens:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for token in tokens:
+                        pipe.hdel(self._get_session_key(token), SNAPSHOT_FIELD)
+                    await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка при сбросе снимков пользователя {user_id}: {e}")
+
+    async def drop_all_snapshots(self) -> None:
+        """Удаляет снимки из всех сессий (например, после переименования роли)."""
+        try:
+            version_key = self._get_snapshot_version_key()
+            async with self.redis.pipeline() as pipe:
+                pipe.incr(version_key)
+                pipe.expire(version_key, int(settings.SESSION_EXPIRE_SECONDS))
+                await pipe.execute()
+            async with self.redis.pipeline(transaction=False) as pipe:
+                async for token, _ in self.redis.zscan_iter(self.session_index_key, count=500):
+                    pipe.hdel(self._get_session_key(token), SNAPSHOT_FIELD)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка при сбросе всех снимков пользователей: {e}")
+
+    def _user_eviction_keys(self, user_id: int) -> list[str]:
+        """KEYS скриптов create_session и deactivate_all_sessions."""
+        return [self._get_user_sessions_key(user_id), self.session_index_key,
+                self._get_revoked_before_key(user_id)]
+
+    async def _revoke_tokens_before_now(self, user_id: Optional[int] = None) -> None:
+        """Отзывает подписанные токены, выпущенные до текущего момента."""
+        await self.redis.set(
+            self._get_revoked_before_key(user_id),
+            time.time_ns() // 1_000_000,
+            ex=int(settings.SESSION_EXPIRE_SECONDS),
+        )
+
+    async def _get_signed_session(self, token: str) -> Optional[RedisSession]:
+        """Проверяет подписанный токен: подпись и срок локально, отзыв - одним запросом к Redis."""
+        claims = verify_token(token)
+        if claims is None:
+            logger.warning(f"Недействительный или истекший подписанный токен {token}")
+            return None
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zscore(self.revoked_tokens_key, claims.jti)
+            pipe.mget(self._get_revoked_before_key(claims.user_id), self._get_revoked_before_key())
+            revoked, cutoffs = await pipe.execute()
+        if revoked is not None or any(c is not None and claims.issued_at_ms < int(c) for c in cutoffs):
+            logger.warning(f"Подписанный токен {token} отозван")
+            return None
+        return RedisSession(user_id=claims.user_id, token=token, expires_at=claims.expires_at_datetime)
+
+    async def _revoke_signed_token(self, token: str) -> bool:
+        claims = verify_token(token, check_expiry=False)
+        if claims is None:
+            return False
+        now = time.time()
+        async with self.redis.pipeline() as pipe:
+            if claims.expires_at > now:
+                pipe.zadd(self.revoked_tokens_key, {claims.jti: claims.expires_at})
+            # Истёкшие токены отклоняются без Redis, их jti больше не нужны
+            pipe.zremrangebyscore(self.revoked_tokens_key, "-inf", now)
+            await pipe.execute()
+        await auth_cache.invalidate_token(token)
+        return True
     
-    async def create_session(self, user_id: int) -> str:
+    async def create_session(self, user_id: int, role_id: Optional[int] = None, event_id: Optional[int] = None) -> str:
         """
         Создает новую сессию для пользователя.
         Если у пользователя уже есть активные сессии, они будут деактивированы.
-        Возвращает токен созданной сессии.
+        Возвращает токен созданной сессии; role_id и event_id попадают только
+        в подписанный токен.
         """
         logger.info(f"Создание новой сессии для пользователя {user_id}")
         
         try:
-            # Деактивируем все активные сессии пользователя
-            await self.deactivate_all_sessions(user_id)
+            if settings.SESSION_TOKEN_FORMAT == "signed":
+                await self.deactivate_all_sessions(user_id)
+                token, _ = issue_token(user_id, role_id=role_id, event_id=event_id)
+                logger.info(f"Новый подписанный токен выпущен для пользователя {user_id}")
+                return token
             
             # Создаем новую сессию
             token = secrets.token_urlsafe(32)
@@ -92,30 +376,40 @@ class RedisSessionService:
                 is_active=True
             )
             
-            # Сохраняем сессию в Redis
-            session_key = self._get_session_key(token)
-            user_sessions_key = self._get_user_sessions_key(user_id)
-            
-            # Используем pipeline для атомарности
-            async with self.redis.pipeline() as pipe:
-                # Сохраняем данные сессии
-                pipe.hset(session_key, mapping=session.to_dict())
-                # Устанавливаем TTL на сессию
-                pipe.expire(session_key, int(settings.SESSION_EXPIRE_SECONDS))
-                # Добавляем токен в set активных сессий пользователя
-                pipe.sadd(user_sessions_key, token)
-                # Устанавливаем TTL на set сессий пользователя
-                pipe.expire(user_sessions_key, int(settings.SESSION_EXPIRE_SECONDS))
-                
-                await pipe.execute()
+            # Прежние сессии удаляются и новая записывается одним вызовом скрипта
+            fields = [item for pair in session.to_dict().items() for item in pair]
+            evicted = await self._script("create_session")(
+                keys=self._user_eviction_keys(user_id),
+                args=[self.session_prefix, time.time_ns() // 1_000_000, int(settings.SESSION_EXPIRE_SECONDS),
+                      token, expires_at.timestamp(), *fields],
+            )
+            await auth_cache.invalidate_user(user_id)
             
-            logger.info(f"Новая сессия успешно создана для пользователя {user_id}")
+            logger.info(f"Новая сессия успешно создана для пользователя {user_id} (закрыто прежних: {evicted})")
             return token
             
         except Exception as e:
             logger.error(f"Ошибка при создании сессии: {e}")
             raise
     
+    async def reuse_session(self, user_id: int) -> Optional[str]:
+        """
+        Повторный вход пользователя: возвращает его действующую сессию, продлив
+        срок действия (скользящее продление), или None, если такой сессии нет.
+        Подписанные токены не хранятся и не продлеваются - для них всегда None.
+        """
+        if settings.SESSION_TOKEN_FORMAT == "signed":
+            return None
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.SESSION_EXPIRE_SECONDS)
+        token = await self._script("renew_user_session")(
+            keys=[self._get_user_sessions_key(user_id), self.session_index_key],
+            args=[self.session_prefix, int(settings.SESSION_EXPIRE_SECONDS),
+                  expires_at.isoformat(), expires_at.timestamp()],
+        )
+        if token:
+            logger.info(f"Сессия пользователя {user_id} продлена до {expires_at.isoformat()}")
+        return token or None
+
     async def get_session(self, token: str) -> Optional[RedisSession]:
         """
         Получает сессию по токену.
@@ -124,13 +418,23 @@ class RedisSessionService:
         logger.info(f"Получение сессии по токену {token}")
         
         try:
-            session_key = self._get_session_key(token)
-            session_data = await self.redis.hgetall(session_key)
+            if is_signed_token(token):
+                return await self._get_signed_session(token)
+
+            session_data = await self._script("get_session")(
+                keys=[self._get_session_key(token), self.session_index_key],
+                args=[token, self.user_sessions_prefix, time.time()],
+            )
             
-            if not session_data:
+            if session_data is None:
                 logger.warning(f"Сессия с токеном {token} не найдена")
                 return None
+            if session_data == 0:
+                logger.warning(f"Недействительная или истекшая сессия с токеном {token}")
+                await auth_cache.invalidate_token(token)
+                return None
             
+            session_data = dict(zip(session_data[::2], session_data[1::2]))
             session = RedisSession.from_dict(token, session_data)
             
             if not session.is_valid():
@@ -146,6 +450,22 @@ class RedisSessionService:
             logger.error(f"Ошибка при получении сессии: {e}")
             return None
     
+    async def touch_session(self, token: str) -> bool:
+        """Продлевает действующую сессию на полный срок; False - сессии нет."""
+        if is_signed_token(token):
+            return False
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.SESSION_EXPIRE_SECONDS)
+        try:
+            touched = await self._script("touch_session")(
+                keys=[self._get_session_key(token), self.session_index_key],
+                args=[token, self.user_sessions_prefix, int(settings.SESSION_EXPIRE_SECONDS),
+                      expires_at.isoformat(), expires_at.timestamp()],
+            )
+            return bool(touched)
+        except Exception as e:
+            logger.error(f"Ошибка при продлении сессии: {e}")
+            return False
+
     async def deactivate_session(self, token: str) -> bool:
         """
         Деактивирует сессию по токену.
@@ -154,25 +474,17 @@ class RedisSessionService:
         logger.info(f"Деактивация сессии с токеном {token}")
         
         try:
-            session_key = self._get_session_key(token)
-            
-            # Получаем данные сессии чтобы найти user_id
-            session_data = await self.redis.hgetall(session_key)
-            if not session_data:
+            if is_signed_token(token):
+                return await self._revoke_signed_token(token)
+
+            deactivated = await self._script("deactivate_session")(
+                keys=[self._get_session_key(token), self.session_index_key],
+                args=[token, self.user_sessions_prefix],
+            )
+            if not deactivated:
                 logger.warning(f"Сессия с токеном {token} не найдена для деактивации")
                 return False
-            
-            user_id = int(session_data['user_id'])
-            user_sessions_key = self._get_user_sessions_key(user_id)
-            
-            # Используем pipeline для атомарности
-            async with self.redis.pipeline() as pipe:
-                # Удаляем сессию
-                pipe.delete(session_key)
-                # Удаляем токен из set активных сессий пользователя
-                pipe.srem(user_sessions_key, token)
-                
-                await pipe.execute()
+            await auth_cache.invalidate_token(token)
             
             logger.info(f"Сессия с токеном {token} успешно деактивирована")
             return True
@@ -189,28 +501,18 @@ class RedisSessionService:
         logger.info(f"Деактивация всех сессий пользователя {user_id}")
         
         try:
-            user_sessions_key = self._get_user_sessions_key(user_id)
-            
-            # Получаем все активные токены пользователя
-            active_tokens = await self.redis.smembers(user_sessions_key)
+            # Подписанные токены не перечислить - скрипт заодно отзывает всё,
+            # что выпущено до этого момента
+            deactivated_count = await self._script("deactivate_all_sessions")(
+                keys=self._user_eviction_keys(user_id),
+                args=[self.session_prefix, time.time_ns() // 1_000_000, int(settings.SESSION_EXPIRE_SECONDS)],
+            )
+            await auth_cache.invalidate_user(user_id)
             
-            if not active_tokens:
+            if not deactivated_count:
                 logger.info(f"У пользователя {user_id} нет активных сессий")
                 return 0
             
-            # Деактивируем все сессии
-            deactivated_count = 0
-            async with self.redis.pipeline() as pipe:
-                for token in active_tokens:
-                    session_key = self._get_session_key(token)
-                    pipe.delete(session_key)
-                    deactivated_count += 1
-                
-                # Очищаем set активных сессий пользователя
-                pipe.delete(user_sessions_key)
-                
-                await pipe.execute()
-            
             logger.info(f"Все сессии пользователя {user_id} успешно деактивированы ({deactivated_count} сессий)")
             return deactivated_count
             
@@ -232,37 +534,69 @@ class RedisSessionService:
     
     async def get_session_count(self) -> int:
         """
-        Получает общее количество активных сессий.
+        Получает общее количество активных сессий (ZCOUNT по индексу, без обхода ключей).
         """
         try:
-            session_keys = await self.redis.keys(f"{self.session_prefix}*")
-            return len(session_keys)
+            return await self.redis.zcount(self.session_index_key, f"({time.time()}", "+inf")
         except Exception as e:
             logger.error(f"Ошибка при подсчете сессий: {e}")
             return 0
-    
-    async def cleanup_expired_sessions(self) -> int:
+
+    async def get_index_size(self) -> int:
+        """Количество токенов в индексе, включая ещё не вычищенные истёкшие."""
+        return await self.redis.zcard(self.session_index_key)
+
+    async def list_sessions(self, offset: int = 0, limit: int = 50) -> list[RedisSession]:
+        """
+        Страница сессий из индекса, начиная с самых поздно истекающих (новых).
+        Сессии, чьи хеши уже истекли по TTL, пропускаются.
+        """
+        tokens = await self.redis.zrange(self.session_index_key, offset, offset + limit - 1, desc=True)
+        if not tokens:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for token in tokens:
+                pipe.hgetall(self._get_session_key(token))
+            rows = await pipe.execute()
+        sessions = []
+        for token, data in zip(tokens, rows):
+            if not data:
+                continue
+            try:
+                sessions.append(RedisSession.from_dict(token, data))
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Повреждённая сессия {token} в индексе: {e}")
+        return sessions
+
+    async def cleanup_expired_sessions(self, batch_size: int = 500) -> int:
         """
-        Очищает истекшие сессии (Redis делает это автоматически через TTL,
-        но эта функция может быть полезна для принудительной очистки).
+        Очищает истекшие сессии (Redis делает это автоматически через TTL, а истёкшие
+        токены убираются из индекса при каждом входе - см. CREATE_SESSION_SCRIPT;
+        функция нужна для принудительной очистки из админки).
+        Истёкшие токены выбираются из индекса диапазоном score пачками по batch_size.
         """
         try:
             cleaned_count = 0
-            session_keys = await self.redis.keys(f"{self.session_prefix}*")
-            
-            for session_key in session_keys:
-                session_data = await self.redis.hgetall(session_key)
-                if session_data:
-                    token = session_key.split(':', 1)[1]
-                    try:
-                        session = RedisSession.from_dict(token, session_data)
-                        if session.is_expired():
-                            await self.deactivate_session(token)
-                            cleaned_count += 1
-                    except Exception:
-                        # Если не можем распарсить сессию, удаляем её
-                        await self.redis.delete(session_key)
-                        cleaned_count += 1
+            now = time.time()
+            while True:
+                tokens = await self.redis.zrangebyscore(
+                    self.session_index_key, "-inf", now, start=0, num=batch_size
+                )
+                if not tokens:
+                    break
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for token in tokens:
+                        pipe.hget(self._get_session_key(token), "user_id")
+                    user_ids = await pipe.execute()
+                async with self.redis.pipeline() as pipe:
+                    for token, user_id in zip(tokens, user_ids):
+                        pipe.delete(self._get_session_key(token))
+                        if user_id is not None:
+                            pipe.srem(self._get_user_sessions_key(user_id), token)
+                    pipe.zrem(self.session_index_key, *tokens)
+                    await pipe.execute()
+                # Кэш аутентификации не оповещаем: его записи живут не дольше сессии
+                cleaned_count += len(tokens)
             
             logger.info(f"Очищено {cleaned_count} истекших сессий")
             return cleaned_count
@@ -271,6 +605,63 @@ class RedisSessionService:
             logger.error(f"Ошибка при очистке истекших сессий: {e}")
             return 0
 
+    async def rebuild_session_index(self, batch_size: int = 500) -> int:
+        """
+        Заполняет индекс сессий по хешам session:* (обход через SCAN).
+        Нужен один раз для сессий, созданных до появления индекса.
+        """
+        indexed = 0
+        keys = []
+        async for session_key in self.redis.scan_iter(match=f"{self.session_prefix}*", count=batch_size):
+            keys.append(session_key)
+            if len(keys) >= batch_size:
+                indexed += await self._index_session_keys(keys)
+                keys = []
+        if keys:
+            indexed += await self._index_session_keys(keys)
+        logger.info(f"Индекс сессий перестроен: {indexed} сессий")
+        return indexed
+
+    async def _index_session_keys(self, keys: list[str]) -> int:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for session_key in keys:
+                pipe.hget(session_key, "expires_at")
+            expirations = await pipe.execute()
+        scores = {}
+        for session_key, expires_at in zip(keys, expirations):
+            if expires_at is None:
+                continue
+            try:
+                scores[session_key[len(self.session_prefix):]] = (
+                    datetime.fromisoformat(expires_at).replace(tzinfo=timezone.utc).timestamp()
+                )
+            except ValueError:
+                logger.warning(f"Некорректный срок действия в {session_key}")
+        if scores:
+            await self.redis.zadd(self.session_index_key, scores)
+        return len(scores)
+
+    async def ensure_session_index(self) -> None:
+        """Строит индекс сессий при первом запуске с индексом (если его ещё нет)."""
+        try:
+            if not await self.redis.exists(self.session_index_key):
+                await self.rebuild_session_index()
+        except Exception as e:
+            logger.error(f"Ошибка при построении индекса сессий: {e}")
+
+    async def _delete_matching(self, pattern: str, batch_size: int = 500) -> int:
+        """Удаляет ключи по шаблону пачками, обходя их через SCAN."""
+        deleted = 0
+        keys = []
+        async for key in self.redis.scan_iter(match=pattern, count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                deleted += await self.redis.unlink(*keys)
+                keys = []
+        if keys:
+            deleted += await self.redis.unlink(*keys)
+        return deleted
+
     async def clear_all_sessions(self) -> int:
         """
         Удаляет все сессии из Redis (для тестирования).
@@ -278,23 +669,20 @@ class RedisSessionService:
         """
         logger.info("Удаление всех сессий из Redis")
         try:
-            # Получаем все ключи сессий
-            session_keys = await self.redis.keys(f"{self.session_prefix}*")
-            user_sessions_keys = await self.redis.keys(f"{self.user_sessions_prefix}*")
-            
             total_deleted = 0
+            await self._revoke_tokens_before_now()
+            await auth_cache.invalidate_all()
             
             # Удаляем все сессии
-            if session_keys:
-                await self.redis.delete(*session_keys)
-                total_deleted += len(session_keys)
-                logger.info(f"Удалено {len(session_keys)} сессий")
+            sessions_deleted = await self._delete_matching(f"{self.session_prefix}*")
+            await self.redis.delete(self.session_index_key)
+            total_deleted += sessions_deleted
+            logger.info(f"Удалено {sessions_deleted} сессий")
             
             # Удаляем все наборы пользовательских сессий
-            if user_sessions_keys:
-                await self.redis.delete(*user_sessions_keys)
-                total_deleted += len(user_sessions_keys)
-                logger.info(f"Удалено {len(user_sessions_keys)} наборов пользовательских сессий")
+            user_sets_deleted = await self._delete_matching(f"{self.user_sessions_prefix}*")
+            total_deleted += user_sets_deleted
+            logger.info(f"Удалено {user_sets_deleted} наборов пользовательских сессий")
             
             logger.info(f"Все сессии очищены из Redis. Всего удалено: {total_deleted}")
             return total_deleted
@@ -308,6 +696,38 @@ class RedisSessionService:
 redis_session_service: Optional[RedisSessionService] = None
 
 
+async def invalidate_user_auth(*user_ids: int) -> None:
+    """
+    Данные пользователей (ФИО, роль, команда) изменились: сбрасывает их снимки
+    в Redis-сессиях и в кэше аутентификации воркеров. Вызывается после коммита.
+    """
+    from app.auth.session_store import memory_session_store, session_backend
+
+    for user_id in user_ids:
+        if settings.USE_REDIS and redis_session_service is not None:
+            await redis_session_service.drop_user_snapshots(user_id)
+        if session_backend() == "memory":
+            memory_session_store.drop_user_snapshots(user_id)
+        await auth_cache.invalidate_user(user_id)
+
+
+async def invalidate_all_auth() -> None:
+    """Сбрасывает снимки всех пользователей."""
+    from app.auth.session_store import memory_session_store, session_backend
+
+    if settings.USE_REDIS and redis_session_service is not None:
+        await redis_session_service.drop_all_snapshots()
+    if session_backend() == "memory":
+        memory_session_store.drop_all_snapshots()
+    await auth_cache.invalidate_all()
+
+
+def invalidate_user_auth_after_commit(session, *user_ids: int) -> None:
+    """Откладывает invalidate_user_auth до коммита сессии, изменившей пользователей."""
+    for user_id in user_ids:
+        after_commit(session, ("auth", user_id), lambda user_id=user_id: invalidate_user_auth(user_id))
+
+
 async def get_redis_session_service() -> RedisSessionService:
     """
     Dependency для получения Redis session service.
@@ -323,4 +743,6 @@ async def init_redis_session_service(redis_broker: RedisBroker) -> RedisSessionS
     """
     global redis_session_service
     redis_session_service = RedisSessionService(redis_broker)
+    await redis_session_service.load_scripts()
+    await redis_session_service.ensure_session_index()
     return redis_session_service 
\ No newline at end of file
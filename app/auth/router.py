@@ -1,12 +1,14 @@
 from typing import Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
 from fastapi.responses import JSONResponse
 # Cache imports
 from fastapi_cache.decorator import cache
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
+from app.auth.dao import EventsDAO
 from app.auth.models import User
 from app.auth.schemas import (CommandEdit, CommandInfo,
                               CommandLeaderboardResponse,
@@ -16,14 +18,15 @@ from app.auth.schemas import (CommandEdit, CommandInfo,
 from app.auth.services import (CommandService, EventService, ProgramService,
                                QRService, StatsService, UserService)
 from app.auth.utils import set_tokens, user_profile_key_builder
+from app.dao.base import InvalidCursorError, requested_page_size
+from app.dao.writer import db_writer
 from app.dependencies.auth_dep import (get_access_token,
                                        get_current_event_name,
                                        get_current_user)
-from app.dependencies.dao_dep import (get_session_with_commit,
-                                      get_session_without_commit)
+from app.dependencies.dao_dep import get_session_without_commit
 from app.exceptions import (BadRequestException, ForbiddenException,
-                            InternalServerErrorException, NotFoundException,
-                            TokenExpiredException)
+                            InternalServerErrorException, InvalidCursorException,
+                            NotFoundException, TokenExpiredException)
 from app.logger import logger
 
 router = APIRouter()
@@ -34,16 +37,21 @@ router = APIRouter()
 @router.post("/telegram")
 async def telegram_auth(
     user_data: TelegramAuthData,
-    session: AsyncSession = Depends(get_session_with_commit)
+    event_name: str = Depends(get_current_event_name),
+    session: AsyncSession = Depends(get_session_without_commit),
 ):
     """Аутентификация через Telegram."""
     try:
-        user_service = UserService(session)
-        response_content, session_token = await user_service.handle_telegram_auth(user_data)
+        # Записи в БД (новый пользователь, строка сессии SQL-хранилища) сервис ставит в db_writer сам
+        response_content, session_token = await UserService(session).handle_telegram_auth(
+            user_data, event_name=event_name
+        )
         
         response = JSONResponse(content=response_content)
         set_tokens(response, session_token) # Используем утилиту для установки кук
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка при аутентификации через Telegram: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Ошибка сервера при аутентификации.")
@@ -52,7 +60,6 @@ async def telegram_auth(
 @router.post("/complete-registration")
 async def complete_registration(
     request: CompleteRegistrationRequest,
-    session: AsyncSession = Depends(get_session_with_commit),
     user: User = Depends(get_current_user)
 ):
     """Завершение регистрации пользователя."""
@@ -60,8 +67,7 @@ async def complete_registration(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Пользователь не авторизован")
         
     try:
-        user_service = UserService(session)
-        await user_service.complete_registration(user, request)
+        await db_writer.submit(lambda session: UserService(session).complete_registration(user, request))
         return {"ok": True, "message": "Регистрация успешно завершена"}
     except InternalServerErrorException as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -137,15 +143,13 @@ class QRVerifyRequest(BaseModel):
 @router.post("/toggle_looking_for_team")
 async def toggle_looking_for_team(
     user: User = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session_with_commit) # Нужен коммит
 ):
     """Переключение флага поиска команды."""
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Пользователь не авторизован")
     
     try:
-        user_service = UserService(session)
-        new_status = await user_service.toggle_looking_for_team(user.id)
+        new_status = await db_writer.submit(lambda session: UserService(session).toggle_looking_for_team(user.id))
         return {"ok": True, "is_looking_for_friends": new_status}
     except NotFoundException as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -190,8 +194,7 @@ class JoinTeamRequest(BaseModel):
 @router.post("/command/join")
 async def join_team(
     request: JoinTeamRequest,
-    scanner_user: User = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session_with_commit) # Нужен коммит
+    scanner_user: User = Depends(get_current_user)
 ):
     """Присоединение к команде через QR-код (по токену)."""
     logger.info(f"Запрос на присоединение к команде от пользователя {scanner_user.id}")
@@ -200,8 +203,9 @@ async def join_team(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Необходима авторизация")
         
     try:
-        command_service = CommandService(session)
-        await command_service.join_command_via_qr(scanner_user, request.token)
+        await db_writer.submit(
+            lambda session: CommandService(session).join_command_via_qr(scanner_user, request.token)
+        )
         return {"ok": True, "message": "Вы успешно добавлены в команду"}
     except TokenExpiredException as e:
         raise HTTPException(status_code=401, detail=str(e))
@@ -242,7 +246,6 @@ async def get_user_command(
 @router.post("/command/create")
 async def command_create(
     request: CommandEdit,
-    session: AsyncSession = Depends(get_session_with_commit),
     user: User = Depends(get_current_user),
     event_name: str = Depends(get_current_event_name)
 ):
@@ -253,8 +256,9 @@ async def command_create(
     logger.info(f"Попытка создания команды пользователем {user.id} с именем {request.name}")
     
     try:
-        command_service = CommandService(session)
-        await command_service.create_command(user, request, event_name)
+        await db_writer.submit(
+            lambda session: CommandService(session).create_command(user, request, event_name)
+        )
         return JSONResponse(
             status_code=200,
             content={"message": "Команда успешно создана"}
@@ -265,12 +269,10 @@ async def command_create(
         raise HTTPException(status_code=status_code, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при создании команды: {str(e)}", exc_info=True)
-        await session.rollback()
         raise HTTPException(status_code=500, detail="Не удалось создать команду.")
 
 @router.post("/command/delete")
 async def delete_command(
-    session: AsyncSession = Depends(get_session_with_commit),
     user: User = Depends(get_current_user)
 ):
     """Удаление команды капитаном."""
@@ -280,8 +282,7 @@ async def delete_command(
     logger.info(f"Попытка удаления команды пользователем {user.id}")
     
     try:
-        command_service = CommandService(session)
-        await command_service.delete_command(user)
+        await db_writer.submit(lambda session: CommandService(session).delete_command(user))
         return JSONResponse(
             status_code=200,
             content={"message": "Команда успешно удалена"}
@@ -293,13 +294,11 @@ async def delete_command(
     except Exception as e:
         # Логируем ID пользователя, т.к. ID команды может быть недоступен
         logger.error(f"Ошибка при удалении команды пользователя {user.id}: {str(e)}", exc_info=True)
-        await session.rollback()
         raise HTTPException(status_code=500, detail="Не удалось удалить команду.")
 
 @router.post("/command/rename")
 async def rename_command(
     request: CommandEdit,
-    session: AsyncSession = Depends(get_session_with_commit),
     user: User = Depends(get_current_user)
 ):
     """Переименование команды капитаном."""
@@ -309,8 +308,7 @@ async def rename_command(
     logger.info(f"Попытка изменения команды пользователем {user.id} на {request.name}")
     
     try:
-        command_service = CommandService(session)
-        await command_service.rename_command(user, request)
+        await db_writer.submit(lambda session: CommandService(session).rename_command(user, request))
         return JSONResponse(
             status_code=200,
             content={"message": "Команда успешно обновлена"}
@@ -323,12 +321,10 @@ async def rename_command(
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при переименовании команды пользователя {user.id}: {str(e)}", exc_info=True)
-        await session.rollback()
         raise HTTPException(status_code=500, detail="Не удалось переименовать команду.")
 
 @router.post("/command/leave")
 async def leave_command(
-    session: AsyncSession = Depends(get_session_with_commit),
     user: User = Depends(get_current_user)
 ):
     """Выход пользователя из команды."""
@@ -338,8 +334,7 @@ async def leave_command(
     logger.info(f"Попытка выхода из команды пользователем {user.id}")
     
     try:
-        command_service = CommandService(session)
-        await command_service.leave_command(user)
+        await db_writer.submit(lambda session: CommandService(session).leave_command(user))
         return JSONResponse(
             status_code=200,
             content={"message": "Вы успешно покинули команду"}
@@ -350,13 +345,11 @@ async def leave_command(
         raise HTTPException(status_code=403, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при выходе из команды пользователя {user.id}: {str(e)}", exc_info=True)
-        await session.rollback()
         raise HTTPException(status_code=500, detail="Не удалось выйти из команды.")
 
 @router.post("/command/remove_user")
 async def remove_user_from_command(
     user_id: int = Body(..., embed=True),
-    session: AsyncSession = Depends(get_session_with_commit),
     user: User = Depends(get_current_user)
 ):
     """Исключение пользователя из команды капитаном."""
@@ -366,8 +359,9 @@ async def remove_user_from_command(
     logger.info(f"Попытка исключения пользователя {user_id} из команды пользователем {user.id}")
     
     try:
-        command_service = CommandService(session)
-        await command_service.remove_user_from_command(user, user_id)
+        await db_writer.submit(
+            lambda session: CommandService(session).remove_user_from_command(user, user_id)
+        )
         return JSONResponse(
             status_code=200,
             content={"message": "Пользователь успешно исключен из команды"}
@@ -378,22 +372,25 @@ async def remove_user_from_command(
         raise HTTPException(status_code=403, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при исключении пользователя {user_id} из команды капитаном {user.id}: {str(e)}", exc_info=True)
-        await session.rollback()
         raise HTTPException(status_code=500, detail="Не удалось исключить пользователя из команды.")
 
 @router.post("/update_profile")
 async def update_profile(
     request: UpdateProfileRequest,
-    session: AsyncSession = Depends(get_session_without_commit), # Use without_commit
     user: User = Depends(get_current_user)
 ):
     """Обновление профиля пользователя."""
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Пользователь не авторизован")
-    
-    try:
+
+    async def update_job(session: AsyncSession) -> None:
+        # Пользователь из get_current_user привязан к сессии чтения - перечитываем его в сессии писателя
         user_service = UserService(session)
-        await user_service.update_profile(user, request)
+        db_user = await user_service.users_dao.find_one_by_id(user.id, options=[selectinload(User.insider_info)])
+        await user_service.update_profile(db_user, request)
+
+    try:
+        await db_writer.submit(update_job)
         return {"ok": True, "message": "Профиль успешно обновлен"}
     except InternalServerErrorException as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -448,17 +445,21 @@ async def get_registration_stats(
 
 @router.get("/users/looking_for_team")
 async def get_users_looking_for_team(
+    after: Optional[str] = Query(default=None, description="Курсор следующей страницы"),
+    limit: Optional[int] = Query(default=None, ge=1, le=200, description="Размер страницы; без limit и курсора - весь список"),
     session: AsyncSession = Depends(get_session_without_commit), # Только чтение
     user: User = Depends(get_current_user)
 ):
-    """Возвращает список пользователей, которые ищут команду."""
+    """Возвращает страницу пользователей, которые ищут команду."""
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Пользователь не авторизован")
     
     try:
         user_service = UserService(session)
-        users_list = await user_service.get_users_looking_for_team(user.id)
-        return {"ok": True, "users": users_list}
+        page = await user_service.get_users_looking_for_team(user.id, after=after, limit=requested_page_size(limit, after))
+        return {"ok": True, "users": page["users"], "next_cursor": page["next_cursor"]}
+    except InvalidCursorError:
+        raise InvalidCursorException
     except Exception as e:
         logger.error(f"Ошибка при получении списка пользователей, ищущих команду: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Ошибка при получении списка пользователей")
@@ -470,7 +471,6 @@ async def get_users_looking_for_team(
 async def add_score(
     user_id: int = Body(..., embed=True),
     score_data: ProgramScoreAdd = Body(...),
-    session: AsyncSession = Depends(get_session_with_commit),
     current_user: User = Depends(get_current_user) # Renamed user to current_user for clarity
 ):
     """Добавляет баллы пользователю (только CTC/Организатор)."""
@@ -481,8 +481,9 @@ async def add_score(
         raise HTTPException(status_code=401, detail="Необходима авторизация")
 
     try:
-        program_service = ProgramService(session)
-        total_score = await program_service.add_score(user_id, score_data, current_user)
+        total_score = await db_writer.submit(
+            lambda session: ProgramService(session).add_score(user_id, score_data, current_user)
+        )
         
         return {
             "ok": True,
@@ -531,7 +532,6 @@ async def get_user_score(
 async def qr_add_score(
     token: str = Body(..., embed=True),
     score_data: ProgramScoreAdd = Body(...),
-    session: AsyncSession = Depends(get_session_with_commit),
     scanner_user: User = Depends(get_current_user)
 ):
     """Быстрое добавление баллов при сканировании QR-кода (только CTC/Организатор)."""
@@ -542,8 +542,9 @@ async def qr_add_score(
         raise HTTPException(status_code=401, detail="Необходима авторизация")
     
     try:
-        program_service = ProgramService(session)
-        result_data = await program_service.qr_add_score(token, score_data, scanner_user)
+        result_data = await db_writer.submit(
+            lambda session: ProgramService(session).qr_add_score(token, score_data, scanner_user)
+        )
         
         return {
             "ok": True,
@@ -564,25 +565,29 @@ async def qr_add_score(
 @router.get("/commands/leaderboard/{event_name}", response_model=CommandLeaderboardResponse)
 async def get_command_leaderboard(
     event_name: str,
+    after: Optional[str] = Query(default=None, description="Курсор следующей страницы"),
+    limit: Optional[int] = Query(default=None, ge=1, le=200, description="Размер страницы; без limit и курсора - весь список"),
     session: AsyncSession = Depends(get_session_without_commit), # Только чтение
     user: Optional[User] = Depends(get_current_user) # Авторизация не обязательна
 ):
-    """Возвращает лидерборд команд для события (расчет по формуле, доступен всем)."""
+    """Возвращает страницу лидерборда команд для события (расчет по формуле, доступен всем)."""
     # TODO: Перенести логику в CommandService или StatsService - DONE (StatsService)
     logger.info(f"Запрос лидерборда команд для события '{event_name}' (доступен всем)")
 
     try:
         stats_service = StatsService(session)
-        leaderboard_data = await stats_service.get_command_leaderboard(event_name)
+        leaderboard_data = await stats_service.get_command_leaderboard(event_name, after=after, limit=requested_page_size(limit, after))
         
         # Проверяем, найден ли был лидерборд (сервис возвращает пустой объект, если событие не найдено)
-        if not leaderboard_data.leaderboard and not await EventsDAO(session).get_event_id_by_name(event_name): # Дополнительная проверка, что событие не существует
+        if not leaderboard_data.leaderboard and not after and not await EventsDAO(session).get_event_id_by_name(event_name): # Дополнительная проверка, что событие не существует
             logger.warning(f"Событие с именем '{event_name}' не найдено для лидерборда")
             return CommandLeaderboardResponse(ok=False, message=f"Событие '{event_name}' не найдено")
         
         # Возвращаем успешный результат (может быть пустым, если команд нет)
         return CommandLeaderboardResponse(ok=True, data=leaderboard_data)
 
+    except InvalidCursorError:
+        raise InvalidCursorException
     except Exception as e:
         logger.error(f"Ошибка при получении лидерборда команд для события '{event_name}': {str(e)}", exc_info=True)
         # Сервис уже логирует ошибку и возвращает пустой лидерборд, 
@@ -195,6 +195,7 @@ class CommandLeaderboardEntry(BaseModel):
 # Обновляем обертку данных
 class CommandLeaderboardData(BaseModel):
     leaderboard: List[CommandLeaderboardEntry] # Используем новую схему
+    next_cursor: Optional[str] = Field(default=None, description="Курсор следующей страницы")
 
 class CommandLeaderboardResponse(BaseModel):
     ok: bool
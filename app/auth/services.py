@@ -1,17 +1,20 @@
 import base64
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
 
 # Cache imports
 from fastapi_cache import FastAPICache
-from sqlalchemy import func, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.auth.auth_cache import auth_cache
 from app.auth.dao import (CommandsDAO, CommandsUsersDAO, EventsDAO,
                           InsidersInfoDAO, ProgramDAO, RolesDAO,
                           RolesUsersCommandDAO, SessionDAO, UsersDAO)
+from app.auth.loading import (COMMAND_MEMBERS_PROFILE, COMMAND_PARTICIPANTS_PROFILE,
+                              USER_AUTH_PROFILE, USER_ME_PROFILE)
 from app.auth.models import Command, CommandsUser, User
+from app.auth.redis_session import invalidate_user_auth_after_commit
 from app.auth.schemas import (CommandBase, CommandEdit, CommandInfo,
                               CommandLeaderboardData, CommandLeaderboardEntry,
                               CommandName, CommandsUserBase,
@@ -21,13 +24,18 @@ from app.auth.schemas import (CommandBase, CommandEdit, CommandInfo,
                               UpdateProfileRequest,
                               UserFindCompleteRegistration,
                               UserMakeCompleteRegistration, UserTelegramID)
+from app.auth.session_store import session_backend
+from app.auth.telegram_verifier import telegram_verifier
 from app.auth.utils import generate_qr_image
 from app.config import settings
+from app.dao.base import InvalidCursorError
+from app.dao.writer import db_writer
 from app.exceptions import (BadRequestException, ForbiddenException,
                             InternalServerErrorException, NotFoundException,
-                            TokenExpiredException)
+                            TelegramAuthInvalidException, TokenExpiredException)
 from app.logger import logger
-from app.quest.models import Attempt, AttemptType
+
+T = TypeVar("T")
 
 
 class UserService:
@@ -40,26 +48,37 @@ class UserService:
         self.program_dao = ProgramDAO(session)
         self.commands_users_dao = CommandsUsersDAO(session) # Для get_me
 
-    async def handle_telegram_auth(self, user_data: TelegramAuthData) -> Tuple[Dict[str, Any], str]:
-        """Обрабатывает аутентификацию через Telegram, создает или находит пользователя, создает сессию."""
-        user = await self.users_dao.find_one_or_none(
-            filters=UserTelegramID(telegram_id=user_data.id)
-        )
-        if not user:
-            logger.info(f"Создание нового пользователя для Telegram ID: {user_data.id}")
-            new_user = await self.users_dao.add(
-                values=SUserAddDB(
-                    full_name=user_data.first_name,
-                    telegram_id=user_data.id,
-                    telegram_username=user_data.username
-                )
-            )
-            user = new_user
-        else:
-            logger.info(f"Пользователь найден для Telegram ID: {user_data.id}")
+    async def handle_telegram_auth(
+        self, user_data: TelegramAuthData, event_name: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Обрабатывает аутентификацию через Telegram, создает или находит пользователя, создает сессию.
+
+        Выполняется в задаче запроса на сессии чтения: проверка подписи, поиск пользователя
+        и сессии в Redis или памяти не ждут очереди писателя. Через db_writer идут только
+        записи в БД - создание пользователя и строки сессии SQL-хранилища.
+        """
+        auth = telegram_verifier.verify_login_widget(user_data.model_dump(exclude={"registration_code"}))
+        if auth is None:
+            raise TelegramAuthInvalidException
+
+        user, session_token = None, None
+        if auth.user_id is not None and settings.SESSION_TOKEN_FORMAT != "signed":
+            # Те же данные уже проверялись (перезагрузка страницы): пользователь известен,
+            # его данные берём из снимка продлённой сессии, если он в кэше аутентификации
+            session_token = await self._with_session_store(lambda dao: dao.login(auth.user_id))
+            snapshot = auth_cache.get(session_token)
+            if snapshot is not None:
+                user = snapshot.to_user()
+            else:
+                user = await self.users_dao.find_one_or_none_by_id(auth.user_id)
+            if user is None:
+                session_token = None
+        if user is None:
+            user, is_new_user = await self._find_or_create_telegram_user(user_data)
+            session_token = await self._telegram_login_session(user, is_new_user, event_name)
+            auth.user_id = user.id
 
-        session_token = await self.session_dao.create_session(user.id)
-        
         registration_type = "default"
         if user_data.registration_code and user_data.registration_code == "insider":
             registration_type = "insider"
@@ -81,6 +100,53 @@ class UserService:
         
         return response_content, session_token
 
+    async def _with_session_store(self, action: Callable[[SessionDAO], Awaitable[T]]) -> T:
+        """Операция с хранилищем сессий: SQL-хранилище пишет строки sessions через db_writer."""
+        if session_backend() == "sql":
+            return await db_writer.submit(lambda session: action(SessionDAO(session)))
+        return await action(self.session_dao)
+
+    async def _find_or_create_telegram_user(self, user_data: TelegramAuthData) -> Tuple[User, bool]:
+        """Находит пользователя по Telegram ID или создает нового; второй элемент - создан ли он."""
+        user = await self.users_dao.find_one_or_none(
+            filters=UserTelegramID(telegram_id=user_data.id)
+        )
+        if user:
+            logger.info(f"Пользователь найден для Telegram ID: {user_data.id}")
+            return user, False
+        return await db_writer.submit(lambda session: UserService(session)._create_telegram_user(user_data))
+
+    async def _create_telegram_user(self, user_data: TelegramAuthData) -> Tuple[User, bool]:
+        """Задание писателя: повторная проверка и создание пользователя (параллельный первый вход)."""
+        user = await self.users_dao.find_one_or_none(
+            filters=UserTelegramID(telegram_id=user_data.id)
+        )
+        if user:
+            return user, False
+        logger.info(f"Создание нового пользователя для Telegram ID: {user_data.id}")
+        user = await self.users_dao.add(
+            values=SUserAddDB(
+                full_name=user_data.first_name,
+                telegram_id=user_data.id,
+                telegram_username=user_data.username
+            )
+        )
+        return user, True
+
+    async def _telegram_login_session(self, user: User, is_new_user: bool, event_name: Optional[str]) -> str:
+        # Мероприятие нужно только подписанному токену - лишний запрос для обычных не делаем
+        event_id = None
+        if settings.SESSION_TOKEN_FORMAT == "signed" and event_name:
+            event_id = await EventsDAO(self.session).get_event_id_by_name(event_name)
+        if is_new_user:
+            return await self._with_session_store(
+                lambda dao: dao.create_session(user.id, role_id=user.role_id, event_id=event_id)
+            )
+        # Повторный вход (Mini App открыта снова) переиспользует действующую сессию
+        return await self._with_session_store(
+            lambda dao: dao.login(user.id, role_id=user.role_id, event_id=event_id)
+        )
+
     async def complete_registration(self, user: User, request: CompleteRegistrationRequest) -> None:
         """Завершает регистрацию пользователя, устанавливая ФИО, роль и информацию инсайдера."""
         role_name = "insider" if request.student_organization else "guest"
@@ -94,6 +160,8 @@ class UserService:
             filters=UserFindCompleteRegistration(id=user.id),
             values=UserMakeCompleteRegistration(full_name=request.full_name, role_id=role.id)
         )
+        # Сменились ФИО и роль - снимки пользователя в сессиях и кэше аутентификации устарели
+        invalidate_user_auth_after_commit(self.session, user.id)
         
         if role_name == "insider" and (request.student_organization or request.geo_link):
             try:
@@ -110,13 +178,7 @@ class UserService:
         """Получает расширенную информацию о профиле пользователя."""
         user = await self.users_dao.find_one_by_id(
             user_id,
-            options=[
-                selectinload(User.commands).joinedload(CommandsUser.command).joinedload(Command.users).joinedload(CommandsUser.user).selectinload(User.role), # Добавили роль участника
-                selectinload(User.commands).joinedload(CommandsUser.command).joinedload(Command.users).joinedload(CommandsUser.role),
-                selectinload(User.commands).joinedload(CommandsUser.role),
-                selectinload(User.role),
-                selectinload(User.insider_info)
-            ]
+            options=USER_ME_PROFILE
         )
         if not user:
             raise NotFoundException("Пользователь не найден")
@@ -182,7 +244,7 @@ class UserService:
                     student_organization_to_save = request.student_organization
                 elif user.role.name == "ctc":
                     # Ensure insider_info exists for СтС before potentially saving geo_link
-                    if not user.insider_info:
+                    if not await self.insiders_dao.get_by_user_id(user.id):
                         await self.insiders_dao.create_or_update(user_id=user.id, student_organization="СтС")
                         # Re-fetch user or manually create insider_info object if needed immediately
                     student_organization_to_save = "СтС" # This isn't saved in the db column usually
@@ -195,6 +257,7 @@ class UserService:
                     )
             
             # Commit changes within the service method
+            invalidate_user_auth_after_commit(self.session, user.id)
             await self.session.commit()
             logger.info(f"User profile {user.id} updated and committed successfully.")
             
@@ -228,27 +291,27 @@ class UserService:
             raise NotFoundException("Пользователь не найден")
         
         current_user.is_looking_for_friends = not current_user.is_looking_for_friends
-        # Коммит будет выполнен в роутере через зависимость get_session_with_commit
-        # await self.session.commit() - убираем явный коммит из сервиса
+        invalidate_user_auth_after_commit(self.session, user_id)
+        # Коммит выполняет вызывающий (задание db_writer)
         return current_user.is_looking_for_friends
 
-    async def get_users_looking_for_team(self, current_user_id: int) -> List[Dict[str, Any]]:
-         """Возвращает список пользователей, ищущих команду, исключая текущего."""
-         looking_users = await self.users_dao.find_all_looking_for_team()
-         
+    async def get_users_looking_for_team(
+        self, current_user_id: int, after: Optional[str] = None, limit: Optional[int] = 50
+    ) -> Dict[str, Any]:
+         """Возвращает страницу пользователей, ищущих команду, исключая текущего."""
+         page = await self.users_dao.find_looking_for_team_page(
+             exclude_user_id=current_user_id, after=after, limit=limit
+         )
+
          users_list = [
              {
                  "id": u.id,
                  "full_name": u.full_name,
                  "telegram_username": u.telegram_username,
-                 # Информацию о команде и капитанстве лучше получать отдельно при необходимости,
-                 # чтобы не усложнять этот запрос
-                 # "is_captain": getattr(u, "is_captain", False), # Убираем
-                 # "team_name": getattr(u, "team_name", None)   # Убираем
              }
-             for u in looking_users if u.id != current_user_id
+             for u in page.items
          ]
-         return users_list
+         return {"users": users_list, "next_cursor": page.next_cursor}
 
 
 class QRService:
@@ -281,7 +344,7 @@ class QRService:
                  
             qr_user = await self.users_dao.find_one_by_id(
                 qr_user_session.user_id, 
-                options=[selectinload(User.role)] # Загружаем роль
+                options=USER_AUTH_PROFILE # Загружаем роль
             )
             if not qr_user:
                  raise NotFoundException("Пользователь по QR-коду не найден.")
@@ -295,10 +358,7 @@ class QRService:
 
         qr_user_command = await self.users_dao.find_user_command_in_event(
              user_id=qr_user.id,
-             options=[ # Загружаем необходимые связи для format_participants
-                 selectinload(Command.users).selectinload(CommandsUser.user).selectinload(User.role),
-                 selectinload(Command.users).selectinload(CommandsUser.role)
-             ]
+             options=COMMAND_PARTICIPANTS_PROFILE # Загружаем необходимые связи для format_participants
          )
         if not qr_user_command:
             logger.warning(f"Пользователь {qr_user.id} (из QR) не состоит в команде")
@@ -306,7 +366,7 @@ class QRService:
 
         qr_user_role_name, is_captain = get_user_role_in_command(qr_user_command.users, qr_user.id)
 
-        scanner_user_command = await self.users_dao.find_user_command_in_event(user_id=scanner_user.id)
+        scanner_membership = await self.users_dao.find_user_membership(user_id=scanner_user.id)
 
         scanner_role_name = scanner_user.role.name if scanner_user.role else None
         
@@ -342,10 +402,10 @@ class QRService:
                     logger.error(f"Ошибка при получении баллов пользователя {qr_user.id} при сканировании QR: {e}")
                     response_data["program"] = {"total_score": 0, "can_add_score": True, "error": "Не удалось загрузить баллы"}
 
-            can_join = scanner_role_name == "organizer" and not scanner_user_command and is_captain and len(qr_user_command.users) < 6
+            can_join = scanner_role_name == "organizer" and not scanner_membership and is_captain and len(qr_user_command.users) < 6
             join_reason = None
             if not can_join:
-                 join_reason = ("already_in_team" if scanner_user_command else
+                 join_reason = ("already_in_team" if scanner_membership else
                                 "not_captain" if not is_captain else
                                 "team_full" if len(qr_user_command.users) >= 6 else
                                 "only_guests_can_join" if scanner_role_name != 'guest' else # Уточнение для не-гостей
@@ -365,10 +425,10 @@ class QRService:
              if not is_captain:
                   return {"ok": False, "message": "Только QR капитана команды позволяет присоединиться"}
                   
-             can_join = not scanner_user_command and len(qr_user_command.users) < 6
+             can_join = not scanner_membership and len(qr_user_command.users) < 6
              join_reason = None
              if not can_join:
-                  join_reason = ("already_in_team" if scanner_user_command else
+                  join_reason = ("already_in_team" if scanner_membership else
                                 "team_full" if len(qr_user_command.users) >= 6 else
                                 "unknown")
              
@@ -431,6 +491,7 @@ class CommandService:
             user_id=user.id,
             role_id=captain_role_id
         ))
+        invalidate_user_auth_after_commit(self.session, user.id)
         logger.info(f"Пользователь {user.id} назначен капитаном команды {command.id}")
 
     async def _validate_captain(self, user_id: int) -> Command:
@@ -452,6 +513,7 @@ class CommandService:
         """Удаляет команду, если пользователь является капитаном."""
         command = await self._validate_captain(user.id)
         await self.commands_dao.delete_by_id(command.id)
+        invalidate_user_auth_after_commit(self.session, *(cu.user_id for cu in command.users))
         logger.info(f"Команда {command.id} удалена капитаном {user.id}")
 
     async def rename_command(self, user: User, command_data: CommandEdit) -> None:
@@ -464,6 +526,8 @@ class CommandService:
             raise BadRequestException("Команда с таким названием уже существует.")
             
         await self.commands_dao.update_name(command.id, command_data.name, command_data.language_id)
+        # Язык команды входит в снимки всех участников
+        invalidate_user_auth_after_commit(self.session, *(cu.user_id for cu in command.users))
         logger.info(f"Команда {command.id} переименована капитаном {user.id} в '{command_data.name}'")
 
     async def leave_command(self, user: User) -> None:
@@ -481,6 +545,7 @@ class CommandService:
             raise ForbiddenException("Капитан не может покинуть команду. Вместо этого удалите команду.")
             
         await self.commands_users_dao.delete_by_user_id(user.id)
+        invalidate_user_auth_after_commit(self.session, user.id)
         logger.info(f"Пользователь {user.id} покинул команду {command.id}")
 
     async def remove_user_from_command(self, captain: User, user_to_remove_id: int) -> None:
@@ -498,6 +563,7 @@ class CommandService:
             raise ForbiddenException("Нельзя исключить капитана из команды")
             
         await self.commands_users_dao.delete_by_user_id(user_to_remove_id)
+        invalidate_user_auth_after_commit(self.session, user_to_remove_id)
         logger.info(f"Капитан {captain.id} исключил пользователя {user_to_remove_id} из команды {command.id}")
 
     async def join_command_via_qr(self, scanner_user: User, qr_token: str) -> None:
@@ -523,10 +589,7 @@ class CommandService:
         # 2. Получаем команду владельца QR
         qr_user_command = await self.users_dao.find_user_command_in_event(
             user_id=qr_user.id, 
-            options=[
-                selectinload(Command.users).selectinload(CommandsUser.user),
-                selectinload(Command.users).selectinload(CommandsUser.role)
-            ]
+            options=COMMAND_MEMBERS_PROFILE
         )
         if not qr_user_command:
             raise BadRequestException("Пользователь не состоит в команде")
@@ -537,8 +600,8 @@ class CommandService:
             raise BadRequestException("Только QR капитана команды позволяет присоединиться")
             
         # 4. Проверяем, не состоит ли сканирующий пользователь уже в команде
-        scanner_user_command = await self.users_dao.find_user_command_in_event(user_id=scanner_user.id)
-        if scanner_user_command:
+        scanner_membership = await self.users_dao.find_user_membership(user_id=scanner_user.id)
+        if scanner_membership:
             raise BadRequestException("Вы уже состоите в другой команде")
             
         # 5. Проверяем, не состоит ли сканирующий пользователь уже в ЭТОЙ команде
@@ -560,6 +623,7 @@ class CommandService:
             user_id=scanner_user.id,
             role_id=member_role_id
         ))
+        invalidate_user_auth_after_commit(self.session, scanner_user.id)
         logger.info(f"Пользователь {scanner_user.id} успешно добавлен в команду {qr_user_command.id} через QR")
 
 
@@ -791,8 +855,10 @@ class StatsService:
             logger.error(f"Ошибка при получении статистики регистраций: {str(e)}", exc_info=True)
             raise InternalServerErrorException("Внутренняя ошибка сервера при получении статистики")
 
-    async def get_command_leaderboard(self, event_name: str) -> CommandLeaderboardData:
-        """Формирует и возвращает лидерборд команд для события."""
+    async def get_command_leaderboard(
+        self, event_name: str, after: Optional[str] = None, limit: Optional[int] = 50
+    ) -> CommandLeaderboardData:
+        """Формирует и возвращает страницу лидерборда команд для события."""
         logger.info(f"Запрос лидерборда команд для события '{event_name}' (доступен всем)")
 
         try:
@@ -801,69 +867,25 @@ class StatsService:
             if not target_event_id:
                 logger.warning(f"Событие с именем '{event_name}' не найдено для лидерборда")
                 # Возвращаем пустой лидерборд, а не ошибку
-                return CommandLeaderboardData(leaderboard=[]) 
-                
-            # 2. Получаем все команды указанного события, ЗАГРУЖАЕМ язык и пользователей
-            commands = await self.commands_dao.find_all_by_event(
-                target_event_id,
-                options=[
-                    selectinload(Command.language),
-                    selectinload(Command.users).selectinload(CommandsUser.user) # Не нужно для подсчета очков, но может понадобиться для отображения
-                ]
-            )
-
-            if not commands:
-                logger.info(f"В событии '{event_name}' нет команд для лидерборда")
                 return CommandLeaderboardData(leaderboard=[])
 
-            # 4. Вычисляем score и coins для каждой команды на основе верных попыток
-            leaderboard_results: List[CommandLeaderboardEntry] = []
-            for command in commands:
-                user_ids = [cu.user_id for cu in command.users if cu.user_id is not None]
-
-                total_score_base = 0.0 # Сумма AttemptType.score
-                total_coins_base = 0   # Сумма AttemptType.money
-
-                if user_ids:
-                    # Запрос для суммирования базовых очков и монет за ВСЕ верные попытки пользователей команды
-                    stmt = (
-                        select(
-                            func.sum(AttemptType.score).label("total_score"),
-                            func.sum(AttemptType.money).label("total_coins")
-                        )
-                        .join(Attempt, Attempt.attempt_type_id == AttemptType.id)
-                        .where(
-                            Attempt.user_id.in_(user_ids),
-                            Attempt.is_true == True,
-                        )
-                    )
-                    result = await self.session.execute(stmt)
-                    scores = result.fetchone()
-                    if scores and scores.total_score is not None:
-                        total_score_base = float(scores.total_score)
-                    if scores and scores.total_coins is not None:
-                        total_coins_base = int(scores.total_coins)
-
-                # Применяем формулу: total_score = (coins * 0.5) + score
-                final_total_score = (total_coins_base * 0.5) + total_score_base
-                
-                # Применяем фильтр >= 2 к финальному баллу
-                if final_total_score > 2:
-                    leaderboard_results.append(CommandLeaderboardEntry(
-                        command_name=command.name,
-                        total_score=final_total_score,
-                        language_name=command.language.name if command.language else None,
-                    ))
-
-            logger.info(f"Лидерборд для события '{event_name}' (score={total_score_base}, coins={total_coins_base}, final=coins*0.5+score, filter: >= 2) успешно сформирован, найдено {len(leaderboard_results)} команд")
+            # 2. Итог (coins * 0.5 + score), фильтр > 2 и сортировка считаются в БД по таблице балансов
+            page = await self.commands_dao.find_leaderboard_page(target_event_id, after=after, limit=limit)
+            leaderboard_results = [
+                CommandLeaderboardEntry(
+                    command_name=row.command_name,
+                    total_score=float(row.total_score),
+                    language_name=row.language_name,
+                )
+                for row in page.items
+            ]
 
-            # 5. Сортируем по убыванию финального очка
-            leaderboard_results.sort(key=lambda x: x.total_score, reverse=True)
-            
-            return CommandLeaderboardData(leaderboard=leaderboard_results)
+            logger.info(f"Страница лидерборда для события '{event_name}' сформирована, найдено {len(leaderboard_results)} команд")
+            return CommandLeaderboardData(leaderboard=leaderboard_results, next_cursor=page.next_cursor)
 
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Ошибка при формировании лидерборда команд для события '{event_name}': {str(e)}", exc_info=True)
             # Не пробрасываем ошибку, возвращаем пустой лидерборд
-            # raise InternalServerErrorException(f"Внутренняя ошибка сервера при формировании лидерборда для '{event_name}")
             return CommandLeaderboardData(leaderboard=[]) # Возвращаем пустой, чтобы не ломать фронт
@@ -0,0 +1,287 @@
+"""
+Хранилища сессий для SessionDAO.
+
+SESSION_STORE выбирает реализацию:
+    "redis"  - RedisSessionService (общий для всех воркеров и узлов);
+    "sql"    - таблица sessions в основной БД (запись в БД на каждый вход);
+    "memory" - шардированный словарь в памяти процесса (MemorySessionStore).
+               Только для развёртывания в один процесс: сессии не видны
+               другим воркерам и теряются при перезапуске;
+    "auto"   - redis при USE_REDIS, иначе sql (прежнее поведение).
+
+Все реализации соответствуют протоколу SessionStore; get_session возвращает
+объект с user_id, token, expires_at и is_valid() (RedisSession или Session).
+"""
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Protocol, Set, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import redis_session
+from app.auth.auth_cache import auth_cache
+from app.auth.models import Session
+from app.auth.redis_session import RedisSession
+from app.auth.utils import create_session
+from app.config import settings
+
+
+class SessionStore(Protocol):
+    async def create_session(
+        self, user_id: int, role_id: Optional[int] = None, event_id: Optional[int] = None
+    ) -> str: ...
+
+    async def reuse_session(self, user_id: int) -> Optional[str]: ...
+
+    async def get_session(self, token: str): ...
+
+    async def deactivate_session(self, token: str) -> bool: ...
+
+    async def deactivate_all_sessions(self, user_id: int) -> int: ...
+
+    async def get_snapshot_versions(self, user_id: int) -> Optional[Tuple[str, str]]: ...
+
+    async def save_snapshot(self, token: str, user_id: int, snapshot: str, versions: Tuple[str, str]) -> bool: ...
+
+    async def clear_all_sessions(self) -> int: ...
+
+
+class SqlSessionStore:
+    """Сессии в таблице sessions; коммит выполняет владелец сессии БД."""
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    async def create_session(
+        self, user_id: int, role_id: Optional[int] = None, event_id: Optional[int] = None
+    ) -> str:
+        await self.deactivate_all_sessions(user_id)
+        session = await create_session(user_id)
+        self._session.add(session)
+        await self._session.flush()
+        return session.token
+
+    async def reuse_session(self, user_id: int) -> Optional[str]:
+        now = datetime.now(timezone.utc)
+        result = await self._session.execute(
+            select(Session)
+            .where(Session.user_id == user_id, Session.is_active.is_(True), Session.expires_at > now)
+            .order_by(Session.expires_at.desc())
+            .limit(1)
+        )
+        session = result.scalar_one_or_none()
+        if session is None:
+            return None
+        session.expires_at = now + timedelta(seconds=settings.SESSION_EXPIRE_SECONDS)
+        await self._session.flush()
+        return session.token
+
+    async def get_session(self, token: str) -> Optional[Session]:
+        result = await self._session.execute(select(Session).where(Session.token == token))
+        session = result.scalar_one_or_none()
+        return session if session is not None and session.is_valid() else None
+
+    async def deactivate_session(self, token: str) -> bool:
+        result = await self._session.execute(
+            update(Session)
+            .where(Session.token == token)
+            .values(is_active=False, expires_at=datetime.now(timezone.utc))
+        )
+        await auth_cache.invalidate_token(token)
+        return result.rowcount > 0
+
+    async def deactivate_all_sessions(self, user_id: int) -> int:
+        result = await self._session.execute(
+            update(Session)
+            .where(Session.user_id == user_id, Session.is_active.is_(True))
+            .values(is_active=False, expires_at=datetime.now(timezone.utc))
+        )
+        await auth_cache.invalidate_user(user_id)
+        return result.rowcount
+
+    async def get_snapshot_versions(self, user_id: int) -> Optional[Tuple[str, str]]:
+        # Снимки в строках sessions не хранятся: пользователь читается из той же БД
+        return None
+
+    async def save_snapshot(self, token: str, user_id: int, snapshot: str, versions: Tuple[str, str]) -> bool:
+        return False
+
+    async def clear_all_sessions(self) -> int:
+        result = await self._session.execute(delete(Session))
+        await self._session.commit()
+        await auth_cache.invalidate_all()
+        return result.rowcount
+
+
+class MemorySessionStore:
+    """
+    Сессии в памяти процесса, разбитые на шарды по хешу токена.
+
+    Истёкшие сессии отклоняются при чтении, а раз в sweep_interval секунд
+    вычищаются целиком: за один проход очищается один шард, проходы
+    распределены по интервалу и выполняются попутно с create/get, так что
+    паузы не растут с общим числом сессий.
+
+    Снимки пользователей (AuthSnapshot) хранятся в записи сессии и
+    версионируются так же, как в Redis (см. RedisSessionService).
+    """
+
+    def __init__(self, shards: int = 16, sweep_interval: float = 60.0):
+        self._shards: List[Dict[str, RedisSession]] = [{} for _ in range(shards)]
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self._user_versions: Dict[int, int] = {}
+        self._all_version = 0
+        self._sweep_step = sweep_interval / shards
+        self._next_sweep = time.monotonic() + self._sweep_step
+        self._sweep_shard = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def _shard(self, token: str) -> Dict[str, RedisSession]:
+        return self._shards[hash(token) % len(self._shards)]
+
+    def _remove(self, token: str) -> Optional[RedisSession]:
+        session = self._shard(token).pop(token, None)
+        if session is not None:
+            tokens = self._tokens_by_user.get(session.user_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[session.user_id]
+        return session
+
+    def _maybe_sweep(self) -> None:
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self._sweep_step
+        self.sweep_shard(self._sweep_shard)
+        self._sweep_shard = (self._sweep_shard + 1) % len(self._shards)
+
+    def sweep_shard(self, index: int) -> int:
+        """Удаляет истёкшие сессии одного шарда; возвращает их число."""
+        now = datetime.now(timezone.utc)
+        expired = [token for token, session in self._shards[index].items() if session.expires_at <= now]
+        for token in expired:
+            self._remove(token)
+        return len(expired)
+
+    async def create_session(
+        self, user_id: int, role_id: Optional[int] = None, event_id: Optional[int] = None
+    ) -> str:
+        self._maybe_sweep()
+        await self.deactivate_all_sessions(user_id)
+        session = RedisSession(
+            user_id=user_id,
+            token=secrets.token_urlsafe(32),
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.SESSION_EXPIRE_SECONDS),
+        )
+        self._shard(session.token)[session.token] = session
+        self._tokens_by_user.setdefault(user_id, set()).add(session.token)
+        return session.token
+
+    async def reuse_session(self, user_id: int) -> Optional[str]:
+        for token in self._tokens_by_user.get(user_id, ()):
+            session = self._shard(token)[token]
+            if session.is_valid():
+                session.expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.SESSION_EXPIRE_SECONDS)
+                return token
+        return None
+
+    async def get_session(self, token: str) -> Optional[RedisSession]:
+        self._maybe_sweep()
+        session = self._shard(token).get(token)
+        if session is None:
+            return None
+        if not session.is_valid():
+            self._remove(token)
+            return None
+        return session
+
+    async def deactivate_session(self, token: str) -> bool:
+        removed = self._remove(token) is not None
+        await auth_cache.invalidate_token(token)
+        return removed
+
+    async def deactivate_all_sessions(self, user_id: int) -> int:
+        tokens = list(self._tokens_by_user.get(user_id, ()))
+        for token in tokens:
+            self._remove(token)
+        await auth_cache.invalidate_user(user_id)
+        return len(tokens)
+
+    async def get_snapshot_versions(self, user_id: int) -> Optional[Tuple[str, str]]:
+        return str(self._user_versions.get(user_id, 0)), str(self._all_version)
+
+    async def save_snapshot(self, token: str, user_id: int, snapshot: str, versions: Tuple[str, str]) -> bool:
+        session = self._shard(token).get(token)
+        if session is None or versions != await self.get_snapshot_versions(user_id):
+            return False
+        session.snapshot = snapshot
+        return True
+
+    def drop_user_snapshots(self, user_id: int) -> None:
+        self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+        for token in self._tokens_by_user.get(user_id, ()):
+            self._shard(token)[token].snapshot = None
+
+    def drop_all_snapshots(self) -> None:
+        self._all_version += 1
+        for shard in self._shards:
+            for session in shard.values():
+                session.snapshot = None
+
+    async def clear_all_sessions(self) -> int:
+        count = len(self)
+        for shard in self._shards:
+            shard.clear()
+        self._tokens_by_user.clear()
+        await auth_cache.invalidate_all()
+        return count
+
+
+memory_session_store = MemorySessionStore(
+    shards=settings.MEMORY_SESSION_SHARDS,
+    sweep_interval=settings.MEMORY_SESSION_SWEEP_SECONDS,
+)
+
+
+def session_backend() -> str:
+    """Имя действующего хранилища сессий с учётом SESSION_STORE = "auto"."""
+    if settings.SESSION_STORE == "auto":
+        return "redis" if settings.USE_REDIS else "sql"
+    return settings.SESSION_STORE
+
+
+def check_session_settings() -> None:
+    """
+    Проверяет сочетание SESSION_STORE и SESSION_TOKEN_FORMAT при старте.
+    Подписанные токены выдаёт и отзывает только Redis-хранилище: SQL и memory
+    выдавали бы случайные токены, и сравнение форматов было бы неверным.
+    """
+    token_format = settings.SESSION_TOKEN_FORMAT
+    if token_format not in ("opaque", "signed"):
+        raise ValueError(f"Неизвестный формат токена SESSION_TOKEN_FORMAT={token_format!r}")
+    backend = session_backend()
+    if token_format == "signed" and backend != "redis":
+        raise ValueError(
+            f'SESSION_TOKEN_FORMAT="signed" поддерживается только хранилищем redis, '
+            f"а выбрано SESSION_STORE={settings.SESSION_STORE!r} ({backend})"
+        )
+
+
+def get_session_store(session: AsyncSession) -> SessionStore:
+    """Хранилище сессий по настройкам; session - сессия БД для SQL-хранилища."""
+    backend = session_backend()
+    if backend == "redis":
+        if redis_session.redis_session_service is None:
+            raise RuntimeError("Redis session service not initialized")
+        return redis_session.redis_session_service
+    if backend == "memory":
+        return memory_session_store
+    if backend == "sql":
+        return SqlSessionStore(session)
+    raise ValueError(f"Неизвестное хранилище сессий SESSION_STORE={settings.SESSION_STORE!r}")
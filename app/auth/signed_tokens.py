@@ -0,0 +1,114 @@
+"""
+Подписанные токены сессии (SESSION_TOKEN_FORMAT = "signed").
+
+Токен "s1.<payload>.<signature>": payload - base64url компактного JSON с
+user_id, ролью, мероприятием, временем выпуска, сроком действия и jti,
+signature - base64url HMAC-SHA256 от "s1.<payload>" на ключе SECRET_KEY.
+Подпись и срок проверяются локально, без обращений к Redis; отзыв токенов
+хранится в Redis (см. RedisSessionService).
+
+Роль и мероприятие в токене - значения на момент входа; права по-прежнему
+проверяются по пользователю из БД.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from app.config import settings
+
+TOKEN_PREFIX = "s1."
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    user_id: int
+    role_id: Optional[int]
+    event_id: Optional[int]
+    issued_at_ms: int
+    expires_at: int  # unix-время в секундах
+    jti: str
+
+    @property
+    def expires_at_datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.expires_at, tz=timezone.utc)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(message: str, key: str) -> str:
+    return _b64encode(hmac.new(key.encode(), message.encode(), hashlib.sha256).digest())
+
+
+def is_signed_token(token: str) -> bool:
+    return token.startswith(TOKEN_PREFIX)
+
+
+def issue_token(
+    user_id: int,
+    role_id: Optional[int] = None,
+    event_id: Optional[int] = None,
+    lifetime_seconds: Optional[int] = None,
+    key: Optional[str] = None,
+) -> Tuple[str, TokenClaims]:
+    """Выпускает подписанный токен и возвращает его вместе с содержимым."""
+    key = key or settings.SECRET_KEY
+    if not key:
+        raise RuntimeError("SECRET_KEY не задан: подписанные токены сессии недоступны")
+    now_ms = time.time_ns() // 1_000_000
+    lifetime = lifetime_seconds if lifetime_seconds is not None else settings.SESSION_EXPIRE_SECONDS
+    claims = TokenClaims(
+        user_id=user_id,
+        role_id=role_id,
+        event_id=event_id,
+        issued_at_ms=now_ms,
+        expires_at=now_ms // 1000 + int(lifetime),
+        jti=secrets.token_urlsafe(9),
+    )
+    payload = _b64encode(json.dumps(
+        {"u": claims.user_id, "r": claims.role_id, "e": claims.event_id,
+         "i": claims.issued_at_ms, "x": claims.expires_at, "j": claims.jti},
+        separators=(",", ":"),
+    ).encode())
+    signed = TOKEN_PREFIX + payload
+    return f"{signed}.{_sign(signed, key)}", claims
+
+
+def verify_token(token: str, key: Optional[str] = None, check_expiry: bool = True) -> Optional[TokenClaims]:
+    """
+    Проверяет подпись и срок действия токена.
+    Возвращает содержимое токена или None, если токен поддельный, повреждён или истёк.
+    """
+    key = key or settings.SECRET_KEY
+    if not key or not is_signed_token(token):
+        return None
+    signed, _, signature = token.rpartition(".")
+    if not signed or not hmac.compare_digest(signature, _sign(signed, key)):
+        return None
+    try:
+        data = json.loads(_b64decode(signed[len(TOKEN_PREFIX):]))
+        claims = TokenClaims(
+            user_id=int(data["u"]),
+            role_id=data.get("r"),
+            event_id=data.get("e"),
+            issued_at_ms=int(data["i"]),
+            expires_at=int(data["x"]),
+            jti=str(data["j"]),
+        )
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+    if check_expiry and claims.expires_at <= time.time():
+        return None
+    return claims
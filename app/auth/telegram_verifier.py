@@ -0,0 +1,138 @@
+"""
+Проверка данных входа через Telegram.
+
+Два формата с разными ключами подписи, оба выводятся из BOT_TOKEN один раз:
+    - initData Mini App: ключ HMAC-SHA256("WebAppData", BOT_TOKEN), данные -
+      query string с URL-кодированием;
+    - Login Widget: ключ SHA256(BOT_TOKEN), данные - поля пользователя.
+В обоих случаях подпись - HMAC-SHA256 строки "key=value", отсортированной по
+ключам и соединённой "\\n", без поля hash. auth_date не должен быть старше
+TELEGRAM_AUTH_MAX_AGE_SECONDS.
+
+Без BOT_TOKEN вход отклоняется: проверку подписи можно пропустить только явно
+(TELEGRAM_AUTH_ALLOW_UNSIGNED, для локальной разработки).
+
+Недавно проверенные данные хранятся в LRU по точному содержимому: повторная
+отправка тех же данных (перезагрузка Mini App) не пересчитывает HMAC, а в
+результате запоминается найденный пользователь, чтобы не искать его снова.
+"""
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import parse_qsl
+
+from app.config import settings
+from app.logger import logger
+
+
+@dataclass
+class TelegramAuthResult:
+    telegram_id: int
+    auth_date: int
+    user: Dict[str, Any]  # поля пользователя Telegram
+    user_id: Optional[int] = None  # id пользователя в БД, если уже известен
+
+
+class TelegramAuthVerifier:
+    def __init__(self, bot_token: str, max_age_seconds: int, cache_size: int, allow_unsigned: bool = False):
+        self.enabled = bool(bot_token)
+        self.allow_unsigned = allow_unsigned
+        self.max_age_seconds = max_age_seconds
+        self.cache_size = cache_size
+        self._webapp_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+        self._widget_key = hashlib.sha256(bot_token.encode()).digest()
+        self._verified: "OrderedDict[str, TelegramAuthResult]" = OrderedDict()
+
+    def _is_fresh(self, auth_date: int) -> bool:
+        return time.time() - auth_date <= self.max_age_seconds
+
+    def _cached(self, key: str) -> Optional[TelegramAuthResult]:
+        result = self._verified.get(key)
+        if result is None:
+            return None
+        if not self._is_fresh(result.auth_date):
+            del self._verified[key]
+            return None
+        self._verified.move_to_end(key)
+        return result
+
+    def _remember(self, key: str, result: TelegramAuthResult) -> TelegramAuthResult:
+        self._verified[key] = result
+        while len(self._verified) > self.cache_size:
+            self._verified.popitem(last=False)
+        return result
+
+    def _check(self, fields: Mapping[str, str], received_hash: str, key: bytes) -> bool:
+        if not self.enabled:
+            # Без BOT_TOKEN подпись проверить нечем: данные принимаются только при явном разрешении
+            if not self.allow_unsigned:
+                logger.error("BOT_TOKEN не задан: вход через Telegram отклонён")
+            return self.allow_unsigned
+        data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+        calculated = hmac.new(key, data_check_string.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(calculated, received_hash)
+
+    def verify_init_data(self, init_data: str) -> Optional[TelegramAuthResult]:
+        """Проверяет initData Mini App; None - подпись неверна, данные устарели или повреждены."""
+        cached = self._cached(init_data)
+        if cached is not None:
+            return cached
+        try:
+            fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+            received_hash = fields.pop("hash")
+            auth_date = int(fields["auth_date"])
+            user = json.loads(fields.get("user", "{}"))
+            telegram_id = int(user["id"])
+        except (KeyError, ValueError, TypeError) as e:
+            logger.warning(f"Некорректные initData Telegram: {e}")
+            return None
+        if not self._check(fields, received_hash, self._webapp_key):
+            logger.warning(f"Неверная подпись initData Telegram для {telegram_id}")
+            return None
+        if not self._is_fresh(auth_date):
+            logger.warning(f"Устаревшие initData Telegram для {telegram_id}")
+            return None
+        return self._remember(init_data, TelegramAuthResult(telegram_id, auth_date, user))
+
+    def verify_login_widget(self, data: Mapping[str, Any]) -> Optional[TelegramAuthResult]:
+        """
+        Проверяет данные Login Widget (id, first_name, ..., auth_date, hash).
+        Поля со значением None в подписи не участвуют.
+        """
+        fields = {key: str(value) for key, value in data.items() if value is not None and key != "hash"}
+        received_hash = str(data.get("hash") or "")
+        # Ключ кэша - все поля вместе с подписью, поэтому подмена любого поля - промах
+        cache_key = json.dumps([fields, received_hash], sort_keys=True)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return cached
+        try:
+            telegram_id = int(fields["id"])
+            auth_date = int(fields["auth_date"])
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Некорректные данные Login Widget Telegram: {e}")
+            return None
+        if not self._check(fields, received_hash, self._widget_key):
+            logger.warning(f"Неверная подпись Login Widget Telegram для {telegram_id}")
+            return None
+        if not self._is_fresh(auth_date):
+            logger.warning(f"Устаревшие данные Login Widget Telegram для {telegram_id}")
+            return None
+        return self._remember(cache_key, TelegramAuthResult(telegram_id, auth_date, dict(data)))
+
+
+telegram_verifier = TelegramAuthVerifier(
+    bot_token=settings.BOT_TOKEN,
+    max_age_seconds=settings.TELEGRAM_AUTH_MAX_AGE_SECONDS,
+    cache_size=settings.TELEGRAM_AUTH_CACHE_SIZE,
+    allow_unsigned=settings.TELEGRAM_AUTH_ALLOW_UNSIGNED,
+)
+if not telegram_verifier.enabled:
+    if telegram_verifier.allow_unsigned:
+        logger.warning("BOT_TOKEN не задан: подпись данных входа через Telegram не проверяется (TELEGRAM_AUTH_ALLOW_UNSIGNED)")
+    else:
+        logger.error("BOT_TOKEN не задан: вход через Telegram будет отклоняться")
@@ -1,8 +1,5 @@
 import secrets
-import hashlib
-import hmac
 import io
-import json
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Tuple, Optional
 
@@ -10,38 +7,13 @@ from fastapi import Response
 import segno
 
 from app.auth.models import Session, CommandsUser, User
+from app.auth.telegram_verifier import telegram_verifier
 from app.config import settings
 
 def verify_telegram_data(init_data: str) -> Optional[Dict[str, Any]]:
-    """Проверяет данные инициализации Telegram Web App."""
-    try:
-        # Разделяем строку на пары ключ=значение
-        params = dict(item.split("=") for item in init_data.split("&"))
-        # Извлекаем хеш для проверки
-        received_hash = params.pop("hash")
-        
-        # Формируем строку данных для проверки хеша
-        data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(params.items()))
-        
-        # Генерируем секретный ключ
-        secret_key = hmac.new(b"WebAppData", settings.BOT_TOKEN.encode(), hashlib.sha256).digest()
-        
-        # Вычисляем хеш
-        calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
-        
-        # Сравниваем хеши
-        if calculated_hash == received_hash:
-            # Данные валидны, извлекаем user
-            user_data = json.loads(params.get('user', '{}'))
-            return user_data
-        else:
-            # Данные невалидны
-            return None
-    except Exception as e:
-        # Ошибка при разборе или проверке
-        # Можно добавить логирование ошибки для отладки
-        # logger.error(f"Failed to verify Telegram data: {e}", exc_info=True)
-        return None
+    """Проверяет данные инициализации Telegram Web App; возвращает пользователя Telegram или None."""
+    result = telegram_verifier.verify_init_data(init_data)
+    return result.user if result is not None else None
 
 def set_tokens(response: Response, session_token: str):
     """Устанавливает сессионный токен в httpOnly cookie и дублирует его
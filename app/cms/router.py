@@ -4,7 +4,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import RedirectResponse, HTMLResponse, JSONResponse, Response
 from starlette.types import ASGIApp
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from functools import wraps
 from typing import Any, Optional, Callable, TypeVar
 import os
@@ -13,11 +13,13 @@ import io
 from sqlalchemy.orm import selectinload
 
 from app.config import DEBUG
-from app.dao.database import engine
+from app.dao.base import InvalidCursorError, requested_page_size
+from app.dao.database import async_session_maker_read, engine, read_engine
 from app.cms import views
 from app.dependencies.auth_dep import get_access_token
 from app.dependencies.template_dep import get_templates
 from app.auth.dao import UsersDAO, SessionDAO
+from app.auth.loading import USER_AUTH_PROFILE
 from app.logger import logger
 
 # Определяем возвращаемый тип для декораторов
@@ -437,7 +439,7 @@ class AdminProgramView(AdminPage):
                 users_dao = UsersDAO(session)
                 
                 # Получаем пользователя
-                user = await users_dao.find_one_by_id(user_id)
+                user = await users_dao.find_one_by_id(user_id, options=USER_AUTH_PROFILE)
                 if not user:
                     return JSONResponse({
                         "ok": False,
@@ -531,7 +533,7 @@ class AdminProgramView(AdminPage):
                     score = user_score.total_score
                     
                     # Получаем данные пользователя
-                    user_query = select(User).where(User.id == user_id)
+                    user_query = select(User).options(*USER_AUTH_PROFILE).where(User.id == user_id)
                     user_result = await session.execute(user_query)
                     user = user_result.scalar_one_or_none()
                     
@@ -585,12 +587,23 @@ class AdminProgramView(AdminPage):
                         "message": "Пользователь не найден"
                     }, status_code=status.HTTP_404_NOT_FOUND)
                 
-                # Получаем историю баллов пользователя
-                history = await program_dao.get_score_history(user_id)
+                # Без limit и after - вся история, страница только по запросу клиента
+                after = request.query_params.get("after")
+                limit = request.query_params.get("limit")
+                limit = min(int(limit), 500) if limit else None
+                try:
+                    page = await program_dao.get_score_history_page(
+                        user_id, after=after, limit=requested_page_size(limit, after)
+                    )
+                except InvalidCursorError:
+                    return JSONResponse({
+                        "ok": False,
+                        "message": "Некорректный курсор пагинации"
+                    }, status_code=status.HTTP_400_BAD_REQUEST)
                 
                 # Преобразуем историю в формат транзакций
                 transactions = []
-                for record in history:
+                for record in page.items:
                     transaction_type = "credit" if record.score >= 0 else "debit"
                     transactions.append({
                         "id": record.id,
@@ -602,7 +615,8 @@ class AdminProgramView(AdminPage):
                 
                 return JSONResponse({
                     "ok": True,
-                    "transactions": transactions
+                    "transactions": transactions,
+                    "next_cursor": page.next_cursor
                 })
         except Exception as e:
             logger.error(f"Ошибка при получении транзакций пользователя {user_id}: {e}", exc_info=True)
@@ -788,6 +802,35 @@ class AdminQuestView(AdminPage):
         admin.app.get("/admin/quest/stats")(require_organizer_role(self.get_quest_stats))
 
 
+class AdminSlowQueriesView(AdminPage):
+    """Журнал медленных SQL-запросов с планами выполнения."""
+    name = "Медленные запросы"
+    icon = "fa-solid fa-stopwatch"
+
+    async def get_slow_queries_page(self, request: Request) -> HTMLResponse:
+        """Отображает последние медленные запросы."""
+        from app.config import settings
+        from app.dao.slow_queries import read_slow_queries
+
+        try:
+            limit = min(int(request.query_params.get("limit", 100)), 1000)
+        except ValueError:
+            limit = 100
+        return templates.TemplateResponse(
+            "admin/slow_queries.html",
+            {
+                "request": request,
+                "entries": read_slow_queries(limit),
+                "threshold_ms": settings.DB_SLOW_QUERY_MS,
+            }
+        )
+
+    def register(self, admin: Admin) -> None:
+        """Регистрирует маршрут журнала медленных запросов."""
+        admin.app.get("/admin/slow-queries")(require_organizer_role(self.get_slow_queries_page))
+        admin.app.get("/admin/slow-queries/")(require_organizer_role(self.get_slow_queries_page))
+
+
 class AdminAuthMiddleware(BaseHTTPMiddleware):
     """Middleware для аутентификации в админке, дающее доступ только пользователям с ролью organizer."""
     
@@ -820,7 +863,7 @@ class AdminAuthMiddleware(BaseHTTPMiddleware):
             
             # Получаем пользователя
             users_dao = UsersDAO(session)
-            user = await users_dao.find_one_or_none_by_id(user_session.user_id)
+            user = await users_dao.find_one_or_none_by_id(user_session.user_id, options=USER_AUTH_PROFILE)
             
             return user
 
@@ -885,8 +928,11 @@ def require_organizer_role(func: Callable[..., T]) -> Callable[..., T]:
 def init_admin(app: FastAPI, base_url: str = "/admin") -> Admin:
     """Инициализирует админ-панель с проверкой прав доступа."""
     
-    # Создаем экземпляр админки
-    admin = Admin(app, engine, base_url=base_url)
+    # Создаем экземпляр админки. Страницы админки читают через пул чтения, чтобы не занимать
+    # единственное соединение писателя; сохранения идут через app.dao.writer (см. views.BaseModelView).
+    # Фабрика сессий своя: Admin перенастраивает переданную (autoflush=False)
+    admin_session_maker = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+    admin = Admin(app, session_maker=admin_session_maker, base_url=base_url)
     
     # Обработчики для корневого пути с обоими вариантами (со слешем и без)
     @admin.app.get(f"{base_url}")
@@ -916,13 +962,14 @@ def init_admin(app: FastAPI, base_url: str = "/admin") -> Admin:
         try:
             # Перенаправляем запрос на обработчик в auth router
             from app.auth.router import get_registration_stats
-            from app.dependencies.auth_dep import get_session_with_commit
-            
-            # Используем зависимость для получения сессии
-            session = await get_session_with_commit(request)
+            from app.dependencies.auth_dep import get_current_event_name
             
-            # Вызываем обработчик из auth router
-            return await get_registration_stats(session=session, user=user)
+            # Статистика только читает - сессия из пула чтения
+            async with async_session_maker_read() as session:
+                # Вызываем обработчик из auth router
+                return await get_registration_stats(
+                    session=session, user=user, event_name=get_current_event_name(request)
+                )
         except Exception as e:
             logger.error(f"Ошибка при получении статистики: {e}", exc_info=True)
             return JSONResponse(
@@ -948,6 +995,10 @@ def init_admin(app: FastAPI, base_url: str = "/admin") -> Admin:
     # Добавляем страницу статистики квеста
     quest_view = AdminQuestView()
     quest_view.register(admin)
+
+    # Добавляем журнал медленных запросов
+    slow_queries_view = AdminSlowQueriesView()
+    slow_queries_view.register(admin)
     
     # Автоматически регистрируем все классы ModelView из модуля views
     for name, view in vars(views).items():
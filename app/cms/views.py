@@ -1,8 +1,17 @@
+from contextlib import asynccontextmanager
 from sqladmin import ModelView
+from sqladmin._queries import Query
 from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from sqlalchemy.sql import func
 from wtforms.fields import TextAreaField
+from app.auth.auth_cache import auth_cache
+from app.auth.redis_session import invalidate_all_auth, invalidate_user_auth
 from app.auth.models import Event, User, Role, Command, Language, RoleUserCommand, Session, CommandsUser, InsiderInfo, Program
+from app.dao.writer import db_writer
+from app.quest.content import quest_content
+from app.quest.dao import CommandBalancesDAO
 from app.quest.models import Answer, Block, Question, AttemptType, Attempt, QuestionInsider
 from sqladmin.forms import FileField
 from fastapi import UploadFile, Request
@@ -13,7 +22,54 @@ from pathlib import Path
 from markupsafe import Markup
 import uuid
 
-class UserAdmin(ModelView, model=User):
+
+async def rebuild_command_balances() -> None:
+    fixed = await db_writer.submit(lambda session: CommandBalancesDAO(session).rebuild())
+    logger.info(f"Балансы команд пересчитаны после правки в админке, исправлено строк: {fixed}")
+
+
+class _JobSessionView:
+    """Представление sqladmin, чей session_maker отдаёт сессию задания db_writer."""
+
+    def __init__(self, view: ModelView, session: AsyncSession):
+        self._view = view
+        self._session = session
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._view, name)
+
+    @asynccontextmanager
+    async def session_maker(self, **kwargs):
+        # Сессию закрывает и коммитит писатель
+        yield self._session
+
+
+class BaseModelView(ModelView):
+    """
+    Связи моделей не грузятся неявно (lazy="raise_on_sql"), а sqladmin подгружает
+    только связи формы, поэтому для страницы просмотра догружаем показываемые связи.
+
+    Списки и карточки читаются через пул чтения (session_maker админки), а создание,
+    правка и удаление выполняются заданием db_writer вместе с хуками on_/after_model_*.
+    """
+
+    def details_query(self, request: Request) -> Select:
+        stmt = super().details_query(request)
+        for relation in self._details_relations:
+            stmt = stmt.options(selectinload(relation))
+        return stmt
+
+    async def insert_model(self, request: Request, data: dict) -> Any:
+        return await db_writer.submit(lambda session: Query(_JobSessionView(self, session)).insert(data, request))
+
+    async def update_model(self, request: Request, pk: str, data: dict) -> Any:
+        return await db_writer.submit(lambda session: Query(_JobSessionView(self, session)).update(pk, data, request))
+
+    async def delete_model(self, request: Request, pk: Any) -> None:
+        await db_writer.submit(lambda session: Query(_JobSessionView(self, session)).delete(pk, request))
+
+
+class UserAdmin(BaseModelView, model=User):
     column_list = [
         User.id,
         User.full_name,
@@ -51,13 +107,29 @@ class UserAdmin(ModelView, model=User):
                 stmt = stmt.join(Role).order_by(Role.name.asc())
         return super().sort_query(stmt, request)
 
-class RoleAdmin(ModelView, model=Role):
+    # Роль и ФИО пользователя входят в снимок аутентификации
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        await invalidate_user_auth(model.id)
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        await invalidate_user_auth(model.id)
+        # Попытки пользователя удаляет каскад внешнего ключа в БД, мимо слушателей балансов
+        await rebuild_command_balances()
+
+class RoleAdmin(BaseModelView, model=Role):
     column_list = [Role.id, Role.name]
     form_columns = [Role.name]
     column_searchable_list = ["name"]
     column_sortable_list = [Role.id, Role.name]
+
+    # Переименование роли затрагивает снимки всех её пользователей
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        await invalidate_all_auth()
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        await invalidate_all_auth()
     
-class EventAdmin(ModelView, model=Event):
+class EventAdmin(BaseModelView, model=Event):
     column_list = [
         Event.id,
         Event.name,
@@ -72,7 +144,7 @@ class EventAdmin(ModelView, model=Event):
     column_sortable_list = [Event.id, Event.name, Event.start_time, Event.end_time, Event.created_at, Event.updated_at]
 
 
-class CommandAdmin(ModelView, model=Command):
+class CommandAdmin(BaseModelView, model=Command):
     column_list = [Command.id, Command.name, Command.users, Command.language]
     form_columns = [Command.name, Command.users]
     column_searchable_list = ["name"]
@@ -88,7 +160,15 @@ class CommandAdmin(ModelView, model=Command):
                 stmt = stmt.join(Language).order_by(Language.name.asc())
         return super().sort_query(stmt, request)
 
-class BlockAdmin(ModelView, model=Block):
+    # Команда участников входит в их снимки аутентификации; прежний состав
+    # после редактирования неизвестен, поэтому сбрасываем все снимки
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        await invalidate_all_auth()
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        await invalidate_all_auth()
+
+class BlockAdmin(BaseModelView, model=Block):
     column_list = [Block.id, Block.title, Block.language, Block.image_path]
     form_columns = [Block.title, Block.language, Block.image_path]
     column_searchable_list = ["title"]
@@ -236,8 +316,15 @@ class BlockAdmin(ModelView, model=Block):
 
         return await super().on_model_delete(model, request)
 
+    # Контент квеста читается из снимка в памяти воркеров - перестраиваем его
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        await quest_content.invalidate()
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        await quest_content.invalidate()
+
 
-class LanguageAdmin(ModelView, model=Language):
+class LanguageAdmin(BaseModelView, model=Language):
     column_list = [
         Language.id,
         Language.name,
@@ -247,7 +334,7 @@ class LanguageAdmin(ModelView, model=Language):
     column_searchable_list = ["name"]
     column_sortable_list = [Language.id, Language.name]
     
-class RoleUserCommandAdmin(ModelView, model=RoleUserCommand):
+class RoleUserCommandAdmin(BaseModelView, model=RoleUserCommand):
     column_list = [
         RoleUserCommand.id,
         RoleUserCommand.name
@@ -256,7 +343,7 @@ class RoleUserCommandAdmin(ModelView, model=RoleUserCommand):
     column_searchable_list = ["name"]
     column_sortable_list = [RoleUserCommand.id, RoleUserCommand.name]
 
-class QuestionAdmin(ModelView, model=Question):
+class QuestionAdmin(BaseModelView, model=Question):
     column_list = [
         Question.id,
         Question.title,
@@ -277,9 +364,18 @@ class QuestionAdmin(ModelView, model=Question):
         Question.text_answered,
         Question.image_path_answered,
         Question.hint_path,
-        Question.longread
+        Question.longread,
+        Question.answer_tolerance,
     ]
 
+    column_labels = {"answer_tolerance": "Допуск опечаток"}
+    form_args = {
+        "answer_tolerance": {
+            "description": "Сколько опечаток прощать в ответе (0 - только точное совпадение). "
+                           "Не больше одной опечатки на 4 символа ответа.",
+        },
+    }
+
     form_overrides = {
         'image_path': FileField,
         'image_path_answered': FileField,
@@ -478,7 +574,14 @@ class QuestionAdmin(ModelView, model=Question):
 
         return await super().on_model_delete(model, request)
 
-class AnswerAdmin(ModelView, model=Answer):
+    # Контент квеста читается из снимка в памяти воркеров - перестраиваем его
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        await quest_content.invalidate()
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        await quest_content.invalidate()
+
+class AnswerAdmin(BaseModelView, model=Answer):
     column_list = [
         Answer.id,
         Answer.answer_text,
@@ -515,7 +618,14 @@ class AnswerAdmin(ModelView, model=Answer):
                 stmt = stmt.join(Question).order_by(Question.title.asc())
         return super().sort_query(stmt, request)
 
-class AttemptTypeAdmin(ModelView, model=AttemptType):
+    # Контент квеста читается из снимка в памяти воркеров - перестраиваем его
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        await quest_content.invalidate()
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        await quest_content.invalidate()
+
+class AttemptTypeAdmin(BaseModelView, model=AttemptType):
     column_list = [
         AttemptType.id,
         AttemptType.name,
@@ -532,7 +642,16 @@ class AttemptTypeAdmin(ModelView, model=AttemptType):
     column_searchable_list = ["name"]
     column_sortable_list = [AttemptType.id, AttemptType.name, AttemptType.score, AttemptType.money, AttemptType.is_active]
 
-class AttemptAdmin(ModelView, model=Attempt):
+    # Балансы команд накапливают score/money типа на момент попытки: после правки
+    # или удаления типа пересчитываем command_balances из attempts
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        if not is_created:
+            await rebuild_command_balances()
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        await rebuild_command_balances()
+
+class AttemptAdmin(BaseModelView, model=Attempt):
     column_list = [
         Attempt.id,
         Attempt.command,
@@ -616,7 +735,7 @@ class AttemptAdmin(ModelView, model=Attempt):
                 stmt = stmt.join(AttemptType, Attempt.attempt_type_id == AttemptType.id).order_by(AttemptType.name.asc())
         return super().sort_query(stmt, request)
 
-class QuestionInsiderAdmin(ModelView, model=QuestionInsider):
+class QuestionInsiderAdmin(BaseModelView, model=QuestionInsider):
     column_list = [
         QuestionInsider.id,
         QuestionInsider.question,
@@ -649,7 +768,7 @@ class QuestionInsiderAdmin(ModelView, model=QuestionInsider):
                 stmt = stmt.join(User, QuestionInsider.user_id == User.id).order_by(User.full_name.asc())
         return super().sort_query(stmt, request)
 
-class SessionAdmin(ModelView, model=Session):
+class SessionAdmin(BaseModelView, model=Session):
     column_list = [
         Session.id,
         Session.user_id,
@@ -667,7 +786,13 @@ class SessionAdmin(ModelView, model=Session):
     column_searchable_list = ["token"]
     column_sortable_list = [Session.id, Session.user_id, Session.created_at, Session.expires_at, Session.is_active]
 
-class CommandsUserAdmin(ModelView, model=CommandsUser):
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        await auth_cache.invalidate_token(model.token)
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        await auth_cache.invalidate_token(model.token)
+
+class CommandsUserAdmin(BaseModelView, model=CommandsUser):
     column_list = [
         CommandsUser.command,
         CommandsUser.user,
@@ -699,8 +824,15 @@ class CommandsUserAdmin(ModelView, model=CommandsUser):
             else:
                 stmt = stmt.join(RoleUserCommand, CommandsUser.role_id == RoleUserCommand.id).order_by(RoleUserCommand.name.asc())
         return super().sort_query(stmt, request)
+
+    # Пользователя могли перенести в другую команду или заменить другим
+    async def after_model_change(self, data: dict, model: Any, is_created: bool, request: Request) -> None:
+        await invalidate_all_auth()
+
+    async def after_model_delete(self, model: Any, request: Request) -> None:
+        await invalidate_user_auth(model.user_id)
     
-class InsiderInfoAdmin(ModelView, model=InsiderInfo):
+class InsiderInfoAdmin(BaseModelView, model=InsiderInfo):
     column_list = [
         InsiderInfo.id,
         InsiderInfo.user,
@@ -725,7 +857,7 @@ class InsiderInfoAdmin(ModelView, model=InsiderInfo):
                 stmt = stmt.join(User, InsiderInfo.user_id == User.id).order_by(User.full_name.asc())
         return super().sort_query(stmt, request)
 
-class ProgramAdmin(ModelView, model=Program):
+class ProgramAdmin(BaseModelView, model=Program):
     column_list = [
         Program.id,
         Program.user,
@@ -15,8 +15,82 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=f"{BASE_DIR}/.env", extra="ignore")
     BASE_URL: str = "https://hserun.ru"
     SESSION_EXPIRE_SECONDS: int = 60 * 60 * 24 * 7  # 1 неделя
+    # Формат токена Redis-сессий: "opaque" - случайный токен, данные сессии в Redis;
+    # "signed" - подписанный токен с данными внутри (app.auth.signed_tokens), в Redis только отзыв;
+    # "signed" требует хранилища redis - иначе приложение не стартует
+    SESSION_TOKEN_FORMAT: str = "opaque"
+    SECRET_KEY: str = ""  # ключ подписи токенов "signed"
+    # Хранилище сессий (app.auth.session_store): "auto" (redis при USE_REDIS, иначе sql),
+    # "redis", "sql" или "memory" - в памяти процесса, только для запуска в один процесс
+    SESSION_STORE: str = "auto"
+    # Повторный вход продлевает действующую сессию вместо создания новой
+    SESSION_REUSE_ON_LOGIN: bool = True
+
+    # Проверка подписи данных входа через Telegram (app.auth.telegram_verifier).
+    # Без BOT_TOKEN вход отклоняется
+    BOT_TOKEN: str = ""
+    TELEGRAM_AUTH_ALLOW_UNSIGNED: bool = False  # только локальная разработка: вход без BOT_TOKEN и подписи
+    TELEGRAM_AUTH_MAX_AGE_SECONDS: int = 60 * 60 * 24  # допустимый возраст auth_date
+    TELEGRAM_AUTH_CACHE_SIZE: int = 10000  # недавно проверенные данные входа
+    MEMORY_SESSION_SHARDS: int = 16
+    MEMORY_SESSION_SWEEP_SECONDS: float = 60.0  # полный проход очистки истёкших сессий
+
+    # Общий пул соединений Redis (app.redis_client)
+    REDIS_MAX_CONNECTIONS: int = 100
+    REDIS_POOL_TIMEOUT: float = 5.0  # ожидание свободного соединения, секунд
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 2.0
+    REDIS_RETRY_ATTEMPTS: int = 3
+    REDIS_RETRY_BACKOFF_BASE: float = 0.05
+    REDIS_RETRY_BACKOFF_CAP: float = 1.0
+    REDIS_HEALTH_CHECK_INTERVAL: float = 15.0
+    REDIS_FAKE: bool = False  # fakeredis в памяти вместо сервера (тесты без Redis)
     DEBUG: bool = False
 
+    # Пул соединений для серверных СУБД (PostgreSQL и т.п.)
+    DB_POOL_SIZE: int = 50
+    DB_MAX_OVERFLOW: int = 300
+    DB_POOL_TIMEOUT: float = 30.0
+
+    # Профиль SQLite: WAL + умеренная синхронизация, пул под одного писателя
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # 256 МБ
+    SQLITE_CACHE_SIZE: int = -64000  # отрицательное значение - размер в КиБ (~64 МБ)
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    SQLITE_POOL_SIZE: int = 8
+    SQLITE_MAX_OVERFLOW: int = 4
+    SQLITE_READ_POOL_SIZE: int = 16
+    SQLITE_READ_MAX_OVERFLOW: int = 16
+
+    # Очередь заданий единственного писателя (app.dao.writer)
+    DB_WRITE_QUEUE_SIZE: int = 1000
+
+    # Подсчёт SQL-запросов на HTTP-запрос (app.dao.query_stats)
+    DB_QUERY_STATS_ENABLED: bool = True
+    DB_QUERY_BUDGET_STRICT: bool = False  # превышение query_budget - ошибка, а не предупреждение
+    DB_N_PLUS_ONE_THRESHOLD: int = 10  # столько одинаковых запросов за запрос - предупреждение о N+1
+
+    # Журнал медленных запросов (app.dao.slow_queries): NDJSON с планом и вызывающим методом
+    DB_SLOW_QUERY_MS: float = 200.0  # 0 - отключить; работает и при DB_QUERY_STATS_ENABLED=False
+    DB_SLOW_QUERY_LOG_PATH: str = f"{BASE_DIR}/data/logs/slow_queries.ndjson"
+    DB_SLOW_QUERY_LOG_ROTATION: str = "10 MB"
+    DB_SLOW_QUERY_LOG_RETENTION: int = 5  # сколько ротированных файлов хранить
+
+    # Кэш аутентификации в памяти воркера (app.auth.auth_cache): токен -> снимок пользователя.
+    # Инвалидация рассылается через Redis pub/sub; без Redis устаревание ограничено TTL
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: float = 30.0
+    AUTH_CACHE_CHANNEL: str = "auth_cache:invalidate"
+
+    # Снимок контента квеста в памяти воркера (app.quest.content); правки из CMS
+    # рассылаются остальным воркерам через Redis pub/sub
+    QUEST_CONTENT_CHANNEL: str = "quest_content:invalidate"
+    # Нечёткая проверка ответов для загадок с допуском опечаток (Question.answer_tolerance)
+    ANSWER_FUZZY_ENABLED: bool = True
+
 
 class EventConfig:
     def __init__(
@@ -0,0 +1,36 @@
+"""
+Асинхронные действия после коммита сессии: сброс кэшей, снимков в Redis и т.п.
+
+Событие SQLAlchemy after_commit синхронное, поэтому действия копятся в
+session.info и выполняются тем, кто коммитит: db_writer вызывает
+run_after_commit сразу после успешного коммита.
+Если транзакция откатилась, действия отбрасываются вместе с сессией.
+"""
+from typing import Awaitable, Callable, Hashable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.logger import logger
+
+_ACTIONS_KEY = "after_commit_actions"
+
+
+def after_commit(session: AsyncSession, key: Hashable, action: Callable[[], Awaitable[None]]) -> None:
+    """Откладывает action до коммита; повторная постановка с тем же key не дублирует действие."""
+    session.info.setdefault(_ACTIONS_KEY, {})[key] = action
+
+
+async def run_after_commit(session: AsyncSession) -> None:
+    """Выполняет отложенные действия. Ошибки логируются: коммит уже состоялся."""
+    actions = session.info.pop(_ACTIONS_KEY, None)
+    if not actions:
+        return
+    for key, action in actions.items():
+        try:
+            await action()
+        except Exception as e:
+            logger.error(f"Ошибка действия после коммита {key}: {e}")
+
+
+def discard_after_commit(session: AsyncSession) -> None:
+    session.info.pop(_ACTIONS_KEY, None)
@@ -1,13 +1,80 @@
-from typing import List, TypeVar, Generic, Type, Optional
+import base64
+import json
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, List, TypeVar, Generic, Type, Optional, Sequence, Union
 from pydantic import BaseModel
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
-from sqlalchemy import update as sqlalchemy_update, delete as sqlalchemy_delete, func
+from sqlalchemy.sql import Select, operators
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlalchemy import and_, inspect, insert, or_, tuple_, update as sqlalchemy_update, delete as sqlalchemy_delete, func
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 from .database import Base
 
 T = TypeVar("T", bound=Base)
+Values = Union[BaseModel, Dict[str, Any]]
+
+# Размер страницы, когда клиент передал курсор, но не limit
+DEFAULT_PAGE_SIZE = 50
+
+
+def dialect_insert(dialect_name: str):
+    """Возвращает insert() диалекта с поддержкой ON CONFLICT (SQLite или PostgreSQL)."""
+    if dialect_name == "postgresql":
+        return postgresql.insert
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"Upsert не поддерживается для диалекта {dialect_name}")
+
+
+def _as_dict(values: Values) -> Dict[str, Any]:
+    return values.model_dump(exclude_unset=True) if isinstance(values, BaseModel) else dict(values)
+
+
+class InvalidCursorError(ValueError):
+    """Курсор пагинации повреждён или получен для другого порядка сортировки."""
+
+
+@dataclass
+class Page(Generic[T]):
+    """Страница keyset-пагинации: элементы и курсор следующей страницы (None - страниц больше нет)."""
+    items: List[Any]
+    next_cursor: Optional[str] = None
+
+
+def requested_page_size(limit: Optional[int], after: Optional[str]) -> Optional[int]:
+    """Размер страницы по параметрам запроса: без limit и курсора - вся выборка (None)."""
+    if limit is not None:
+        return limit
+    return DEFAULT_PAGE_SIZE if after else None
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Упаковывает значения ключей сортировки последней строки в непрозрачный курсор."""
+    payload = json.dumps([float(v) if isinstance(v, Decimal) else v for v in values],
+                         ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursorError("Некорректный курсор пагинации") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError("Некорректный курсор пагинации")
+    return values
+
+
+def _split_order(clause) -> tuple:
+    """Разбирает Column.desc()/asc() на выражение и направление."""
+    if isinstance(clause, UnaryExpression) and clause.modifier in (operators.desc_op, operators.asc_op):
+        return clause.element, clause.modifier is operators.desc_op
+    return clause, False
 
 
 class BaseDAO(Generic[T]):
@@ -18,14 +85,14 @@ class BaseDAO(Generic[T]):
         if self.model is None:
             raise ValueError("Модель должна быть указана в дочернем классе")
 
-    async def find_one_or_none_by_id(self, data_id: int):
+    async def find_one_or_none_by_id(self, data_id: int, options: Sequence[Any] = ()):
         try:
             # Проверяем, что ID целое число
             if not isinstance(data_id, int) or data_id < 0:
                 logger.error(f"Недопустимый ID: {data_id}")
                 raise ValueError("Недопустимый ID")
                 
-            query = select(self.model).filter_by(id=data_id)
+            query = select(self.model).filter_by(id=data_id).options(*options)
             result = await self._session.execute(query)
             record = result.unique().scalar_one_or_none()
             log_message = f"Запись {self.model.__name__} с ID {data_id} {'найдена' if record else 'не найдена'}."
@@ -36,14 +103,14 @@ class BaseDAO(Generic[T]):
             logger.exception(f"DB error finding {self.model.__name__} by ID {data_id}")
             raise
 
-    async def find_one_or_none(self, filters: BaseModel) -> Optional[T]:
+    async def find_one_or_none(self, filters: BaseModel, options: Sequence[Any] = ()) -> Optional[T]:
         try:
             filter_dict = filters.model_dump(exclude_unset=True)
             # Проверяем входные данные
             # filter_dict = await self._validate_input(filter_dict)
             
             logger.info(f"Поиск одной записи {self.model.__name__} по фильтрам: {filter_dict}")
-            query = select(self.model).filter_by(**filter_dict)
+            query = select(self.model).filter_by(**filter_dict).options(*options)
             result = await self._session.execute(query)
             record = result.unique().scalar_one_or_none()
             log_message = f"Запись {'найдена' if record else 'не найдена'} по фильтрам: {filter_dict}"
@@ -54,14 +121,14 @@ class BaseDAO(Generic[T]):
             logger.exception(f"DB error finding {self.model.__name__} with filters {list(filter_dict.keys())}")
             raise
 
-    async def find_all(self, filters: BaseModel | None = None):
+    async def find_all(self, filters: BaseModel | None = None, options: Sequence[Any] = ()):
         try:
             filter_dict = filters.model_dump(exclude_unset=True) if filters else {}
             # Проверяем входные данные
             # filter_dict = await self._validate_input(filter_dict)
             
             logger.info(f"Поиск всех записей {self.model.__name__} по фильтрам: {filter_dict}")
-            query = select(self.model).filter_by(**filter_dict)
+            query = select(self.model).filter_by(**filter_dict).options(*options)
             result = await self._session.execute(query)
             records = result.scalars().all()
             logger.info(f"Найдено {len(records)} записей.")
@@ -92,14 +159,16 @@ class BaseDAO(Generic[T]):
             await self._session.rollback() # Ensure rollback on error
             raise
 
-    async def add_many(self, instances: List[BaseModel]):
-        values_list = [item.model_dump(exclude_unset=True) for item in instances]
+    async def add_many(self, instances: List[Values]) -> List[T]:
+        """Вставляет записи одним INSERT ... RETURNING и возвращает созданные объекты."""
+        values_list = [_as_dict(item) for item in instances]
         logger.info(f"Добавление нескольких записей {self.model.__name__}. Количество: {len(values_list)}")
+        if not values_list:
+            return []
         try:
-            new_instances = [self.model(**values) for values in values_list]
-            self._session.add_all(new_instances)
+            result = await self._session.scalars(insert(self.model).returning(self.model), values_list)
+            new_instances = list(result.all())
             logger.info(f"Успешно добавлено {len(new_instances)} записей.")
-            await self._session.flush()
             return new_instances
         except SQLAlchemyError as e:
             # Include model name in error log
@@ -163,29 +232,148 @@ class BaseDAO(Generic[T]):
             logger.exception(f"DB error counting {self.model.__name__} filtered by {list(filter_dict.keys())}")
             raise
 
-    async def bulk_update(self, records: List[BaseModel]):
+    async def find_page(
+        self,
+        filters: BaseModel | None = None,
+        order_by: Optional[Sequence[Any]] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = DEFAULT_PAGE_SIZE,
+        statement: Optional[Select] = None,
+        options: Sequence[Any] = (),
+    ) -> Page:
+        """
+        Keyset-пагинация: WHERE (ключи) > (ключи последней строки) вместо OFFSET.
+
+        order_by - выражения сортировки (Column, Column.desc(), вычисляемые выражения);
+        первичный ключ модели добавляется последним ключом, чтобы порядок был однозначным.
+        Ключи должны быть NOT NULL. after - курсор из Page.next_cursor предыдущей страницы.
+        statement - исходный select (по умолчанию select(model)); если он выбирает одну
+        сущность, в items попадают объекты, иначе строки результата.
+        options - профиль загрузки связей (см. app/auth/loading.py).
+        limit=None - без ограничения: вся выборка одной страницей, next_cursor = None.
+        """
+        filter_dict = filters.model_dump(exclude_unset=True) if filters else {}
+        keys = [_split_order(clause) for clause in (order_by or [])]
+        for pk in inspect(self.model).primary_key:
+            if not any(expr is pk or (hasattr(expr, "compare") and expr.compare(pk)) for expr, _ in keys):
+                keys.append((pk, False))
+
+        query = statement if statement is not None else select(self.model)
+        descriptions = query.column_descriptions
+        single_entity = len(descriptions) == 1 and descriptions[0]["expr"] is descriptions[0]["entity"]
+        if filter_dict:
+            query = query.filter_by(**filter_dict)
+        query = query.options(*options).add_columns(*[expr.label(f"_page_key_{i}") for i, (expr, _) in enumerate(keys)])
+
+        if after:
+            values = decode_cursor(after, len(keys))
+            if len({descending for _, descending in keys}) == 1:
+                # Одно направление - сравнение кортежей, которое планировщик берёт по индексу
+                left, right = tuple_(*[expr for expr, _ in keys]), tuple_(*values)
+                query = query.where(left < right if keys[0][1] else left > right)
+            else:
+                conditions = []
+                for i, (expr, descending) in enumerate(keys):
+                    equal_prefix = [keys[j][0] == values[j] for j in range(i)]
+                    conditions.append(and_(*equal_prefix, expr < values[i] if descending else expr > values[i]))
+                query = query.where(or_(*conditions))
+
+        query = query.order_by(*[expr.desc() if descending else expr.asc() for expr, descending in keys])
+        if limit is not None:
+            query = query.limit(limit + 1)
+        try:
+            rows = (await self._session.execute(query)).all()
+        except SQLAlchemyError as e:
+            logger.exception(f"DB error paging {self.model.__name__}")
+            raise
+
+        has_more = limit is not None and len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(list(rows[-1][-len(keys):])) if has_more and rows else None
+        items = [row[0] for row in rows] if single_entity else rows
+        logger.info(f"Страница {self.model.__name__}: {len(items)} записей, есть следующая: {has_more}")
+        return Page(items=items, next_cursor=next_cursor)
+
+    async def bulk_update(self, records: List[Values]) -> int:
+        """
+        Массовое обновление по первичному ключу одним executemany.
+        Записи без первичного ключа пропускаются. Возвращает число переданных на обновление записей.
+        Уже загруженные в сессию объекты не обновляются - перечитайте их при необходимости.
+        """
         logger.info(f"Массовое обновление записей {self.model.__name__}")
+        pk_names = [column.key for column in inspect(self.model).primary_key]
+        params = [
+            record_dict for record_dict in map(_as_dict, records)
+            if all(record_dict.get(name) is not None for name in pk_names)
+        ]
+        if not params:
+            return 0
         try:
-            updated_count = 0
-            for record in records:
-                record_dict = record.model_dump(exclude_unset=True)
-                if 'id' not in record_dict:
-                    continue
-
-                update_data = {k: v for k, v in record_dict.items() if k != 'id'}
-                stmt = (
-                    sqlalchemy_update(self.model)
-                    .filter_by(id=record_dict['id'])
-                    .values(**update_data)
-                )
-                result = await self._session.execute(stmt)
-                updated_count += result.rowcount
-
-            logger.info(f"Обновлено {updated_count} записей")
+            # ORM bulk UPDATE by primary key: записи группируются по набору колонок
+            await self._session.execute(sqlalchemy_update(self.model), params)
+            logger.info(f"Обновлено {len(params)} записей")
             await self._session.flush()
-            return updated_count
+            return len(params)
         except SQLAlchemyError as e:
             # Include model name in error log
             logger.exception(f"DB error during bulk update of {self.model.__name__}")
             await self._session.rollback()
             raise
+
+    def _upsert_statement(self, index_elements: Sequence[str], update_fields: Optional[Sequence[str]]):
+        stmt = dialect_insert(self._session.bind.dialect.name)(self.model)
+        set_ = {name: stmt.excluded[name] for name in (update_fields or [])}
+        if not set_:
+            # DO UPDATE без изменений, чтобы RETURNING вернул существующую строку
+            set_ = {index_elements[0]: stmt.excluded[index_elements[0]]}
+        if "updated_at" in self.model.__table__.c:
+            # onupdate не применяется к ON CONFLICT DO UPDATE
+            set_["updated_at"] = func.now()
+        return stmt.on_conflict_do_update(index_elements=list(index_elements), set_=set_)
+
+    async def upsert(
+        self, values: Values, index_elements: Sequence[str], update_fields: Optional[Sequence[str]] = None
+    ) -> T:
+        """
+        INSERT ... ON CONFLICT (index_elements) DO UPDATE одним запросом.
+        update_fields - колонки, перезаписываемые при конфликте (по умолчанию все переданные,
+        кроме index_elements). Возвращает актуальный объект.
+        """
+        values_dict = _as_dict(values)
+        if update_fields is None:
+            update_fields = [name for name in values_dict if name not in index_elements]
+        logger.info(f"Upsert {self.model.__name__} по {list(index_elements)} с ключами: {list(values_dict.keys())}")
+        try:
+            stmt = (
+                self._upsert_statement(index_elements, update_fields)
+                .values(**values_dict)
+                .returning(self.model)
+                .execution_options(populate_existing=True)
+            )
+            result = await self._session.execute(stmt)
+            return result.scalar_one()
+        except SQLAlchemyError as e:
+            logger.exception(f"DB error upserting {self.model.__name__} by {list(index_elements)}")
+            await self._session.rollback()
+            raise
+
+    async def upsert_many(
+        self, records: List[Values], index_elements: Sequence[str], update_fields: Optional[Sequence[str]] = None
+    ) -> int:
+        """
+        Пакетный upsert одним executemany. Возвращает число переданных записей.
+        Как и bulk_update, не обновляет уже загруженные в сессию объекты.
+        """
+        values_list = [_as_dict(record) for record in records]
+        if not values_list:
+            return 0
+        if update_fields is None:
+            update_fields = [name for name in values_list[0] if name not in index_elements]
+        logger.info(f"Пакетный upsert {self.model.__name__}. Количество: {len(values_list)}")
+        try:
+            await self._session.execute(self._upsert_statement(index_elements, update_fields), values_list)
+            return len(values_list)
+        except SQLAlchemyError as e:
+            logger.exception(f"DB error during bulk upsert of {self.model.__name__}")
+            await self._session.rollback()
+            raise
@@ -2,18 +2,108 @@ import uuid
 from datetime import datetime
 from decimal import Decimal
 from typing import Annotated
-from sqlalchemy import func, TIMESTAMP, Integer, inspect
+from sqlalchemy import func, TIMESTAMP, Integer, inspect, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase, declared_attr
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession
-from ..config import database_url
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession, AsyncEngine
+from ..config import database_url, settings, Settings
+from .query_stats import instrument_engine
 
 
-engine = create_async_engine(
-    url=database_url, 
-    pool_size=50,         # Базовый размер пула
-    max_overflow=300      # Максимальное количество дополнительных соединений (50 + 150 = 200)
-)
+def is_sqlite_url(url: str) -> bool:
+    """Проверяет, указывает ли URL на SQLite."""
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def sqlite_pragmas(config: Settings = settings) -> dict:
+    """Возвращает PRAGMA, выполняемые на каждом новом соединении SQLite."""
+    return {
+        "journal_mode": config.SQLITE_JOURNAL_MODE,
+        "synchronous": config.SQLITE_SYNCHRONOUS,
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": config.SQLITE_MMAP_SIZE,
+        "cache_size": config.SQLITE_CACHE_SIZE,
+        "temp_store": config.SQLITE_TEMP_STORE,
+    }
+
+
+def create_engine_for_url(
+    url: str,
+    config: Settings = settings,
+    read_only: bool = False,
+    pool_size: int | None = None,
+    max_overflow: int | None = None,
+) -> AsyncEngine:
+    """
+    Создаёт движок с учётом диалекта.
+
+    Для SQLite включается профиль из настроек (WAL, busy_timeout, mmap и т.д.)
+    и небольшой пул: параллельно пишет только одно соединение, поэтому сотни
+    соединений лишь увеличивают конкуренцию за блокировку. Для остальных СУБД
+    сохраняются прежние размеры пула.
+
+    Args:
+        read_only: для SQLite включает PRAGMA query_only - запись через такой движок невозможна
+        pool_size, max_overflow: переопределяют размеры пула из настроек
+    """
+    if not is_sqlite_url(url):
+        return create_async_engine(
+            url=url,
+            pool_size=pool_size if pool_size is not None else config.DB_POOL_SIZE,
+            max_overflow=max_overflow if max_overflow is not None else config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+        )
+
+    new_engine = create_async_engine(
+        url=url,
+        pool_size=pool_size if pool_size is not None else config.SQLITE_POOL_SIZE,
+        max_overflow=max_overflow if max_overflow is not None else config.SQLITE_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        # Таймаут драйвера в секундах, согласован с busy_timeout
+        connect_args={"timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000},
+    )
+    pragmas = sqlite_pragmas(config)
+    if read_only:
+        pragmas["query_only"] = "ON"
+
+    @event.listens_for(new_engine.sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return new_engine
+
+
+engine = create_engine_for_url(database_url)
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+if is_sqlite_url(database_url):
+    # Чтение идёт через отдельный пул соединений в режиме query_only: в WAL читатели
+    # не блокируют писателя и не могут случайно открыть пишущую транзакцию.
+    read_engine = create_engine_for_url(
+        database_url,
+        read_only=True,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        max_overflow=settings.SQLITE_READ_MAX_OVERFLOW,
+    )
+    # Единственное соединение писателя (см. app.dao.writer)
+    write_engine = create_engine_for_url(database_url, pool_size=1, max_overflow=0)
+else:
+    read_engine = engine
+    write_engine = engine
+
+# Обработчики событий движка и считают запросы, и пишут журнал медленных запросов:
+# подключаем их, если включено хотя бы одно из двух
+if settings.DB_QUERY_STATS_ENABLED or settings.DB_SLOW_QUERY_MS > 0:
+    for _engine in (engine, read_engine, write_engine):
+        instrument_engine(_engine)
+
+async_session_maker_read = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+async_session_maker_write = async_sessionmaker(write_engine, class_=AsyncSession, expire_on_commit=False)
 str_uniq = Annotated[str, mapped_column(unique=True, nullable=False)]
 int_uniq = Annotated[int, mapped_column(unique=True, nullable=False)]
 
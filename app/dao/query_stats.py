@@ -0,0 +1,176 @@
+import functools
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from prometheus_client import Histogram
+from sqlalchemy import event
+
+from app.config import settings
+from app.dao.slow_queries import record_slow_query
+from app.logger import logger
+
+DB_QUERIES_PER_REQUEST = Histogram(
+    "http_request_db_queries",
+    "Количество SQL-запросов на один HTTP-запрос",
+    ["method", "handler"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "http_request_db_time_seconds",
+    "Суммарное время SQL-запросов на один HTTP-запрос",
+    ["method", "handler"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+_QUERY_START_KEY = "query_stats_start"
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Обработчик выполнил больше SQL-запросов, чем объявлено в query_budget."""
+
+
+@dataclass
+class QueryStats:
+    """Счётчик SQL-запросов и времени БД в пределах одного HTTP-запроса."""
+    count: int = 0
+    total_time: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+    # Запросы самого обработчика с query_budget, без зависимостей (аутентификация, сессия)
+    endpoint_count: Optional[int] = None
+    # Бюджет, выбранный по аргументам вызова (см. варианты query_budget)
+    endpoint_budget: Optional[int] = None
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Запросы, выполненные не менее threshold раз (признак N+1)."""
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+_instrumented_engines = weakref.WeakSet()
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Возвращает счётчик текущего запроса или None вне track_queries()."""
+    return _current_stats.get()
+
+
+@contextmanager
+def track_queries(stats: Optional[QueryStats] = None) -> Iterator[QueryStats]:
+    """Считает SQL-запросы, выполненные внутри блока (в том числе в дочерних задачах)."""
+    stats = stats if stats is not None else QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info[_QUERY_START_KEY].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    if settings.DB_SLOW_QUERY_MS and duration * 1000 >= settings.DB_SLOW_QUERY_MS:
+        record_slow_query(conn, statement, parameters, executemany, duration)
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_QUERY_START_KEY):
+        connection.info[_QUERY_START_KEY].pop()
+
+
+def instrument_engine(engine) -> None:
+    """
+    Подключает к движку (sync или async) подсчёт запросов и журнал медленных запросов.
+    Повторный вызов ничего не делает.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine in _instrumented_engines:
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+    _instrumented_engines.add(sync_engine)
+
+
+def query_budget(max_queries: int, **variants: int) -> Callable:
+    """
+    Объявляет максимальное число SQL-запросов для обработчика.
+    Ставится под декоратором роутера:
+
+        @router.get("/")
+        @query_budget(2, include_riddles=3)
+        async def handler(..., include_riddles: bool = False): ...
+
+    variants - отдельные бюджеты для веток обработчика: если аргумент с таким именем
+    истинен, действует его бюджет (при нескольких - наибольший), иначе max_queries.
+
+    Считаются только запросы самого обработчика (включая задания db_writer, которые
+    он поставил): запросы зависимостей - аутентификации, загрузки сессии - зависят от
+    кэшей и хранилища сессий и в бюджет обработчика не входят.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            stats = _current_stats.get()
+            before = stats.count if stats is not None else 0
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                if stats is not None:
+                    stats.endpoint_count = stats.count - before
+                    stats.endpoint_budget = max(
+                        [budget for name, budget in variants.items() if kwargs.get(name)],
+                        default=max_queries,
+                    )
+
+        wrapper.__query_budget__ = max_queries
+        return wrapper
+    return decorator
+
+
+def get_query_budget(endpoint: Optional[Callable]) -> Optional[int]:
+    return getattr(endpoint, "__query_budget__", None)
+
+
+def observe_request(method: str, handler: str, stats: QueryStats) -> None:
+    """Записывает метрики Prometheus по запросу."""
+    DB_QUERIES_PER_REQUEST.labels(method=method, handler=handler).observe(stats.count)
+    DB_TIME_PER_REQUEST.labels(method=method, handler=handler).observe(stats.total_time)
+
+
+def check_query_budget(label: str, stats: QueryStats, budget: Optional[int]) -> None:
+    """
+    Проверяет бюджет запросов и ищет повторяющиеся запросы (N+1).
+    В строгом режиме (DB_QUERY_BUDGET_STRICT, включается в тестах)
+    превышение бюджета - исключение, иначе - предупреждение в лог.
+    """
+    repeated = stats.repeated(settings.DB_N_PLUS_ONE_THRESHOLD)
+    for statement, n in repeated:
+        logger.warning(f"Возможный N+1 в {label}: запрос выполнен {n} раз: {statement[:200]}")
+
+    count = stats.endpoint_count if stats.endpoint_count is not None else stats.count
+    if stats.endpoint_budget is not None:
+        budget = stats.endpoint_budget
+    if budget is None or count <= budget:
+        return
+    message = f"{label}: выполнено {count} SQL-запросов при бюджете {budget}"
+    if settings.DB_QUERY_BUDGET_STRICT:
+        top = "\n".join(f"  {n} x {statement[:200]}" for statement, n in stats.statements.most_common(5))
+        raise QueryBudgetExceeded(f"{message}\n{top}")
+    logger.warning(message)
@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, List, Optional
+
+import greenlet
+
+from app.config import settings
+from app.logger import logger, request_id_context
+
+# Префикс EXPLAIN по диалекту; для остальных СУБД план не снимается
+EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+}
+EXPLAINABLE_STATEMENTS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+_sink_id: Optional[int] = None
+
+
+def _ensure_sink() -> None:
+    """Подключает файловый sink loguru при первом медленном запросе."""
+    global _sink_id
+    if _sink_id is not None:
+        return
+    os.makedirs(os.path.dirname(settings.DB_SLOW_QUERY_LOG_PATH), exist_ok=True)
+    _sink_id = logger.add(
+        settings.DB_SLOW_QUERY_LOG_PATH,
+        level="WARNING",
+        format="{extra[slow_query]}",
+        filter=lambda record: "slow_query" in record["extra"],
+        rotation=settings.DB_SLOW_QUERY_LOG_ROTATION,
+        retention=settings.DB_SLOW_QUERY_LOG_RETENTION,
+        encoding="utf-8",
+        enqueue=True,
+    )
+
+
+def redact_value(value: Any) -> Any:
+    """Оставляет числа и даты, строки и бинарные данные заменяет описанием."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return f"<str len={len(value)}>"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<bytes len={len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters: Any) -> Any:
+    if isinstance(parameters, dict):
+        return {key: redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(item) if isinstance(item, (dict, list, tuple)) else redact_value(item)
+                for item in parameters]
+    return redact_value(parameters)
+
+
+def _frame_label(frame) -> Optional[str]:
+    module = frame.f_globals.get("__name__", "")
+    if not module.startswith("app.") or module in (__name__, "app.dao.query_stats"):
+        return None
+    owner = frame.f_locals.get("self")
+    if owner is not None:
+        return f"{type(owner).__name__}.{frame.f_code.co_name}"
+    return f"{module}.{frame.f_code.co_name}"
+
+
+def _caller_frames():
+    frame = sys._getframe(2)
+    while frame is not None:
+        yield frame
+        frame = frame.f_back
+    # Под asyncio синхронный код SQLAlchemy работает в дочернем greenlet, а корутины
+    # приложения остаются в стеке родительского greenlet, который сейчас приостановлен
+    parent = greenlet.getcurrent().parent
+    frame = parent.gr_frame if parent is not None else None
+    while frame is not None:
+        yield frame
+        frame = frame.f_back
+
+
+def find_caller() -> str:
+    """Возвращает самый глубокий метод приложения (обычно метод DAO), выполнивший запрос."""
+    for frame in _caller_frames():
+        label = _frame_label(frame)
+        if label is not None:
+            return label
+    return "-"
+
+
+def capture_plan(conn, statement: str, parameters: Any, executemany: bool) -> List[str]:
+    """Снимает план запроса на том же соединении, минуя события SQLAlchemy."""
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None or executemany or not statement.lstrip().upper().startswith(EXPLAINABLE_STATEMENTS):
+        return []
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [str(row[-1]) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except Exception as e:
+        return [f"<план не получен: {e}>"]
+
+
+def record_slow_query(conn, statement: str, parameters: Any, executemany: bool, duration: float) -> None:
+    """Пишет медленный запрос с параметрами, вызывающим методом и планом в NDJSON-журнал."""
+    try:
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 2),
+            "caller": find_caller(),
+            "request_id": request_id_context.get(),
+            "statement": statement,
+            "params": redact_parameters(parameters),
+            "plan": capture_plan(conn, statement, parameters, executemany),
+        }
+        _ensure_sink()
+        logger.bind(slow_query=json.dumps(entry, ensure_ascii=False)).warning(
+            f"Медленный SQL-запрос {entry['duration_ms']} мс в {entry['caller']}"
+        )
+    except Exception as e:
+        logger.error(f"Не удалось записать медленный запрос: {e}")
+
+
+def read_slow_queries(limit: int = 100, path: Optional[str] = None) -> List[dict]:
+    """Возвращает последние записи журнала медленных запросов, новые первыми."""
+    path = path or settings.DB_SLOW_QUERY_LOG_PATH
+    if not os.path.exists(path):
+        return []
+    block_size = 64 * 1024
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        # Читаем файл с конца блоками, пока не наберём нужное число строк
+        while position > 0 and data.count(b"\n") <= limit:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    entries = []
+    for line in reversed(data.splitlines()):
+        if len(entries) >= limit:
+            break
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
@@ -0,0 +1,136 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import database_url, settings
+from app.dao.after_commit import discard_after_commit, run_after_commit
+from app.dao.database import async_session_maker_write, is_sqlite_url
+from app.dao.query_stats import current_query_stats, track_queries
+from app.logger import logger
+
+T = TypeVar("T")
+WriteJob = Callable[[AsyncSession], Awaitable[T]]
+
+# Сессия задания, которое сейчас выполняет писатель
+_job_session: ContextVar[Optional[AsyncSession]] = ContextVar("db_writer_job_session", default=None)
+
+
+class DatabaseWriter:
+    """
+    Последовательный писатель в БД.
+
+    Задания записи (попытки, начисления баллов, изменения команд) ставятся
+    в asyncio-очередь и выполняются по одному на единственном соединении:
+    каждое задание получает свою сессию, после успешного выполнения она
+    коммитится, при ошибке - откатывается, а исключение возвращается вызывающему.
+    Так SQLite не видит конкурирующих писателей внутри процесса и не отвечает
+    "database is locked".
+
+    Если воркер не запущен (скрипты, тесты) или БД не SQLite, задание
+    выполняется сразу в вызывающей корутине. Задание, поставленное изнутри
+    другого задания, выполняется в его сессии и транзакции: ожидание очереди
+    из самого воркера привело бы к взаимной блокировке.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker, max_queue_size: int = 1000, serialized: bool = True):
+        self._session_maker = session_maker
+        self._max_queue_size = max_queue_size
+        self.serialized = serialized
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self) -> None:
+        """Запускает воркер очереди записи."""
+        if not self.serialized or self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self._max_queue_size)
+        self._worker = asyncio.create_task(self._run(), name="db-writer")
+        logger.info("Запущен последовательный писатель БД")
+
+    async def stop(self) -> None:
+        """Дожидается выполнения поставленных заданий и останавливает воркер."""
+        if not self.is_running:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        self._queue = None
+        logger.info("Последовательный писатель БД остановлен")
+
+    async def submit(self, job: WriteJob[T]) -> T:
+        """Выполняет задание записи и возвращает его результат."""
+        session = _job_session.get()
+        if session is not None:
+            return await job(session)
+        if not self.is_running:
+            return await self._execute(job)
+        future = asyncio.get_running_loop().create_future()
+        # Запросы задания засчитываются HTTP-запросу, который его поставил
+        await self._queue.put((job, future, current_query_stats()))
+        return await future
+
+    async def add(self, *instances: Any) -> None:
+        """Добавляет ORM-объекты и коммитит их через писателя."""
+        async def job(session: AsyncSession) -> None:
+            session.add_all(instances)
+
+        await self.submit(job)
+
+    async def _execute(self, job: WriteJob[T]) -> T:
+        async with self._session_maker() as session:
+            token = _job_session.set(session)
+            try:
+                result = await job(session)
+                await session.commit()
+            except BaseException:
+                discard_after_commit(session)
+                await session.rollback()
+                raise
+            finally:
+                _job_session.reset(token)
+        await run_after_commit(session)
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            job, future, stats = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                try:
+                    with track_queries(stats):
+                        result = await self._execute(job)
+                except BaseException as e:
+                    # Ошибка задания (в том числе CancelledError изнутри него) уходит
+                    # вызывающему, воркер продолжает работу. Останавливается он только
+                    # при отмене собственной задачи.
+                    if not future.cancelled():
+                        future.set_exception(e)
+                    if asyncio.current_task().cancelling():
+                        raise
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+
+db_writer = DatabaseWriter(
+    async_session_maker_write,
+    max_queue_size=settings.DB_WRITE_QUEUE_SIZE,
+    serialized=is_sqlite_url(database_url),
+)
@@ -3,7 +3,9 @@ from typing import List, Optional
 from fastapi import Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth.auth_cache import AuthSnapshot, auth_cache
 from app.auth.dao import SessionDAO, UsersDAO
+from app.auth.loading import USER_AUTH_PROFILE
 from app.auth.models import User
 from app.dependencies.dao_dep import get_session_without_commit
 from app.exceptions import ForbiddenException
@@ -38,15 +40,25 @@ def get_current_event_name(request: Request) -> str:
     return event_name
 
 
-async def get_current_user(
+async def get_auth_snapshot(
     session_token: Optional[str] = Depends(get_access_token),
     session: AsyncSession = Depends(get_session_without_commit),
-) -> Optional[User]:
-    """Получаем текущего пользователя по токену сессии."""
+) -> Optional[AuthSnapshot]:
+    """
+    Снимок текущего пользователя (пользователь, роль, команда) по токену сессии.
+
+    Порядок: кэш аутентификации воркера -> снимок в хеше Redis-сессии (один
+    HGETALL) -> БД, после чего снимок записывается в сессию и в кэш.
+    """
     if not session_token:
         logger.warning("Не предоставлен токен сессии")
         return None
 
+    # Попадание в кэш аутентификации: ни Redis, ни БД не нужны
+    snapshot = auth_cache.get(session_token)
+    if snapshot is not None:
+        return snapshot
+
     session_dao = SessionDAO(session)
     users_dao = UsersDAO(session)
 
@@ -68,21 +80,46 @@ async def get_current_user(
 
         logger.info(f"Найдена сессия для пользователя с ID: {user_session.user_id}")
 
-        # Получаем пользователя
-        user = await users_dao.find_one_or_none_by_id(user_session.user_id)
-        if not user:
-            logger.error(
-                f"Пользователь с ID {user_session.user_id} не найден в базе данных"
-            )
-            return None
-
-        logger.info(f"Успешно получен пользователь: {user.id} {user.full_name}")
-        return user
+        raw_snapshot = getattr(user_session, "snapshot", None)
+        if raw_snapshot:
+            try:
+                snapshot = AuthSnapshot.from_json(raw_snapshot)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Повреждённый снимок в сессии пользователя {user_session.user_id}: {e}")
+
+        if snapshot is None:
+            # Версии читаем до БД: если пользователь изменится, пока мы читаем, снимок не запишется
+            versions = await session_dao.get_snapshot_versions(user_session.user_id)
+            user = await users_dao.find_one_or_none_by_id(user_session.user_id, options=USER_AUTH_PROFILE)
+            if not user:
+                logger.error(
+                    f"Пользователь с ID {user_session.user_id} не найден в базе данных"
+                )
+                return None
+            # Только колонки команды: участники в снимок не входят
+            command = await users_dao.find_user_command_in_event(user.id, options=[])
+            snapshot = AuthSnapshot.from_models(user, command)
+            if versions is not None:
+                await session_dao.save_snapshot(session_token, user.id, snapshot.to_json(), versions)
+
+        auth_cache.put(session_token, snapshot, user_session.expires_at)
+        return snapshot
     except Exception as e:
         logger.error(f"Ошибка при получении пользователя: {str(e)}")
         return None
 
 
+async def get_current_user(
+    snapshot: Optional[AuthSnapshot] = Depends(get_auth_snapshot),
+) -> Optional[User]:
+    """Получаем текущего пользователя по токену сессии (отсоединённый объект с ролью)."""
+    if snapshot is None:
+        return None
+    user = snapshot.to_user()
+    logger.info(f"Успешно получен пользователь: {user.id} {user.full_name}")
+    return user
+
+
 # async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
 #     """Проверяем права пользователя как администратора."""
 #     if current_user.role.id in [3, 4]:
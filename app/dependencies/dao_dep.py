@@ -1,24 +1,16 @@
 from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.dao.database import async_session_maker
-
-
-async def get_session_with_commit() -> AsyncGenerator[AsyncSession, None]:
-    """Асинхронная сессия с автоматическим коммитом."""
-    async with async_session_maker() as session:
-        try:
-            yield session
-            await session.commit()
-        except Exception:
-            await session.rollback()
-            raise
-        finally:
-            await session.close()
+from app.dao.database import async_session_maker_read
 
 
 async def get_session_without_commit() -> AsyncGenerator[AsyncSession, None]:
-    """Асинхронная сессия без автоматического коммита."""
-    async with async_session_maker() as session:
+    """
+    Асинхронная сессия только для чтения.
+
+    Для SQLite соединение открыто в режиме query_only. Отдельной зависимости
+    с коммитом нет: запись выполняется только заданиями app.dao.writer.db_writer.
+    """
+    async with async_session_maker_read() as session:
         try:
             yield session
         except Exception:
@@ -1,23 +1,25 @@
 from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Tuple
+from typing import Optional, Tuple
 
+from app.auth.auth_cache import AuthSnapshot
 from app.auth.models import User, Command
-from app.auth.dao import UsersDAO
-from app.dependencies.auth_dep import get_current_user
-from app.dependencies.dao_dep import get_session_with_commit
-from app.exceptions import UserNotInCommandException # Import the specific exception
+from app.dependencies.auth_dep import get_auth_snapshot, get_current_user
+from app.exceptions import ForbiddenException, UserNotInCommandException # Import the specific exception
 
 async def get_authenticated_user_and_command(
-    session: AsyncSession = Depends(get_session_with_commit),
-    user: User = Depends(get_current_user) # Ensures user is authenticated
+    user: Optional[User] = Depends(get_current_user), # Ensures user is authenticated
+    snapshot: Optional[AuthSnapshot] = Depends(get_auth_snapshot),
 ) -> Tuple[User, Command]:
     """
     Dependency to get the authenticated user and their associated command.
     Raises UserNotInCommandException if the user is not in a command.
+
+    Команда берётся из снимка аутентификации (без запросов к БД) и содержит
+    только колонки: связи (участники, язык) не загружены.
     """
-    users_dao = UsersDAO(session)
-    command = await users_dao.find_user_command_in_event(user.id)
+    if user is None:
+        raise ForbiddenException
+    command = snapshot.to_command()
     if not command:
         raise UserNotInCommandException
-    return user, command 
\ No newline at end of file
+    return user, command
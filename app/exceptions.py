@@ -40,6 +40,12 @@ TokenExpiredException = HTTPException(
     detail='Токен истек'
 )
 
+# Подпись данных Telegram не сошлась или данные устарели
+TelegramAuthInvalidException = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail='Недействительные данные авторизации Telegram'
+)
+
 # Некорректный формат токена
 InvalidTokenFormatException = HTTPException(
     status_code=status.HTTP_400_BAD_REQUEST,
@@ -155,3 +161,9 @@ CannotMarkUnsolvedException = HTTPException(
     status_code=status.HTTP_400_BAD_REQUEST,
     detail='Невозможно отметить посещение: команда еще не решила эту загадку'
 )
+
+# Некорректный курсор пагинации
+InvalidCursorException = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail='Некорректный курсор пагинации'
+)
@@ -21,18 +21,24 @@ from prometheus_fastapi_instrumentator import Instrumentator
 # from fastapi_csrf_protect import CsrfProtect # Removed CSRF import
 # from fastapi_csrf_protect.exceptions import CsrfProtectError # Removed CSRF import
 from pydantic import BaseModel
-from redis import asyncio as aioredis
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from app.auth.auth_cache import auth_cache
 from app.auth.redis_session import init_redis_session_service
 from app.auth.router import router as router_auth
+from app.auth.session_store import check_session_settings
 from app.cms.router import init_admin
 from app.config import (BASE_URL, DEBUG, event_config,
                         get_event_name_by_domain, settings)
+from app.dao.query_stats import (check_query_budget, get_query_budget,
+                                 observe_request, track_queries)
+from app.dao.writer import db_writer
 # Import logger and context var from app.logger
 from app.logger import request_id_context
+from app.quest.content import quest_content
 from app.quest.router import router as router_quest
+from app.redis_client import redis_clients
 # Import FastStream broker
 from app.tasks.cleanup import broker as cleanup_broker
 from app.utils.template import render_template
@@ -125,6 +131,25 @@ class RequestIdMiddleware(BaseHTTPMiddleware):
         return response
 
 
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """
+    Считает SQL-запросы и время БД на HTTP-запрос: заголовки X-DB-Queries
+    и X-DB-Time (мс), гистограммы Prometheus по маршруту, проверка query_budget.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        with track_queries() as stats:
+            response = await call_next(request)
+        route = request.scope.get("route")
+        # Шаблон маршрута, а не фактический путь - иначе метки размножатся по id
+        handler = getattr(route, "path", None) or "unmatched"
+        response.headers["X-DB-Queries"] = str(stats.count)
+        response.headers["X-DB-Time"] = f"{stats.total_time * 1000:.2f}"
+        observe_request(request.method, handler, stats)
+        check_query_budget(f"{request.method} {handler}", stats, get_query_budget(getattr(route, "endpoint", None)))
+        return response
+
+
 class MaxBodySizeMiddleware(BaseHTTPMiddleware):
     """Middleware для ограничения размера тела запроса."""
 
@@ -225,6 +250,9 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
 
 # Настройка Middleware (CORS, TrustedHost, Security, Rate Limiting)
 def setup_middleware(app: FastAPI):
+    if settings.DB_QUERY_STATS_ENABLED:
+        app.add_middleware(QueryStatsMiddleware)
+
     # Add Request ID Middleware (should be one of the first)
     app.add_middleware(RequestIdMiddleware)
 
@@ -270,6 +298,13 @@ def setup_middleware(app: FastAPI):
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Управление жизненным циклом приложения."""
     logger.info("Инициализация приложения...")
+    check_session_settings()
+    await db_writer.start()
+    try:
+        await quest_content.load()
+    except Exception:
+        # Не блокируем старт: снимок загрузится при первом запросе квеста
+        logger.exception("Не удалось загрузить контент квеста при старте")
     if settings.USE_REDIS:
         logger.info("Redis is ENABLED. Initializing Redis features...")
         try:
@@ -277,11 +312,9 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             await cleanup_broker.start()
             logger.info("FastStream broker started.")
 
-            # Create Redis client directly for FastAPI Cache
-            redis_cache = aioredis.from_url(
-                settings.REDIS_URL, encoding="utf-8", decode_responses=True
-            )
-            FastAPICache.init(RedisBackend(redis_cache), prefix="fastapi-cache")
+            # FastAPI Cache, сессии и кэш аутентификации работают через общий пул Redis
+            await redis_clients.start_health_checks()
+            FastAPICache.init(RedisBackend(redis_clients.get()), prefix="fastapi-cache")
             logger.info(
                 f"FastAPI Cache initialized with Redis backend at {settings.REDIS_URL}"
             )
@@ -290,6 +323,10 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             await init_redis_session_service(cleanup_broker)
             logger.info("Redis session service initialized.")
 
+            # Инвалидации кэша аутентификации от других воркеров
+            await auth_cache.start()
+            await quest_content.start()
+
         except Exception:
             logger.exception(
                 "Failed to initialize Redis features. Check Redis connection and settings."
@@ -307,6 +344,9 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     yield  # Application runs here
 
     logger.info("Завершение работы приложения...")
+    await db_writer.stop()
+    await auth_cache.stop()
+    await quest_content.stop()
     if settings.USE_REDIS:
         # Stop FastStream broker if it was used
         try:
@@ -326,6 +366,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         # Clear in-memory cache if needed (optional)
         await FastAPICache.clear()
         logger.info("InMemory cache cleared.")
+    await redis_clients.close()
 
 
 # Unified Error Handlers
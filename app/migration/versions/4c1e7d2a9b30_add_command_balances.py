@@ -0,0 +1,51 @@
+"""add_command_balances
+
+Revision ID: 4c1e7d2a9b30
+Revises: f2808871a1fc
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1e7d2a9b30'
+down_revision: Union[str, None] = 'f2808871a1fc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('command_balances',
+    sa.Column('command_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('coins', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('solved_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('version', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['command_id'], ['commands.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('command_id')
+    )
+
+    # Заполняем балансы по уже существующим успешным попыткам
+    op.execute("""
+        INSERT INTO command_balances (command_id, score, coins, solved_count, version)
+        SELECT attempts.command_id,
+               COALESCE(SUM(attempttypes.score), 0),
+               COALESCE(SUM(attempttypes.money), 0),
+               SUM(CASE WHEN attempttypes.name IN ('question', 'question_hint') THEN 1 ELSE 0 END),
+               1
+        FROM attempts
+        JOIN attempttypes ON attempts.attempt_type_id = attempttypes.id
+        JOIN commands ON attempts.command_id = commands.id
+        WHERE attempts.is_true
+        GROUP BY attempts.command_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('command_balances')
@@ -0,0 +1,27 @@
+"""add_answer_tolerance
+
+Revision ID: 9e41c0d7b5a2
+Revises: 4c1e7d2a9b30
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e41c0d7b5a2'
+down_revision: Union[str, None] = '4c1e7d2a9b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('questions', sa.Column('answer_tolerance', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('questions') as batch_op:
+        batch_op.drop_column('answer_tolerance')
@@ -0,0 +1,71 @@
+"""add_query_indexes
+
+Revision ID: f2808871a1fc
+Revises: b3aa9ea4f88a
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2808871a1fc'
+down_revision: Union[str, None] = 'b3aa9ea4f88a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Попытки: агрегаты AttemptsDAO фильтруют по command_id/question_id и is_true
+    op.create_index(
+        'ix_attempts_command_success', 'attempts',
+        ['command_id', 'is_true', 'question_id', 'attempt_type_id'], unique=False,
+    )
+    op.create_index(
+        'ix_attempts_success_question', 'attempts',
+        ['question_id', 'command_id', 'attempt_type_id'], unique=False,
+        sqlite_where=sa.text('is_true = 1'), postgresql_where=sa.text('is_true'),
+    )
+    op.create_index(op.f('ix_attempts_user_id'), 'attempts', ['user_id'], unique=False)
+
+    # Контент квеста
+    op.create_index(op.f('ix_blocks_language_id'), 'blocks', ['language_id'], unique=False)
+    op.create_index(op.f('ix_questions_block_id'), 'questions', ['block_id'], unique=False)
+    op.create_index(op.f('ix_answers_question_id'), 'answers', ['question_id'], unique=False)
+    op.create_index(op.f('ix_questioninsiders_user_id'), 'questioninsiders', ['user_id'], unique=False)
+
+    # Команды и пользователи
+    op.create_index(
+        'ix_users_looking_for_team', 'users', ['full_name'], unique=False,
+        sqlite_where=sa.text('is_looking_for_friends = 1'), postgresql_where=sa.text('is_looking_for_friends'),
+    )
+    op.create_index(op.f('ix_commands_event_id'), 'commands', ['event_id'], unique=False)
+    op.create_index(op.f('ix_commandsusers_user_id'), 'commandsusers', ['user_id'], unique=False)
+    op.create_index(op.f('ix_programs_user_id'), 'programs', ['user_id'], unique=False)
+
+    # Сессии (token уже покрыт ограничением UNIQUE)
+    op.create_index(op.f('ix_sessions_expires_at'), 'sessions', ['expires_at'], unique=False)
+    op.create_index('ix_sessions_user_active', 'sessions', ['user_id', 'is_active'], unique=False)
+
+    # Обновляем статистику планировщика под новые индексы
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('ANALYZE')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sessions_user_active', table_name='sessions')
+    op.drop_index(op.f('ix_sessions_expires_at'), table_name='sessions')
+    op.drop_index(op.f('ix_programs_user_id'), table_name='programs')
+    op.drop_index(op.f('ix_commandsusers_user_id'), table_name='commandsusers')
+    op.drop_index(op.f('ix_commands_event_id'), table_name='commands')
+    op.drop_index('ix_users_looking_for_team', table_name='users')
+    op.drop_index(op.f('ix_questioninsiders_user_id'), table_name='questioninsiders')
+    op.drop_index(op.f('ix_answers_question_id'), table_name='answers')
+    op.drop_index(op.f('ix_questions_block_id'), table_name='questions')
+    op.drop_index(op.f('ix_blocks_language_id'), table_name='blocks')
+    op.drop_index(op.f('ix_attempts_user_id'), table_name='attempts')
+    op.drop_index('ix_attempts_success_question', table_name='attempts')
+    op.drop_index('ix_attempts_command_success', table_name='attempts')
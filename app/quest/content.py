@@ -0,0 +1,233 @@
+"""
+Контент квеста в памяти воркера: блоки, загадки, ответы и подсказки.
+Варианты ответов каждой загадки нормализуются при загрузке (AnswerIndex).
+
+Во время мероприятия контент меняется только через CMS, поэтому он читается
+из БД целиком в неизменяемый снимок (QuestContent) при старте приложения, а
+запросам квеста остаётся читать из БД только попытки команды.
+
+Правка блока, загадки или ответа в CMS вызывает quest_content.invalidate():
+версия снимка растёт, воркер перестраивает снимок и публикует сообщение в
+QUEST_CONTENT_CHANNEL, по которому свой снимок перестраивают остальные воркеры.
+Новый снимок собирается целиком и подменяет прежний одним присваиванием:
+запросы, начатые до подмены, дочитывают прежнюю версию.
+"""
+import asyncio
+import uuid
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.dao.database import async_session_maker_read
+from app.logger import logger
+from app.quest.matching import AnswerIndex
+from app.quest.models import Answer, Block, Question
+
+
+@dataclass(frozen=True)
+class AnswerContent:
+    answer_text: str
+    additional_field_value: Optional[str]
+
+
+@dataclass(frozen=True)
+class QuestionContent:
+    id: int
+    block_id: int
+    title: str
+    image_path: Optional[str]
+    geo_answered: str
+    text_answered: str
+    image_path_answered: Optional[str]
+    hint_path: Optional[str]
+    answers: Tuple[AnswerContent, ...]
+    answer_index: AnswerIndex  # варианты ответа, нормализованные при загрузке
+
+    @property
+    def has_additional_field(self) -> bool:
+        return self.answer_index.has_additional
+
+
+@dataclass(frozen=True)
+class BlockContent:
+    id: int
+    title: str
+    language_id: int
+    image_path: Optional[str]
+    questions: Tuple[QuestionContent, ...]  # по возрастанию id
+
+
+@dataclass(frozen=True)
+class QuestContent:
+    """Снимок контента квеста; version - поколение, из которого он собран."""
+    version: int
+    blocks: Mapping[int, BlockContent]
+    questions: Mapping[int, QuestionContent]
+    blocks_by_language: Mapping[int, Tuple[BlockContent, ...]]
+
+    def blocks_for_language(self, language_id: int) -> Tuple[BlockContent, ...]:
+        return self.blocks_by_language.get(language_id, ())
+
+    @classmethod
+    def from_models(
+        cls, version: int, blocks: List[Block], questions: List[Question], answers: List[Answer]
+    ) -> "QuestContent":
+        """Собирает снимок из строк, упорядоченных по id."""
+        answers_by_question: Dict[int, List[AnswerContent]] = {}
+        for answer in answers:
+            answers_by_question.setdefault(answer.question_id, []).append(
+                AnswerContent(answer.answer_text, answer.additional_field_value)
+            )
+        questions_by_block: Dict[int, List[QuestionContent]] = {}
+        question_map = {}
+        for question in questions:
+            question_answers = tuple(answers_by_question.get(question.id, ()))
+            content = QuestionContent(
+                id=question.id,
+                block_id=question.block_id,
+                title=question.title,
+                image_path=question.image_path,
+                geo_answered=question.geo_answered,
+                text_answered=question.text_answered,
+                image_path_answered=question.image_path_answered,
+                hint_path=question.hint_path,
+                answers=question_answers,
+                answer_index=AnswerIndex.build(
+                    ((answer.answer_text, answer.additional_field_value) for answer in question_answers),
+                    tolerance=question.answer_tolerance if settings.ANSWER_FUZZY_ENABLED else 0,
+                ),
+            )
+            question_map[question.id] = content
+            questions_by_block.setdefault(question.block_id, []).append(content)
+        block_map = {}
+        by_language: Dict[int, List[BlockContent]] = {}
+        for block in blocks:
+            content = BlockContent(
+                id=block.id,
+                title=block.title,
+                language_id=block.language_id,
+                image_path=block.image_path,
+                questions=tuple(questions_by_block.get(block.id, ())),
+            )
+            block_map[block.id] = content
+            by_language.setdefault(block.language_id, []).append(content)
+        return cls(
+            version=version,
+            blocks=MappingProxyType(block_map),
+            questions=MappingProxyType(question_map),
+            blocks_by_language=MappingProxyType({k: tuple(v) for k, v in by_language.items()}),
+        )
+
+
+class QuestContentStore:
+    """Текущий снимок контента квеста с перестроением по инвалидациям из CMS."""
+
+    def __init__(self, channel: str, session_maker=async_session_maker_read):
+        self.channel = channel
+        # Своё сообщение воркер узнаёт по id и не перестраивает снимок второй раз
+        self._instance_id = uuid.uuid4().hex
+        self._session_maker = session_maker
+        self._content: Optional[QuestContent] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._content.version if self._content is not None else None
+
+    async def get(self) -> QuestContent:
+        """Действующий снимок; устаревший или ещё не загруженный перестраивается."""
+        content = self._content
+        if content is not None and content.version == self._generation:
+            return content
+        try:
+            return await self.reload()
+        except Exception as e:
+            if content is None:
+                raise
+            logger.error(f"Не удалось перестроить контент квеста, используется версия {content.version}: {e}")
+            return content
+
+    async def load(self, session_maker=None) -> QuestContent:
+        """Загружает снимок заново (при старте приложения); session_maker - другая БД (тесты, бенчмарки)."""
+        if session_maker is not None:
+            self._session_maker = session_maker
+        self._generation += 1
+        return await self.reload()
+
+    async def reload(self) -> QuestContent:
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог перестроить другой запрос
+            if self._content is not None and self._content.version == self._generation:
+                return self._content
+            generation = self._generation
+            async with self._session_maker() as session:
+                blocks = (await session.execute(select(Block).order_by(Block.id))).scalars().all()
+                questions = (await session.execute(select(Question).order_by(Question.id))).scalars().all()
+                answers = (await session.execute(select(Answer).order_by(Answer.id))).scalars().all()
+            self._content = QuestContent.from_models(generation, blocks, questions, answers)
+            logger.info(
+                f"Контент квеста загружен (версия {generation}): блоков {len(blocks)}, "
+                f"загадок {len(questions)}, ответов {len(answers)}"
+            )
+            return self._content
+
+    async def invalidate(self) -> None:
+        """Контент изменён в CMS (после коммита): перестраивает снимок и оповещает остальные воркеры."""
+        self._generation += 1
+        if self._redis is not None:
+            try:
+                await self._redis.publish(self.channel, self._instance_id)
+            except Exception as e:
+                logger.error(f"Не удалось разослать инвалидацию контента квеста: {e}")
+        await self.get()
+
+    async def start(self) -> None:
+        """Подписывается на канал инвалидаций (вызывается при старте приложения с Redis)."""
+        if self._listener is not None and not self._listener.done():
+            return
+        from app.redis_client import redis_clients
+
+        self._redis = redis_clients.get()
+        self._listener = asyncio.create_task(self._listen(), name="quest-content-invalidation")
+        logger.info(f"Контент квеста подписан на канал {self.channel}")
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self._redis = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                # Пока подписки не было, инвалидации могли потеряться
+                self._generation += 1
+                await self.get()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None or message["type"] != "message" or message["data"] == self._instance_id:
+                        continue
+                    self._generation += 1
+                    await self.get()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Подписка на инвалидации контента квеста прервана: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+quest_content = QuestContentStore(channel=settings.QUEST_CONTENT_CHANNEL)
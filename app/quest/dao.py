@@ -1,30 +1,101 @@
 from app.logger import logger
-from pydantic import BaseModel
-from sqlalchemy import select, func
+from sqlalchemy import bindparam, select, func, case, delete, text
 from app.dao.base import BaseDAO
-from app.quest.models import Answer, Block, Question, QuestionInsider, Attempt, AttemptType
-from app.auth.models import User, Command
+from app.quest.models import Answer, Block, Question, QuestionInsider, Attempt, AttemptType, CommandBalance, SOLVED_ATTEMPT_TYPES
+from app.auth.models import Command, InsiderInfo
+from app.quest.loading import INSIDER_LINKS_PROFILE, INSIDER_QUESTIONS_PROFILE
 from sqlalchemy.exc import SQLAlchemyError
 from typing import List, Optional, Dict
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
+# Заранее построенные запросы горячих методов (проверка ответа, прогресс блоков).
+# Дерево select() и ключ кэша компиляции создаются один раз при импорте модуля,
+# при вызове передаются только значения bindparam.
+_TOTAL_RIDDLES_COUNT = select(func.count(Question.id)).where(Question.block_id == bindparam("block_id"))
+
+_ATTEMPT_TYPE_BY_NAME = select(AttemptType).where(AttemptType.name == bindparam("type_name"))
+
+_ATTEMPT_TYPE_ID_BY_NAME = select(AttemptType.id).where(AttemptType.name == bindparam("type_name"))
+
+_HAS_SUCCESSFUL_ATTEMPT = (
+    select(Attempt.id)
+    .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
+    .where(
+        Attempt.command_id == bindparam("command_id"),
+        Attempt.question_id == bindparam("question_id"),
+        Attempt.is_true == True,
+        AttemptType.name.in_(bindparam("type_names", expanding=True)),
+    )
+    .limit(1)
+)
+
+_BLOCK_ATTEMPTS_COUNT = (
+    select(func.count(Attempt.id))
+    .join(Question, Question.id == Attempt.question_id)
+    .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
+    .where(
+        Question.block_id == bindparam("block_id"),
+        Attempt.command_id == bindparam("command_id"),
+        Attempt.is_true == True,
+        AttemptType.name.in_(bindparam("type_names", expanding=True)),
+    )
+)
+
+# Ссылки инсайдеров сразу для всех решённых загадок списка (без загрузки User и InsiderInfo)
+_INSIDER_GEO_LINKS = (
+    select(QuestionInsider.question_id, InsiderInfo.geo_link)
+    .join(InsiderInfo, InsiderInfo.user_id == QuestionInsider.user_id)
+    .where(
+        QuestionInsider.question_id.in_(bindparam("question_ids", expanding=True)),
+        InsiderInfo.geo_link.is_not(None),
+        InsiderInfo.geo_link != "",
+    )
+    .order_by(QuestionInsider.question_id, QuestionInsider.id)
+)
+
+_SOLVED_TYPE_NAMES = ("question", "question_hint")
+_INSIDER_TYPE_NAMES = ("insider", "insider_hint")
+
+# Счётчики решённых загадок и посещённых инсайдеров по всем блокам команды одним запросом
+_BLOCK_PROGRESS = (
+    select(
+        Question.block_id,
+        func.count(case((AttemptType.name.in_(_SOLVED_TYPE_NAMES), Attempt.id))).label("solved"),
+        func.count(case((AttemptType.name.in_(_INSIDER_TYPE_NAMES), Attempt.id))).label("insider"),
+    )
+    .join(Question, Question.id == Attempt.question_id)
+    .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
+    .where(
+        Attempt.command_id == bindparam("command_id"),
+        Question.block_id.in_(bindparam("block_ids", expanding=True)),
+        Attempt.is_true == True,
+        AttemptType.name.in_(_SOLVED_TYPE_NAMES + _INSIDER_TYPE_NAMES),
+    )
+    .group_by(Question.block_id)
+)
+
+_HAS_SUCCESSFUL_BLOCK_ATTEMPT = (
+    select(Attempt.id)
+    .join(Question, Attempt.question_id == Question.id)
+    .where(
+        Attempt.command_id == bindparam("command_id"),
+        Question.block_id == bindparam("block_id"),
+        Attempt.attempt_type_id == bindparam("attempt_type_id"),
+        Attempt.is_true == True,
+    )
+    .limit(1)
+)
+
+_COMMAND_BALANCE = select(
+    CommandBalance.score, CommandBalance.coins, CommandBalance.solved_count, CommandBalance.version
+).where(CommandBalance.command_id == bindparam("command_id"))
+
+
 class BlocksDAO(BaseDAO):
     model = Block
 
-    async def find_all(self, filters: BaseModel | None = None):
-        filter_dict = filters.model_dump(exclude_unset=True) if filters else {}
-        logger.info(f"Поиск всех записей {self.model.__name__} по фильтрам: {filter_dict}")
-        try:
-            query = select(self.model).filter_by(**filter_dict)
-            result = await self._session.execute(query)
-            records = result.unique().scalars().all()  # Добавлен вызов unique()
-            logger.info(f"Найдено {len(records)} записей.")
-            return records
-        except SQLAlchemyError as e:
-            logger.error(f"Ошибка при поиске всех записей по фильтрам {filter_dict}: {e}")
-            raise
-        
+
 class QuestionsDAO(BaseDAO):
     """DAO для работы с вопросами"""
     
@@ -57,8 +128,7 @@ class QuestionsDAO(BaseDAO):
     async def get_total_riddles_count(self, block_id: int) -> int:
         """Получает общее количество загадок в блоке"""
         try:
-            query = select(func.count(self.model.id)).where(self.model.block_id == block_id)
-            result = await self._session.execute(query)
+            result = await self._session.execute(_TOTAL_RIDDLES_COUNT, {"block_id": block_id})
             count = result.scalar_one()
             logger.debug(f"Общее количество загадок в блоке {block_id}: {count}")
             return count
@@ -118,10 +188,7 @@ class QuestionInsiderDAO(BaseDAO):
             query = (
                 select(self.model)
                 .where(self.model.question_id == question_id)
-                .options(
-                    selectinload(self.model.user)
-                    .selectinload(User.insider_info) # Загружаем User, затем InsiderInfo
-                )
+                .options(*INSIDER_LINKS_PROFILE)
             )
             result = await self._session.execute(query)
             records = result.unique().scalars().all()
@@ -131,6 +198,24 @@ class QuestionInsiderDAO(BaseDAO):
             logger.error(f"Ошибка при поиске инсайдеров с user+info для вопроса {question_id}: {e}")
             raise
 
+    async def get_geo_links_by_question(self, question_ids: List[int]) -> Dict[int, List[str]]:
+        """
+        Ссылки на геолокацию инсайдеров для списка вопросов одним запросом:
+        question_id -> geo_link инсайдеров в порядке назначения. Инсайдеры без ссылки пропускаются.
+        """
+        links: Dict[int, List[str]] = {question_id: [] for question_id in question_ids}
+        if not question_ids:
+            return links
+        try:
+            result = await self._session.execute(_INSIDER_GEO_LINKS, {"question_ids": list(question_ids)})
+            for question_id, geo_link in result.all():
+                links[question_id].append(geo_link)
+            logger.debug(f"Загружены ссылки инсайдеров для {len(question_ids)} вопросов")
+            return links
+        except SQLAlchemyError as e:
+            logger.error(f"Ошибка при загрузке ссылок инсайдеров для вопросов {list(question_ids)}: {e}")
+            raise
+
     async def find_questions_by_insider(self, insider_user_id: int) -> List[Question]:
         """Находит все вопросы (объекты Question), назначенные указанному инсайдеру."""
         try:
@@ -138,7 +223,7 @@ class QuestionInsiderDAO(BaseDAO):
                 select(Question)
                 .join(QuestionInsider, QuestionInsider.question_id == Question.id)
                 .where(QuestionInsider.user_id == insider_user_id)
-                .options(selectinload(Question.answers), selectinload(Question.block))
+                .options(*INSIDER_QUESTIONS_PROFILE)
             )
             result = await self._session.execute(query)
             records = result.scalars().unique().all()
@@ -163,6 +248,127 @@ class QuestionInsiderDAO(BaseDAO):
             logger.error(f"Ошибка при проверке назначения вопроса {question_id} инсайдеру {insider_user_id}: {e}")
             raise
 
+class CommandBalancesDAO(BaseDAO):
+    model = CommandBalance
+
+    @staticmethod
+    def _empty_balance() -> Dict[str, int]:
+        return {"score": 0, "coins": 0, "solved_count": 0, "version": 0}
+
+    async def get_balance(self, command_id: int) -> Dict[str, int]:
+        """Возвращает баланс команды одним поиском по первичному ключу."""
+        try:
+            # Выбираем колонки, а не объект: identity map сессии не должна отдавать устаревший баланс
+            row = (await self._session.execute(_COMMAND_BALANCE, {"command_id": command_id})).first()
+            if row is None:
+                return self._empty_balance()
+            return dict(row._mapping)
+        except SQLAlchemyError as e:
+            logger.error(f"Ошибка при получении баланса команды {command_id}: {e}")
+            raise
+
+    async def get_balances(self, command_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """Возвращает балансы для списка команд ({command_id: {...}}), отсутствующие - нулевые."""
+        if not command_ids:
+            return {}
+        try:
+            query = select(
+                CommandBalance.command_id, CommandBalance.score, CommandBalance.coins,
+                CommandBalance.solved_count, CommandBalance.version
+            ).where(CommandBalance.command_id.in_(command_ids))
+            balances = {command_id: self._empty_balance() for command_id in command_ids}
+            for row in (await self._session.execute(query)).all():
+                balances[row.command_id] = {
+                    "score": row.score, "coins": row.coins,
+                    "solved_count": row.solved_count, "version": row.version,
+                }
+            return balances
+        except SQLAlchemyError as e:
+            logger.error(f"Ошибка при получении балансов команд {command_ids}: {e}")
+            raise
+
+    async def _lock_attempt_writes(self) -> None:
+        """
+        Запрещает запись попыток другим соединениям до конца транзакции.
+        SQLite: пустой UPDATE открывает пишущую транзакцию (как BEGIN IMMEDIATE), остальные
+        писатели ждут busy_timeout; PostgreSQL: LOCK TABLE attempts в режиме SHARE.
+        """
+        dialect = self._session.bind.dialect.name
+        if dialect == "sqlite":
+            await self._session.execute(text(f"UPDATE {CommandBalance.__tablename__} SET version = version WHERE 0"))
+        elif dialect == "postgresql":
+            await self._session.execute(text(f"LOCK TABLE {Attempt.__tablename__} IN SHARE MODE"))
+
+    async def rebuild(self, command_ids: Optional[List[int]] = None) -> int:
+        """
+        Пересчитывает балансы из таблицы attempts и исправляет расхождения.
+        Коммит выполняет вызывающий код. Возвращает число исправленных строк.
+
+        Агрегаты читаются и записываются в одной транзакции под блокировкой записи попыток,
+        поэтому вставки, сделанные во время пересчёта, не перезаписываются. В приложении
+        вызывайте как задание db_writer; скрипт из отдельного процесса защищает блокировка.
+        """
+        try:
+            await self._lock_attempt_writes()
+            aggregate = (
+                select(
+                    Attempt.command_id,
+                    func.coalesce(func.sum(AttemptType.score), 0).label("score"),
+                    func.coalesce(func.sum(AttemptType.money), 0).label("coins"),
+                    func.sum(case((AttemptType.name.in_(SOLVED_ATTEMPT_TYPES), 1), else_=0)).label("solved_count"),
+                )
+                .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
+                .join(Command, Attempt.command_id == Command.id)
+                .where(Attempt.is_true == True)
+                .group_by(Attempt.command_id)
+            )
+            existing_query = select(
+                CommandBalance.command_id, CommandBalance.score, CommandBalance.coins,
+                CommandBalance.solved_count, CommandBalance.version, Command.id.label("live_command_id"),
+            ).outerjoin(Command, CommandBalance.command_id == Command.id)
+            if command_ids is not None:
+                aggregate = aggregate.where(Attempt.command_id.in_(command_ids))
+                existing_query = existing_query.where(CommandBalance.command_id.in_(command_ids))
+
+            expected = {
+                row.command_id: {"score": int(row.score), "coins": int(row.coins), "solved_count": int(row.solved_count)}
+                for row in (await self._session.execute(aggregate)).all()
+            }
+            existing, orphaned = {}, []
+            for row in (await self._session.execute(existing_query)).all():
+                if row.live_command_id is None:
+                    # Команда удалена, а внешние ключи SQLite не каскадировали удаление
+                    orphaned.append(row.command_id)
+                else:
+                    existing[row.command_id] = row
+
+            zero = {"score": 0, "coins": 0, "solved_count": 0}
+            inserts, updates = [], []
+            for command_id in set(expected) | set(existing):
+                values = expected.get(command_id, zero)
+                balance = existing.get(command_id)
+                if balance is None:
+                    inserts.append({"command_id": command_id, "version": 1, **values})
+                elif (balance.score, balance.coins, balance.solved_count) != tuple(values.values()):
+                    logger.warning(
+                        f"Расхождение баланса команды {command_id}: "
+                        f"score={balance.score}/{values['score']}, coins={balance.coins}/{values['coins']}, "
+                        f"solved={balance.solved_count}/{values['solved_count']}"
+                    )
+                    updates.append({"command_id": command_id, "version": balance.version + 1, **values})
+
+            if orphaned:
+                await self._session.execute(delete(CommandBalance).where(CommandBalance.command_id.in_(orphaned)))
+            await self.add_many(inserts)
+            await self.bulk_update(updates)
+            fixed = len(orphaned) + len(inserts) + len(updates)
+            logger.info(f"Пересчёт балансов команд завершён, исправлено строк: {fixed}")
+            return fixed
+        except SQLAlchemyError as e:
+            logger.error(f"Ошибка при пересчёте балансов команд: {e}")
+            raise
+
+
 class AttemptsDAO(BaseDAO):
     model = Attempt
 
@@ -184,13 +390,10 @@ class AttemptsDAO(BaseDAO):
     async def has_successful_attempt_of_type(self, command_id: int, question_id: int, attempt_type_name: str) -> bool:
         """Проверяет, есть ли успешная попытка заданного типа для команды и вопроса."""
         try:
-            query = select(Attempt).join(AttemptType).where(
-                Attempt.command_id == command_id,
-                Attempt.question_id == question_id,
-                Attempt.is_true == True,
-                AttemptType.name == attempt_type_name
+            result = await self._session.execute(
+                _HAS_SUCCESSFUL_ATTEMPT,
+                {"command_id": command_id, "question_id": question_id, "type_names": [attempt_type_name]},
             )
-            result = await self._session.execute(query)
             exists = result.scalar_one_or_none() is not None
             logger.debug(f"Проверка успешной попытки типа '{attempt_type_name}' для команды {command_id}, вопроса {question_id}: {exists}")
             return exists
@@ -201,13 +404,10 @@ class AttemptsDAO(BaseDAO):
     async def has_successful_insider_attempt(self, command_id: int, question_id: int) -> bool:
         """Проверяет, есть ли успешная попытка типа insider или insider_hint для команды и вопроса."""
         try:
-            query = select(Attempt).join(AttemptType).where(
-                Attempt.command_id == command_id,
-                Attempt.question_id == question_id,
-                Attempt.is_true == True,
-                AttemptType.name.in_(["insider", "insider_hint"])
+            result = await self._session.execute(
+                _HAS_SUCCESSFUL_ATTEMPT,
+                {"command_id": command_id, "question_id": question_id, "type_names": ["insider", "insider_hint"]},
             )
-            result = await self._session.execute(query)
             exists = result.scalar_one_or_none() is not None
             logger.debug(f"Проверка успешной insider/insider_hint попытки для команды {command_id}, вопроса {question_id}: {exists}")
             return exists
@@ -218,13 +418,10 @@ class AttemptsDAO(BaseDAO):
     async def has_successful_solve_attempt(self, command_id: int, question_id: int) -> bool:
         """Проверяет, есть ли успешная попытка решения (question/question_hint) для команды и вопроса."""
         try:
-            query = select(Attempt).join(AttemptType).where(
-                Attempt.command_id == command_id,
-                Attempt.question_id == question_id,
-                Attempt.is_true == True,
-                AttemptType.name.in_(["question", "question_hint"])
+            result = await self._session.execute(
+                _HAS_SUCCESSFUL_ATTEMPT,
+                {"command_id": command_id, "question_id": question_id, "type_names": ["question", "question_hint"]},
             )
-            result = await self._session.execute(query)
             exists = result.scalar_one_or_none() is not None
             logger.debug(f"Проверка успешной question/question_hint попытки для команды {command_id}, вопроса {question_id}: {exists}")
             return exists
@@ -235,8 +432,7 @@ class AttemptsDAO(BaseDAO):
     async def get_attempt_type_by_name(self, type_name: str) -> Optional[AttemptType]:
         """Получает объект AttemptType по его имени."""
         try:
-            query = select(AttemptType).where(AttemptType.name == type_name)
-            result = await self._session.execute(query)
+            result = await self._session.execute(_ATTEMPT_TYPE_BY_NAME, {"type_name": type_name})
             attempt_type = result.scalar_one_or_none()
             if not attempt_type:
                 logger.warning(f"Тип попытки '{type_name}' не найден.")
@@ -248,8 +444,7 @@ class AttemptsDAO(BaseDAO):
     async def get_attempt_type_id_by_name(self, type_name: str) -> Optional[int]:
         """Получает ID типа попытки по его имени."""
         try:
-            query = select(AttemptType.id).where(AttemptType.name == type_name)
-            result = await self._session.execute(query)
+            result = await self._session.execute(_ATTEMPT_TYPE_ID_BY_NAME, {"type_name": type_name})
             type_id = result.scalar_one_or_none()
             if not type_id:
                 logger.warning(f"Тип попытки '{type_name}' не найден.")
@@ -261,18 +456,10 @@ class AttemptsDAO(BaseDAO):
     async def get_solved_riddles_count(self, block_id: int, command_id: int) -> int:
         """Получает количество решённых загадок в блоке для команды (типы question/question_hint)."""
         try:
-            query = (
-                select(func.count(Attempt.id))
-                .join(Question, Question.id == Attempt.question_id)
-                .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
-                .where(
-                    Question.block_id == block_id,
-                    Attempt.command_id == command_id,
-                    Attempt.is_true == True,
-                    AttemptType.name.in_(["question", "question_hint"])
-                )
+            result = await self._session.execute(
+                _BLOCK_ATTEMPTS_COUNT,
+                {"block_id": block_id, "command_id": command_id, "type_names": ["question", "question_hint"]},
             )
-            result = await self._session.execute(query)
             count = result.scalar_one()
             logger.debug(f"Количество решенных загадок в блоке {block_id} для команды {command_id}: {count}")
             return count
@@ -283,18 +470,10 @@ class AttemptsDAO(BaseDAO):
     async def get_insider_riddles_count(self, block_id: int, command_id: int) -> int:
         """Получает количество загадок, на которые приехали (типы insider/insider_hint)."""
         try:
-            query = (
-                select(func.count(Attempt.id))
-                .join(Question, Question.id == Attempt.question_id)
-                .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
-                .where(
-                    Question.block_id == block_id,
-                    Attempt.command_id == command_id,
-                    Attempt.is_true == True,
-                    AttemptType.name.in_(["insider", "insider_hint"])
-                )
+            result = await self._session.execute(
+                _BLOCK_ATTEMPTS_COUNT,
+                {"block_id": block_id, "command_id": command_id, "type_names": ["insider", "insider_hint"]},
             )
-            result = await self._session.execute(query)
             count = result.scalar_one()
             logger.debug(f"Количество посещенных инсайдерских локаций в блоке {block_id} для команды {command_id}: {count}")
             return count
@@ -302,61 +481,44 @@ class AttemptsDAO(BaseDAO):
             logger.error(f"Ошибка подсчета посещенных инсайдерских локаций в блоке {block_id} для команды {command_id}: {e}")
             raise
 
-    async def get_solved_riddles_count_for_command(self, command_id: int) -> int:
-        """Получает общее количество решённых загадок для команды (типы question/question_hint)."""
+    async def get_block_progress(self, command_id: int, block_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """
+        Количество решённых загадок (question/question_hint) и посещённых инсайдеров
+        (insider/insider_hint) команды по каждому из блоков одним запросом.
+        Блоки без попыток возвращаются с нулями.
+        """
+        progress = {block_id: {"solved": 0, "insider": 0} for block_id in block_ids}
+        if not block_ids:
+            return progress
         try:
-            query = (
-                select(func.count(Attempt.id))
-                .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
-                .where(
-                    Attempt.command_id == command_id,
-                    Attempt.is_true == True,
-                    AttemptType.name.in_(["question", "question_hint"])
-                )
-            )
-            result = await self._session.execute(query)
-            count = result.scalar_one()
-            logger.debug(f"Общее количество решенных загадок для команды {command_id}: {count}")
-            return count
+            result = await self._session.execute(_BLOCK_PROGRESS, {"command_id": command_id, "block_ids": list(block_ids)})
+            for block_id, solved, insider in result.all():
+                progress[block_id] = {"solved": solved, "insider": insider}
+            logger.debug(f"Прогресс команды {command_id} по блокам {list(block_ids)}: {progress}")
+            return progress
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка подсчета решенных загадок для команды {command_id}: {e}")
+            logger.error(f"Ошибка подсчета прогресса по блокам для команды {command_id}: {e}")
             raise
 
-    async def calculate_team_score_and_coins(self, command_id: int) -> Dict[str, int]:
-        """Вычисляет счёт и количество монет команды на основе успешных попыток."""
-        try:
-            query = (
-                select(func.sum(AttemptType.score), func.sum(AttemptType.money))
-                .join(Attempt, Attempt.attempt_type_id == AttemptType.id)
-                .where(Attempt.command_id == command_id, Attempt.is_true == True)
-            )
-            result = await self._session.execute(query)
-            scores_and_coins = result.first() # Используем first() для агрегирующих функций
-
-            total_score = scores_and_coins[0] if scores_and_coins and scores_and_coins[0] is not None else 0
-            total_coins = scores_and_coins[1] if scores_and_coins and scores_and_coins[1] is not None else 0
+    async def get_solved_riddles_count_for_command(self, command_id: int) -> int:
+        """Получает общее количество решённых загадок для команды (типы question/question_hint)."""
+        balance = await CommandBalancesDAO(self._session).get_balance(command_id)
+        logger.debug(f"Общее количество решенных загадок для команды {command_id}: {balance['solved_count']}")
+        return balance["solved_count"]
 
-            logger.debug(f"Расчет статистики для команды {command_id}: score={total_score}, coins={total_coins}")
-            return {"score": total_score, "coins": total_coins}
-        except SQLAlchemyError as e:
-            logger.error(f"Ошибка при расчете статистики для команды {command_id}: {e}")
-            raise
+    async def calculate_team_score_and_coins(self, command_id: int) -> Dict[str, int]:
+        """Возвращает счёт и количество монет команды из таблицы command_balances."""
+        balance = await CommandBalancesDAO(self._session).get_balance(command_id)
+        logger.debug(f"Расчет статистики для команды {command_id}: score={balance['score']}, coins={balance['coins']}")
+        return {"score": balance["score"], "coins": balance["coins"]}
 
     async def has_successful_block_attempt(self, command_id: int, block_id: int, block_attempt_type_id: int) -> bool:
         """Проверяет, есть ли успешная попытка завершения блока (question_block/insider_block) для команды."""
         try:
-            query = (
-                select(Attempt.id) # Достаточно выбрать ID для проверки существования
-                .join(Question, Attempt.question_id == Question.id)
-                .where(
-                    Attempt.command_id == command_id,
-                    Question.block_id == block_id,
-                    Attempt.attempt_type_id == block_attempt_type_id,
-                    Attempt.is_true == True
-                )
-                .limit(1) # Нам нужна только одна запись для подтверждения
+            result = await self._session.execute(
+                _HAS_SUCCESSFUL_BLOCK_ATTEMPT,
+                {"command_id": command_id, "block_id": block_id, "attempt_type_id": block_attempt_type_id},
             )
-            result = await self._session.execute(query)
             exists = result.scalar_one_or_none() is not None
             logger.debug(f"Проверка успешной попытки завершения блока {block_id} (тип {block_attempt_type_id}) для команды {command_id}: {exists}")
             return exists
@@ -443,40 +605,20 @@ class AttemptsDAO(BaseDAO):
 
     async def get_aggregated_scores_for_commands(self, command_ids: List[int]) -> Dict[int, Dict[str, int]]:
         """
-        Вычисляет агрегированные базовые очки (sum(score)) и монеты (sum(money))
-        для списка команд на основе их успешных попыток.
-        Возвращает словарь {command_id: {"base_score": ..., "coins": ...}}.
+        Возвращает базовые очки и монеты для списка команд из таблицы command_balances.
+        Возвращает словарь {command_id: {"base_score": ..., "coins": ...}}
+        только для команд, у которых есть баланс.
         """
         if not command_ids:
             return {}
-        try:
-            query = (
-                select(
-                    Attempt.command_id,
-                    func.sum(AttemptType.score).label("base_score"),
-                    func.sum(AttemptType.money).label("coins")
-                )
-                .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
-                .where(
-                    Attempt.command_id.in_(command_ids),
-                    Attempt.is_true == True
-                )
-                .group_by(Attempt.command_id)
-            )
-            result = await self._session.execute(query)
-            # Создаем словарь с результатами, обрабатывая None значения
-            aggregated_data = {
-                row.command_id: {
-                    "base_score": int(row.base_score) if row.base_score is not None else 0,
-                    "coins": int(row.coins) if row.coins is not None else 0
-                }
-                for row in result.all()
-            }
-            logger.debug(f"Получены агрегированные score/coins для {len(aggregated_data)} команд из {len(command_ids)} запрошенных.")
-            return aggregated_data
-        except SQLAlchemyError as e:
-            logger.error(f"Ошибка при агрегации score/coins для команд {command_ids}: {e}")
-            raise # Передаем ошибку выше
+        balances = await CommandBalancesDAO(self._session).get_balances(command_ids)
+        aggregated_data = {
+            command_id: {"base_score": balance["score"], "coins": balance["coins"]}
+            for command_id, balance in balances.items()
+            if balance["version"] > 0
+        }
+        logger.debug(f"Получены агрегированные score/coins для {len(aggregated_data)} команд из {len(command_ids)} запрошенных.")
+        return aggregated_data
 
     async def try_complete_question_block(self, command_id: int, block_id: int, user_id: int, last_question_id: int) -> bool:
         """
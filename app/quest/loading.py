@@ -0,0 +1,19 @@
+"""
+Профили загрузки связей для контента квеста (см. app/auth/loading.py).
+"""
+from sqlalchemy.orm import raiseload, selectinload
+
+from app.auth.models import User
+from app.quest.models import Block, Question, QuestionInsider
+
+# GET /api/quest/: для прогресса нужны только колонки блока, связи не грузим вовсе
+QUEST_BLOCK_PROFILE = [raiseload("*")]
+
+# Структура квеста для организатора: блоки с загадками
+QUEST_STRUCTURE_PROFILE = [selectinload(Block.questions)]
+
+# Загадки инсайдера: ответы и блок
+INSIDER_QUESTIONS_PROFILE = [selectinload(Question.answers), selectinload(Question.block)]
+
+# Ссылки инсайдеров решённой загадки: пользователь и его данные инсайдера
+INSIDER_LINKS_PROFILE = [selectinload(QuestionInsider.user).selectinload(User.insider_info)]
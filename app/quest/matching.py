@@ -0,0 +1,239 @@
+"""
+Сравнение ответов на загадки.
+
+Ответ и вариант считаются совпавшими, если совпадают множества их слов без
+учёта регистра и порядка (compare_strings). Для снимка контента варианты
+нормализуются заранее в AnswerIndex: проверка ответа токенизирует ввод один раз
+и ищет его ключ в множестве.
+
+Если у загадки задан допуск опечаток (Question.answer_tolerance, в CMS), при
+промахе точного сравнения работает нечёткое (FuzzyIndex): ответ и варианты
+приводятся к общему виду (ё -> е, транслитерация в латиницу, без служебных
+слов вроде "улица" и "дом", слова по алфавиту) и сравниваются расстоянием
+Дамерау-Левенштейна не больше допуска - и не больше одной правки на
+CHARS_PER_EDIT символов ответа, чтобы короткие ответы ("5", "Покровка")
+не совпадали с соседними. Числа (номера домов, годы) должны совпадать точно. Кандидаты заранее отбираются по общим триграммам,
+расстояние считается только в полосе шириной в допуск с выходом, как только
+строка DP целиком превысила допуск.
+"""
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+_WORD = re.compile(r'\b\w+\b')
+
+AnswerKey = FrozenSet[str]
+
+# Не больше одной опечатки на столько символов ответа
+CHARS_PER_EDIT = 4
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya",
+})
+
+
+def _fold(text: str) -> List[str]:
+    """Слова в общем виде: нижний регистр, ё -> е, кириллица транслитерирована в латиницу."""
+    return _WORD.findall(text.lower().translate(_TRANSLIT))
+
+
+def _fold_words(text: str) -> Dict[str, int]:
+    """Слово в общем виде -> длина исходного слова (транслитерация удлиняет "ш", "щ", "я"...)."""
+    return {word.translate(_TRANSLIT): len(word) for word in _WORD.findall(text.lower())}
+
+
+STOP_WORDS = frozenset(
+    word
+    for phrase in (
+        "ул улица д дом стр строение к корп корпус пер переулок пр проезд просп проспект "
+        "пл площадь наб набережная б бульвар ш шоссе г город москва и в на у"
+    ).split()
+    for word in _fold(phrase)
+)
+
+
+# Длинные служебные слова узнаются и с одной опечаткой ("улца", "перулок")
+_TYPO_STOP_WORDS = tuple(word for word in STOP_WORDS if len(word) >= CHARS_PER_EDIT + 1)
+
+
+def normalize_text(text: str) -> set[str]:
+    # Извлекаем слова и сразу возвращаем множество
+    return set(_WORD.findall(text.lower()))
+
+
+def answer_key(text: str) -> AnswerKey:
+    """Неизменяемый ключ ответа для поиска в AnswerIndex."""
+    return frozenset(_WORD.findall(text.lower()))
+
+
+def compare_strings(str1: str, str2: str) -> bool:
+    # Сравниваем множества слов
+    return normalize_text(str1) == normalize_text(str2)
+
+
+FuzzyKey = Tuple[str, str]  # (числа, слова)
+
+
+def fuzzy_key(text: str) -> Tuple[FuzzyKey, int]:
+    """
+    Ответ в общем виде для нечёткого сравнения: числа (слова с цифрами - номера домов,
+    годы) отдельно от остальных слов, и длина слов в исходных символах, по которой
+    ограничивается число правок. Служебные слова отбрасываются, если есть другие.
+    """
+    folded = _fold_words(text)
+    numbers = sorted(word for word in folded if any(char.isdigit() for char in word))
+    words = [word for word in folded if word not in numbers]
+    meaningful = [word for word in words if not _is_stop_word(word)] or words
+    meaningful.sort()
+    length = sum(folded[word] for word in meaningful) + max(len(meaningful) - 1, 0)
+    return (" ".join(numbers), " ".join(meaningful)), length
+
+
+def bounded_distance(a: str, b: str, bound: int) -> int:
+    """
+    Расстояние Дамерау-Левенштейна (перестановка соседних символов - одна правка)
+    между a и b, если оно не больше bound, иначе bound + 1.
+    """
+    la, lb = len(a), len(b)
+    over = bound + 1
+    if abs(la - lb) > bound:
+        return over
+    if a == b:
+        return 0
+    before = None
+    prev = [min(j, over) for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        cur = [over] * (lb + 1)
+        if i <= bound:
+            cur[0] = i
+        row_min = cur[0]
+        ca = a[i - 1]
+        # Клетки дальше bound от диагонали заведомо больше bound
+        for j in range(max(1, i - bound), min(lb, i + bound) + 1):
+            cb = b[j - 1]
+            value = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and before[j - 2] + 1 < value:
+                value = before[j - 2] + 1
+            cur[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > bound:
+            return over
+        before, prev = prev, cur
+    return min(prev[lb], over)
+
+
+def _is_stop_word(word: str) -> bool:
+    if word in STOP_WORDS:
+        return True
+    return len(word) > CHARS_PER_EDIT and any(bounded_distance(word, stop, 1) <= 1 for stop in _TYPO_STOP_WORDS)
+
+
+def _trigrams(key: str) -> FrozenSet[str]:
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+@dataclass(frozen=True)
+class FuzzyIndex:
+    """
+    Варианты ответа в общем виде с триграммами слов для отбора кандидатов.
+    Числа должны совпадать точно, опечатки допускаются только в словах.
+    """
+    tolerance: int
+    exact: FrozenSet[FuzzyKey]
+    keys: Tuple[FuzzyKey, ...]
+    lengths: Tuple[int, ...]  # длины слов вариантов в исходных символах
+    trigram_counts: Tuple[int, ...]
+    postings: Mapping[str, Tuple[int, ...]]  # триграмма -> номера вариантов в keys
+
+    @classmethod
+    def build(cls, texts: Iterable[str], tolerance: int) -> "FuzzyIndex":
+        variants = dict(sorted(fuzzy_key(text) for text in texts))
+        keys = tuple(variants)
+        postings: Dict[str, List[int]] = {}
+        counts = []
+        for number, (_, words) in enumerate(keys):
+            grams = _trigrams(words)
+            counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(number)
+        return cls(
+            tolerance=tolerance,
+            exact=frozenset(keys),
+            keys=keys,
+            lengths=tuple(variants.values()),
+            trigram_counts=tuple(counts),
+            postings=MappingProxyType({gram: tuple(numbers) for gram, numbers in postings.items()}),
+        )
+
+    def matches(self, text: str) -> bool:
+        key, length = fuzzy_key(text)
+        if key in self.exact:
+            return True
+        bound = min(self.tolerance, length // CHARS_PER_EDIT)
+        if bound == 0:
+            return False
+        numbers, words = key
+        grams = _trigrams(words)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for number in self.postings.get(gram, ()):
+                shared[number] = shared.get(number, 0) + 1
+        # Одна правка затрагивает не больше 4 триграмм (перестановка), поэтому у
+        # варианта на расстоянии bound общих триграмм не меньше max(|A|, |B|) - 4 * bound
+        for number, count in shared.items():
+            variant_numbers, variant = self.keys[number]
+            if variant_numbers != numbers:
+                continue
+            if count < max(len(grams), self.trigram_counts[number]) - 4 * bound:
+                continue
+            variant_bound = min(bound, self.lengths[number] // CHARS_PER_EDIT)
+            if variant_bound and bounded_distance(words, variant, variant_bound) <= variant_bound:
+                return True
+        return False
+
+
+@dataclass(frozen=True)
+class AnswerIndex:
+    """Ключи вариантов ответа загадки: основного поля и дополнительного."""
+    main: FrozenSet[AnswerKey]
+    additional: FrozenSet[AnswerKey]
+    main_fuzzy: Optional[FuzzyIndex] = None  # при допуске опечаток > 0
+    additional_fuzzy: Optional[FuzzyIndex] = None
+
+    @classmethod
+    def build(cls, variants: Iterable[tuple[str, Optional[str]]], tolerance: int = 0) -> "AnswerIndex":
+        """variants - пары (answer_text, additional_field_value); tolerance - допуск опечаток."""
+        main_texts, additional_texts = [], []
+        for answer_text, additional_value in variants:
+            main_texts.append(answer_text)
+            if additional_value:
+                additional_texts.append(additional_value)
+        return cls(
+            main=frozenset(answer_key(text) for text in main_texts),
+            additional=frozenset(answer_key(text) for text in additional_texts),
+            main_fuzzy=FuzzyIndex.build(main_texts, tolerance) if tolerance > 0 and main_texts else None,
+            additional_fuzzy=(
+                FuzzyIndex.build(additional_texts, tolerance) if tolerance > 0 and additional_texts else None
+            ),
+        )
+
+    @property
+    def has_additional(self) -> bool:
+        return bool(self.additional)
+
+    def matches(self, text: str) -> bool:
+        if answer_key(text) in self.main:
+            return True
+        return self.main_fuzzy is not None and self.main_fuzzy.matches(text)
+
+    def matches_additional(self, text: str) -> bool:
+        if answer_key(text) in self.additional:
+            return True
+        return self.additional_fuzzy is not None and self.additional_fuzzy.matches(text)
@@ -1,6 +1,8 @@
-from sqlalchemy import ForeignKey, UniqueConstraint
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from app.dao.database import Base
+from sqlalchemy import ForeignKey, Index, UniqueConstraint, case, event, inspect, literal, select, text
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Mapped, ORMExecuteState, Session, mapped_column, relationship
+from app.dao.base import dialect_insert
+from app.dao.database import Base, BaseNoID
 from typing import Optional
 
 class Block(Base):
@@ -8,13 +10,13 @@ class Block(Base):
     title: Mapped[str]  # Название блока
     
     # Связь с языком
-    language_id: Mapped[int] = mapped_column(ForeignKey('languages.id'), nullable=False, default=1)
-    language: Mapped["Language"] = relationship("Language", back_populates="blocks", lazy="joined")  # Используем строку для указания модели
+    language_id: Mapped[int] = mapped_column(ForeignKey('languages.id'), nullable=False, default=1, index=True)
+    language: Mapped["Language"] = relationship("Language", back_populates="blocks", lazy="raise_on_sql")  # Используем строку для указания модели
 
     image_path: Mapped[Optional[str]] = mapped_column(nullable=True)
     
     # Связь с вопросами
-    questions: Mapped[list["Question"]] = relationship("Question", back_populates="block")
+    questions: Mapped[list["Question"]] = relationship("Question", back_populates="block", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"{self.title}"
@@ -23,7 +25,7 @@ class Block(Base):
 class Question(Base):
     """Модель для вопросов в блоках квеста"""
     title: Mapped[str]
-    block_id: Mapped[int] = mapped_column(ForeignKey('blocks.id'), nullable=False)
+    block_id: Mapped[int] = mapped_column(ForeignKey('blocks.id'), nullable=False, index=True)
     image_path: Mapped[Optional[str]] = mapped_column(nullable=True)
     geo_answered: Mapped[str]
     text_answered: Mapped[str]
@@ -31,15 +33,17 @@ class Question(Base):
     hint_path: Mapped[Optional[str]] = mapped_column(nullable=True)  # Путь к подсказке
 
     longread: Mapped[Optional[str]] = mapped_column(nullable=True)  # Лонгрид
+    # Допуск опечаток в ответе (правок Дамерау-Левенштейна), 0 - только точное совпадение
+    answer_tolerance: Mapped[int] = mapped_column(default=0, server_default=text('0'))
 
     # Связь с блоком
-    block: Mapped["Block"] = relationship("Block", back_populates="questions")
+    block: Mapped["Block"] = relationship("Block", back_populates="questions", lazy="raise_on_sql")
 
     # Добавляем связь с ответами
-    answers: Mapped[list["Answer"]] = relationship("Answer", back_populates="question", cascade="all, delete-orphan")
+    answers: Mapped[list["Answer"]] = relationship("Answer", back_populates="question", cascade="all, delete-orphan", lazy="raise_on_sql")
     
     # Связь с инсайдерами
-    insiders: Mapped[list["QuestionInsider"]] = relationship("QuestionInsider", back_populates="question", cascade="all, delete-orphan")
+    insiders: Mapped[list["QuestionInsider"]] = relationship("QuestionInsider", back_populates="question", cascade="all, delete-orphan", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"{self.title}"
@@ -47,12 +51,12 @@ class Question(Base):
 
 class Answer(Base):
     """Модель для ответов на вопросы"""
-    question_id: Mapped[int] = mapped_column(ForeignKey('questions.id'), nullable=False)
+    question_id: Mapped[int] = mapped_column(ForeignKey('questions.id'), nullable=False, index=True)
     answer_text: Mapped[str]
     additional_field_value: Mapped[Optional[str]] = mapped_column(nullable=True)
 
     # Связь с вопросом
-    question: Mapped["Question"] = relationship("Question", back_populates="answers")
+    question: Mapped["Question"] = relationship("Question", back_populates="answers", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"Answer(id={self.id}, question_id={self.question_id}, answer_text={self.answer_text})"
@@ -68,19 +72,133 @@ class AttemptType(Base):
 
 class Attempt(Base):
     """Попытки / Транзакции пользователей"""
+    __table_args__ = (
+        # Счёт команды, статусы загадок, проверки "уже решено" и все попытки команды.
+        # attempt_type_id включён, чтобы индекс был покрывающим для join с attempttypes.
+        Index('ix_attempts_command_success', 'command_id', 'is_true', 'question_id', 'attempt_type_id'),
+        # Статистика решений по вопросам - только успешные попытки
+        Index(
+            'ix_attempts_success_question',
+            'question_id', 'command_id', 'attempt_type_id',
+            sqlite_where=text('is_true = 1'),
+            postgresql_where=text('is_true'),
+        ),
+    )
+
     command_id: Mapped[int] = mapped_column(ForeignKey('commands.id', ondelete="CASCADE"))
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), index=True)
     question_id: Mapped[Optional[int]] = mapped_column(ForeignKey('questions.id', ondelete="SET NULL"), nullable=True)
     attempt_type_id: Mapped[int] = mapped_column(ForeignKey('attempttypes.id', ondelete="CASCADE"))
     attempt_text: Mapped[Optional[str]]
     is_true: Mapped[bool] = mapped_column(default=False) # Было ли начисление
 
     # Связи
-    command: Mapped["Command"] = relationship("Command")
-    user: Mapped["User"] = relationship("User")
-    question: Mapped["Question"] = relationship("Question")
-    attempt_type: Mapped["AttemptType"] = relationship("AttemptType")
-    
+    command: Mapped["Command"] = relationship("Command", lazy="raise_on_sql")
+    user: Mapped["User"] = relationship("User", lazy="raise_on_sql")
+    question: Mapped["Question"] = relationship("Question", lazy="raise_on_sql")
+    attempt_type: Mapped["AttemptType"] = relationship("AttemptType", lazy="raise_on_sql")
+
+
+# Типы попыток, которые считаются решением загадки
+SOLVED_ATTEMPT_TYPES = ("question", "question_hint")
+
+
+class CommandBalance(BaseNoID):
+    """
+    Текущее состояние команды: счёт, монеты и число решённых загадок.
+
+    Обновляется в той же транзакции, что и вставка/изменение попытки
+    (см. слушатели ниже), поэтому чтение - один поиск по первичному ключу.
+    version растёт при каждом изменении строки.
+    """
+    __tablename__ = "command_balances"
+
+    command_id: Mapped[int] = mapped_column(ForeignKey('commands.id', ondelete="CASCADE"), primary_key=True)
+    score: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+    coins: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+    solved_count: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+    version: Mapped[int] = mapped_column(default=0, server_default=text('0'))
+
+    def __repr__(self):
+        return f"CommandBalance(command_id={self.command_id}, score={self.score}, coins={self.coins}, version={self.version})"
+
+
+def _balance_delta_statement(dialect_name: str, command_id: int, attempt_type_id: int, sign: int):
+    """Строит upsert, прибавляющий (sign=1) или вычитающий (sign=-1) вклад попытки в баланс команды."""
+    delta = (
+        select(
+            literal(command_id),
+            AttemptType.score * sign,
+            AttemptType.money * sign,
+            case((AttemptType.name.in_(SOLVED_ATTEMPT_TYPES), sign), else_=0),
+            literal(1),
+        )
+        .where(AttemptType.id == attempt_type_id)
+    )
+    stmt = dialect_insert(dialect_name)(CommandBalance).from_select(
+        ["command_id", "score", "coins", "solved_count", "version"], delta
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[CommandBalance.command_id],
+        set_={
+            "score": CommandBalance.score + stmt.excluded.score,
+            "coins": CommandBalance.coins + stmt.excluded.coins,
+            "solved_count": CommandBalance.solved_count + stmt.excluded.solved_count,
+            "version": CommandBalance.version + 1,
+        },
+    )
+
+
+def _apply_balance_delta(connection, command_id: int, attempt_type_id: int, sign: int) -> None:
+    connection.execute(_balance_delta_statement(connection.dialect.name, command_id, attempt_type_id, sign))
+
+
+# Слушатели срабатывают только для ORM-объектов (session.add/delete, изменение атрибутов).
+# Массовые INSERT/UPDATE/DELETE по Attempt (update, bulk_update, add_many, upsert, delete BaseDAO
+# и session.execute(update(Attempt)) и т.п.) их обходят и поэтому запрещены, см. ниже.
+@event.listens_for(Attempt, "after_insert")
+def _attempt_inserted(mapper, connection, target: Attempt) -> None:
+    if target.is_true:
+        _apply_balance_delta(connection, target.command_id, target.attempt_type_id, 1)
+
+
+@event.listens_for(Attempt, "after_update")
+def _attempt_updated(mapper, connection, target: Attempt) -> None:
+    state = inspect(target)
+    old = {}
+    for key in ("is_true", "command_id", "attempt_type_id"):
+        history = state.attrs[key].history
+        old[key] = history.deleted[0] if history.deleted else getattr(target, key)
+    if (old["is_true"], old["command_id"], old["attempt_type_id"]) == (
+        target.is_true, target.command_id, target.attempt_type_id
+    ):
+        return
+    if old["is_true"]:
+        _apply_balance_delta(connection, old["command_id"], old["attempt_type_id"], -1)
+    if target.is_true:
+        _apply_balance_delta(connection, target.command_id, target.attempt_type_id, 1)
+
+
+@event.listens_for(Attempt, "after_delete")
+def _attempt_deleted(mapper, connection, target: Attempt) -> None:
+    if target.is_true:
+        _apply_balance_delta(connection, target.command_id, target.attempt_type_id, -1)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _reject_bulk_attempt_writes(orm_execute_state: ORMExecuteState) -> None:
+    """Массовая запись попыток прошла бы мимо command_balances - отказываем до выполнения."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Attempt:
+        raise InvalidRequestError(
+            "Массовые INSERT/UPDATE/DELETE попыток запрещены: балансы command_balances ведутся "
+            "слушателями ORM-объектов. Добавляйте, меняйте и удаляйте Attempt через сессию "
+            "или пересчитайте балансы (CommandBalancesDAO.rebuild)."
+        )
+
+
 class QuestionInsider(Base):
     """Модель для связи вопросов с инсайдерами"""
     __table_args__ = (
@@ -88,11 +206,11 @@ class QuestionInsider(Base):
     )
     
     question_id: Mapped[int] = mapped_column(ForeignKey('questions.id'), nullable=False)
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False, index=True)
     
     # Связи
-    question: Mapped["Question"] = relationship("Question", back_populates="insiders")
-    user: Mapped["User"] = relationship("User", back_populates="insider_questions")
+    question: Mapped["Question"] = relationship("Question", back_populates="insiders", lazy="raise_on_sql")
+    user: Mapped["User"] = relationship("User", back_populates="insider_questions", lazy="raise_on_sql")
     
     def __repr__(self):
         return f"{self.question_id}"
@@ -1,14 +1,17 @@
-from typing import Tuple
+from typing import Dict, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
 from app.auth.dao import CommandsDAO, EventsDAO, UsersDAO
-from app.auth.models import Command, CommandsUser, Language, User
+from app.auth.loading import COMMAND_STATS_PROFILE
+from app.auth.models import Command, Language, User
 from app.dependencies.auth_dep import get_current_event_name, require_role
-from app.dependencies.dao_dep import get_session_with_commit
+from app.dao.base import InvalidCursorError, requested_page_size
+from app.dao.query_stats import query_budget
+from app.dao.writer import db_writer
+from app.dependencies.dao_dep import get_session_without_commit
 from app.dependencies.quest_dep import get_authenticated_user_and_command
 # Import exceptions
 from app.exceptions import (AttemptTypeNotFoundException,
@@ -18,46 +21,68 @@ from app.exceptions import (AttemptTypeNotFoundException,
                             EventNotFoundException, HintUnavailableException,
                             InsufficientCoinsException,
                             InternalServerErrorException,
+                            InvalidCursorException,
                             LanguageMismatchException,
                             QuestionNotAssignedException,
                             RewardAlreadyGivenException,
                             RiddleNotFoundException)
 from app.logger import logger
-from app.quest.dao import (AnswersDAO, AttemptsDAO, BlocksDAO,
-                           QuestionInsiderDAO, QuestionsDAO)
-from app.quest.models import Attempt, Block
-from app.quest.schemas import (AnswerRequest, BlockFilter, BlockStructureInfo,
+from app.quest.content import quest_content
+from app.quest.dao import AttemptsDAO, QuestionInsiderDAO, QuestionsDAO
+from app.quest.loading import QUEST_STRUCTURE_PROFILE
+from app.quest.models import Attempt, AttemptType, Block
+from app.quest.schemas import (AnswerRequest, BlockStructureInfo,
                                CheckAnswerResponse,
                                EventQuestStructureResponse,
-                               FindAnswersForQuestion, GetAllBlocksResponse,
+                               GetAllBlocksResponse,
                                GetBlockResponse, GetCommandsStatsResponse,
                                GetInsiderTasksResponse, HintResponse,
                                MarkAttendanceResponse,
                                MarkInsiderAttendanceRequest,
                                QuestionStructureInfo, RiddleInsidersResponse)
-from app.quest.utils import (build_block_response, compare_strings,
-                             get_riddle_data)
+from app.quest.utils import (build_block_response, get_riddle_data,
+                             load_insider_links, solved_question_ids)
 
 router = APIRouter()
 
 # --- Специфичные GET-маршруты (без path params в корне) --- 
 
 @router.get("/", response_model=GetAllBlocksResponse)
+@query_budget(2, include_riddles=3)
 async def get_all_quest_blocks(
-    session: AsyncSession = Depends(get_session_with_commit),
+    session: AsyncSession = Depends(get_session_without_commit),
     auth_data: Tuple[User, Command] = Depends(get_authenticated_user_and_command),
     include_riddles: bool = False
 ):
-    """Получает все блоки квеста"""
+    """
+    Получает все блоки квеста.
+    Структура и число загадок - из снимка контента; счёт команды, попытки по всем
+    блокам и (с include_riddles) ссылки инсайдеров - по одному запросу, сколько бы блоков ни было.
+    """
     user, command = auth_data
         
     attempts_dao = AttemptsDAO(session)
     team_stats = await attempts_dao.calculate_team_score_and_coins(command.id)
 
-    blocks_dao = BlocksDAO(session)
-    blocks = await blocks_dao.find_all(filters=BlockFilter(language_id=command.language_id))
+    content = await quest_content.get()
+    blocks = content.blocks_for_language(command.language_id)
 
-    block_responses = [await build_block_response(block, command, include_riddles, session) for block in blocks]
+    if include_riddles:
+        questions = [question for block in blocks for question in block.questions]
+        attempt_statuses = await attempts_dao.get_attempts_status_for_block(command.id, [q.id for q in questions])
+        insider_links = await load_insider_links(session, solved_question_ids(questions, attempt_statuses))
+        block_responses = [
+            await build_block_response(
+                block, command, True, session, attempt_statuses=attempt_statuses, insider_links=insider_links
+            )
+            for block in blocks
+        ]
+    else:
+        progress = await attempts_dao.get_block_progress(command.id, [block.id for block in blocks])
+        block_responses = [
+            await build_block_response(block, command, False, session, progress=progress[block.id])
+            for block in blocks
+        ]
 
     return GetAllBlocksResponse(
         ok=True,
@@ -68,12 +93,15 @@ async def get_all_quest_blocks(
     )
 
 @router.get("/commands/stats", response_model=GetCommandsStatsResponse)
+@query_budget(3)
 async def get_commands_stats(
-    session: AsyncSession = Depends(get_session_with_commit),
+    after: Optional[str] = Query(default=None, description="Курсор следующей страницы"),
+    limit: Optional[int] = Query(default=None, ge=1, le=200, description="Размер страницы; без limit и курсора - весь список"),
+    session: AsyncSession = Depends(get_session_without_commit),
     user: User = Depends(require_role(["organizer"])),
     event_name: str = Depends(get_current_event_name)
 ):
-    """Получает статистику по всем командам и решенным ими загадкам"""
+    """Получает страницу статистики команд (по убыванию очков) и решенных ими загадок"""
     logger.info("Начало получения статистики команд")
 
     try:
@@ -85,25 +113,17 @@ async def get_commands_stats(
             logger.error("Не удалось получить информацию о текущем событии")
             raise EventNotFoundException
 
-        commands = await commands_dao.find_all_by_event(
+        # Балансы приходят тем же запросом из command_balances, сортировка и страница - в БД
+        page = await commands_dao.find_stats_page(
             curr_event_id,
-            options=[
-                selectinload(Command.users).joinedload(CommandsUser.user),
-                selectinload(Command.users).joinedload(CommandsUser.role),
-                selectinload(Command.language)
-            ]
+            after=after,
+            limit=requested_page_size(limit, after),
+            options=COMMAND_STATS_PROFILE
         )
-        logger.info(f"Найдено команд: {len(commands)}")
+        logger.info(f"Найдено команд на странице: {len(page.items)}")
 
         stats = []
-        attempts_dao = AttemptsDAO(session)
-        for command in commands:
-            logger.info(f"Обработка команды: {command.name}")
-            command_stats = await attempts_dao.calculate_team_score_and_coins(command.id)
-            
-            solved_riddles_count = await attempts_dao.get_solved_riddles_count_for_command(command.id)
-            logger.info(f"Команда {command.name} решила загадок: {solved_riddles_count}")
-
+        for command, score, coins, solved_riddles_count, *_ in page.items:
             participants = [
                 {
                     "id": user_assoc.user.id,
@@ -113,23 +133,22 @@ async def get_commands_stats(
                 for user_assoc in command.users
             ]
 
-            logger.info(f"Собрана информация о команде {command.name}: участников - {len(participants)}, решено загадок - {solved_riddles_count}, очки - {command_stats['score']}, монеты - {command_stats['coins']}")
             stats.append({
                 "id": command.id,
                 "name": command.name,
                 "language": command.language.name if command.language else "default",
-                "score": command_stats["score"],
-                "coins": command_stats["coins"],
+                "score": score,
+                "coins": coins,
                 "solved_riddles_count": solved_riddles_count,
                 "participants_count": len(command.users),
                 "participants": participants
             })
+        logger.info("Статистика команд успешно собрана")
+
+        return GetCommandsStatsResponse(ok=True, stats=stats, next_cursor=page.next_cursor)
         
-        stats.sort(key=lambda x: x["score"], reverse=True)
-        logger.info("Статистика команд успешно собрана и отсортирована")
-        
-        return GetCommandsStatsResponse(ok=True, stats=stats)
-        
+    except InvalidCursorError:
+        raise InvalidCursorException
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
@@ -139,7 +158,7 @@ async def get_commands_stats(
 @router.get("/insiders/tasks/status", response_model=GetInsiderTasksResponse)
 async def get_insider_tasks_status(
     command_id: int,
-    session: AsyncSession = Depends(get_session_with_commit),
+    session: AsyncSession = Depends(get_session_without_commit),
     scanner_user: User = Depends(require_role(["insider", "organizer", "ctc"]))
 ):
     """
@@ -206,19 +225,20 @@ async def get_insider_tasks_status(
 # --- Маршруты с Path Parameters --- 
 
 @router.get("/{block_id}", response_model=GetBlockResponse)
+@query_budget(3)
 async def get_quest_block(
     block_id: int,
-    session: AsyncSession = Depends(get_session_with_commit),
+    session: AsyncSession = Depends(get_session_without_commit),
     auth_data: Tuple[User, Command] = Depends(get_authenticated_user_and_command)
 ):
-    """Получает конкретный блок квеста по его ID"""
+    """Получает конкретный блок квеста по его ID: счёт команды, статусы попыток и ссылки инсайдеров - три запроса"""
     user, command = auth_data
 
     attempts_dao = AttemptsDAO(session)
     team_stats = await attempts_dao.calculate_team_score_and_coins(command.id)
 
-    blocks_dao = BlocksDAO(session)
-    block = await blocks_dao.find_one_or_none_by_id(block_id)
+    content = await quest_content.get()
+    block = content.blocks.get(block_id)
     
     if not block:
         raise BlockNotFoundException
@@ -236,11 +256,40 @@ async def get_quest_block(
         block=block_response
     )
 
+async def _record_answer_attempt(
+    session: AsyncSession, user_id: int, command_id: int, question_id: int, kind: str, attempt_text: str
+) -> None:
+    """
+    Задание db_writer: проверяет, что загадка ещё не решена командой, и записывает попытку
+    kind ("question" или "insider"; с суффиксом _hint, если команда брала подсказку).
+    """
+    attempts_dao = AttemptsDAO(session)
+    if await attempts_dao.has_successful_solve_attempt(command_id, question_id):
+        raise RewardAlreadyGivenException
+    if kind == "insider" and await attempts_dao.has_successful_insider_attempt(command_id, question_id):
+        raise RewardAlreadyGivenException
+    has_hint = await attempts_dao.has_successful_attempt_of_type(command_id, question_id, "hint")
+    attempt_type_name = f"{kind}_hint" if has_hint else kind
+    attempt_type = await attempts_dao.get_attempt_type_by_name(attempt_type_name)
+    if not attempt_type:
+        logger.error(f"Attempt type '{attempt_type_name}' not found in DB.")
+        raise AttemptTypeNotFoundException
+    session.add(Attempt(
+        user_id=user_id,
+        command_id=command_id,
+        question_id=question_id,
+        attempt_type_id=attempt_type.id,
+        attempt_text=attempt_text,
+        is_true=True
+    ))
+
+
 @router.post("/riddles/{riddle_id}/check-answer", response_model=CheckAnswerResponse)
+@query_budget(8)
 async def check_answer(
     riddle_id: int,
     answer_data: AnswerRequest,
-    session: AsyncSession = Depends(get_session_with_commit),
+    session: AsyncSession = Depends(get_session_without_commit),
     auth_data: Tuple[User, Command] = Depends(get_authenticated_user_and_command)
 ):
     """
@@ -250,120 +299,50 @@ async def check_answer(
     try:
         logger.info(f"Начало проверки ответа. Пользователь: {user.id}, Загадка: {riddle_id}")
         
-        questions_dao = QuestionsDAO(session)
-        question = await questions_dao.find_one_or_none_by_id(riddle_id)
+        content = await quest_content.get()
+        question = content.questions.get(riddle_id)
         if not question:
             raise RiddleNotFoundException
         
         attempts_dao = AttemptsDAO(session)
-
-        if await attempts_dao.has_successful_solve_attempt(command.id, question.id):
-             raise RewardAlreadyGivenException
-        
         user_answer = answer_data.answer
-        answers_dao = AnswersDAO(session)
-        answers = await answers_dao.find_all(filters=FindAnswersForQuestion(question_id=riddle_id))
-        
-        # Проверяем основной ответ
-        is_correct = any(compare_strings(user_answer, answer.answer_text) for answer in answers)
-        has_additional = any(answer.additional_field_value for answer in answers)
-        needs_additional_input = False
-        additional_correct = False
-        
-        has_hint = await attempts_dao.has_successful_attempt_of_type(command.id, question.id, "hint")
-        attempt_type_name = "question_hint" if has_hint else "question"
-        attempt_type = await attempts_dao.get_attempt_type_by_name(attempt_type_name)
-        if not attempt_type:
-            logger.error(f"Attempt type '{attempt_type_name}' not found in DB.")
-            raise AttemptTypeNotFoundException
-
-        # Если основной ответ правильный и есть дополнительное поле, но оно не прислано
-        if is_correct and has_additional and not answer_data.additional_field:
-            # Создаем обычную попытку (основной ответ)
-            attempt = Attempt(
-                user_id=user.id,
-                command_id=command.id,
-                question_id=question.id,
-                attempt_type_id=attempt_type.id,
-                attempt_text=user_answer,
-                is_true=True
-            )
-            session.add(attempt)
-            await session.commit()
-            team_stats = await attempts_dao.calculate_team_score_and_coins(command.id)
-            attempt_statuses = await attempts_dao.get_attempts_status_for_block(command.id, [question.id])
-            updated_riddle_data = await get_riddle_data(question, attempt_statuses, session)
-            return CheckAnswerResponse(
-                ok=True,
-                isCorrect=True,
-                needsAdditionalInput=True,
-                updatedRiddle=updated_riddle_data,
-                team_score=team_stats["score"],
-                team_coins=team_stats["coins"]
-            )
-        
-        # Если основной ответ правильный и есть дополнительное поле, и оно прислано
+        # Проверяем основной ответ по заранее нормализованным вариантам
+        is_correct = question.answer_index.matches(user_answer)
+        has_additional = question.has_additional_field
+        needs_additional_input = is_correct and has_additional and not answer_data.additional_field
+        # С дополнительным полем ответ засчитывается, только если верно и оно
+        answer_accepted = is_correct
+
+        # Какую попытку записать: основной ответ или (при верном дополнительном поле) insider/insider_hint
+        attempt_kind, attempt_text = None, None
         if is_correct and has_additional and answer_data.additional_field:
-            # Проверяем дополнительное поле
-            additional_correct = any(
-                compare_strings(answer_data.additional_field, answer.additional_field_value)
-                for answer in answers if answer.additional_field_value
-            )
-            if additional_correct:
-                # Создаем вторую попытку типа insider/insider_hint
-                insider_type_name = "insider_hint" if has_hint else "insider"
-                insider_type = await attempts_dao.get_attempt_type_by_name(insider_type_name)
-                if not insider_type:
-                    logger.error(f"Attempt type '{insider_type_name}' not found in DB.")
-                    raise AttemptTypeNotFoundException
-                insider_attempt = Attempt(
-                    user_id=user.id,
-                    command_id=command.id,
-                    question_id=question.id,
-                    attempt_type_id=insider_type.id,
-                    attempt_text=answer_data.additional_field,
-                    is_true=True
+            answer_accepted = question.answer_index.matches_additional(answer_data.additional_field)
+            if answer_accepted:
+                attempt_kind, attempt_text = "insider", answer_data.additional_field
+        elif is_correct:
+            attempt_kind, attempt_text = "question", user_answer
+
+        if attempt_kind is not None:
+            # Проверка "уже решено" и вставка - одно задание писателя: параллельные ответы команды
+            # видят записи друг друга и не получают награду дважды
+            await db_writer.submit(
+                lambda write_session: _record_answer_attempt(
+                    write_session, user.id, command.id, question.id, attempt_kind, attempt_text
                 )
-                session.add(insider_attempt)
-                await session.commit()
-            team_stats = await attempts_dao.calculate_team_score_and_coins(command.id)
-            attempt_statuses = await attempts_dao.get_attempts_status_for_block(command.id, [question.id])
-            updated_riddle_data = await get_riddle_data(question, attempt_statuses, session)
-            return CheckAnswerResponse(
-                ok=True,
-                isCorrect=additional_correct,
-                needsAdditionalInput=False,
-                updatedRiddle=updated_riddle_data,
-                team_score=team_stats["score"],
-                team_coins=team_stats["coins"]
             )
-        
-        # Обычная логика (нет дополнительного поля)
-        if is_correct:
-            attempt = Attempt(
-                user_id=user.id,
-                command_id=command.id,
-                question_id=question.id,
-                attempt_type_id=attempt_type.id,
-                attempt_text=user_answer,
-                is_true=True
-            )
-            session.add(attempt)
-            await session.commit()
+        elif await attempts_dao.has_successful_solve_attempt(command.id, question.id):
+            raise RewardAlreadyGivenException
+
         team_stats = await attempts_dao.calculate_team_score_and_coins(command.id)
         updated_riddle_data = None
         if is_correct:
-            question = await questions_dao.find_one_or_none_by_id(riddle_id)
-            if not question:
-                logger.error(f"Question {riddle_id} disappeared after commit in check_answer for command {command.id}")
-            else: 
-                attempt_statuses = await attempts_dao.get_attempts_status_for_block(command.id, [question.id])
-                updated_riddle_data = await get_riddle_data(question, attempt_statuses, session)
+            attempt_statuses = await attempts_dao.get_attempts_status_for_block(command.id, [question.id])
+            updated_riddle_data = await get_riddle_data(question, attempt_statuses, session)
         return CheckAnswerResponse(
             ok=True,
-            isCorrect=is_correct,
-            needsAdditionalInput=False,
-            updatedRiddle=updated_riddle_data, 
+            isCorrect=answer_accepted,
+            needsAdditionalInput=needs_additional_input,
+            updatedRiddle=updated_riddle_data,
             team_score=team_stats["score"],
             team_coins=team_stats["coins"]
         )
@@ -374,10 +353,35 @@ async def check_answer(
         await session.rollback()
         raise InternalServerErrorException
 
+async def _buy_hint(
+    session: AsyncSession, user_id: int, command_id: int, question_id: int, attempt_type: AttemptType
+) -> Dict[str, int]:
+    """
+    Задание db_writer: повторно проверяет подсказку и монеты команды и списывает их.
+    Возвращает счёт и монеты команды после покупки.
+    """
+    attempts_dao = AttemptsDAO(session)
+    if not await attempts_dao.has_successful_attempt_of_type(command_id, question_id, "hint"):
+        team_stats = await attempts_dao.calculate_team_score_and_coins(command_id)
+        if team_stats["coins"] < abs(attempt_type.money):
+            raise InsufficientCoinsException
+        session.add(Attempt(
+            user_id=user_id,
+            command_id=command_id,
+            question_id=question_id,
+            attempt_type_id=attempt_type.id,
+            attempt_text="hint_request",
+            is_true=True
+        ))
+        await session.flush()
+    return await attempts_dao.calculate_team_score_and_coins(command_id)
+
+
 @router.get("/riddles/{riddle_id}/hint", response_model=HintResponse)
+@query_budget(7)
 async def get_hint(
     riddle_id: int,
-    session: AsyncSession = Depends(get_session_with_commit),
+    session: AsyncSession = Depends(get_session_without_commit),
     auth_data: Tuple[User, Command] = Depends(get_authenticated_user_and_command)
 ):
     """
@@ -394,44 +398,25 @@ async def get_hint(
             logger.error("Не найден тип попытки 'hint'.")
             raise AttemptTypeNotFoundException
         
-        questions_dao = QuestionsDAO(session)
-        question = await questions_dao.find_one_or_none_by_id(riddle_id)
+        content = await quest_content.get()
+        question = content.questions.get(riddle_id)
         if not question:
             raise RiddleNotFoundException
         if not question.hint_path:
              raise HintUnavailableException
 
-        existing_hint_attempt = await attempts_dao.has_successful_attempt_of_type(command.id, question.id, "hint")        
-        team_stats = await attempts_dao.calculate_team_score_and_coins(command.id)
-
-        if existing_hint_attempt:
-            return HintResponse(
-                ok=True,
-                hint=question.hint_path,
-                team_score=team_stats["score"],
-                team_coins=team_stats["coins"]
+        # Повторный просмотр уже купленной подсказки не ждёт писателя
+        if await attempts_dao.has_successful_attempt_of_type(command.id, question.id, "hint"):
+            team_stats = await attempts_dao.calculate_team_score_and_coins(command.id)
+        else:
+            team_stats = await db_writer.submit(
+                lambda write_session: _buy_hint(write_session, user.id, command.id, question.id, attempt_type)
             )
-
-        if team_stats["coins"] < abs(attempt_type.money):
-            raise InsufficientCoinsException
-
-        attempt = Attempt(
-            user_id=user.id,
-            command_id=command.id,
-            question_id=question.id,
-            attempt_type_id=attempt_type.id,
-            attempt_text="hint_request",
-            is_true=True
-        )
-        session.add(attempt)
-        await session.commit()
-
-        team_stats_updated = await attempts_dao.calculate_team_score_and_coins(command.id)
         return HintResponse(
             ok=True,
             hint=question.hint_path,
-            team_score=team_stats_updated["score"],
-            team_coins=team_stats_updated["coins"]
+            team_score=team_stats["score"],
+            team_coins=team_stats["coins"]
         )
 
     except HTTPException as http_exc:
@@ -444,7 +429,7 @@ async def get_hint(
 @router.get("/riddles/{riddle_id}/insiders", response_model=RiddleInsidersResponse)
 async def get_riddle_insiders(
     riddle_id: int,
-    session: AsyncSession = Depends(get_session_with_commit),
+    session: AsyncSession = Depends(get_session_without_commit),
     user: User = Depends(require_role(["organizer"]))
 ):
     """
@@ -489,10 +474,57 @@ async def get_riddle_insiders(
 
 # --- POST маршруты --- 
 
+async def _record_insider_attendance(
+    session: AsyncSession, request: MarkInsiderAttendanceRequest, scanner_user_id: int
+) -> str:
+    """Задание db_writer: проверяет, можно ли отметить посещение, и записывает попытку. Возвращает её тип."""
+    attempts_dao = AttemptsDAO(session)
+    already_marked = await attempts_dao.has_successful_insider_attempt(
+        command_id=request.command_id,
+        question_id=request.question_id
+    )
+    if already_marked:
+        logger.warning(f"Посещение вопроса {request.question_id} для команды {request.command_id} уже было отмечено")
+        raise AttendanceAlreadyMarkedException
+        
+    is_solved_by_team = await attempts_dao.has_successful_solve_attempt(
+        command_id=request.command_id,
+        question_id=request.question_id
+    )
+    if not is_solved_by_team:
+        logger.warning(f"Попытка отметить посещение нерешенной загадки {request.question_id} для команды {request.command_id}")
+        raise CannotMarkUnsolvedException
+    
+    hint_was_used_for_solving = await attempts_dao.has_successful_attempt_of_type(
+        command_id=request.command_id,
+        question_id=request.question_id,
+        attempt_type_name="question_hint"
+    )
+    
+    attempt_type_name = "insider_hint" if hint_was_used_for_solving else "insider"
+    logger.info(f"Определен тип отметки инсайдера: {attempt_type_name}")
+    
+    attempt_type = await attempts_dao.get_attempt_type_by_name(attempt_type_name)
+    if not attempt_type:
+        logger.error(f"Не удалось найти ID для типа попытки {attempt_type_name}")
+        raise AttemptTypeNotFoundException
+        
+    new_attempt = Attempt(
+        user_id=request.scanned_user_id,
+        command_id=request.command_id,
+        question_id=request.question_id,
+        attempt_type_id=attempt_type.id,
+        is_true=True,
+        attempt_text=f"Marked by insider {scanner_user_id}"
+    )
+    session.add(new_attempt)
+    return attempt_type_name
+
+
 @router.post("/insiders/attendance/mark", response_model=MarkAttendanceResponse)
 async def mark_insider_attendance(
     request: MarkInsiderAttendanceRequest,
-    session: AsyncSession = Depends(get_session_with_commit),
+    session: AsyncSession = Depends(get_session_without_commit),
     scanner_user: User = Depends(require_role(["insider", "organizer", "ctc"]))
 ):
     """
@@ -503,10 +535,8 @@ async def mark_insider_attendance(
     
     try:
         q_insider_dao = QuestionInsiderDAO(session)
-        attempts_dao = AttemptsDAO(session)
-        questions_dao = QuestionsDAO(session)
         
-        question = await questions_dao.find_one_or_none_by_id(request.question_id)
+        question = (await quest_content.get()).questions.get(request.question_id)
         if not question:
             logger.error(f"Question {request.question_id} not found during insider marking for command {request.command_id}")
             raise RiddleNotFoundException 
@@ -521,56 +551,23 @@ async def mark_insider_attendance(
             logger.warning(f"Вопрос {request.question_id} не назначен инсайдеру {scanner_user.id}")
             raise QuestionNotAssignedException
             
-        already_marked = await attempts_dao.has_successful_insider_attempt(
-            command_id=request.command_id,
-            question_id=request.question_id
-        )
-        if already_marked:
-            logger.warning(f"Посещение вопроса {request.question_id} для команды {request.command_id} уже было отмечено")
-            raise AttendanceAlreadyMarkedException
-            
-        is_solved_by_team = await attempts_dao.has_successful_solve_attempt(
-            command_id=request.command_id,
-            question_id=request.question_id
+        # Проверки "уже отмечено" / "решена ли загадка" и вставка - одно задание писателя:
+        # два инсайдера, сканирующие команду одновременно, не начислят награду дважды
+        attempt_type_name = await db_writer.submit(
+            lambda write_session: _record_insider_attendance(write_session, request, scanner_user.id)
         )
-        if not is_solved_by_team:
-            logger.warning(f"Попытка отметить посещение нерешенной загадки {request.question_id} для команды {request.command_id}")
-            raise CannotMarkUnsolvedException
-        
-        hint_was_used_for_solving = await attempts_dao.has_successful_attempt_of_type(
-            command_id=request.command_id,
-            question_id=request.question_id,
-            attempt_type_name="question_hint"
-        )
-        
-        attempt_type_name = "insider_hint" if hint_was_used_for_solving else "insider"
-        logger.info(f"Определен тип отметки инсайдера: {attempt_type_name}")
-        
-        attempt_type = await attempts_dao.get_attempt_type_by_name(attempt_type_name)
-        if not attempt_type:
-            logger.error(f"Не удалось найти ID для типа попытки {attempt_type_name}")
-            raise AttemptTypeNotFoundException
-            
-        new_attempt = Attempt(
-            user_id=request.scanned_user_id,
-            command_id=request.command_id,
-            question_id=request.question_id,
-            attempt_type_id=attempt_type.id,
-            is_true=True,
-            attempt_text=f"Marked by insider {scanner_user.id}" 
-        )
-        session.add(new_attempt)
-        await session.commit()
         
         logger.info(f"Посещение вопроса {request.question_id} для команды {request.command_id} успешно отмечено инсайдером {scanner_user.id} с типом {attempt_type_name}")
         
         # --- Check for insider block completion --- 
         try:
-            completed = await attempts_dao.try_complete_insider_block(
-                command_id=request.command_id,
-                block_id=block_id,
-                user_id=request.scanned_user_id,
-                last_question_id=request.question_id
+            completed = await db_writer.submit(
+                lambda write_session: AttemptsDAO(write_session).try_complete_insider_block(
+                    command_id=request.command_id,
+                    block_id=block_id,
+                    user_id=request.scanned_user_id,
+                    last_question_id=request.question_id
+                )
             )
             if completed:
                 logger.info(f"Insider block {block_id} completed by command {request.command_id} after marking question {request.question_id}")
@@ -590,7 +587,7 @@ async def mark_insider_attendance(
 @router.get("/events/{event_name}/answers", response_model=EventQuestStructureResponse)
 async def get_event_quest_structure(
     event_name: str,
-    session: AsyncSession = Depends(get_session_with_commit),
+    session: AsyncSession = Depends(get_session_without_commit),
 ):
     """
     Возвращает полную структуру блоков и загадок для указанного события.
@@ -627,7 +624,7 @@ async def get_event_quest_structure(
         stmt = (
             select(Block)
             .where(Block.language_id.in_(event_language_ids))
-            .options(selectinload(Block.questions))
+            .options(*QUEST_STRUCTURE_PROFILE)
             # .order_by(Block.order) # Сортировка будет применена позже
         )
         result = await session.execute(stmt)
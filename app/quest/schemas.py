@@ -148,6 +148,7 @@ class CommandStats(BaseModel):
 class GetCommandsStatsResponse(BaseModel):
     ok: bool
     stats: List[CommandStats]
+    next_cursor: Optional[str] = None
 
 class AnswerInfo(BaseModel):
     id: int
@@ -258,6 +259,7 @@ class CommandStats(BaseModel):
 
 class GetCommandsStatsResponse(BaseModel):
     stats: List[CommandStats]
+    next_cursor: Optional[str] = None
 
 # --- Схемы для структуры квеста (организатор) ---
 class QuestionStructureInfo(BaseModel):
@@ -1,25 +1,27 @@
-import re
+from typing import Dict, Iterable, List, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth.models import Command
-from app.quest.models import Block, Question
-from app.quest.dao import QuestionsDAO, QuestionInsiderDAO, AttemptsDAO
-from app.quest.schemas import FindQuestionsForBlock
+from app.quest.content import BlockContent, QuestionContent
+from app.quest.dao import QuestionInsiderDAO, AttemptsDAO
 from app.logger import logger
 
-
-def normalize_text(text: str) -> set[str]:
-    # Извлекаем слова и сразу возвращаем множество
-    return set(re.findall(r'\b\w+\b', text.lower()))
-
-def compare_strings(str1: str, str2: str) -> bool:
-    # Сравниваем множества слов
-    return normalize_text(str1) == normalize_text(str2)
-
 # --- Вспомогательные функции для сборки ответа --- 
 
-async def build_block_response(block: Block, command: Command, include_riddles: bool = False, session: AsyncSession = None) -> dict:
-    """Создание структуры ответа для блока (принимает command) -- Теперь в utils"""
+async def build_block_response(
+    block: BlockContent,
+    command: Command,
+    include_riddles: bool = False,
+    session: AsyncSession = None,
+    progress: Optional[Dict[str, int]] = None,
+    attempt_statuses: Optional[dict] = None,
+    insider_links: Optional[Dict[int, List[str]]] = None,
+) -> dict:
+    """
+    Создание структуры ответа для блока из снимка контента; из БД читаются только попытки команды.
+    progress (счётчики get_block_progress), attempt_statuses и insider_links можно загрузить
+    заранее сразу для всех блоков - тогда для блока запросов не выполняется.
+    """
     if not session:
         logger.error("Сессия не передана в build_block_response")
         # Лучше выбросить исключение или вернуть ошибку явно
@@ -30,9 +32,6 @@ async def build_block_response(block: Block, command: Command, include_riddles:
             "error": "Failed to calculate progress (no session)"
         }
 
-    questions_dao = QuestionsDAO(session)
-    attempts_dao = AttemptsDAO(session)
-
     response = {
         "id": block.id,
         "title": block.title,
@@ -40,20 +39,45 @@ async def build_block_response(block: Block, command: Command, include_riddles:
     }
     if include_riddles:
         # Вызываем get_riddles_for_block (определение ниже)
-        response['riddles'] = await get_riddles_for_block(block.id, session, command.id)
+        response['riddles'] = await get_riddles_for_block(block, session, command.id, attempt_statuses, insider_links)
     else:
-        # Используем методы DAO для счетчиков
-        solved = await attempts_dao.get_solved_riddles_count(block.id, command.id)
-        total = await questions_dao.get_total_riddles_count(block.id)
-        insider = await attempts_dao.get_insider_riddles_count(block.id, command.id)
+        if progress is None:
+            progress = (await AttemptsDAO(session).get_block_progress(command.id, [block.id]))[block.id]
+        solved = progress["solved"]
+        total = len(block.questions)
         response['solved_count'] = solved
         response['total_count'] = total
-        response['insider_count'] = insider
+        response['insider_count'] = progress["insider"]
         response['progress'] = round((solved / total) * 100) if total > 0 else 0
     return response
 
-async def get_riddle_data(question: Question, attempt_statuses: dict, session: AsyncSession) -> dict:
-    """Формирует данные загадки, используя предзагруженные статусы попыток -- Теперь в utils."""
+async def load_insider_links(session: AsyncSession, question_ids: List[int]) -> Dict[int, List[str]]:
+    """Ссылки инсайдеров для решённых загадок одним запросом; при ошибке загадки отдаются без ссылок."""
+    if not question_ids:
+        return {}
+    try:
+        return await QuestionInsiderDAO(session).get_geo_links_by_question(question_ids)
+    except Exception as e:
+        logger.error(f"Error fetching insider links for questions {question_ids}: {e}", exc_info=True)
+        return {}
+
+
+def solved_question_ids(questions: Iterable[QuestionContent], attempt_statuses: dict) -> List[int]:
+    solved = attempt_statuses.get("solved", set())
+    return [question.id for question in questions if question.id in solved]
+
+
+async def get_riddle_data(
+    question: QuestionContent,
+    attempt_statuses: dict,
+    session: AsyncSession,
+    insider_links: Optional[Dict[int, List[str]]] = None,
+) -> dict:
+    """
+    Формирует данные загадки, используя предзагруженные статусы попыток.
+    insider_links - ссылки инсайдеров, загруженные для списка загадок (load_insider_links);
+    без них ссылки решённой загадки загружаются отдельным запросом.
+    """
     # Получаем статусы из словаря
     solved = question.id in attempt_statuses.get("solved", set())
     has_hint = question.id in attempt_statuses.get("hint_used", set())
@@ -61,38 +85,19 @@ async def get_riddle_data(question: Question, attempt_statuses: dict, session: A
 
     if solved:
         # Для решенных загадок возвращаем полные данные
-        
-        # --- Get insider links (plural) --- 
-        insider_links = [] # Initialize as list
-        try:
-            insider_dao = QuestionInsiderDAO(session)
-            insiders_with_info = await insider_dao.find_by_question_id_with_user_and_info(question.id)
-            
-            if insiders_with_info:
-                for qi in insiders_with_info: # Iterate through all found insiders
-                    insider_user = qi.user
-                    if insider_user and insider_user.insider_info and insider_user.insider_info.geo_link:
-                        insider_links.append(insider_user.insider_info.geo_link) # Add link to list
-                        logger.debug(f"Insider link found for question {question.id}: {insider_user.insider_info.geo_link}")
-                    else:
-                        logger.warning(f"Insider {qi.id} found for question {question.id}, but no user, insider_info, or geo_link.")
-            else:
-                 logger.debug(f"No insiders found for question {question.id}.")
-                 
-            if not insider_links:
-                 logger.debug(f"No valid insider links collected for question {question.id}.")
-                 
-        except Exception as e:
-            logger.error(f"Error fetching insider links for question {question.id}: {e}", exc_info=True)
-        # --- End get insider links ---
-        
+        if insider_links is None:
+            insider_links = await load_insider_links(session, [question.id])
+        question_links = insider_links.get(question.id, [])
+        if not question_links:
+            logger.debug(f"No valid insider links collected for question {question.id}.")
+
         return {
             "id": question.id,
             "title": question.title,
             "text_answered": question.text_answered,
             "image_path_answered": question.image_path_answered,
             "geo_answered": question.geo_answered,
-            "insiderLinks": insider_links, # Use the new list field name
+            "insiderLinks": question_links,
             "has_insider_attempt": has_insider_attempt,
             "has_hint": has_hint and question.hint_path is not None,
             "hint": question.hint_path if has_hint else None
@@ -106,27 +111,30 @@ async def get_riddle_data(question: Question, attempt_statuses: dict, session: A
             "hint": question.hint_path if has_hint else None
         }
 
-async def get_riddles_for_block(block_id: int, session: AsyncSession, command_id: int) -> list:
+async def get_riddles_for_block(
+    block: BlockContent,
+    session: AsyncSession,
+    command_id: int,
+    attempt_statuses: Optional[dict] = None,
+    insider_links: Optional[Dict[int, List[str]]] = None,
+) -> list:
     """
-    Получает список вопросов для указанного блока, оптимизируя запросы статусов попыток -- Теперь в utils.
+    Список загадок блока: вопросы из снимка контента, статусы попыток команды и ссылки
+    инсайдеров решённых загадок - по одному запросу (или уже загруженные вызывающим
+    для нескольких блоков сразу).
     """
-    questions_dao = QuestionsDAO(session)
-    attempts_dao = AttemptsDAO(session)
-
-    # 1. Получаем все вопросы для блока
-    questions = await questions_dao.find_all(filters=FindQuestionsForBlock(block_id=block_id))
-    if not questions:
+    if not block.questions:
         return []
 
-    # 2. Собираем ID вопросов
-    question_ids = [q.id for q in questions]
+    if attempt_statuses is None:
+        attempts_dao = AttemptsDAO(session)
+        attempt_statuses = await attempts_dao.get_attempts_status_for_block(command_id, [q.id for q in block.questions])
 
-    # 3. Получаем все статусы попыток для этих вопросов одним запросом
-    attempt_statuses = await attempts_dao.get_attempts_status_for_block(command_id, question_ids)
+    if insider_links is None:
+        insider_links = await load_insider_links(session, solved_question_ids(block.questions, attempt_statuses))
 
-    # 4. Формируем результат, передавая каждой загадке общий словарь статусов и сессию
     result = []
-    for question in questions:
-        result.append(await get_riddle_data(question, attempt_statuses, session))
+    for question in block.questions:
+        result.append(await get_riddle_data(question, attempt_statuses, session, insider_links))
 
     return result
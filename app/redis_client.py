@@ -0,0 +1,141 @@
+"""
+Общий клиент Redis процесса.
+
+Все компоненты (кэш fastapi-cache, сессии, кэш аутентификации) берут клиент
+через redis_clients.get() и работают поверх одного BlockingConnectionPool:
+ограниченное число соединений (REDIS_MAX_CONNECTIONS), таймауты сокетов и
+повтор команд с экспоненциальной задержкой при обрыве соединения.
+Фоновая задача раз в REDIS_HEALTH_CHECK_INTERVAL секунд выполняет PING и
+обновляет метрики; при остановке приложения пул закрывается.
+
+REDIS_FAKE = True подменяет Redis на fakeredis в памяти процесса (для тестов
+без сервера Redis; нужен пакет fakeredis с lupa - сессии работают на Lua-скриптах).
+"""
+import asyncio
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter, Gauge
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.config import settings
+from app.logger import logger
+
+REDIS_UP = Gauge("redis_up", "Результат последней проверки Redis (1 - отвечает)")
+REDIS_HEALTH_CHECKS = Counter(
+    "redis_health_checks_total",
+    "Проверки доступности Redis",
+    ["result"],
+)
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections",
+    "Соединения общего пула Redis по состоянию",
+    ["state"],
+)
+
+
+class RedisClientRegistry:
+    """Ленивый общий клиент Redis с пулом соединений, проверками доступности и закрытием."""
+
+    def __init__(self):
+        self._client: Optional[Redis] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self.healthy: Optional[bool] = None
+
+    def get(self) -> Redis:
+        """Клиент Redis процесса; создаётся при первом обращении."""
+        if self._client is None:
+            self._client = self._create_fake() if settings.REDIS_FAKE else self._create()
+        return self._client
+
+    @staticmethod
+    def _create() -> Redis:
+        pool = BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            socket_keepalive=True,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            retry=Retry(
+                ExponentialBackoff(cap=settings.REDIS_RETRY_BACKOFF_CAP, base=settings.REDIS_RETRY_BACKOFF_BASE),
+                settings.REDIS_RETRY_ATTEMPTS,
+            ),
+            retry_on_error=[ConnectionError, TimeoutError],
+            encoding="utf-8",
+            decode_responses=True,
+        )
+        logger.info(
+            f"Пул Redis создан: {settings.REDIS_URL}, до {settings.REDIS_MAX_CONNECTIONS} соединений"
+        )
+        return Redis(connection_pool=pool)
+
+    @staticmethod
+    def _create_fake() -> Redis:
+        import fakeredis
+
+        logger.warning("REDIS_FAKE: используется fakeredis в памяти процесса")
+        return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        if self._client is None:
+            return {"in_use": 0, "available": 0, "max": settings.REDIS_MAX_CONNECTIONS}
+        pool = self._client.connection_pool
+        return {
+            "in_use": len(getattr(pool, "_in_use_connections", ())),
+            "available": len(getattr(pool, "_available_connections", ())),
+            "max": pool.max_connections,
+        }
+
+    async def ping(self) -> bool:
+        """Проверка доступности Redis; результат попадает в метрики."""
+        try:
+            await self.get().ping()
+            healthy = True
+        except Exception as e:
+            healthy = False
+            if self.healthy is not False:
+                logger.error(f"Redis не отвечает: {e}")
+        if healthy and self.healthy is False:
+            logger.info("Соединение с Redis восстановлено")
+        self.healthy = healthy
+        REDIS_UP.set(1 if healthy else 0)
+        REDIS_HEALTH_CHECKS.labels(result="ok" if healthy else "error").inc()
+        return healthy
+
+    async def start_health_checks(self) -> None:
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop(), name="redis-health-check")
+
+    async def _health_loop(self) -> None:
+        while True:
+            await self.ping()
+            await asyncio.sleep(settings.REDIS_HEALTH_CHECK_INTERVAL)
+
+    async def close(self) -> None:
+        """Останавливает проверки и закрывает пул (при остановке приложения)."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        if self._client is not None:
+            client, self._client = self._client, None
+            try:
+                await client.aclose()
+                await client.connection_pool.disconnect()
+            except Exception as e:
+                logger.error(f"Ошибка при закрытии пула Redis: {e}")
+            logger.info("Пул Redis закрыт")
+        self.healthy = None
+
+
+redis_clients = RedisClientRegistry()
+
+REDIS_POOL_CONNECTIONS.labels(state="in_use").set_function(lambda: redis_clients.pool_stats()["in_use"])
+REDIS_POOL_CONNECTIONS.labels(state="available").set_function(lambda: redis_clients.pool_stats()["available"])
@@ -13,7 +13,16 @@ from app.config import settings # Import settings
 
 # Initialize Redis broker using settings
 # TODO: Move broker URL to configuration - DONE
-broker = RedisBroker(settings.REDIS_URL)
+# FastStream создаёт собственный пул, поэтому параметры соединений те же, что у общего (app.redis_client)
+broker = RedisBroker(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+    socket_keepalive=True,
+    retry_on_timeout=True,
+    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+)
 # Remove the FastStream app instance as schedule should be on the broker
 # stream_app = FastStream(broker)
 
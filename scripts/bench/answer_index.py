@@ -0,0 +1,148 @@
+"""
+Проверка ответа на загадку: прежний перебор compare_strings по всем вариантам
+(регулярное выражение над каждым вариантом при каждой проверке) против
+AnswerIndex, собранного при загрузке контента (ввод токенизируется один раз,
+поиск ключа в множестве). Запросы к БД за ответами в замер не входят.
+
+    python -m scripts.bench.answer_index [--riddles 200] [--variants 40] [--checks 50000] [--tolerance 2]
+
+Корпус синтетический: у каждой загадки варианты названия места (улица, дом,
+сокращения, порядок слов) и дополнительное поле; проверки - примерно поровну
+правильных ответов и промахов.
+
+Вторая часть - нечёткое сравнение при допуске опечаток --tolerance: ответы с
+одной-двумя опечатками (замена, пропуск, перестановка) и промахи, которые
+проходят весь путь отбора кандидатов. Цель - p99 меньше 1 мс на проверку.
+"""
+import argparse
+import random
+import time
+
+from scripts.bench.common import Timer, format_summary, summarize
+
+from app.quest.matching import AnswerIndex, compare_strings
+
+STREETS = [
+    "Мясницкая", "Покровка", "Маросейка", "Солянка", "Хитровский переулок", "Старая площадь",
+    "Лубянский проезд", "Китайгородский проезд", "Большой Златоустинский", "Армянский переулок",
+]
+PREFIXES = ["улица", "ул", "дом", "д", "строение", "стр", "корпус", "к", "Москва", "г Москва"]
+
+
+def make_corpus(riddles: int, variants: int, rnd: random.Random) -> list:
+    """Загадки как списки пар (answer_text, additional_field_value)."""
+    corpus = []
+    for r in range(riddles):
+        street = STREETS[r % len(STREETS)]
+        house = f"{r + 1}/{r % 9 + 1}"
+        answers = []
+        for v in range(variants):
+            words = [street, house] + rnd.sample(PREFIXES, k=v % 4)
+            rnd.shuffle(words)
+            answers.append((" ".join(words), f"место {r} {v % 3}" if v % 5 == 0 else None))
+        corpus.append(answers)
+    return corpus
+
+
+def make_checks(corpus: list, checks: int, rnd: random.Random) -> list:
+    result = []
+    for _ in range(checks):
+        r = rnd.randrange(len(corpus))
+        text = rnd.choice(corpus[r])[0]
+        if rnd.random() < 0.5:
+            text = text.upper() + " ?"
+        else:
+            text = f"{text} неверно"
+        result.append((r, text))
+    return result
+
+
+def add_typo(text: str, rnd: random.Random) -> str:
+    """Одна случайная опечатка в слове длиннее четырёх букв."""
+    words = text.split()
+    long_words = [i for i, word in enumerate(words) if len(word) > 4 and word.isalpha()]
+    if not long_words:
+        return text
+    i = rnd.choice(long_words)
+    word = words[i]
+    pos = rnd.randrange(1, len(word) - 1)
+    kind = rnd.randrange(3)
+    if kind == 0:
+        word = word[:pos] + rnd.choice("абвгдеклмнопрст") + word[pos + 1:]
+    elif kind == 1:
+        word = word[:pos] + word[pos + 1:]
+    else:
+        word = word[:pos - 1] + word[pos] + word[pos - 1] + word[pos + 1:]
+    words[i] = word
+    return " ".join(words)
+
+
+def make_fuzzy_checks(corpus: list, checks: int, rnd: random.Random) -> list:
+    result = []
+    for _ in range(checks):
+        r = rnd.randrange(len(corpus))
+        text = rnd.choice(corpus[r])[0]
+        if rnd.random() < 0.5:
+            text = add_typo(text, rnd)
+        else:
+            # Промах: ответ другой загадки с опечаткой
+            text = add_typo(rnd.choice(corpus[(r + 1) % len(corpus)])[0], rnd)
+        result.append((r, text))
+    return result
+
+
+def bench_fuzzy(corpus: list, args, rnd: random.Random) -> None:
+    started = time.perf_counter()
+    indexes = [AnswerIndex.build(answers, tolerance=args.tolerance) for answers in corpus]
+    print(f"Построение индекса с допуском {args.tolerance}: "
+          f"{(time.perf_counter() - started) * 1000:.1f} мс")
+
+    samples = []
+    matched = 0
+    for r, text in make_fuzzy_checks(corpus, args.checks, rnd):
+        with Timer(samples):
+            matched += indexes[r].matches(text)
+    stats = summarize(samples)
+    print(format_summary(f"AnswerIndex, допуск {args.tolerance}", stats))
+    print(f"Засчитано {matched} из {args.checks} проверок (около половины - ответы с опечаткой)")
+    if stats["p99"] >= 1.0:
+        print("ВНИМАНИЕ: p99 нечёткой проверки не меньше 1 мс")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--riddles", type=int, default=200)
+    parser.add_argument("--variants", type=int, default=40)
+    parser.add_argument("--checks", type=int, default=50_000)
+    parser.add_argument("--tolerance", type=int, default=2, help="допуск опечаток, 0 - без нечёткой части")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    corpus = make_corpus(args.riddles, args.variants, rnd)
+    checks = make_checks(corpus, args.checks, rnd)
+
+    started = time.perf_counter()
+    indexes = [AnswerIndex.build(answers) for answers in corpus]
+    print(f"Построение индекса: {args.riddles} загадок x {args.variants} вариантов "
+          f"за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    scan_samples, index_samples = [], []
+    mismatches = 0
+    for r, text in checks:
+        with Timer(scan_samples):
+            scanned = any(compare_strings(text, answer_text) for answer_text, _ in corpus[r])
+        with Timer(index_samples):
+            indexed = indexes[r].matches(text)
+        mismatches += scanned != indexed
+    assert mismatches == 0, f"результаты расходятся в {mismatches} проверках"
+
+    print(format_summary("compare_strings по вариантам", summarize(scan_samples)))
+    print(format_summary("AnswerIndex", summarize(index_samples)))
+    print(f"Всего: перебор {sum(scan_samples) * 1000:.0f} мс, индекс {sum(index_samples) * 1000:.0f} мс")
+
+    if args.tolerance > 0:
+        bench_fuzzy(corpus, args, rnd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Микробенчмарк массовых операций BaseDAO: строк в секунду до и после.
+
+    python -m scripts.bench.bulk_ops [--rows 2000]
+
+insert - session.add_all + flush (unit of work)   vs  BaseDAO.add_many (INSERT ... RETURNING)
+update - UPDATE на каждую запись в цикле            vs  BaseDAO.bulk_update (executemany по PK)
+upsert - SELECT, затем INSERT/UPDATE на запись      vs  BaseDAO.upsert_many (ON CONFLICT DO UPDATE)
+"""
+import argparse
+import asyncio
+import time
+
+from scripts.bench.common import quiet_logs, seed, temp_sqlite_url
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.auth.dao import ProgramDAO, UserProfileDAO
+from app.auth.models import Program, User, UserProfile
+from app.dao.database import create_engine_for_url
+
+
+async def legacy_insert(session, user_ids):
+    session.add_all([Program(user_id=user_id, score=1.0, comment="bench") for user_id in user_ids])
+    await session.flush()
+
+
+async def bulk_insert(session, user_ids):
+    await ProgramDAO(session).add_many([{"user_id": user_id, "score": 1.0, "comment": "bench"} for user_id in user_ids])
+
+
+async def legacy_update(session, user_ids):
+    program_ids = (await session.scalars(select(Program.id))).all()
+    for program_id in program_ids:
+        await session.execute(update(Program).filter_by(id=program_id).values(score=2.0))
+
+
+async def bulk_update(session, user_ids):
+    program_ids = (await session.scalars(select(Program.id))).all()
+    await ProgramDAO(session).bulk_update([{"id": program_id, "score": 2.0} for program_id in program_ids])
+
+
+async def legacy_upsert(session, user_ids):
+    for user_id in user_ids:
+        profile = (await session.execute(select(UserProfile).filter_by(user_id=user_id))).scalar_one_or_none()
+        if profile:
+            profile.email = f"{user_id}@example.com"
+        else:
+            session.add(UserProfile(user_id=user_id, email=f"{user_id}@example.com"))
+        await session.flush()
+
+
+async def bulk_upsert(session, user_ids):
+    await UserProfileDAO(session).upsert_many(
+        [{"user_id": user_id, "email": f"{user_id}@example.com"} for user_id in user_ids],
+        index_elements=["user_id"],
+    )
+
+
+CASES = [
+    ("insert", legacy_insert, bulk_insert),
+    ("update", legacy_update, bulk_update),
+    ("upsert", legacy_upsert, bulk_upsert),
+]
+
+
+async def measure(operation, rows: int) -> float:
+    """Выполняет операцию на свежей БД и возвращает строк в секунду."""
+    async with temp_sqlite_url() as url:
+        engine = create_engine_for_url(url)
+        # Пользователей ровно rows: 4 на команду
+        await seed(engine, commands=max(1, rows // 4), blocks=1, questions_per_block=1)
+        maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with maker() as session:
+            user_ids = (await session.scalars(select(User.id))).all()
+            if operation is legacy_update or operation is bulk_update:
+                await bulk_insert(session, user_ids)
+                await session.commit()
+            if operation is legacy_upsert or operation is bulk_upsert:
+                # Половина профилей уже существует - смесь вставок и обновлений
+                await bulk_upsert(session, user_ids[::2])
+                await session.commit()
+        async with maker() as session:
+            started = time.perf_counter()
+            await operation(session, user_ids)
+            await session.commit()
+            elapsed = time.perf_counter() - started
+        await engine.dispose()
+    return len(user_ids) / elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    quiet_logs()
+    print(f"{'операция':<8} {'до, строк/с':>14} {'после, строк/с':>16} {'ускорение':>10}")
+    for name, legacy, bulk in CASES:
+        before = await measure(legacy, args.rows)
+        after = await measure(bulk, args.rows)
+        print(f"{name:<8} {before:>14.0f} {after:>16.0f} {after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
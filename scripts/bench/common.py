@@ -0,0 +1,139 @@
+"""
+Общие помощники для бенчмарков: временная БД SQLite с синтетическими данными
+и простая статистика по замерам.
+
+Запуск бенчмарков из корня репозитория:
+    python -m scripts.bench.<имя_модуля>
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.auth.models import Command, CommandsUser, Event, Language, Role, RoleUserCommand, User
+from app.dao.database import Base
+from app.quest.models import Answer, AttemptType, Block, Question
+
+ATTEMPT_TYPES = [
+    # name, score, money
+    ("question", 10, 0),
+    ("question_hint", 5, 0),
+    ("hint", 0, -1),
+    ("insider", 5, 1),
+    ("insider_hint", 3, 1),
+    ("question_block", 20, 2),
+    ("insider_block", 10, 1),
+    ("money_start", 0, 10),
+]
+
+
+def quiet_logs() -> None:
+    """Отключает логирование DAO, чтобы не искажать замеры выводом в stdout."""
+    logger.remove()
+
+
+@asynccontextmanager
+async def temp_sqlite_url():
+    """Выдаёт URL временной файловой БД SQLite и удаляет её по завершении."""
+    with tempfile.TemporaryDirectory(prefix="hserun_bench_") as tmp:
+        yield f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.sqlite3')}"
+
+
+async def seed(engine: AsyncEngine, commands: int = 50, blocks: int = 6, questions_per_block: int = 8) -> dict:
+    """
+    Создаёт схему и заполняет её синтетическими данными.
+
+    Returns:
+        dict: идентификаторы созданных сущностей (commands, users, questions)
+    """
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with maker() as session:
+        session.add_all([Role(name="guest"), Role(name="organizer"), Role(name="insider")])
+        session.add_all([RoleUserCommand(name="member"), RoleUserCommand(name="captain")])
+        session.add_all([AttemptType(name=n, score=s, money=m, is_active=True) for n, s, m in ATTEMPT_TYPES])
+        event = Event(name="HSERUN29")
+        language = Language(name="Python")
+        session.add_all([event, language])
+        await session.flush()
+
+        question_ids = []
+        for b in range(blocks):
+            block = Block(title=f"Блок {b}", language_id=language.id)
+            session.add(block)
+            await session.flush()
+            for q in range(questions_per_block):
+                question = Question(title=f"Загадка {b}.{q}", block_id=block.id,
+                                    geo_answered=f"geo {b}.{q}", text_answered="текст")
+                session.add(question)
+                await session.flush()
+                session.add(Answer(question_id=question.id, answer_text=f"ответ {b} {q}",
+                                   additional_field_value=f"место {q}"))
+                question_ids.append(question.id)
+
+        command_ids, user_ids = [], []
+        for c in range(commands):
+            command = Command(name=f"Команда {c}", event_id=event.id, language_id=language.id)
+            session.add(command)
+            await session.flush()
+            for u in range(4):
+                user = User(full_name=f"Участник {c}.{u}", telegram_id=c * 10 + u + 1, role_id=1)
+                session.add(user)
+                await session.flush()
+                session.add(CommandsUser(command_id=command.id, user_id=user.id, role_id=2 if u == 0 else 1))
+                user_ids.append(user.id)
+            command_ids.append(command.id)
+        await session.commit()
+
+    return {"commands": command_ids, "users": user_ids, "questions": question_ids}
+
+
+def summarize(samples: list[float]) -> dict:
+    """Возвращает p50/p95/p99 (мс) по списку длительностей в секундах."""
+    if not samples:
+        return {"n": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered) * 1000,
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+    }
+
+
+def format_summary(label: str, stats: dict) -> str:
+    return (f"{label:<28} n={stats['n']:<6} p50={stats['p50']:.2f}ms "
+            f"p95={stats['p95']:.2f}ms p99={stats['p99']:.2f}ms")
+
+
+class Timer:
+    """Контекстный менеджер, добавляющий длительность блока в список."""
+
+    def __init__(self, samples: list[float]):
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self.start)
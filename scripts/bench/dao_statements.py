@@ -0,0 +1,188 @@
+"""
+CPU-время горячих методов DAO на вызов: запрос, собираемый при каждом вызове,
+против заранее построенного запроса с bindparam.
+
+    python -m scripts.bench.dao_statements [--rate 200] [--duration 10]
+
+Нагрузка - «запросы» с частотой --rate в секунду; каждый запрос вызывает все
+методы из CASES по разу (как проверка ответа в /api/quest/answer). Меряется
+time.thread_time() основного потока: построение и компиляция запроса, обработка
+результата. Сам SQLite работает в потоке aiosqlite и в замер не попадает.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from scripts.bench.common import quiet_logs, seed, temp_sqlite_url
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.auth.dao import UsersDAO
+from app.auth.loading import COMMAND_MEMBERS_PROFILE
+from app.auth.models import Command, CommandsUser
+from app.dao.database import create_engine_for_url
+from app.quest.dao import AttemptsDAO, CommandBalancesDAO, QuestionsDAO
+from app.quest.models import Attempt, AttemptType, CommandBalance, Question
+
+
+# Прежние реализации: select() собирается заново при каждом вызове
+
+async def legacy_user_command(session, ids):
+    query = (
+        select(Command)
+        .join(CommandsUser, Command.id == CommandsUser.command_id)
+        .filter(Command.event_id == 1)
+        .filter(CommandsUser.user_id == ids["user_id"])
+        .options(*COMMAND_MEMBERS_PROFILE)
+        .limit(1)
+    )
+    return (await session.execute(query)).unique().scalar_one_or_none()
+
+
+async def legacy_attempt_type_id(session, ids):
+    return (await session.execute(select(AttemptType.id).where(AttemptType.name == "question"))).scalar_one_or_none()
+
+
+async def legacy_solve_attempt(session, ids):
+    query = select(Attempt).join(AttemptType).where(
+        Attempt.command_id == ids["command_id"],
+        Attempt.question_id == ids["question_id"],
+        Attempt.is_true == True,
+        AttemptType.name.in_(["question", "question_hint"])
+    )
+    return (await session.execute(query)).scalar_one_or_none() is not None
+
+
+async def legacy_solved_count(session, ids):
+    query = (
+        select(func.count(Attempt.id))
+        .join(Question, Question.id == Attempt.question_id)
+        .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
+        .where(
+            Question.block_id == ids["block_id"],
+            Attempt.command_id == ids["command_id"],
+            Attempt.is_true == True,
+            AttemptType.name.in_(["question", "question_hint"])
+        )
+    )
+    return (await session.execute(query)).scalar_one()
+
+
+async def legacy_total_count(session, ids):
+    query = select(func.count(Question.id)).where(Question.block_id == ids["block_id"])
+    return (await session.execute(query)).scalar_one()
+
+
+async def legacy_balance(session, ids):
+    query = select(
+        CommandBalance.score, CommandBalance.coins, CommandBalance.solved_count, CommandBalance.version
+    ).where(CommandBalance.command_id == ids["command_id"])
+    return (await session.execute(query)).first()
+
+
+# Текущие методы DAO
+
+async def dao_user_command(session, ids):
+    return await UsersDAO(session).find_user_command_in_event(ids["user_id"])
+
+
+async def dao_attempt_type_id(session, ids):
+    return await AttemptsDAO(session).get_attempt_type_id_by_name("question")
+
+
+async def dao_solve_attempt(session, ids):
+    return await AttemptsDAO(session).has_successful_solve_attempt(ids["command_id"], ids["question_id"])
+
+
+async def dao_solved_count(session, ids):
+    return await AttemptsDAO(session).get_solved_riddles_count(ids["block_id"], ids["command_id"])
+
+
+async def dao_total_count(session, ids):
+    return await QuestionsDAO(session).get_total_riddles_count(ids["block_id"])
+
+
+async def dao_balance(session, ids):
+    return await CommandBalancesDAO(session).get_balance(ids["command_id"])
+
+
+CASES = [
+    ("find_user_command_in_event", legacy_user_command, dao_user_command),
+    ("get_attempt_type_id_by_name", legacy_attempt_type_id, dao_attempt_type_id),
+    ("has_successful_solve_attempt", legacy_solve_attempt, dao_solve_attempt),
+    ("get_solved_riddles_count", legacy_solved_count, dao_solved_count),
+    ("get_total_riddles_count", legacy_total_count, dao_total_count),
+    ("get_balance", legacy_balance, dao_balance),
+]
+
+
+async def run_load(maker, variant: int, ids: dict, rate: int, duration: float) -> dict:
+    """Вызывает методы с заданной частотой и возвращает CPU-время вызовов (сек) по методам."""
+    rng = random.Random(0)
+    samples = {name: [] for name, *_ in CASES}
+    interval = 1 / rate
+    started = time.perf_counter()
+    for n in range(int(rate * duration)):
+        delay = started + n * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        user = rng.randrange(len(ids["users"]))
+        question = rng.randrange(len(ids["questions"]))
+        params = {
+            "user_id": ids["users"][user],
+            "command_id": ids["commands"][user // 4],
+            "question_id": ids["questions"][question],
+            "block_id": ids["blocks"][question // ids["questions_per_block"]],
+        }
+        async with maker() as session:
+            for name, *impls in CASES:
+                cpu = time.thread_time()
+                await impls[variant](session, params)
+                samples[name].append(time.thread_time() - cpu)
+    return samples
+
+
+def stats_us(samples: list) -> tuple:
+    ordered = sorted(samples)
+    return (
+        statistics.fmean(ordered) * 1e6,
+        ordered[len(ordered) // 2] * 1e6,
+        ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1e6,
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=200, help="запросов в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность каждого прогона, сек")
+    args = parser.parse_args()
+
+    quiet_logs()
+    async with temp_sqlite_url() as url:
+        engine = create_engine_for_url(url)
+        ids = await seed(engine, commands=50, blocks=6, questions_per_block=8)
+        ids["questions_per_block"] = 8
+        async with engine.connect() as conn:
+            ids["blocks"] = sorted(set((await conn.execute(select(Question.block_id))).scalars()))
+        maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        # Прогрев: кэш компиляции и пул соединений
+        await run_load(maker, 0, ids, args.rate, 0.5)
+        await run_load(maker, 1, ids, args.rate, 0.5)
+        before = await run_load(maker, 0, ids, args.rate, args.duration)
+        after = await run_load(maker, 1, ids, args.rate, args.duration)
+        await engine.dispose()
+
+    print(f"CPU на вызов, мкс ({args.rate} запросов/с, {args.duration:g} с на прогон)")
+    print(f"{'метод':<30} {'до: mean/p50/p95':>22} {'после: mean/p50/p95':>22} {'ускорение':>10}")
+    for name, *_ in CASES:
+        b, a = stats_us(before[name]), stats_us(after[name])
+        print(f"{name:<30} {'/'.join(f'{v:.0f}' for v in b):>22} {'/'.join(f'{v:.0f}' for v in a):>22} "
+              f"{b[0] / a[0]:>9.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
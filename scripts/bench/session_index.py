@@ -0,0 +1,120 @@
+"""
+Подсчёт, листинг и очистка Redis-сессий: обход KEYS session:* (как было)
+против индекса session_index (ZCOUNT / ZRANGE / выборка истёкших по score).
+Дополнительно меряется задержка get_session, пока другой клиент в цикле
+считает сессии: KEYS блокирует Redis для всех клиентов.
+
+    python -m scripts.bench.session_index [--sessions 100000] [--expired 0.1] [--rounds 20]
+
+Нужен запущенный Redis (REDIS_URL). Все сессии в этой БД Redis удаляются
+по завершении - не запускайте на рабочем Redis.
+"""
+import argparse
+import asyncio
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+
+from scripts.bench.common import Timer, format_summary, quiet_logs, summarize
+
+from app.auth.redis_session import RedisSession, RedisSessionService
+from app.config import settings
+from app.redis_client import redis_clients
+
+
+async def fill(service: RedisSessionService, sessions: int, expired_share: float) -> list:
+    """Создаёт фейковые сессии напрямую пачками (create_session сначала гасит сессии пользователя)."""
+    now = datetime.now(timezone.utc)
+    expired = int(sessions * expired_share)
+    tokens = []
+    for start in range(0, sessions, 1000):
+        async with service.redis.pipeline(transaction=False) as pipe:
+            for i in range(start, min(start + 1000, sessions)):
+                token = secrets.token_urlsafe(32)
+                # Первые expired сессий уже истекли, но ещё не удалены по TTL
+                expires_at = now + (timedelta(seconds=-60) if i < expired else timedelta(hours=1))
+                session = RedisSession(user_id=i + 1, token=token, expires_at=expires_at)
+                pipe.hset(service._get_session_key(token), mapping=session.to_dict())
+                pipe.expire(service._get_session_key(token), int(settings.SESSION_EXPIRE_SECONDS))
+                pipe.sadd(service._get_user_sessions_key(i + 1), token)
+                pipe.zadd(service.session_index_key, {token: expires_at.timestamp()})
+                tokens.append(token)
+            await pipe.execute()
+    return tokens
+
+
+async def timed(rounds: int, action) -> dict:
+    samples = []
+    for _ in range(rounds):
+        with Timer(samples):
+            await action()
+    return summarize(samples)
+
+
+async def lookup_latency(service: RedisSessionService, tokens: list, background, duration: float) -> dict:
+    """Задержка get_session, пока background выполняется в цикле."""
+    samples = []
+    stop = asyncio.Event()
+
+    async def loop_background() -> None:
+        while not stop.is_set():
+            await background()
+
+    task = asyncio.create_task(loop_background())
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        with Timer(samples):
+            await service.get_session(tokens[-1 - i % 1000])
+        i += 1
+    stop.set()
+    await task
+    return summarize(samples)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--expired", type=float, default=0.1, help="доля уже истёкших сессий")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    quiet_logs()
+    service = RedisSessionService(redis_broker=None)
+    pattern = f"{service.session_prefix}*"
+    try:
+        await service.clear_all_sessions()
+        tokens = await fill(service, args.sessions, args.expired)
+
+        async def keys_count():
+            return len(await service.redis.keys(pattern))
+
+        async def keys_page():
+            keys = await service.redis.keys(pattern)
+            async with service.redis.pipeline(transaction=False) as pipe:
+                for key in keys[:50]:
+                    pipe.hgetall(key)
+                await pipe.execute()
+
+        print(format_summary("count KEYS", await timed(args.rounds, keys_count)))
+        print(format_summary("count ZCOUNT", await timed(args.rounds, service.get_session_count)))
+        print(format_summary("page KEYS", await timed(args.rounds, keys_page)))
+        print(format_summary("page ZRANGE", await timed(args.rounds, lambda: service.list_sessions(0, 50))))
+        print(format_summary("get_session + KEYS", await lookup_latency(service, tokens, keys_count, 3.0)))
+        print(format_summary("get_session + ZCOUNT", await lookup_latency(service, tokens, service.get_session_count, 3.0)))
+
+        started = time.perf_counter()
+        cleaned = await service.cleanup_expired_sessions()
+        print(f"cleanup_expired_sessions: {cleaned} сессий за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+        await service.redis.delete(service.session_index_key)
+        started = time.perf_counter()
+        indexed = await service.rebuild_session_index()
+        print(f"rebuild_session_index (SCAN): {indexed} сессий за {(time.perf_counter() - started) * 1000:.1f} мс")
+    finally:
+        await service.clear_all_sessions()
+        await redis_clients.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,172 @@
+"""
+Задержка операций с Redis-сессиями: прежние реализации в несколько обращений
+(HGETALL + разбор в Python + pipeline) против Lua-скриптов RedisSessionService
+(один EVALSHA на операцию): вход с вытеснением прежних сессий, проверка токена,
+продление, выход и выход со всех устройств.
+
+    python -m scripts.bench.session_scripts [--users 2000] [--rounds 5000]
+
+Нужен Redis: локальный redis-server по REDIS_URL или REDIS_FAKE=1 (fakeredis
+с пакетом lupa; цифры тогда показывают только накладные расходы клиента).
+Все сессии в этой БД Redis удаляются по завершении - не запускайте на рабочем Redis.
+"""
+import argparse
+import asyncio
+import random
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+
+from scripts.bench.common import Timer, format_summary, quiet_logs, summarize
+
+from app.auth.redis_session import RedisSession, RedisSessionService
+from app.config import settings
+from app.redis_client import redis_clients
+
+
+async def legacy_deactivate_all(service: RedisSessionService, user_id: int) -> int:
+    user_sessions_key = service._get_user_sessions_key(user_id)
+    tokens = await service.redis.smembers(user_sessions_key)
+    await service._revoke_tokens_before_now(user_id)
+    if not tokens:
+        return 0
+    async with service.redis.pipeline() as pipe:
+        for token in tokens:
+            pipe.delete(service._get_session_key(token))
+        pipe.delete(user_sessions_key)
+        pipe.zrem(service.session_index_key, *tokens)
+        await pipe.execute()
+    return len(tokens)
+
+
+async def legacy_create(service: RedisSessionService, user_id: int) -> str:
+    await legacy_deactivate_all(service, user_id)
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.SESSION_EXPIRE_SECONDS)
+    session = RedisSession(user_id=user_id, token=token, expires_at=expires_at)
+    async with service.redis.pipeline() as pipe:
+        pipe.hset(service._get_session_key(token), mapping=session.to_dict())
+        pipe.expire(service._get_session_key(token), int(settings.SESSION_EXPIRE_SECONDS))
+        pipe.sadd(service._get_user_sessions_key(user_id), token)
+        pipe.expire(service._get_user_sessions_key(user_id), int(settings.SESSION_EXPIRE_SECONDS))
+        pipe.zadd(service.session_index_key, {token: expires_at.timestamp()})
+        await pipe.execute()
+    return token
+
+
+async def legacy_get(service: RedisSessionService, token: str):
+    data = await service.redis.hgetall(service._get_session_key(token))
+    if not data:
+        await service.redis.zrem(service.session_index_key, token)
+        return None
+    session = RedisSession.from_dict(token, data)
+    if not session.is_valid():
+        await legacy_deactivate(service, token)
+        return None
+    return session
+
+
+async def legacy_touch(service: RedisSessionService, token: str) -> bool:
+    session_key = service._get_session_key(token)
+    data = await service.redis.hgetall(session_key)
+    if not data:
+        return False
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.SESSION_EXPIRE_SECONDS)
+    async with service.redis.pipeline() as pipe:
+        pipe.hset(session_key, "expires_at", expires_at.isoformat())
+        pipe.expire(session_key, int(settings.SESSION_EXPIRE_SECONDS))
+        pipe.expire(service._get_user_sessions_key(int(data["user_id"])), int(settings.SESSION_EXPIRE_SECONDS))
+        pipe.zadd(service.session_index_key, {token: expires_at.timestamp()})
+        await pipe.execute()
+    return True
+
+
+async def legacy_deactivate(service: RedisSessionService, token: str) -> bool:
+    session_key = service._get_session_key(token)
+    data = await service.redis.hgetall(session_key)
+    if not data:
+        return False
+    async with service.redis.pipeline() as pipe:
+        pipe.delete(session_key)
+        pipe.srem(service._get_user_sessions_key(int(data["user_id"])), token)
+        pipe.zrem(service.session_index_key, token)
+        await pipe.execute()
+    return True
+
+
+async def run(ops: dict, users: int, rounds: int) -> dict:
+    """Латентность каждой операции; токены создаются заново для каждого набора операций."""
+    rnd = random.Random(0)
+    result = {}
+    tokens = {}
+
+    samples = []
+    for user_id in range(1, users + 1):
+        with Timer(samples):
+            tokens[user_id] = await ops["create"](user_id)
+    result["create"] = summarize(samples)
+
+    for name in ("get", "touch"):
+        samples = []
+        for _ in range(rounds):
+            token = tokens[rnd.randint(1, users)]
+            with Timer(samples):
+                assert await ops[name](token)
+        result[name] = summarize(samples)
+
+    samples = []
+    for user_id in range(1, users // 2 + 1):
+        with Timer(samples):
+            await ops["deactivate"](tokens[user_id])
+    result["deactivate"] = summarize(samples)
+
+    samples = []
+    for user_id in range(users // 2 + 1, users + 1):
+        with Timer(samples):
+            await ops["deactivate_all"](user_id)
+    result["deactivate_all"] = summarize(samples)
+    return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args()
+
+    quiet_logs()
+    settings.SESSION_TOKEN_FORMAT = "opaque"
+    service = RedisSessionService(redis_broker=None)
+    await service.load_scripts()
+    variants = {
+        "pipeline": {
+            "create": lambda user_id: legacy_create(service, user_id),
+            "get": lambda token: legacy_get(service, token),
+            "touch": lambda token: legacy_touch(service, token),
+            "deactivate": lambda token: legacy_deactivate(service, token),
+            "deactivate_all": lambda user_id: legacy_deactivate_all(service, user_id),
+        },
+        "lua": {
+            "create": service.create_session,
+            "get": service.get_session,
+            "touch": service.touch_session,
+            "deactivate": service.deactivate_session,
+            "deactivate_all": service.deactivate_all_sessions,
+        },
+    }
+    backend = "fakeredis" if settings.REDIS_FAKE else settings.REDIS_URL
+    try:
+        for variant, ops in variants.items():
+            await service.clear_all_sessions()
+            started = time.perf_counter()
+            stats = await run(ops, args.users, args.rounds)
+            print(f"{variant} ({backend}), всего {time.perf_counter() - started:.1f} с")
+            for op, summary in stats.items():
+                print(format_summary(f"  {op}", summary))
+    finally:
+        await service.clear_all_sessions()
+        await redis_clients.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Пропускная способность хранилищ сессий (app.auth.session_store): вход
+(create_session), проверка токена (get_session) и выход (deactivate_session)
+для redis, sql и memory.
+
+    python -m scripts.bench.session_stores [--users 2000] [--lookups 20000] [--stores redis,sql,memory]
+
+sql - временная файловая БД SQLite, каждый вход и выход коммитится отдельно,
+как в обработчиках. redis - REDIS_URL (или REDIS_FAKE=1 для fakeredis, тогда
+цифры показывают только накладные расходы клиента); все сессии в этой БД
+Redis удаляются по завершении - не запускайте на рабочем Redis.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from scripts.bench.common import quiet_logs, seed, temp_sqlite_url
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.auth import redis_session
+from app.auth.dao import SessionDAO
+from app.config import settings
+from app.dao.database import create_engine_for_url
+from app.redis_client import redis_clients
+
+
+async def measure(maker, user_ids: list, lookups: int) -> dict:
+    """ops/s для входа, проверки и выхода через SessionDAO."""
+    rnd = random.Random(0)
+    result = {}
+
+    started = time.perf_counter()
+    tokens = []
+    for user_id in user_ids:
+        async with maker() as session:
+            tokens.append(await SessionDAO(session).create_session(user_id))
+            await session.commit()
+    result["create"] = len(user_ids) / (time.perf_counter() - started)
+
+    async with maker() as session:
+        dao = SessionDAO(session)
+        started = time.perf_counter()
+        for _ in range(lookups):
+            assert await dao.get_session(rnd.choice(tokens)) is not None
+        result["get"] = lookups / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for token in tokens:
+        async with maker() as session:
+            await SessionDAO(session).deactivate_session(token)
+            await session.commit()
+    result["deactivate"] = len(tokens) / (time.perf_counter() - started)
+    return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--stores", default="redis,sql,memory")
+    args = parser.parse_args()
+
+    quiet_logs()
+    async with temp_sqlite_url() as url:
+        engine = create_engine_for_url(url)
+        # Пользователи нужны таблице sessions (внешний ключ)
+        ids = await seed(engine, commands=max(1, args.users // 5), blocks=1, questions_per_block=1)
+        user_ids = ids["users"][:args.users]
+        maker = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            for store in args.stores.split(","):
+                settings.SESSION_STORE = store
+                if store == "redis":
+                    await redis_session.init_redis_session_service(redis_broker=None)
+                    await redis_session.redis_session_service.clear_all_sessions()
+                stats = await measure(maker, user_ids, args.lookups)
+                print(f"{store:<8} " + " ".join(f"{op}={ops:,.0f}/s" for op, ops in stats.items()))
+        finally:
+            if redis_session.redis_session_service is not None:
+                await redis_session.redis_session_service.clear_all_sessions()
+                await redis_clients.close()
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
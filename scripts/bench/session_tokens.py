@@ -0,0 +1,75 @@
+"""
+Задержка проверки токена сессии: случайный токен (HGETALL session:<token>)
+против подписанного (HMAC локально + ZSCORE/MGET отзыва одним pipeline).
+
+    python -m scripts.bench.session_tokens [--users 1000] [--requests 20000] [--concurrency 100]
+
+Нужен запущенный Redis (REDIS_URL). Ключи бенчмарка удаляются по завершении
+вместе со всеми сессиями в этой БД Redis - не запускайте на рабочем Redis.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from scripts.bench.common import Timer, format_summary, quiet_logs, summarize
+
+from app.auth.redis_session import RedisSessionService
+from app.auth.signed_tokens import verify_token
+from app.config import settings
+from app.redis_client import redis_clients
+
+
+async def measure(service: RedisSessionService, token_format: str, users: int, requests: int, concurrency: int) -> dict:
+    settings.SESSION_TOKEN_FORMAT = token_format
+    tokens = [await service.create_session(user_id, role_id=1, event_id=1) for user_id in range(1, users + 1)]
+    rnd = random.Random(0)
+    samples = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(rnd.choice(tokens))
+
+    async def client() -> None:
+        while not queue.empty():
+            token = queue.get_nowait()
+            with Timer(samples):
+                session = await service.get_session(token)
+            assert session is not None
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    stats = summarize(samples)
+    stats["rps"] = requests / (time.perf_counter() - started)
+    return stats
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    quiet_logs()
+    settings.SECRET_KEY = settings.SECRET_KEY or "bench-secret"
+    service = RedisSessionService(redis_broker=None)
+    try:
+        for token_format in ("opaque", "signed"):
+            stats = await measure(service, token_format, args.users, args.requests, args.concurrency)
+            print(f"{format_summary(token_format, stats)} rps={stats['rps']:.0f}")
+
+        # Только локальная часть подписанного токена: подпись и срок
+        token = await service.create_session(1)
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            verify_token(token)
+        print(f"verify_token без Redis: {(time.perf_counter() - started) / args.requests * 1e6:.1f} мкс")
+    finally:
+        await service.clear_all_sessions()
+        revoked = [key async for key in service.redis.scan_iter(f"{service.revoked_before_prefix}*")]
+        await service.redis.delete(service.revoked_tokens_key, *revoked)
+        await redis_clients.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
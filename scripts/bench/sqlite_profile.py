@@ -0,0 +1,89 @@
+"""
+Бенчмарк профиля SQLite: пропускная способность записи check-answer
+и задержка чтения счёта команды до и после настройки движка.
+
+    python -m scripts.bench.sqlite_profile [--writers 50] [--readers 20] [--ops 40]
+
+"before" - прежний движок (pool_size=50, max_overflow=300, без PRAGMA),
+"after"  - движок из app.dao.database.create_engine_for_url с настройками из Settings.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from scripts.bench.common import Timer, format_summary, quiet_logs, seed, summarize, temp_sqlite_url
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.dao.database import create_engine_for_url
+from app.quest.dao import AttemptsDAO
+from app.quest.models import Attempt
+
+
+def legacy_engine(url: str):
+    return create_async_engine(url=url, pool_size=50, max_overflow=300)
+
+
+async def run_profile(label: str, make_engine, writers: int, readers: int, ops: int) -> None:
+    async with temp_sqlite_url() as url:
+        engine = make_engine(url)
+        ids = await seed(engine)
+        maker = async_sessionmaker(engine, expire_on_commit=False)
+        write_samples, read_samples = [], []
+        errors = 0
+        writing = True
+
+        async def writer(n: int) -> None:
+            nonlocal errors
+            rnd = random.Random(n)
+            for _ in range(ops):
+                command_id = rnd.choice(ids["commands"])
+                try:
+                    with Timer(write_samples):
+                        # Повторяет путь check-answer: вставка попытки, коммит, пересчёт счёта
+                        async with maker() as session:
+                            session.add(Attempt(command_id=command_id, user_id=rnd.choice(ids["users"]),
+                                                question_id=rnd.choice(ids["questions"]), attempt_type_id=1,
+                                                attempt_text="ответ", is_true=rnd.random() < 0.3))
+                            await session.commit()
+                            await AttemptsDAO(session).calculate_team_score_and_coins(command_id)
+                except OperationalError:
+                    errors += 1
+
+        async def reader(n: int) -> None:
+            rnd = random.Random(10_000 + n)
+            while writing:
+                with Timer(read_samples):
+                    async with maker() as session:
+                        await AttemptsDAO(session).calculate_team_score_and_coins(rnd.choice(ids["commands"]))
+
+        reader_tasks = [asyncio.create_task(reader(i)) for i in range(readers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(writer(i) for i in range(writers)))
+        elapsed = time.perf_counter() - started
+        writing = False
+        await asyncio.gather(*reader_tasks)
+        await engine.dispose()
+
+    ok_writes = len(write_samples) - errors
+    print(f"[{label}] {ok_writes / elapsed:.1f} check-answer/s, ошибок блокировки: {errors}")
+    print("  " + format_summary("check-answer (write)", summarize(write_samples)))
+    print("  " + format_summary("team score (read)", summarize(read_samples)))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=20)
+    parser.add_argument("--ops", type=int, default=40, help="операций на одного писателя")
+    args = parser.parse_args()
+
+    quiet_logs()
+    await run_profile("before", legacy_engine, args.writers, args.readers, args.ops)
+    await run_profile("after", create_engine_for_url, args.writers, args.readers, args.ops)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
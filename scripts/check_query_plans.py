@@ -0,0 +1,243 @@
+"""
+Проверка планов запросов DAO.
+
+Выполняет методы DAO на временной БД SQLite с синтетическими данными,
+перехватывает все SELECT-запросы и прогоняет их через EXPLAIN QUERY PLAN.
+Завершается с кодом 1, если хотя бы один запрос читает таблицу полным
+сканированием (строка плана "SCAN <таблица>" без индекса).
+
+    python -m scripts.check_query_plans [-v]
+
+Небольшие справочники (типы попыток, роли, языки, события) и заведомо
+агрегирующие по всей таблице методы статистики перечислены в исключениях.
+"""
+import argparse
+import asyncio
+import re
+import sqlite3
+import sys
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from scripts.bench.common import quiet_logs, seed, temp_sqlite_url
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.auth.dao import (CommandInviteDAO, CommandsDAO, EventsDAO, InsidersInfoDAO,
+                          ProgramDAO, RolesUsersCommandDAO, SessionDAO, UserProfileDAO, UsersDAO)
+from app.auth.models import Program, Session
+from app.auth.session_store import SqlSessionStore
+from app.config import settings
+from app.dao.database import create_engine_for_url
+from app.quest.dao import AnswersDAO, AttemptsDAO, BlocksDAO, CommandBalancesDAO, QuestionInsiderDAO, QuestionsDAO
+from app.quest.models import Attempt, QuestionInsider
+from app.quest.schemas import BlockFilter, FindAnswersForQuestion
+
+# Справочники из единиц строк: полный просмотр дешевле обращения к индексу
+SMALL_TABLES = {"attempttypes", "roles", "roleusercommands", "languages", "events"}
+
+# Методы, которые по смыслу агрегируют всю таблицу (статистика для организаторов)
+FULL_SCAN_ALLOWED = {
+    "UsersDAO.count_all_users",
+    "UsersDAO.count_users_with_role",
+    "UsersDAO.get_registrations_by_date",
+    "UsersDAO.get_users_by_role",
+    "UsersDAO.count_users_with_unusual_name",
+    "UsersDAO.get_unusual_name_registrations_by_date",
+    "AttemptsDAO.get_question_solve_stats",
+    "AttemptsDAO.get_question_solve_stats_by_language",
+}
+
+SCAN_RE = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+current_method: ContextVar[str] = ContextVar("current_method", default="-")
+
+
+@dataclass
+class CapturedQuery:
+    method: str
+    statement: str
+    parameters: tuple
+    full_scans: list = field(default_factory=list)
+
+
+def dao_calls(ids: dict) -> list:
+    """Список (имя метода, вызов) для проверки. Вызов получает AsyncSession."""
+    command_id = ids["commands"][0]
+    user_id = ids["users"][0]
+    question_id = ids["questions"][0]
+    question_ids = ids["questions"][:8]
+    return [
+        # Квест
+        ("BlocksDAO.find_all", lambda s: BlocksDAO(s).find_all(BlockFilter(language_id=1))),
+        ("QuestionsDAO.find_by_block_id", lambda s: QuestionsDAO(s).find_by_block_id(1)),
+        ("QuestionsDAO.get_questions_by_block", lambda s: QuestionsDAO(s).get_questions_by_block(1)),
+        ("QuestionsDAO.get_total_riddles_count", lambda s: QuestionsDAO(s).get_total_riddles_count(1)),
+        ("QuestionsDAO.get_total_insider_riddles_count", lambda s: QuestionsDAO(s).get_total_insider_riddles_count(1)),
+        ("AnswersDAO.find_all", lambda s: AnswersDAO(s).find_all(FindAnswersForQuestion(question_id=question_id))),
+        ("AnswersDAO.find_by_question_id", lambda s: AnswersDAO(s).find_by_question_id(question_id)),
+        ("QuestionInsiderDAO.find_by_question_id", lambda s: QuestionInsiderDAO(s).find_by_question_id(question_id)),
+        ("QuestionInsiderDAO.find_by_question_id_with_user_and_info",
+         lambda s: QuestionInsiderDAO(s).find_by_question_id_with_user_and_info(question_id)),
+        ("QuestionInsiderDAO.get_geo_links_by_question",
+         lambda s: QuestionInsiderDAO(s).get_geo_links_by_question(question_ids)),
+        ("QuestionInsiderDAO.find_questions_by_insider", lambda s: QuestionInsiderDAO(s).find_questions_by_insider(user_id)),
+        ("QuestionInsiderDAO.is_question_assigned_to_insider",
+         lambda s: QuestionInsiderDAO(s).is_question_assigned_to_insider(question_id, user_id)),
+        ("AttemptsDAO.find_by_command_and_question", lambda s: AttemptsDAO(s).find_by_command_and_question(command_id, question_id)),
+        ("AttemptsDAO.has_successful_attempt_of_type",
+         lambda s: AttemptsDAO(s).has_successful_attempt_of_type(command_id, question_id, "hint")),
+        ("AttemptsDAO.has_successful_insider_attempt", lambda s: AttemptsDAO(s).has_successful_insider_attempt(command_id, question_id)),
+        ("AttemptsDAO.has_successful_solve_attempt", lambda s: AttemptsDAO(s).has_successful_solve_attempt(command_id, question_id)),
+        ("AttemptsDAO.get_attempt_type_by_name", lambda s: AttemptsDAO(s).get_attempt_type_by_name("question")),
+        ("AttemptsDAO.get_solved_riddles_count", lambda s: AttemptsDAO(s).get_solved_riddles_count(1, command_id)),
+        ("AttemptsDAO.get_insider_riddles_count", lambda s: AttemptsDAO(s).get_insider_riddles_count(1, command_id)),
+        ("AttemptsDAO.get_block_progress", lambda s: AttemptsDAO(s).get_block_progress(command_id, [1, 2, 3])),
+        ("AttemptsDAO.get_solved_riddles_count_for_command", lambda s: AttemptsDAO(s).get_solved_riddles_count_for_command(command_id)),
+        ("AttemptsDAO.calculate_team_score_and_coins", lambda s: AttemptsDAO(s).calculate_team_score_and_coins(command_id)),
+        ("AttemptsDAO.has_successful_block_attempt", lambda s: AttemptsDAO(s).has_successful_block_attempt(command_id, 1, 6)),
+        ("AttemptsDAO.get_attempts_status_for_block", lambda s: AttemptsDAO(s).get_attempts_status_for_block(command_id, question_ids)),
+        ("AttemptsDAO.get_all_successful_attempts_for_commands",
+         lambda s: AttemptsDAO(s).get_all_successful_attempts_for_commands(ids["commands"][:10])),
+        ("AttemptsDAO.get_aggregated_scores_for_commands",
+         lambda s: AttemptsDAO(s).get_aggregated_scores_for_commands(ids["commands"][:10])),
+        ("AttemptsDAO.get_question_solve_stats", lambda s: AttemptsDAO(s).get_question_solve_stats(question_ids)),
+        ("CommandBalancesDAO.get_balance", lambda s: CommandBalancesDAO(s).get_balance(command_id)),
+        ("CommandBalancesDAO.get_balances", lambda s: CommandBalancesDAO(s).get_balances(ids["commands"][:10])),
+        # Пользователи и команды
+        ("UsersDAO.find_one_or_none_by_id", lambda s: UsersDAO(s).find_one_or_none_by_id(user_id)),
+        ("UsersDAO.find_user_command_in_event", lambda s: UsersDAO(s).find_user_command_in_event(user_id)),
+        ("UsersDAO.find_user_membership", lambda s: UsersDAO(s).find_user_membership(user_id)),
+        ("UsersDAO.is_user_captain_in_command", lambda s: UsersDAO(s).is_user_captain_in_command(user_id, command_id)),
+        ("UsersDAO.find_looking_for_team_page", lambda s: UsersDAO(s).find_looking_for_team_page(exclude_user_id=user_id)),
+        ("UsersDAO.count_all_users", lambda s: UsersDAO(s).count_all_users()),
+        ("UsersDAO.get_users_by_role", lambda s: UsersDAO(s).get_users_by_role()),
+        ("CommandsDAO.find_all_by_event", lambda s: CommandsDAO(s).find_all_by_event(1)),
+        ("CommandsDAO.find_stats_page", lambda s: CommandsDAO(s).find_stats_page(1)),
+        ("CommandsDAO.find_leaderboard_page", lambda s: CommandsDAO(s).find_leaderboard_page(1)),
+        ("CommandInviteDAO.get_uuid_by_command_id", lambda s: CommandInviteDAO(s).get_uuid_by_command_id(command_id)),
+        ("CommandInviteDAO.find_command_by_uuid", lambda s: CommandInviteDAO(s).find_command_by_uuid("missing")),
+        ("RolesUsersCommandDAO.get_role_id", lambda s: RolesUsersCommandDAO(s).get_role_id()),
+        ("EventsDAO.get_event_id_by_name", lambda s: EventsDAO(s).get_event_id_by_name("HSERUN29")),
+        ("EventsDAO.is_event_active", lambda s: EventsDAO(s).is_event_active(1)),
+        ("SessionDAO.get_session", lambda s: SessionDAO(s).get_session("missing-token")),
+        ("SqlSessionStore.reuse_session", lambda s: SqlSessionStore(s).reuse_session(user_id)),
+        ("InsidersInfoDAO.get_by_user_id", lambda s: InsidersInfoDAO(s).get_by_user_id(user_id)),
+        ("ProgramDAO.get_total_score", lambda s: ProgramDAO(s).get_total_score(user_id)),
+        ("ProgramDAO.get_score_history", lambda s: ProgramDAO(s).get_score_history(user_id)),
+        ("ProgramDAO.get_score_history_page", lambda s: ProgramDAO(s).get_score_history_page(user_id, limit=5)),
+        ("UserProfileDAO.get_by_user_id", lambda s: UserProfileDAO(s).get_by_user_id(user_id)),
+    ]
+
+
+async def seed_activity(maker, ids: dict) -> None:
+    """Добавляет попытки, баллы, сессии и инсайдеров, чтобы запросы возвращали данные."""
+    from datetime import datetime, timedelta, timezone
+
+    async with maker() as session:
+        for i, command_id in enumerate(ids["commands"]):
+            for j, question_id in enumerate(ids["questions"][: (i % 10) + 5]):
+                session.add(Attempt(command_id=command_id, user_id=ids["users"][i * 4],
+                                    question_id=question_id, attempt_type_id=1 + (j % 5),
+                                    attempt_text="ответ", is_true=j % 3 != 0))
+        for user_id in ids["users"]:
+            session.add(Program(user_id=user_id, score=1.0, comment="seed"))
+            session.add(Session(user_id=user_id, token=f"token-{user_id}", is_active=True,
+                                expires_at=datetime.now(timezone.utc) + timedelta(days=1)))
+        for question_id in ids["questions"]:
+            session.add(QuestionInsider(question_id=question_id, user_id=ids["users"][question_id % len(ids["users"])]))
+        await session.commit()
+
+
+def explain(db_path: str, query: CapturedQuery) -> list:
+    """Возвращает строки плана запроса."""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query.statement}", query.parameters).fetchall()
+        return [row[-1] for row in rows]
+    finally:
+        conn.close()
+
+
+def find_full_scans(plan: list) -> list:
+    scans = []
+    for detail in plan:
+        match = SCAN_RE.match(detail.strip())
+        if match and match.group(1) not in SMALL_TABLES:
+            scans.append(detail.strip())
+    return scans
+
+
+async def run(verbose: bool) -> int:
+    quiet_logs()
+    previous_use_redis = settings.USE_REDIS
+    settings.USE_REDIS = False  # SessionDAO проверяется на SQL-реализации
+    captured: list[CapturedQuery] = []
+
+    try:
+        async with temp_sqlite_url() as url:
+            engine = create_engine_for_url(url)
+            ids = await seed(engine)
+            maker = async_sessionmaker(engine, expire_on_commit=False)
+            await seed_activity(maker, ids)
+            # ANALYZE намеренно не выполняется: без статистики SQLite считает любой
+            # подходящий индекс селективным, поэтому SCAN в плане означает отсутствие индекса,
+            # а не выбор планировщика на синтетических данных
+
+            @event.listens_for(engine.sync_engine, "before_cursor_execute")
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                if statement.lstrip().upper().startswith("SELECT"):
+                    captured.append(CapturedQuery(current_method.get(), statement, tuple(parameters or ())))
+
+            failed_calls = []
+            for name, call in dao_calls(ids):
+                token = current_method.set(name)
+                try:
+                    async with maker() as session:
+                        await call(session)
+                except Exception as e:
+                    # Планы уже выполненных запросов всё равно проверяем
+                    failed_calls.append(f"{name}: {type(e).__name__}: {e}".splitlines()[0])
+                finally:
+                    current_method.reset(token)
+
+            await engine.dispose()
+            db_path = url.split(":///", 1)[1]
+
+            violations = []
+            for query in captured:
+                plan = explain(db_path, query)
+                query.full_scans = find_full_scans(plan)
+                if verbose:
+                    print(f"-- {query.method}")
+                    for detail in plan:
+                        print(f"     {detail}")
+                if query.full_scans and query.method not in FULL_SCAN_ALLOWED:
+                    violations.append(query)
+    finally:
+        settings.USE_REDIS = previous_use_redis
+
+    print(f"Проверено запросов: {len(captured)}")
+    for failure in failed_calls:
+        print(f"Предупреждение: вызов завершился ошибкой - {failure}")
+    if not violations:
+        print("Полных сканирований не найдено.")
+        return 0
+
+    print(f"Найдено запросов с полным сканированием: {len(violations)}")
+    for query in violations:
+        print(f"\n[{query.method}] {', '.join(query.full_scans)}")
+        print("  " + " ".join(query.statement.split()))
+    return 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Проверка EXPLAIN QUERY PLAN для запросов DAO")
+    parser.add_argument("-v", "--verbose", action="store_true", help="печатать планы всех запросов")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.verbose)))
+
+
+if __name__ == "__main__":
+    main()
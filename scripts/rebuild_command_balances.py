@@ -0,0 +1,45 @@
+"""
+Сверка таблицы command_balances с таблицей attempts.
+
+Пересчитывает счёт, монеты и число решённых загадок каждой команды по
+успешным попыткам и исправляет расходящиеся строки (например, после
+ручных правок БД; после правки типа попытки в админке пересчёт
+выполняется автоматически).
+Повторный запуск безопасен. Пересчёт идёт в одной транзакции под блокировкой
+записи попыток (см. CommandBalancesDAO.rebuild): работающее приложение на время
+пересчёта ждёт, а не теряет начисления.
+
+    python -m scripts.rebuild_command_balances [--command-id ID ...] [--dry-run]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from app.dao.database import async_session_maker_write
+from app.quest.dao import CommandBalancesDAO
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--command-id", type=int, action="append", dest="command_ids",
+                        help="пересчитать только указанные команды (можно повторять)")
+    parser.add_argument("--dry-run", action="store_true", help="показать расхождения без сохранения")
+    args = parser.parse_args()
+
+    async with async_session_maker_write() as session:
+        fixed = await CommandBalancesDAO(session).rebuild(args.command_ids)
+        if args.dry_run:
+            await session.rollback()
+            print(f"Найдено расхождений: {fixed} (dry-run, изменения не сохранены)")
+        else:
+            await session.commit()
+            print(f"Исправлено балансов: {fixed}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
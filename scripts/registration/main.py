@@ -21,6 +21,11 @@ from app.dao.database import Base
 from app.auth.models import User, Role, Command, CommandsUser, RoleUserCommand, Event, Language, UserProfile
 from app.auth.dao import UsersDAO, RolesDAO, CommandsDAO, CommandsUsersDAO, RolesUsersCommandDAO, EventsDAO, LanguagesDAO, UserProfileDAO, CommandInviteDAO
 from app.auth.schemas import SUserAddDB, UserTelegramID, RoleFilter, CommandBase, CommandsUserBase
+from app.auth import redis_session
+from app.auth.auth_cache import auth_cache
+from app.auth.redis_session import RedisSessionService, invalidate_user_auth
+from app.config import settings
+from app.redis_client import redis_clients
 
 load_dotenv()
 
@@ -283,6 +288,8 @@ async def create_command(telegram_id: int, command_name: str) -> tuple[bool, str
             
             # Коммитим все изменения
             await session.commit()
+            # Сбрасываем закэшированное членство и снимок пользователя у воркеров API
+            await invalidate_user_auth(user.id)
             
             # Создаем ссылку для присоединения (используем UUID)
             bot_info = await bot.get_me()
@@ -595,6 +602,8 @@ async def handle_join_command(message: types.Message, invite_uuid: str):
             })
             
             await session.commit()
+            # Сбрасываем закэшированное членство и снимок пользователя у воркеров API
+            await invalidate_user_auth(user.id)
             
             # Используем уже посчитанное количество участников
             current_members = current_members_count + 1  # +1 за нового участника
@@ -789,8 +798,17 @@ async def main():
     except Exception as e:
         logger.error(f"Ошибка при инициализации базы данных: {e}")
         return
-        
-    await dp.start_polling(bot)
+
+    # Инвалидации кэшей аутентификации и членства рассылаются воркерам API через Redis
+    if settings.USE_REDIS:
+        redis_session.redis_session_service = RedisSessionService(redis_broker=None)
+        await auth_cache.start()
+
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await auth_cache.stop()
+        await redis_clients.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,105 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from app.auth.models import Command, CommandsUser, Event, Language, Role, RoleUserCommand, User
+from app.config import settings
+from app.dao.database import Base, create_engine_for_url
+from app.dao.query_stats import instrument_engine
+from app.quest.models import Answer, AttemptType, Block, Question
+
+ATTEMPT_TYPES = [
+    # name, score, money; id совпадает с позицией в списке, начиная с 1
+    ("question", 10, 0),
+    ("question_hint", 5, 0),
+    ("hint", 0, -1),
+    ("insider", 5, 1),
+    ("insider_hint", 3, 1),
+    ("question_block", 20, 2),
+    ("insider_block", 10, 1),
+    ("money_start", 0, 10),
+]
+
+
+@pytest.fixture(autouse=True)
+def strict_query_budgets(monkeypatch):
+    """В тестах превышение query_budget обработчика - ошибка, а не предупреждение."""
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET_STRICT", True)
+
+
+async def seed_database(engine: AsyncEngine, commands: int, blocks: int, questions_per_block: int) -> dict:
+    """
+    Создаёт схему и заполняет её тестовыми данными: роли, типы попыток, одно событие
+    и язык, блоки с загадками (по одному ответу) и команды из четырёх участников,
+    первый из которых - капитан.
+
+    Returns:
+        dict: идентификаторы созданных сущностей (commands, users, questions)
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        session.add_all([Role(name="guest"), Role(name="organizer"), Role(name="insider")])
+        session.add_all([RoleUserCommand(name="member"), RoleUserCommand(name="captain")])
+        session.add_all([AttemptType(name=n, score=s, money=m, is_active=True) for n, s, m in ATTEMPT_TYPES])
+        event = Event(name="HSERUN29")
+        language = Language(name="Python")
+        session.add_all([event, language])
+        await session.flush()
+
+        question_ids = []
+        for b in range(blocks):
+            block = Block(title=f"Блок {b}", language_id=language.id)
+            session.add(block)
+            await session.flush()
+            for q in range(questions_per_block):
+                question = Question(title=f"Загадка {b}.{q}", block_id=block.id,
+                                    geo_answered=f"geo {b}.{q}", text_answered="текст")
+                session.add(question)
+                await session.flush()
+                session.add(Answer(question_id=question.id, answer_text=f"ответ {b} {q}",
+                                   additional_field_value=f"место {q}"))
+                question_ids.append(question.id)
+
+        command_ids, user_ids = [], []
+        for c in range(commands):
+            command = Command(name=f"Команда {c}", event_id=event.id, language_id=language.id)
+            session.add(command)
+            await session.flush()
+            for u in range(4):
+                user = User(full_name=f"Участник {c}.{u}", telegram_id=c * 10 + u + 1, role_id=1)
+                session.add(user)
+                await session.flush()
+                session.add(CommandsUser(command_id=command.id, user_id=user.id, role_id=2 if u == 0 else 1))
+                user_ids.append(user.id)
+            command_ids.append(command.id)
+        await session.commit()
+
+    return {"commands": command_ids, "users": user_ids, "questions": question_ids}
+
+
+@pytest_asyncio.fixture
+async def seeded_db(tmp_path):
+    """
+    Фабрика временных файловых БД SQLite с тестовыми данными:
+
+        maker, ids = await seeded_db(commands=1, blocks=2, questions_per_block=3)
+
+    instrument=True подключает счётчик запросов (track_queries) уже после заполнения.
+    Движки закрываются по окончании теста.
+    """
+    engines = []
+
+    async def factory(commands: int = 2, blocks: int = 1, questions_per_block: int = 1,
+                      instrument: bool = False) -> tuple[async_sessionmaker, dict]:
+        engine = create_engine_for_url(f"sqlite+aiosqlite:///{tmp_path / f'test_{len(engines)}.sqlite3'}")
+        engines.append(engine)
+        ids = await seed_database(engine, commands, blocks, questions_per_block)
+        if instrument:
+            instrument_engine(engine)
+        return async_sessionmaker(engine, expire_on_commit=False), ids
+
+    yield factory
+    for engine in engines:
+        await engine.dispose()
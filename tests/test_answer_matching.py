@@ -0,0 +1,42 @@
+from app.quest.matching import AnswerIndex, bounded_distance, compare_strings
+
+VARIANTS = [("Мясницкая улица, 20", "Кофейня"), ("ул. Мясницкая 20", None), ("Покровка", "")]
+
+
+def test_index_agrees_with_compare_strings():
+    index = AnswerIndex.build(VARIANTS)
+    for text in ["20 МЯСНИЦКАЯ улица!", "мясницкая ул 20", "покровка", "Мясницкая", "улица 20", ""]:
+        assert index.matches(text) == any(compare_strings(text, answer) for answer, _ in VARIANTS)
+
+    assert index.has_additional
+    assert index.matches_additional("кофейня")
+    assert not index.matches_additional("")
+    assert not AnswerIndex.build([("Покровка", None)]).has_additional
+
+
+def test_bounded_distance():
+    assert bounded_distance("pokrovka", "pokrovka", 2) == 0
+    assert bounded_distance("pokrovka", "pokorvka", 2) == 1  # перестановка соседних
+    assert bounded_distance("pokrovka", "pkrovk", 2) == 2
+    assert bounded_distance("pokrovka", "maroseyka", 2) == 3
+    assert bounded_distance("abc", "abcdef", 1) == 2
+
+
+def test_fuzzy_matching_with_tolerance():
+    strict = AnswerIndex.build(VARIANTS)
+    index = AnswerIndex.build(VARIANTS, tolerance=2)
+    for text in ["Мясницкя 20", "мясниская ул., д. 20", "Mjasnitskaya 20", "Покравка", "покровкА", "Мясницкая улца 20"]:
+        assert index.matches(text), text
+    assert not strict.matches("Мясницкя 20")
+    assert index.matches_additional("кофеня")
+
+    for text in ["Маросейка", "Мясницкая 21 22", "улица", "", "Мясницкая 21", "Мясницкая 2", "Мясницкя 200"]:
+        assert not index.matches(text), text
+    # Числа сравниваются точно: опечатка в номере дома или годе - другой ответ
+    years = AnswerIndex.build([("1945 год", None), ("Покровка 12", None)], tolerance=2)
+    assert years.matches("год 1945") and years.matches("Покравка 12")
+    for text in ["1954 год", "Покровка 13", "Покровка 21", "Покровка 1 2"]:
+        assert not years.matches(text), text
+    # Короткие ответы сравниваются только точно
+    short = AnswerIndex.build([("Шов", None), ("5", None)], tolerance=2)
+    assert short.matches("шов") and not short.matches("шок") and not short.matches("6")
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.orm.exc import DetachedInstanceError
+
+from app.auth.auth_cache import AuthCache, AuthSnapshot, Membership, auth_cache
+from app.auth.dao import UsersDAO
+from app.auth.models import Command, Role, User
+from app.auth.utils import create_session
+from app.config import settings
+from app.dao.query_stats import track_queries
+from app.dependencies.auth_dep import get_auth_snapshot
+
+
+def make_snapshot(user_id: int, role_name: str = "guest", command_id: int = None) -> AuthSnapshot:
+    user = User(
+        id=user_id, full_name=f"Участник {user_id}", telegram_id=user_id, telegram_username=None,
+        is_looking_for_friends=False, role_id=1, role=Role(id=1, name=role_name),
+        created_at=datetime(2025, 4, 27, 12, 0),
+    )
+    command = Command(id=command_id, name="Команда", event_id=1, language_id=2) if command_id else None
+    return AuthSnapshot.from_models(user, command)
+
+
+def in_hours(hours: float) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(hours=hours)
+
+
+def test_snapshot_roundtrip_builds_detached_models():
+    snapshot = AuthSnapshot.from_json(make_snapshot(1, "organizer", command_id=7).to_json())
+
+    user = snapshot.to_user()
+    assert (user.id, user.full_name, user.role.name) == (1, "Участник 1", "organizer")
+    assert user.created_at == datetime(2025, 4, 27, 12, 0)
+    with pytest.raises(DetachedInstanceError):
+        user.commands
+    command = snapshot.to_command()
+    assert (command.id, command.language_id) == (7, 2)
+    assert make_snapshot(2).to_command() is None
+
+
+def test_lifetime_is_bounded_by_ttl_and_session(monkeypatch):
+    cache = AuthCache(maxsize=10, ttl=60, channel="test")
+    cache.put("expired", make_snapshot(1), in_hours(-1))
+    assert cache.get("expired") is None
+
+    now = [1000.0]
+    monkeypatch.setattr("app.auth.auth_cache.time.monotonic", lambda: now[0])
+    cache.put("t1", make_snapshot(1), in_hours(1))
+    now[0] += 59
+    assert cache.get("t1") is not None
+    now[0] += 2
+    assert cache.get("t1") is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_invalidation():
+    cache = AuthCache(maxsize=2, ttl=60, channel="test")
+    cache.put("a", make_snapshot(1), in_hours(1))
+    cache.put("b", make_snapshot(1), in_hours(1))
+    cache.get("a")
+    cache.put("c", make_snapshot(2), in_hours(1))
+    # "b" давно не использовался и вытеснен
+    assert cache.get("b") is None
+
+    await cache.invalidate_user(1)
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+
+    await cache.invalidate_token("c")
+    assert len(cache) == 0
+
+
+@pytest_asyncio.fixture
+async def db(monkeypatch, seeded_db):
+    monkeypatch.setattr(settings, "USE_REDIS", False)
+    yield await seeded_db(commands=2, blocks=1, questions_per_block=1, instrument=True)
+    await auth_cache.invalidate_all()
+
+
+@pytest.mark.asyncio
+async def test_auth_chain_resolves_user_and_command_once(db):
+    maker, ids = db
+    user_session = await create_session(ids["users"][0])
+    async with maker() as session:
+        session.add(user_session)
+        await session.commit()
+
+    async with maker() as session:
+        with track_queries() as stats:
+            snapshot = await get_auth_snapshot(user_session.token, session)
+        assert snapshot.user_id == ids["users"][0]
+        assert snapshot.to_command().id == ids["commands"][0]
+        # Сессия, пользователь с ролью, команда
+        assert stats.count == 3
+
+        with track_queries() as stats:
+            assert await get_auth_snapshot(user_session.token, session) == snapshot
+        assert stats.count == 0
+
+
+@pytest.mark.asyncio
+async def test_membership_is_cached_until_user_invalidation(db):
+    maker, ids = db
+    user_id, outsider_id = ids["users"][0], max(ids["users"]) + 1
+    async with maker() as session:
+        users_dao = UsersDAO(session)
+        with track_queries() as stats:
+            membership = await users_dao.find_user_membership(user_id)
+            assert await users_dao.find_user_membership(outsider_id) is None
+        assert membership == Membership(ids["commands"][0], membership.language_id, True)
+        assert stats.count == 2
+
+        with track_queries() as stats:
+            assert await users_dao.find_user_membership(user_id) == membership
+            assert await users_dao.find_user_membership(outsider_id) is None
+        assert stats.count == 0
+
+        await auth_cache.invalidate_user(user_id)
+        with track_queries() as stats:
+            assert await users_dao.find_user_membership(user_id) == membership
+            assert await users_dao.find_user_membership(outsider_id) is None
+        assert stats.count == 1
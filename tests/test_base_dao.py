@@ -0,0 +1,99 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+
+from app.auth.dao import InsidersInfoDAO, ProgramDAO, UserProfileDAO
+from app.auth.models import Program, UserProfile
+from app.dao.base import DEFAULT_PAGE_SIZE, InvalidCursorError, requested_page_size
+
+
+@pytest_asyncio.fixture
+async def db(seeded_db):
+    return await seeded_db(commands=2, blocks=1, questions_per_block=1)
+
+
+@pytest.mark.asyncio
+async def test_add_many_and_bulk_update(db):
+    maker, ids = db
+    async with maker() as session:
+        dao = ProgramDAO(session)
+        records = await dao.add_many([{"user_id": user_id, "score": 1.0} for user_id in ids["users"]])
+        assert len(records) == len(ids["users"]) and all(record.id for record in records)
+
+        updated = await dao.bulk_update(
+            [{"id": record.id, "score": 5.0} for record in records] + [{"score": 100.0}]
+        )
+        await session.commit()
+        assert updated == len(records)
+        total = await session.scalar(select(func.sum(Program.score)))
+        assert total == 5.0 * len(records)
+
+
+@pytest.mark.asyncio
+async def test_create_or_update_is_a_single_upsert(db):
+    maker, ids = db
+    user_id = ids["users"][0]
+    async with maker() as session:
+        dao = InsidersInfoDAO(session)
+        created = await dao.create_or_update(user_id, student_organization="СтС", geo_link="https://a")
+        updated = await dao.create_or_update(user_id, geo_link="https://b")
+        assert created.id == updated.id
+        assert (updated.student_organization, updated.geo_link) == ("СтС", "https://b")
+
+        profiles = UserProfileDAO(session)
+        await profiles.create_or_update(user_id, email="a@example.com")
+        profile = await profiles.create_or_update(user_id)
+        assert profile.email == "a@example.com"
+
+        count = await profiles.upsert_many(
+            [{"user_id": uid, "email": f"{uid}@example.com"} for uid in ids["users"][:3]],
+            index_elements=["user_id"],
+        )
+        await session.commit()
+        assert count == 3
+        email = await session.scalar(select(UserProfile.email).where(UserProfile.user_id == user_id))
+        assert email == f"{user_id}@example.com"
+
+
+@pytest.mark.asyncio
+async def test_find_page_walks_all_rows_once(db):
+    maker, ids = db
+    async with maker() as session:
+        dao = ProgramDAO(session)
+        await dao.add_many([{"user_id": ids["users"][i % 3], "score": float(i % 4)} for i in range(20)])
+        await session.commit()
+
+        for order_by, expected_key in (
+            ([Program.score.desc()], lambda p: (-p.score, p.id)),  # разные направления ключей
+            ([Program.id.desc()], lambda p: -p.id),                # сравнение кортежей
+        ):
+            expected = [p.id for p in sorted(await dao.find_all(), key=expected_key)]
+            seen, cursor = [], None
+            while True:
+                page = await dao.find_page(order_by=order_by, after=cursor, limit=3)
+                seen.extend(p.id for p in page.items)
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+            assert seen == expected
+
+        with pytest.raises(InvalidCursorError):
+            await dao.find_page(after="not-a-cursor")
+
+
+
+@pytest.mark.asyncio
+async def test_find_page_without_limit_returns_everything(db):
+    maker, ids = db
+    async with maker() as session:
+        dao = ProgramDAO(session)
+        await dao.add_many([{"user_id": ids["users"][0], "score": float(i)} for i in range(DEFAULT_PAGE_SIZE + 5)])
+        await session.commit()
+
+        page = await dao.find_page(order_by=[Program.score.desc()], limit=None)
+        assert len(page.items) == DEFAULT_PAGE_SIZE + 5
+        assert page.next_cursor is None
+
+    assert requested_page_size(None, None) is None
+    assert requested_page_size(None, "cursor") == DEFAULT_PAGE_SIZE
+    assert requested_page_size(10, None) == 10
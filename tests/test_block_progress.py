@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import select
+
+from app.auth.models import Command, InsiderInfo, User
+from app.dao.query_stats import track_queries
+from app.quest import router
+from app.quest.content import quest_content
+from app.quest.dao import AttemptsDAO
+from app.quest.models import Attempt, AttemptType, Question, QuestionInsider
+
+
+async def add_attempts(session, command_id: int, user_id: int) -> list:
+    """Первые загадки первого блока: решена, решена с подсказкой, инсайдер, подсказка."""
+    types = dict((await session.execute(select(AttemptType.name, AttemptType.id))).all())
+    questions = (await session.execute(select(Question.id, Question.block_id).order_by(Question.id))).all()
+    for (question_id, _), type_name in zip(questions, ["question", "question_hint", "insider", "hint"]):
+        session.add(Attempt(user_id=user_id, command_id=command_id, question_id=question_id,
+                            attempt_type_id=types[type_name], is_true=True, attempt_text="ответ"))
+    await session.commit()
+    return questions
+
+
+@pytest.mark.asyncio
+async def test_block_list_counts_progress_in_one_query(seeded_db):
+    maker, ids = await seeded_db(commands=1, blocks=3, questions_per_block=4, instrument=True)
+    command_id, user_id = ids["commands"][0], ids["users"][0]
+    async with maker() as session:
+        await add_attempts(session, command_id, user_id)
+
+    await quest_content.load(maker)
+    async with maker() as session:
+        command = await session.get(Command, command_id)
+        user = await session.get(User, user_id)
+        with track_queries() as stats:
+            response = await router.get_all_quest_blocks(
+                session=session, auth_data=(user, command), include_riddles=False
+            )
+        assert stats.count <= 2
+
+        dao = AttemptsDAO(session)
+        for block in response.blocks:
+            assert block.solved_count == await dao.get_solved_riddles_count(block.id, command_id)
+            assert block.insider_count == await dao.get_insider_riddles_count(block.id, command_id)
+            assert block.total_count == 4
+        assert sum(block.solved_count for block in response.blocks) == 2
+
+
+@pytest.mark.asyncio
+async def test_block_riddles_load_insider_links_in_one_query(seeded_db):
+    maker, ids = await seeded_db(commands=1, blocks=2, questions_per_block=4, instrument=True)
+    command_id, user_id = ids["commands"][0], ids["users"][0]
+    async with maker() as session:
+        questions = await add_attempts(session, command_id, user_id)
+        first, second = questions[0][0], questions[1][0]
+        for n, (question_id, geo_link) in enumerate([(first, "geo:a"), (first, "geo:b"), (second, None)]):
+            insider = User(full_name=f"Инсайдер {n}", telegram_id=1000 + n)
+            session.add(insider)
+            await session.flush()
+            session.add_all([InsiderInfo(user_id=insider.id, geo_link=geo_link),
+                             QuestionInsider(question_id=question_id, user_id=insider.id)])
+        await session.commit()
+
+    await quest_content.load(maker)
+    async with maker() as session:
+        command = await session.get(Command, command_id)
+        user = await session.get(User, user_id)
+        with track_queries() as stats:
+            response = await router.get_quest_block(
+                block_id=questions[0][1], session=session, auth_data=(user, command)
+            )
+        assert stats.count <= 3
+
+        riddles = {riddle.id: riddle for riddle in response.block.riddles}
+        assert riddles[first].insiderLinks == ["geo:a", "geo:b"]
+        assert riddles[second].insiderLinks == []
+
+        with track_queries() as stats:
+            await router.get_all_quest_blocks(session=session, auth_data=(user, command), include_riddles=True)
+        assert stats.count <= 3
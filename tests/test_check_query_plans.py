@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import select
+
+from app.auth.models import Program
+from scripts import check_query_plans
+from scripts.check_query_plans import CapturedQuery, explain, find_full_scans
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "plans.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE programs (id INTEGER PRIMARY KEY, user_id INTEGER, comment TEXT);
+        CREATE INDEX ix_programs_user_id ON programs (user_id);
+        CREATE TABLE roles (id INTEGER PRIMARY KEY, name TEXT);
+    """)
+    conn.close()
+    return path
+
+
+def plan_scans(db_path: str, statement: str, parameters: tuple = ()) -> list:
+    return find_full_scans(explain(db_path, CapturedQuery("test", statement, parameters)))
+
+
+def test_table_scan_is_flagged(db_path):
+    assert plan_scans(db_path, "SELECT id FROM programs WHERE comment = ?", ("x",)) == ["SCAN programs"]
+    assert plan_scans(db_path, "SELECT p.id FROM programs AS p WHERE p.comment = ?", ("x",)) == ["SCAN p"]
+
+
+def test_index_lookups_and_small_tables_pass(db_path):
+    assert plan_scans(db_path, "SELECT id FROM programs WHERE user_id = ?", (1,)) == []
+    assert plan_scans(db_path, "SELECT id FROM programs WHERE id = ?", (1,)) == []
+    assert plan_scans(db_path, "SELECT id FROM roles WHERE name = ?", ("guest",)) == []
+
+
+@pytest.mark.asyncio
+async def test_run_fails_on_unindexed_dao_query(monkeypatch, capsys):
+    async def by_comment(session):
+        await session.execute(select(Program).where(Program.comment == "без индекса"))
+
+    monkeypatch.setattr(check_query_plans, "dao_calls", lambda ids: [("ProgramDAO.find_by_comment", by_comment)])
+
+    assert await check_query_plans.run(verbose=False) == 1
+    output = capsys.readouterr().out
+    assert "[ProgramDAO.find_by_comment] SCAN programs" in output
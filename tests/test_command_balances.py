@@ -0,0 +1,176 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.quest.dao import AttemptsDAO, CommandBalancesDAO
+from app.quest.models import Attempt, CommandBalance
+
+
+@pytest_asyncio.fixture
+async def db(seeded_db):
+    return await seeded_db(commands=2, blocks=1, questions_per_block=3)
+
+
+def make_attempt(ids, attempt_type_id, is_true=True, command_index=0):
+    return Attempt(command_id=ids["commands"][command_index], user_id=ids["users"][0],
+                   question_id=ids["questions"][0], attempt_type_id=attempt_type_id,
+                   attempt_text="ответ", is_true=is_true)
+
+
+@pytest.mark.asyncio
+async def test_balance_follows_attempt_inserts(db):
+    maker, ids = db
+    command_id = ids["commands"][0]
+    async with maker() as session:
+        # question (10, 0), hint (0, -1), неуспешная question, money_start (0, 10)
+        session.add_all([make_attempt(ids, 1), make_attempt(ids, 3), make_attempt(ids, 1, is_true=False),
+                         make_attempt(ids, 8)])
+        await session.commit()
+
+    async with maker() as session:
+        balance = await CommandBalancesDAO(session).get_balance(command_id)
+        assert balance == {"score": 10, "coins": 9, "solved_count": 1, "version": 3}
+        assert await AttemptsDAO(session).calculate_team_score_and_coins(command_id) == {"score": 10, "coins": 9}
+        assert await CommandBalancesDAO(session).get_balance(ids["commands"][1]) == {
+            "score": 0, "coins": 0, "solved_count": 0, "version": 0}
+        assert await CommandBalancesDAO(session).rebuild() == 0
+
+
+@pytest.mark.asyncio
+async def test_balance_follows_attempt_updates_and_deletes(db):
+    maker, ids = db
+    async with maker() as session:
+        attempt = make_attempt(ids, 2, is_true=False)
+        session.add(attempt)
+        await session.commit()
+
+        attempt.is_true = True
+        await session.commit()
+        assert (await CommandBalancesDAO(session).get_balance(ids["commands"][0]))["score"] == 5
+
+        attempt.command_id = ids["commands"][1]
+        await session.commit()
+        balances = await CommandBalancesDAO(session).get_balances(ids["commands"])
+        assert balances[ids["commands"][0]]["score"] == 0
+        assert balances[ids["commands"][1]]["solved_count"] == 1
+
+        await session.delete(attempt)
+        await session.commit()
+        assert (await CommandBalancesDAO(session).get_balance(ids["commands"][1]))["score"] == 0
+        assert await CommandBalancesDAO(session).rebuild() == 0
+
+
+@pytest.mark.asyncio
+async def test_rebuild_fixes_drift(db):
+    maker, ids = db
+    command_id = ids["commands"][0]
+    async with maker() as session:
+        session.add(make_attempt(ids, 1))
+        await session.commit()
+        await session.execute(update(CommandBalance).where(CommandBalance.command_id == command_id).values(score=999))
+        await session.commit()
+
+        assert await CommandBalancesDAO(session).rebuild() == 1
+        await session.commit()
+        balance = await CommandBalancesDAO(session).get_balance(command_id)
+        assert balance["score"] == 10
+        assert balance["version"] == 2
+
+
+@pytest.mark.asyncio
+async def test_attempt_type_edit_in_cms_rebuilds_balances(db, monkeypatch):
+    from app.cms.views import AttemptTypeAdmin
+    from app.dao.writer import db_writer
+    from app.quest.models import AttemptType
+
+    maker, ids = db
+    command_id = ids["commands"][0]
+    monkeypatch.setattr(db_writer, "_session_maker", maker)
+    async with maker() as session:
+        session.add(make_attempt(ids, 1))
+        await session.commit()
+        attempt_type = await session.get(AttemptType, 1)
+        attempt_type.score = 15
+        await session.commit()
+
+    await AttemptTypeAdmin().after_model_change({"score": 15}, attempt_type, False, None)
+    async with maker() as session:
+        assert (await CommandBalancesDAO(session).get_balance(command_id))["score"] == 15
+        assert await CommandBalancesDAO(session).rebuild() == 0
+
+
+@pytest.mark.asyncio
+async def test_cms_save_runs_as_writer_job_and_rebuilds_balances(db, monkeypatch):
+    from app.cms.views import AttemptTypeAdmin
+    from app.dao.database import create_engine_for_url
+    from app.dao.writer import db_writer
+    from app.quest.models import AttemptType
+
+    maker, ids = db
+    monkeypatch.setattr(db_writer, "_session_maker", maker)
+    async with maker() as session:
+        session.add(make_attempt(ids, 1))
+        await session.commit()
+
+    # Страницы админки читают через соединение только для чтения, сохранение - через писателя
+    read_engine = create_engine_for_url(str(maker.kw["bind"].url), read_only=True)
+    view = AttemptTypeAdmin()
+    monkeypatch.setattr(AttemptTypeAdmin, "session_maker", async_sessionmaker(read_engine), raising=False)
+    monkeypatch.setattr(AttemptTypeAdmin, "is_async", True)
+    try:
+        await view.update_model(None, "1", {"score": 15})
+    finally:
+        await read_engine.dispose()
+    async with maker() as session:
+        assert (await session.get(AttemptType, 1)).score == 15
+        assert (await CommandBalancesDAO(session).get_balance(ids["commands"][0]))["score"] == 15
+
+
+@pytest.mark.asyncio
+async def test_bulk_attempt_writes_are_refused(db):
+    from sqlalchemy import delete
+    from sqlalchemy.exc import InvalidRequestError
+
+    maker, ids = db
+    command_id = ids["commands"][0]
+    async with maker() as session:
+        attempt = make_attempt(ids, 1)
+        session.add(attempt)
+        await session.commit()
+
+        dao = AttemptsDAO(session)
+        values = {"command_id": command_id, "user_id": ids["users"][0], "question_id": ids["questions"][1],
+                  "attempt_type_id": 1, "attempt_text": "ответ", "is_true": True}
+        bulk_writes = [
+            lambda: dao.add_many([values]),
+            lambda: dao.bulk_update([{"id": attempt.id, "is_true": False}]),
+            lambda: dao.upsert({"id": attempt.id, **values}, index_elements=["id"]),
+            lambda: session.execute(update(Attempt).values(attempt_type_id=6)),
+            lambda: session.execute(delete(Attempt)),
+        ]
+        for bulk_write in bulk_writes:
+            with pytest.raises(InvalidRequestError, match="Массовые"):
+                await bulk_write()
+
+    async with maker() as session:
+        assert (await CommandBalancesDAO(session).get_balance(command_id))["score"] == 10
+        assert await CommandBalancesDAO(session).rebuild() == 0
+
+
+@pytest.mark.asyncio
+async def test_rebuild_blocks_attempt_writes_until_commit(db):
+    import sqlite3
+
+    maker, ids = db
+    async with maker() as session:
+        await CommandBalancesDAO(session).rebuild()
+        other = sqlite3.connect(maker.kw["bind"].url.database, timeout=0.1)
+        try:
+            with pytest.raises(sqlite3.OperationalError, match="locked"):
+                other.execute("INSERT INTO attempts (command_id, user_id, attempt_type_id, is_true) VALUES (1, 1, 1, 1)")
+            await session.commit()
+            other.execute("INSERT INTO attempts (command_id, user_id, attempt_type_id, is_true) VALUES (1, 1, 1, 1)")
+            other.commit()
+        finally:
+            other.close()
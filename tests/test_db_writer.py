@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app.auth.models import Program
+from app.dao.database import create_engine_for_url
+from app.dao.writer import DatabaseWriter
+
+
+@pytest_asyncio.fixture
+async def writer(seeded_db):
+    maker, ids = await seeded_db(commands=1)
+    db_writer = DatabaseWriter(maker)
+    await db_writer.start()
+    yield db_writer, maker, ids
+    await db_writer.stop()
+
+
+async def programs_count(maker) -> int:
+    async with maker() as session:
+        return await session.scalar(select(func.count(Program.id)))
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_one_by_one_in_submit_order(writer):
+    db_writer, maker, ids = writer
+    order, running = [], []
+
+    def make_job(n: int):
+        async def job(session):
+            running.append(n)
+            assert len(running) == 1
+            session.add(Program(user_id=ids["users"][0], score=float(n)))
+            await asyncio.sleep(0)
+            order.append(n)
+            running.remove(n)
+            return n
+        return job
+
+    results = await asyncio.gather(*(db_writer.submit(make_job(n)) for n in range(20)))
+    assert results == order == list(range(20))
+    assert await programs_count(maker) == 20
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [ValueError("ошибка"), asyncio.CancelledError()])
+async def test_failed_job_is_rolled_back_and_worker_keeps_running(writer, error):
+    db_writer, maker, ids = writer
+
+    async def failing(session):
+        session.add(Program(user_id=ids["users"][0], score=1.0))
+        await session.flush()
+        raise error
+
+    async def ok(session):
+        session.add(Program(user_id=ids["users"][0], score=2.0))
+
+    with pytest.raises(type(error)):
+        await asyncio.wait_for(db_writer.submit(failing), timeout=5)
+    assert db_writer.is_running
+    await db_writer.submit(ok)
+    assert await programs_count(maker) == 1
+
+
+@pytest.mark.asyncio
+async def test_nested_submit_runs_in_the_outer_job(writer):
+    db_writer, maker, ids = writer
+
+    async def outer(session):
+        session.add(Program(user_id=ids["users"][0], score=1.0))
+        inner_session = await db_writer.submit(lambda inner: asyncio.sleep(0, result=inner))
+        return inner_session is session
+
+    assert await asyncio.wait_for(db_writer.submit(outer), timeout=5)
+    assert await programs_count(maker) == 1
+
+
+@pytest.mark.asyncio
+async def test_read_only_engine_rejects_writes(seeded_db):
+    maker, ids = await seeded_db(commands=1)
+    read_engine = create_engine_for_url(str(maker.kw["bind"].url), read_only=True)
+    try:
+        async with read_engine.connect() as conn:
+            assert await conn.scalar(select(func.count(Program.id))) == 0
+            with pytest.raises(OperationalError, match="readonly"):
+                await conn.execute(Program.__table__.insert().values(user_id=ids["users"][0], score=1.0))
+    finally:
+        await read_engine.dispose()
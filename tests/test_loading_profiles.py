@@ -0,0 +1,72 @@
+from collections import Counter
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.exc import InvalidRequestError
+
+from app.auth.dao import CommandsDAO, UsersDAO
+from app.auth.loading import COMMAND_STATS_PROFILE, USER_AUTH_PROFILE, USER_ME_PROFILE
+from app.dao.query_stats import track_queries
+from app.quest.dao import BlocksDAO
+from app.quest.loading import QUEST_BLOCK_PROFILE
+from app.quest.schemas import BlockFilter
+
+COMMANDS, BLOCKS = 5, 3
+
+
+@pytest_asyncio.fixture
+async def db(seeded_db):
+    return await seeded_db(commands=COMMANDS, blocks=BLOCKS, questions_per_block=2, instrument=True)
+
+
+def loaded(session) -> Counter:
+    """Число объектов каждой модели, попавших в сессию (строк, превращённых в ORM-объекты)."""
+    return Counter(type(obj).__name__ for obj in session.identity_map.values())
+
+
+@pytest.mark.asyncio
+async def test_quest_blocks_load_only_blocks(db):
+    maker, _ = db
+    async with maker() as session:
+        with track_queries() as stats:
+            blocks = await BlocksDAO(session).find_all(filters=BlockFilter(language_id=1), options=QUEST_BLOCK_PROFILE)
+        # Раньше Block.language -> Language.blocks/commands тянули весь контент и все команды
+        assert stats.count == 1
+        assert loaded(session) == {"Block": BLOCKS}
+        with pytest.raises(InvalidRequestError):
+            blocks[0].language
+
+
+@pytest.mark.asyncio
+async def test_user_profiles_row_counts(db):
+    maker, ids = db
+    async with maker() as session:
+        with track_queries() as stats:
+            user = await UsersDAO(session).find_one_or_none_by_id(ids["users"][0], options=USER_AUTH_PROFILE)
+        assert stats.count == 1
+        assert loaded(session) == {"User": 1, "Role": 1}
+        assert user.role.name == "guest"
+        with pytest.raises(InvalidRequestError):
+            user.commands
+
+    async with maker() as session:
+        with track_queries() as stats:
+            user = await UsersDAO(session).find_one_by_id(ids["users"][0], options=USER_ME_PROFILE)
+        assert stats.count <= 6
+        assert loaded(session) == {
+            "User": 4, "Role": 1, "CommandsUser": 4, "Command": 1, "RoleUserCommand": 2,
+        }
+        assert len(user.commands[0].command.users) == 4
+
+
+@pytest.mark.asyncio
+async def test_commands_stats_page_row_counts(db):
+    maker, _ = db
+    async with maker() as session:
+        with track_queries() as stats:
+            page = await CommandsDAO(session).find_stats_page(1, limit=2, options=COMMAND_STATS_PROFILE)
+        assert stats.count <= 3
+        assert loaded(session) == {
+            "Command": 2, "CommandsUser": 8, "User": 8, "RoleUserCommand": 2, "Language": 1,
+        }
+        assert all(row[0].language.name == "Python" for row in page.items)
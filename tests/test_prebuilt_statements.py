@@ -0,0 +1,130 @@
+import itertools
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+
+from app.auth.dao import UsersDAO
+from app.auth.models import Command, CommandsUser, Event
+from app.quest.dao import AttemptsDAO, QuestionsDAO
+from app.quest.models import Attempt, AttemptType, Block, Question
+
+# id совпадает с позицией в ATTEMPT_TYPES из conftest
+TYPE_IDS = {name: i for i, name in enumerate(
+    ["question", "question_hint", "hint", "insider", "insider_hint", "question_block", "insider_block", "money_start"],
+    start=1,
+)}
+
+
+@pytest_asyncio.fixture
+async def db(seeded_db):
+    """Две команды, два блока и попытки всех типов, верные и неверные."""
+    maker, ids = await seeded_db(commands=2, blocks=2, questions_per_block=3)
+    async with maker() as session:
+        for n, (command_id, question_id, type_name) in enumerate(
+            itertools.product(ids["commands"], ids["questions"][::2], TYPE_IDS)
+        ):
+            session.add(Attempt(
+                command_id=command_id, user_id=ids["users"][0], question_id=question_id,
+                attempt_type_id=TYPE_IDS[type_name], is_true=n % 3 != 0,
+            ))
+        await session.commit()
+        assert dict((await session.execute(select(AttemptType.name, AttemptType.id))).all()) == TYPE_IDS
+        ids["blocks"] = list((await session.scalars(select(Block.id).order_by(Block.id))).all())
+    return maker, ids
+
+
+def old_has_successful_attempt(command_id: int, question_id: int, names: list):
+    """Запрос в том виде, в каком его строили методы до вынесения в модуль."""
+    return select(Attempt).join(AttemptType).where(
+        Attempt.command_id == command_id,
+        Attempt.question_id == question_id,
+        Attempt.is_true == True,
+        AttemptType.name.in_(names),
+    )
+
+
+def old_block_attempts_count(block_id: int, command_id: int, names: list):
+    return (
+        select(func.count(Attempt.id))
+        .join(Question, Question.id == Attempt.question_id)
+        .join(AttemptType, Attempt.attempt_type_id == AttemptType.id)
+        .where(
+            Question.block_id == block_id,
+            Attempt.command_id == command_id,
+            Attempt.is_true == True,
+            AttemptType.name.in_(names),
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_attempt_checks_match_adhoc_queries(db):
+    maker, ids = db
+    async with maker() as session:
+        dao = AttemptsDAO(session)
+        for command_id, question_id in itertools.product(ids["commands"], ids["questions"]):
+            for method, names in (
+                (dao.has_successful_solve_attempt, ["question", "question_hint"]),
+                (dao.has_successful_insider_attempt, ["insider", "insider_hint"]),
+            ):
+                expected = (await session.execute(old_has_successful_attempt(command_id, question_id, names))).first()
+                assert await method(command_id, question_id) is (expected is not None)
+            for type_name in TYPE_IDS:
+                expected = (await session.execute(old_has_successful_attempt(command_id, question_id, [type_name]))).first()
+                assert await dao.has_successful_attempt_of_type(command_id, question_id, type_name) is (expected is not None)
+
+
+@pytest.mark.asyncio
+async def test_counters_match_adhoc_queries(db):
+    maker, ids = db
+    async with maker() as session:
+        dao = AttemptsDAO(session)
+        seen_nonzero = False
+        for block_id, command_id in itertools.product(ids["blocks"], ids["commands"]):
+            for method, names in (
+                (dao.get_solved_riddles_count, ["question", "question_hint"]),
+                (dao.get_insider_riddles_count, ["insider", "insider_hint"]),
+            ):
+                expected = await session.scalar(old_block_attempts_count(block_id, command_id, names))
+                assert await method(block_id, command_id) == expected
+                seen_nonzero |= expected > 0
+
+            for type_name in ("question_block", "insider_block"):
+                expected = await session.scalar(
+                    select(Attempt.id)
+                    .join(Question, Attempt.question_id == Question.id)
+                    .where(Attempt.command_id == command_id, Question.block_id == block_id,
+                           Attempt.attempt_type_id == TYPE_IDS[type_name], Attempt.is_true == True)
+                    .limit(1)
+                )
+                assert await dao.has_successful_block_attempt(command_id, block_id, TYPE_IDS[type_name]) is (
+                    expected is not None
+                )
+
+            expected = await session.scalar(select(func.count(Question.id)).where(Question.block_id == block_id))
+            assert await QuestionsDAO(session).get_total_riddles_count(block_id) == expected
+        assert seen_nonzero
+
+        for type_name in list(TYPE_IDS) + ["missing"]:
+            expected = await session.scalar(select(AttemptType).where(AttemptType.name == type_name))
+            assert await dao.get_attempt_type_by_name(type_name) is expected
+            assert await dao.get_attempt_type_id_by_name(type_name) == (expected.id if expected else None)
+
+
+@pytest.mark.asyncio
+async def test_user_command_in_event_matches_adhoc_query(db):
+    maker, ids = db
+    async with maker() as session:
+        event_id = await session.scalar(select(Event.id))
+        for user_id, event in itertools.product(ids["users"] + [10_000], (event_id, event_id + 1)):
+            expected = await session.scalar(
+                select(Command.id)
+                .join(CommandsUser, Command.id == CommandsUser.command_id)
+                .where(Command.event_id == event, CommandsUser.user_id == user_id)
+                .limit(1)
+            )
+            command = await UsersDAO(session).find_user_command_in_event(user_id, event)
+            assert (command.id if command else None) == expected
+            if command:
+                assert {assoc.user_id for assoc in command.users} >= {user_id}
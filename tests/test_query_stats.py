@@ -0,0 +1,113 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.dao.query_stats import QueryBudgetExceeded, instrument_engine, query_budget
+from app.main import QueryStatsMiddleware
+
+engine = create_engine("sqlite://")
+instrument_engine(engine)
+
+app = FastAPI()
+app.add_middleware(QueryStatsMiddleware)
+
+
+def run_queries(n: int) -> None:
+    with engine.connect() as conn:
+        for _ in range(n):
+            conn.execute(text("SELECT 1"))
+
+
+@app.get("/items/{item_id}")
+@query_budget(3)
+async def within_budget(item_id: int):
+    run_queries(3)
+    return {"ok": True}
+
+
+@app.get("/n-plus-one")
+@query_budget(3)
+async def over_budget():
+    run_queries(12)
+    return {"ok": True}
+
+
+def dependency_with_queries():
+    run_queries(5)
+
+
+@app.get("/with-dependency", dependencies=[Depends(dependency_with_queries)])
+@query_budget(3)
+async def budget_excludes_dependencies():
+    run_queries(2)
+    return {"ok": True}
+
+
+@app.get("/variant")
+@query_budget(2, detailed=4)
+async def budget_per_branch(detailed: bool = False):
+    run_queries(4 if detailed else 3)
+    return {"ok": True}
+
+
+@app.get("/no-budget")
+async def no_budget():
+    run_queries(5)
+    return {"ok": True}
+
+
+def test_headers_report_queries():
+    client = TestClient(app)
+    response = client.get("/items/1")
+    assert response.status_code == 200
+    assert response.headers["X-DB-Queries"] == "3"
+    assert float(response.headers["X-DB-Time"]) >= 0
+
+    assert client.get("/no-budget").headers["X-DB-Queries"] == "5"
+    # Запросы зависимостей видны в заголовке, но не входят в бюджет обработчика
+    assert client.get("/with-dependency").headers["X-DB-Queries"] == "7"
+
+
+def test_budget_exceeded_fails_in_strict_mode():
+    with pytest.raises(QueryBudgetExceeded, match="12 SQL-запросов при бюджете 3"):
+        TestClient(app).get("/n-plus-one")
+
+
+def test_branch_budget_applies_only_to_its_branch():
+    client = TestClient(app)
+    assert client.get("/variant?detailed=true").status_code == 200
+    with pytest.raises(QueryBudgetExceeded, match="3 SQL-запросов при бюджете 2"):
+        client.get("/variant")
+
+
+def test_budget_exceeded_only_warns_outside_tests(monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "DB_QUERY_BUDGET_STRICT", False)
+    assert TestClient(app).get("/n-plus-one").status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_are_logged_with_caller_and_plan(monkeypatch, tmp_path, seeded_db):
+    from loguru import logger
+
+    from app.config import settings
+    from app.dao import slow_queries
+    from app.quest.dao import AttemptsDAO
+
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_MS", 0.000001)
+    monkeypatch.setattr(settings, "DB_SLOW_QUERY_LOG_PATH", str(tmp_path / "slow.ndjson"))
+    monkeypatch.setattr(slow_queries, "_sink_id", None)
+
+    maker, ids = await seeded_db(commands=1, blocks=1, questions_per_block=1, instrument=True)
+    try:
+        async with maker() as session:
+            await AttemptsDAO(session).has_successful_solve_attempt(ids["commands"][0], ids["questions"][0])
+    finally:
+        logger.remove(slow_queries._sink_id)
+
+    entries = slow_queries.read_slow_queries()
+    entry = next(e for e in entries if e["caller"] == "AttemptsDAO.has_successful_solve_attempt")
+    assert entry["plan"] and any("attempts" in line for line in entry["plan"])
+    assert all(not isinstance(value, str) or value.startswith("<str") for value in entry["params"])
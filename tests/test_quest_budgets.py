@@ -0,0 +1,95 @@
+import asyncio
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from sqlalchemy import update
+from sqlalchemy.orm import selectinload
+
+from app.auth.models import Command, User
+from app.dao.writer import db_writer
+from app.dependencies.auth_dep import get_current_user
+from app.dependencies.dao_dep import get_session_without_commit
+from app.dependencies.quest_dep import get_authenticated_user_and_command
+from app.main import QueryStatsMiddleware
+from app.quest.content import quest_content
+from app.quest.models import Attempt, Question
+from app.quest.router import router
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch, seeded_db):
+    """Маршруты квеста с QueryStatsMiddleware на временной БД; бюджеты строгие (conftest)."""
+    maker, ids = await seeded_db(commands=2, blocks=2, questions_per_block=4, instrument=True)
+    monkeypatch.setattr(db_writer, "_session_maker", maker)
+    async with maker() as session:
+        await session.execute(update(Question).where(Question.id == ids["questions"][1]).values(hint_path="hint.png"))
+        session.add(Attempt(command_id=ids["commands"][0], user_id=ids["users"][0], question_id=ids["questions"][0],
+                            attempt_type_id=8, attempt_text="старт", is_true=True))  # money_start: 10 монет
+        await session.commit()
+        command = await session.get(Command, ids["commands"][0])
+        user = await session.get(User, ids["users"][0], options=[selectinload(User.role)])
+        user.role.name = "organizer"  # только в памяти: доступ к статистике команд
+    await quest_content.load(maker)
+
+    async def session_override():
+        async with maker() as session:
+            yield session
+
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware)
+    app.include_router(router, prefix="/api/quest")
+    app.dependency_overrides[get_session_without_commit] = session_override
+    app.dependency_overrides[get_authenticated_user_and_command] = lambda: (user, command)
+    app.dependency_overrides[get_current_user] = lambda: user
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http, ids
+
+
+@pytest.mark.asyncio
+async def test_quest_routes_stay_within_query_budgets(client):
+    """Ответы, подсказки и списки блоков - по всем веткам, включая решённые загадки со ссылками инсайдеров."""
+    http, ids = client
+    first, with_hint, third, fourth = ids["questions"][:4]
+    requests = [
+        ("GET", "/api/quest/", None),
+        ("GET", "/api/quest/?include_riddles=true", None),
+        ("GET", "/api/quest/1", None),
+        ("POST", f"/api/quest/riddles/{first}/check-answer", {"answer": "неверно"}),
+        ("POST", f"/api/quest/riddles/{first}/check-answer", {"answer": "ответ 0 0"}),
+        ("POST", f"/api/quest/riddles/{third}/check-answer", {"answer": "ответ 0 2", "additional_field": "место 2"}),
+        ("POST", f"/api/quest/riddles/{fourth}/check-answer", {"answer": "ответ 0 3"}),
+        ("GET", f"/api/quest/riddles/{with_hint}/hint", None),
+        ("GET", f"/api/quest/riddles/{with_hint}/hint", None),
+        ("GET", "/api/quest/commands/stats", None),
+        ("GET", "/api/quest/", None),
+        ("GET", "/api/quest/?include_riddles=true", None),
+        ("GET", "/api/quest/1", None),
+    ]
+    # Превышение бюджета в строгом режиме - QueryBudgetExceeded из QueryStatsMiddleware
+    for method, path, body in requests:
+        response = await http.request(method, path, json=body)
+        assert response.status_code == 200, (path, response.text)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_answers_and_hints_reward_once(client):
+    """Проверка и вставка идут одним заданием писателя: параллельные запросы команды не дублируют награду."""
+    http, ids = client
+    first, with_hint = ids["questions"][:2]
+    await db_writer.start()
+    try:
+        answers = await asyncio.gather(*(
+            http.post(f"/api/quest/riddles/{first}/check-answer", json={"answer": "ответ 0 0"}) for _ in range(5)
+        ))
+        hints = await asyncio.gather(*(http.get(f"/api/quest/riddles/{with_hint}/hint") for _ in range(5)))
+    finally:
+        await db_writer.stop()
+
+    assert sorted(response.status_code for response in answers) == [200, 400, 400, 400, 400]
+    assert [response.status_code for response in hints] == [200] * 5
+    # money_start 10 монет, подсказка списывается один раз
+    assert {response.json()["team_coins"] for response in hints} == {9}
+    assert max(response.json()["team_score"] for response in hints) == 10
@@ -0,0 +1,30 @@
+import dataclasses
+
+import pytest
+
+from app.quest.content import QuestContentStore
+from app.quest.models import Answer
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_rebuilt_on_invalidate(seeded_db):
+    maker, ids = await seeded_db(commands=1, blocks=2, questions_per_block=3)
+    store = QuestContentStore(channel="test", session_maker=maker)
+    content = await store.load()
+    assert [len(block.questions) for block in content.blocks_for_language(1)] == [3, 3]
+    question = content.questions[ids["questions"][0]]
+    assert question.has_additional_field and len(question.answers) == 1
+    assert await store.get() is content
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        question.title = "другое"
+
+    async with maker() as session:
+        session.add(Answer(question_id=question.id, answer_text="ещё ответ"))
+        await session.commit()
+    await store.invalidate()
+
+    updated = await store.get()
+    assert updated.version > content.version
+    assert len(updated.questions[question.id].answers) == 2
+    # Запросы, получившие прежний снимок, видят его неизменным
+    assert len(content.questions[question.id].answers) == 1
@@ -0,0 +1,34 @@
+import pytest
+
+from app.auth.redis_session import RedisSessionService
+from app.config import settings
+from app.redis_client import RedisClientRegistry
+
+
+@pytest.mark.asyncio
+async def test_fake_mode_shares_one_client_until_close(monkeypatch):
+    monkeypatch.setattr(settings, "REDIS_FAKE", True)
+    registry = RedisClientRegistry()
+    monkeypatch.setattr("app.auth.redis_session.redis_clients", registry)
+
+    client = registry.get()
+    assert registry.get() is client
+    assert RedisSessionService(redis_broker=None).redis is client
+    assert await registry.ping()
+    assert registry.healthy
+
+    await registry.close()
+    assert registry.healthy is None
+    assert registry.get() is not client
+    await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_ping_reports_unreachable_redis(monkeypatch):
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr(settings, "REDIS_RETRY_ATTEMPTS", 0)
+    registry = RedisClientRegistry()
+    assert not await registry.ping()
+    assert registry.healthy is False
+    assert registry.pool_stats()["max"] == settings.REDIS_MAX_CONNECTIONS
+    await registry.close()
@@ -0,0 +1,62 @@
+import pytest
+
+from app.auth.redis_session import RedisSessionService
+from app.config import settings
+from app.redis_client import RedisClientRegistry
+
+# Скрипты сессий выполняются на Lua: fakeredis умеет это только с пакетом lupa
+pytest.importorskip("lupa")
+
+
+@pytest.mark.asyncio
+async def test_session_lifecycle_scripts(monkeypatch):
+    monkeypatch.setattr(settings, "REDIS_FAKE", True)
+    monkeypatch.setattr(settings, "SESSION_TOKEN_FORMAT", "opaque")
+    registry = RedisClientRegistry()
+    monkeypatch.setattr("app.auth.redis_session.redis_clients", registry)
+    service = RedisSessionService(redis_broker=None)
+    await service.load_scripts()
+    try:
+        first = await service.create_session(1)
+        second = await service.create_session(1)
+        other = await service.create_session(2)
+
+        # Новый вход гасит прежнюю сессию вместе с её записями в наборе и индексе
+        assert await service.get_session(first) is None
+        assert (await service.get_session(second)).user_id == 1
+        assert await service.get_user_sessions(1) == {second}
+        assert await service.get_index_size() == 2
+
+        assert await service.touch_session(second)
+        assert not await service.touch_session(first)
+
+        # Просроченная по индексу сессия удаляется при чтении
+        await service.redis.zadd(service.session_index_key, {other: 1})
+        assert await service.get_session(other) is None
+        assert not await service.redis.exists(service._get_session_key(other))
+        assert await service.get_user_sessions(2) == set()
+
+        assert await service.deactivate_session(second)
+        assert not await service.deactivate_session(second)
+        await service.create_session(1)
+        assert await service.deactivate_all_sessions(1) == 1
+        assert await service.get_index_size() == 0
+    finally:
+        await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_login_trims_expired_tokens_from_index(monkeypatch):
+    monkeypatch.setattr(settings, "REDIS_FAKE", True)
+    monkeypatch.setattr(settings, "SESSION_TOKEN_FORMAT", "opaque")
+    registry = RedisClientRegistry()
+    monkeypatch.setattr("app.auth.redis_session.redis_clients", registry)
+    service = RedisSessionService(redis_broker=None)
+    await service.load_scripts()
+    try:
+        # Токены, чьи хеши уже удалены по TTL и которые больше никто не прочитает
+        await service.redis.zadd(service.session_index_key, {"stale-1": 1, "stale-2": 2})
+        token = await service.create_session(1)
+        assert await service.redis.zrange(service.session_index_key, 0, -1) == [token]
+    finally:
+        await registry.close()
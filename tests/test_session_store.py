@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.auth.dao import SessionDAO
+from app.auth.session_store import MemorySessionStore, check_session_settings, memory_session_store
+from app.config import settings
+from app.dao.database import create_engine_for_url
+
+
+@pytest.mark.asyncio
+async def test_memory_store_replaces_and_sweeps_sessions():
+    store = MemorySessionStore(shards=4)
+    first = await store.create_session(1)
+    second = await store.create_session(1)
+    other = await store.create_session(2)
+
+    # Новый вход гасит прежние сессии пользователя
+    assert await store.get_session(first) is None
+    assert (await store.get_session(second)).user_id == 1
+    assert len(store) == 2
+
+    store._shard(other)[other].expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    assert sum(store.sweep_shard(i) for i in range(4)) == 1
+    assert await store.get_session(other) is None
+
+    assert await store.deactivate_all_sessions(1) == 1
+    assert len(store) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_store_rejects_stale_snapshots():
+    store = MemorySessionStore(shards=4)
+    token = await store.create_session(1)
+    versions = await store.get_snapshot_versions(1)
+
+    # Пользователь изменился, пока снимок собирался из БД
+    store.drop_user_snapshots(1)
+    assert not await store.save_snapshot(token, 1, "{}", versions)
+
+    assert await store.save_snapshot(token, 1, "{}", await store.get_snapshot_versions(1))
+    assert (await store.get_session(token)).snapshot == "{}"
+    store.drop_all_snapshots()
+    assert (await store.get_session(token)).snapshot is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("store", ["memory", "sql"])
+async def test_login_reuses_and_extends_live_session(monkeypatch, seeded_db, store):
+    monkeypatch.setattr(settings, "SESSION_STORE", store)
+    maker, ids = await seeded_db(commands=1, blocks=1, questions_per_block=1)
+    user_id = ids["users"][0]
+    try:
+        async with maker() as session:
+            dao = SessionDAO(session)
+            token = await dao.login(user_id)
+            first_expiry = (await dao.get_session(token)).expires_at
+            await session.commit()
+
+        async with maker() as session:
+            dao = SessionDAO(session)
+            assert await dao.login(user_id) == token
+            assert (await dao.get_session(token)).expires_at >= first_expiry
+
+            monkeypatch.setattr(settings, "SESSION_REUSE_ON_LOGIN", False)
+            assert await dao.login(user_id) != token
+            assert await dao.get_session(token) is None
+            await session.commit()
+    finally:
+        await memory_session_store.clear_all_sessions()
+
+
+@pytest.mark.parametrize("store", ["sql", "memory"])
+def test_signed_tokens_require_redis_store(monkeypatch, store):
+    monkeypatch.setattr(settings, "SESSION_TOKEN_FORMAT", "signed")
+    monkeypatch.setattr(settings, "SESSION_STORE", store)
+    with pytest.raises(ValueError, match="только хранилищем redis"):
+        check_session_settings()
+
+    monkeypatch.setattr(settings, "SESSION_STORE", "redis")
+    check_session_settings()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("store, writes", [("memory", [1, 0]), ("sql", [2, 1])])
+async def test_telegram_login_writes_only_through_db_writer(monkeypatch, seeded_db, store, writes):
+    import hashlib
+    import hmac
+    import time
+
+    from app.auth import services
+    from app.auth.schemas import TelegramAuthData
+    from app.auth.telegram_verifier import TelegramAuthVerifier
+    from app.dao.writer import db_writer
+
+    bot_token = "123456:test-token"
+    monkeypatch.setattr(settings, "SESSION_STORE", store)
+    monkeypatch.setattr(services, "telegram_verifier", TelegramAuthVerifier(bot_token, 3600, 10))
+    maker, _ = await seeded_db(commands=1)
+    monkeypatch.setattr(db_writer, "_session_maker", maker)
+    submitted = []
+    submit = db_writer.submit
+    monkeypatch.setattr(db_writer, "submit", lambda job: submitted.append(job) or submit(job))
+
+    fields = {"id": "777", "first_name": "Иван", "auth_date": str(int(time.time()))}
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    digest = hmac.new(hashlib.sha256(bot_token.encode()).digest(), data_check_string.encode(), hashlib.sha256)
+    user_data = TelegramAuthData(**fields, hash=digest.hexdigest())
+
+    # Запрос работает на соединении только для чтения: запись мимо писателя упала бы
+    read_engine = create_engine_for_url(str(maker.kw["bind"].url), read_only=True)
+    tokens = []
+    try:
+        for expected_writes in writes:
+            submitted.clear()
+            async with async_sessionmaker(read_engine, expire_on_commit=False)() as session:
+                content, token = await services.UserService(session).handle_telegram_auth(user_data)
+            assert len(submitted) == expected_writes
+            tokens.append(token)
+        assert content["user"]["telegram_id"] == 777
+        assert tokens[0] == tokens[1]
+        async with maker() as session:
+            assert (await SessionDAO(session).get_session(tokens[0])).user_id == content["user"]["id"]
+    finally:
+        await read_engine.dispose()
+        await memory_session_store.clear_all_sessions()
@@ -0,0 +1,26 @@
+from app.auth.signed_tokens import issue_token, is_signed_token, verify_token
+
+KEY = "test-secret"
+
+
+def test_roundtrip_carries_claims():
+    token, claims = issue_token(42, role_id=3, event_id=1, lifetime_seconds=60, key=KEY)
+    assert is_signed_token(token)
+    assert verify_token(token, key=KEY) == claims
+    assert (claims.user_id, claims.role_id, claims.event_id) == (42, 3, 1)
+
+
+def test_rejects_forged_expired_and_foreign_tokens():
+    token, _ = issue_token(42, lifetime_seconds=60, key=KEY)
+    prefix, payload, signature = token.split(".")
+    other, _ = issue_token(1, lifetime_seconds=60, key=KEY)
+
+    assert verify_token(token, key="other-secret") is None
+    # Чужой payload с подписью нашего токена
+    assert verify_token(f"{prefix}.{other.split('.')[1]}.{signature}", key=KEY) is None
+    assert verify_token(token[:-2], key=KEY) is None
+    assert verify_token("opaque-random-token", key=KEY) is None
+
+    expired, claims = issue_token(42, lifetime_seconds=-1, key=KEY)
+    assert verify_token(expired, key=KEY) is None
+    assert verify_token(expired, key=KEY, check_expiry=False) == claims
@@ -0,0 +1,66 @@
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+from app.auth.telegram_verifier import TelegramAuthVerifier
+
+BOT_TOKEN = "123456:test-token"
+
+
+def _sign(fields: dict, key: bytes) -> str:
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    return hmac.new(key, data_check_string.encode(), hashlib.sha256).hexdigest()
+
+
+def _widget(auth_date: int) -> dict:
+    fields = {"id": "42", "first_name": "Иван", "auth_date": str(auth_date)}
+    return {**fields, "username": None, "hash": _sign(fields, hashlib.sha256(BOT_TOKEN.encode()).digest())}
+
+
+def _init_data(auth_date: int) -> str:
+    fields = {"auth_date": str(auth_date), "user": json.dumps({"id": 42, "first_name": "Иван"})}
+    key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    return urlencode({**fields, "hash": _sign(fields, key)})
+
+
+def test_accepts_signed_data_and_rejects_forged_or_stale():
+    verifier = TelegramAuthVerifier(BOT_TOKEN, max_age_seconds=3600, cache_size=10)
+    now = int(time.time())
+
+    assert verifier.verify_login_widget(_widget(now)).telegram_id == 42
+    assert verifier.verify_init_data(_init_data(now)).user["first_name"] == "Иван"
+
+    forged = {**_widget(now), "id": "43"}
+    assert verifier.verify_login_widget(forged) is None
+    assert verifier.verify_init_data(_init_data(now).replace("auth_date=", "auth_date=1")) is None
+    assert verifier.verify_login_widget(_widget(now - 7200)) is None
+    assert verifier.verify_init_data(_init_data(now - 7200)) is None
+
+
+def test_repeated_data_served_from_cache():
+    verifier = TelegramAuthVerifier(BOT_TOKEN, max_age_seconds=3600, cache_size=1)
+    data = _widget(int(time.time()))
+
+    first = verifier.verify_login_widget(data)
+    first.user_id = 7
+    # Тот же результат вместе с найденным пользователем, без повторной проверки HMAC
+    assert verifier.verify_login_widget(dict(data)) is first
+
+    verifier.verify_init_data(_init_data(int(time.time())))
+    assert verifier.verify_login_widget(data) is not first  # вытеснен из LRU размера 1
+
+
+def test_empty_bot_token_rejects_login_unless_explicitly_allowed():
+    now = int(time.time())
+    forged = {"id": "42", "first_name": "Иван", "auth_date": str(now), "hash": "0" * 64}
+    init_data = urlencode({"auth_date": str(now), "user": json.dumps({"id": 42}), "hash": "0" * 64})
+
+    verifier = TelegramAuthVerifier("", max_age_seconds=3600, cache_size=10)
+    assert verifier.verify_login_widget(forged) is None
+    assert verifier.verify_init_data(init_data) is None
+
+    dev = TelegramAuthVerifier("", max_age_seconds=3600, cache_size=10, allow_unsigned=True)
+    assert dev.verify_login_widget(forged).telegram_id == 42
+    assert dev.verify_init_data(init_data).telegram_id == 42